@@ -1,28 +1,23 @@
 from flask import Flask, render_template, request, jsonify
+import importlib
 import sys
 import io
-import os
 
-# Add interpreter directories to Python path
-current_dir = os.path.dirname(os.path.abspath(__file__))
-sys.path.append(os.path.join(current_dir, 'interpreter_v_1'))
-sys.path.append(os.path.join(current_dir, 'interpreter_v_2'))
-sys.path.append(os.path.join(current_dir, 'interpreter_v_3'))
-sys.path.append(os.path.join(current_dir, 'interpreter_v_4'))
+from parser.brewparse import set_incremental
 
-# Import all intepreter versions
-from interpreter_v_1.interpreterv1 import Interpreter as Interpreter1
-from interpreter_v_2.interpreterv2 import Interpreter as Interpreter2
-from interpreter_v_3.interpreterv3 import Interpreter as Interpreter3
-from interpreter_v_4.interpreterv4 import Interpreter as Interpreter4
+# Users edit one function at a time and resubmit the whole program, so only reparse
+# the functions that changed
+set_incremental(True)
 
 app = Flask(__name__)
 
+# The interpreter versions, by module; all four are thin facades over one tree
+# walker (core.py), and each is only imported once a request asks for it
 INTERPRETERS = {
-    "1": Interpreter1,
-    "2": Interpreter2,
-    "3": Interpreter3,
-    "4": Interpreter4
+    "1": "interpreter_v_1.interpreterv1",
+    "2": "interpreter_v_2.interpreterv2",
+    "3": "interpreter_v_3.interpreterv3",
+    "4": "interpreter_v_4.interpreterv4"
 }
 
 @app.route('/')
@@ -39,9 +34,10 @@ def run_code():
 
     try:
         # Get the appropriate interpreter class
-        InterpreterClass = INTERPRETERS.get(version)
-        if not InterpreterClass:
+        module = INTERPRETERS.get(version)
+        if not module:
             return jsonify({'error': f'Invalid interpreter version: {version}'}), 400
+        InterpreterClass = importlib.import_module(module).Interpreter
 
         # Capture stdout to get the interpreter's output
         old_stdout = sys.stdout
@@ -0,0 +1,89 @@
+# Measures how parse_many (parser/batch.py) scales with worker processes: the
+# interpreters' test corpora are copied over and over into a temporary directory to
+# about --files files, which are then parsed with 1, 2, 4, ... up to --max-workers
+# workers, against a plain loop over parse_program. Also shows what chunking saves by
+# running the widest pool with one file per task, and checks every run returns the
+# same trees and errors.
+#   python -m benchmarks.bench_batch [--files N] [--max-workers N]
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import corpus_files
+from parser.astbinary import dumps
+from parser.batch import parse_many
+from parser.brewparse import parse_program
+
+
+def replicate_corpus(directory, n_files):
+    sources = corpus_files()
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(directory, f"{i:05d}_{os.path.basename(sources[i % len(sources)])}")
+        shutil.copyfile(sources[i % len(sources)], path)
+        paths.append(path)
+    return paths
+
+
+# what parse_many returns, from a loop over parse_program in this process
+def sequential(paths):
+    results = []
+    for path in paths:
+        with open(path) as f:
+            program = f.read()
+        messages = io.StringIO()
+        ast = None
+        with contextlib.redirect_stdout(messages):
+            try:
+                ast = parse_program(program, use_cache=False)
+            except SyntaxError:
+                pass
+        error = messages.getvalue().strip() or (None if ast is not None else "Syntax error")
+        results.append((path, None if ast is None else dumps(ast), error))
+    return results
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, [tuple(r) for r in result]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--files", type=int, default=10000)
+    arg_parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = replicate_corpus(tmp, args.files)
+        megabytes = sum(os.path.getsize(path) for path in paths) / 1e6
+        print(f"{len(paths)} files, {megabytes:.1f} MB, {os.cpu_count()} CPUs")
+
+        base_seconds, expected = timed(lambda: sequential(paths))
+        print(f"{'parse_program loop':24} {base_seconds:7.2f} s")
+        mismatches = 0
+        workers = [1]
+        while workers[-1] * 2 <= args.max_workers:
+            workers.append(workers[-1] * 2)
+        if workers[-1] != args.max_workers:
+            workers.append(args.max_workers)
+        runs = [(f"parse_many, {n} worker{'s' if n > 1 else ''}", n, 1 << 18) for n in workers]
+        if args.max_workers > 1:
+            runs.append(("  ... one file per task", args.max_workers, 1))
+        for name, n, chunk_bytes in runs:
+            seconds, results = timed(lambda: parse_many(paths, n, serialized=True, chunk_bytes=chunk_bytes))
+            if results != expected:
+                mismatches += 1
+                name += " MISMATCH"
+            print(f"{name:24} {seconds:7.2f} s  {base_seconds / seconds:5.2f}x")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Checks and measures block-scope elision in the v2 and v3 closure compilers (see
+# compile_block in compile_v2.py and compile_v3.py), which run a block that defines
+# no variables of its own without pushing a scope for it:
+#   - parity: every run of bench_core's and bench_frames' scoping programs must
+#     print the same and fail with the same error, on the same line, as in a
+#     checkout of the commit before,
+#   - the scopes pushed running corpus programs and loop-heavy ones on the closure
+#     engines, before and after, and the time the loop-heavy ones take.
+# The tree walker keeps its variables in flat frames (see resolve.py), and the
+# Python and bytecode engines resolve them when they translate a program, so none
+# of those push scopes at all.
+#   python -m benchmarks.bench_blocks [--repeat N] [--baseline REV]
+import argparse
+import os
+
+from benchmarks.bench_core import RUN, core_cases
+from benchmarks.bench_frames import DEEP_V2, SCOPING_CASES_V2, SCOPING_CASES_V3
+from benchmarks.bench_transpile import LOOP_V2
+from benchmarks.bench_typed import LOOP, test_input
+from benchmarks.common import REPO_ROOT, baseline_before, corpus_files, read_source, run_in, worktree
+
+# [scopes pushed, best seconds] of running each (version, program, input) repeat
+# times on the closure engine
+PUSHES = """
+import contextlib, io, json, sys, time
+sys.path.insert(0, ".")
+import core
+from interpreter_v_2.interpreterv2 import Interpreter as V2
+from interpreter_v_3.interpreterv3 import Interpreter as V3
+pushes = 0
+push_block = core.EnvironmentManager.push_block
+def counting_push_block(self):
+    global pushes
+    pushes += 1
+    push_block(self)
+results = []
+for version, program, inp in {programs!r}:
+    best = None
+    for _ in range({repeat}):
+        interpreter = {{"2": V2, "3": V3}}[version](console_output=False, inp=inp, engine="closures")
+        stdin = sys.stdin
+        sys.stdin = io.StringIO()
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                interpreter.run(program)
+        except Exception:
+            pass
+        finally:
+            sys.stdin = stdin
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    # the scopes of one more run, counted
+    pushes = 0
+    core.EnvironmentManager.push_block = counting_push_block
+    interpreter = {{"2": V2, "3": V3}}[version](console_output=False, inp=inp, engine="closures")
+    sys.stdin = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program)
+    except Exception:
+        pass
+    finally:
+        sys.stdin = stdin
+        core.EnvironmentManager.push_block = push_block
+    results.append([pushes, best])
+print(json.dumps(results))
+"""
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--baseline", help="commit without block-scope elision to compare against")
+    args = arg_parser.parse_args()
+    baseline = args.baseline or baseline_before("benchmarks/bench_blocks.py")
+
+    cases = core_cases()
+    for version, sources in (("2", SCOPING_CASES_V2), ("3", SCOPING_CASES_V3)):
+        cases += [(f"v{version} scoping {i} ({engine})", version, engine, source, ["7"])
+                  for i, source in enumerate(sources) for engine in ("closures", "tiered")]
+    corpus = []
+    for path in corpus_files():
+        version = os.path.relpath(path, REPO_ROOT).split(os.sep)[0][-1]
+        if version in "23":
+            source = read_source(path)
+            corpus.append((version, source, test_input(source)))
+    workloads = [
+        ("v2 loop 200x100", "2", LOOP_V2 % 200, None),
+        ("v2 six blocks down", "2", DEEP_V2 % 5000, None),
+        ("v3 loop 200x100", "3", LOOP % 200, None),
+    ]
+    runs = [(version, engine, source, inp) for _, version, engine, source, inp in cases]
+    timed = [(version, program, inp) for _, version, program, inp in workloads]
+    with worktree(baseline) as tmp:
+        before = run_in(tmp, RUN.format(cases=runs))
+        after = run_in(REPO_ROOT, RUN.format(cases=runs))
+        corpus_before = run_in(tmp, PUSHES.format(programs=corpus, repeat=1))
+        corpus_after = run_in(REPO_ROOT, PUSHES.format(programs=corpus, repeat=1))
+        timed_before = run_in(tmp, PUSHES.format(programs=timed, repeat=args.repeat))
+        timed_after = run_in(REPO_ROOT, PUSHES.format(programs=timed, repeat=args.repeat))
+
+    print(f"baseline {baseline}")
+    mismatches = 0
+    for (name, *_), old, new in zip(cases, before, after):
+        if old != new:
+            mismatches += 1
+            print(f"MISMATCH {name}: {new} instead of {old}")
+    print(f"parity: {len(cases)} runs, {mismatches} mismatches")
+
+    pushed_before = sum(pushes for pushes, _ in corpus_before)
+    pushed_after = sum(pushes for pushes, _ in corpus_after)
+    print(
+        f"corpus ({len(corpus)} v2 and v3 programs): {pushed_after} scopes pushed, of {pushed_before}"
+        f" ({1 - pushed_after / max(pushed_before, 1):.0%} avoided)"
+    )
+
+    print(f"\n{'program':22}{'pushed before':>15}{'after':>9}{'before':>10}{'after':>10}{'speedup':>9}")
+    for (name, *_), (old_pushes, old), (new_pushes, new) in zip(workloads, timed_before, timed_after):
+        print(f"{name:22}{old_pushes:15}{new_pushes:9}{old * 1e3:8.1f}ms{new * 1e3:8.1f}ms{old / new:8.2f}x")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
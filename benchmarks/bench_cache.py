@@ -0,0 +1,126 @@
+# Checks the parse cache (parser/astcache.py): every tree parse_program hands out with
+# the cache on is frozen, whether it fits in the cache or not. Then checks that a
+# damaged file in the on-disk store (parser/aststore.py) is a miss rather than an
+# error, for every way of cutting a file short and every byte flipped, and times a
+# cache hit against a parse.
+#   python -m benchmarks.bench_cache [--funcs N] [--repeat N]
+import argparse
+import contextlib
+import io
+import struct
+import tempfile
+import zlib
+
+from benchmarks.common import best_time, generated_program
+from parser import astbinary, brewparse
+from parser.brewparse import parse_program, source_key
+
+# every kind of field value astbinary stores: node lists, field paths, big ints, nil
+STORED_PROGRAM = (
+    generated_program(1)
+    + "func fill(p) {\n  p.a.b = 123456789012345678901234567890;\n  return nil;\n}\n"
+)
+
+
+# whether changing a node of ast fails, as it must for a frozen tree
+def is_read_only(ast):
+    try:
+        ast.functions[0].name = "changed"
+    except AttributeError:
+        return True
+    return False
+
+
+def check_frozen():
+    cache = brewparse.parse_cache
+    small = generated_program(2)
+    large = generated_program(20)
+    recovered = "func main() { print(1) } func main() { print(2); }"  # a syntax error recovered from
+    failures = 0
+    max_bytes = cache.max_bytes
+    cache.max_bytes = len(small) * 2  # large doesn't fit
+    try:
+        programs = (("small program", small), ("oversized program", large), ("recovered program", recovered))
+        for name, program in programs:
+            cache.clear()
+            with contextlib.redirect_stdout(io.StringIO()):
+                first, again = parse_program(program), parse_program(program)
+            if not (is_read_only(first) and is_read_only(again)):
+                failures += 1
+                print(f"FAILED: the tree of the {name} can be changed")
+    finally:
+        cache.max_bytes = max_bytes
+        cache.clear()
+    return failures
+
+
+# Writes each damaged copy of a stored tree in place of the good one and checks that
+# loading it is a miss. The copies with the checksum patched up to match get past
+# it, so they check that the reader's own bounds checks hold: those may load (a
+# flipped span is still a tree), but must never fail other than with a miss.
+def check_store():
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        store = brewparse.set_ast_store(tmp)
+        try:
+            brewparse.parse_cache.clear()
+            parse_program(STORED_PROGRAM)
+            key = source_key(STORED_PROGRAM)
+            path = store.path_for(key)
+            with open(path, "rb") as f:
+                data = f.read()
+
+            def load(damaged):
+                with open(path, "wb") as f:
+                    f.write(damaged)
+                try:
+                    return store.load(key)
+                except Exception as e:
+                    return e
+
+            for size in range(len(data)):
+                if load(data[:size]) is not None:
+                    failures += 1
+                    print(f"FAILED: a store file cut to {size} bytes didn't miss")
+            header_size = astbinary._HEADER.size  # the checksum is the header's last field
+            for at in range(len(data)):
+                damaged = bytearray(data)
+                damaged[at] ^= 0xFF
+                if load(bytes(damaged)) is not None:
+                    failures += 1
+                    print(f"FAILED: a store file with byte {at} flipped didn't miss")
+                if at >= header_size:
+                    struct.pack_into("<I", damaged, header_size - 4, zlib.crc32(damaged[header_size:]))
+                    result = load(bytes(damaged))
+                    if isinstance(result, BaseException):
+                        failures += 1
+                        print(f"FAILED: byte {at} flipped under a good checksum raised {result!r}")
+        finally:
+            brewparse.set_ast_store(None)
+            brewparse.parse_cache.clear()
+    return failures
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--funcs", type=int, default=300, help="functions in the generated program")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    failures = check_frozen()
+    print(f"frozen trees: {failures} failures")
+    store_failures = check_store()
+    print(f"damaged store files: {store_failures} failures")
+    failures += store_failures
+
+    program = generated_program(args.funcs)
+    parse = best_time(lambda: parse_program(program, use_cache=False), args.repeat)
+    parse_program(program)
+    hit = best_time(lambda: parse_program(program), args.repeat)
+    print(f"{args.funcs}-function program: parse {parse * 1e3:.1f}ms, cache hit {hit * 1e3:.3f}ms")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
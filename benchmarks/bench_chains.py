@@ -0,0 +1,150 @@
+# Checks and measures chain nodes (parser/chains.py): long runs of one operator like
+# 1 + 1 + ... + 1 used to be evaluated with a level of recursion per operator.
+#   - parity: a set of chain programs for each interpreter version, covering short-
+#     circuiting and laziness in v4, coercion in v3 and type errors part way along,
+#     must print the same and fail the same way as in a checkout of the commit before
+#     chain nodes,
+#   - depth: a chain of --terms operands in each version, which used to overflow
+#     the stack,
+#   - time: evaluating a 200-operand chain over and over, before and after.
+#   python -m benchmarks.bench_chains [--terms N] [--baseline REV]
+import argparse
+
+from benchmarks.common import REPO_ROOT, baseline_before, run_in, worktree
+
+
+def chain(op, operand, n):
+    return f" {op} ".join([operand] * n)
+
+
+# (name, version, program) for each parity case, with chains of n operands
+def parity_cases(n):
+    v2_main = "func main() {{\n  var x;\n  {body}\n}}\n"
+    v3_main = "func main(): void {{\n  var x: {type};\n  {body}\n}}\n"
+    v4_main = """func side() {{
+  print("evaluated");
+  return true;
+}}
+func ten() {{
+  print("ten");
+  return 10;
+}}
+func main() {{
+  var x;
+  {body}
+}}
+"""
+    cases = [
+        ("v1 +", "1", f"func main() {{\n  var x;\n  x = {chain('+', '2', n)};\n  print(x);\n}}\n"),
+        ("v1 -", "1", f"func main() {{\n  var x;\n  x = 1000 - {chain('-', '3', n)};\n  print(x);\n}}\n"),
+        ("v1 type error", "1", f"func main() {{\n  var x;\n  x = {chain('+', '1', n)} + \"s\" + 1;\n}}\n"),
+    ]
+    v2_bodies = {
+        "+": f"x = {chain('+', '1', n)}; print(x);",
+        "*": f"x = {chain('*', '1', n)} * 7; print(x);",
+        "/": f"x = 1000000 / {chain('/', '1', n)} / 7; print(x);",
+        "strings": f'x = {chain("+", chr(34) + "ab" + chr(34), n)}; print(x);',
+        "&&": f"x = {chain('&&', 'true', n)}; print(x);",
+        "||": f"x = {chain('||', 'false', n)} || true; print(x);",
+        "==": f"x = 1 == 1 == true == true; print(x);",
+        "type error": f'x = {chain("+", "1", n)} + "s" + 1; print(x);',
+    }
+    cases += [(f"v2 {name}", "2", v2_main.format(body=body)) for name, body in v2_bodies.items()]
+    v3_bodies = {
+        "+": ("int", f"x = {chain('+', '1', n)}; print(x);"),
+        "&& coercion": ("bool", f"x = {chain('&&', '5', n)} && 0; print(x);"),
+        "|| coercion": ("bool", f"x = {chain('||', '0', n)} || true; print(x);"),
+        "== coercion": ("bool", "x = 1 == 1 == true == 2; print(x);"),
+        "strings": ("string", f'x = {chain("+", chr(34) + "ab" + chr(34), n)}; print(x);'),
+        "type error": ("int", f"x = {chain('+', '1', n)} + true + 1; print(x);"),
+    }
+    cases += [
+        (f"v3 {name}", "3", v3_main.format(type=var_type, body=body))
+        for name, (var_type, body) in v3_bodies.items()
+    ]
+    v4_bodies = {
+        "+": f"x = {chain('+', '1', n)}; print(x);",
+        "&& short-circuit": f"x = true && false && {chain('&&', 'side()', n)}; print(x);",
+        "|| short-circuit": f"x = false || side() || {chain('||', 'side()', n)}; print(x);",
+        "&& evaluates": f"x = {chain('&&', 'side()', n)}; print(x);",
+        "lazy": f'x = {chain("+", "ten()", n)}; print("before"); print(x); print(x);',
+        "div0": f'try {{ x = 100 / {chain("/", "1", n)} / 0 / ten(); print(x); }} catch "div0" {{ print("caught"); }}',
+        "div0 lazy": f'x = 100 / {chain("/", "1", n)} / 0; print("never used");',
+        "type error": f'x = {chain("+", "1", n)} + "s" + 1; print(x);',
+    }
+    cases += [(f"v4 {name}", "4", v4_main.format(body=body)) for name, body in v4_bodies.items()]
+    return cases
+
+
+# prints [output, error] for each case; error is the type and start of the message
+# of whatever the run raised, or None
+RUN = """
+import contextlib, io, json, sys
+sys.path.insert(0, ".")
+sys.path.insert(0, "interpreter_v_1")
+from interpreterv1 import Interpreter as V1
+from interpreter_v_2.interpreterv2 import Interpreter as V2
+from interpreter_v_3.interpreterv3 import Interpreter as V3
+from interpreter_v_4.interpreterv4 import Interpreter as V4
+versions = {{"1": V1, "2": V2, "3": V3, "4": V4}}
+results = []
+for version, program in {cases!r}:
+    interpreter = versions[version](console_output=False)
+    error = None
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program)
+    except Exception as e:
+        error = type(e).__name__ + ": " + str(e)[:60]
+    results.append([interpreter.get_output(), error])
+print(json.dumps(results))
+"""
+
+# prints the best time to run a loop that evaluates a 200-operand chain rounds times
+TIMING = """
+import sys
+sys.path.insert(0, ".")
+from benchmarks.common import best_time
+from interpreter_v_2.interpreterv2 import Interpreter
+program = "func main() {{ var i; var x; for (i = 0; i < {rounds}; i = i + 1) {{ x = {chain}; }} print(x); }}"
+print(best_time(lambda: Interpreter(console_output=False).run(program), repeat=5))
+"""
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--terms", type=int, default=20000, help="operands in the depth test's chains")
+    arg_parser.add_argument("--rounds", type=int, default=200, help="evaluations of the timed chain")
+    arg_parser.add_argument("--baseline", help="commit without chain nodes to compare against")
+    args = arg_parser.parse_args()
+    baseline = args.baseline or baseline_before("parser/chains.py")
+
+    cases = parity_cases(40)
+    deep = [(f"v{v} {args.terms} terms", v, program) for name, v, program in parity_cases(args.terms)
+            if name.endswith(" +")]
+    timing = TIMING.format(rounds=args.rounds, chain=chain("+", "1", 200))
+    with worktree(baseline) as tmp:
+        before = run_in(tmp, RUN.format(cases=[(v, p) for _, v, p in cases]))
+        after = run_in(REPO_ROOT, RUN.format(cases=[(v, p) for _, v, p in cases]))
+        deep_before = run_in(tmp, RUN.format(cases=[(v, p) for _, v, p in deep]))
+        deep_after = run_in(REPO_ROOT, RUN.format(cases=[(v, p) for _, v, p in deep]))
+        seconds_before, seconds_after = run_in(tmp, timing), run_in(REPO_ROOT, timing)
+
+    print(f"baseline {baseline}")
+    mismatches = 0
+    for (name, _, _), old, new in zip(cases, before, after):
+        if old != new:
+            mismatches += 1
+            print(f"MISMATCH {name}: {new} instead of {old}")
+    print(f"parity: {len(cases)} chain programs, {mismatches} mismatches")
+    failures = 0
+    for (name, _, _), (_, old_error), (output, error) in zip(deep, deep_before, deep_after):
+        failures += error is not None
+        print(f"{name:18} before: {(old_error or 'ok')[:40]:40}  now: {error or 'ok, printed ' + output[0][:12]}")
+    print(f"v2, 200-operand chain x{args.rounds}: {seconds_before * 1e3:.1f}ms -> {seconds_after * 1e3:.1f}ms")
+    if mismatches or failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
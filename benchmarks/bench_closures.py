@@ -0,0 +1,132 @@
+# Compares the v2 interpreter's two engines: walking the AST, and running it compiled
+# to closures (interpreter_v_2/compile_v2.py). Every v2 test program, plus a few
+# programs aimed at corners of the tree walker's behavior, must print the same and
+# fail with the same error on both; then fib and loop-heavy programs are timed.
+#   python -m benchmarks.bench_closures [--repeat N]
+import argparse
+import contextlib
+import io
+import os
+import re
+
+from benchmarks.common import REPO_ROOT, best_time, corpus_files, read_source
+from interpreter_v_2.interpreterv2 import Interpreter
+
+CORNER_CASES = [
+    # the update runs once more after the condition turns false
+    "func main() { var i; for (i = 0; i < 3; i = i + 1) { } print(i); }",
+    # a repeated formal parameter takes the last argument
+    "func f(a, a) { return a; } func main() { print(f(1, 2)); }",
+    # expression statements other than calls aren't evaluated
+    "func main() { var x; x + undefined_var; print(\"ok\"); }",
+    # overloading on argument count, and calls to the wrong count
+    "func f(a) { return a; } func f(a, b) { return a + b; } func main() { print(f(1), f(1, 2)); f(1, 2, 3); }",
+    # errors in nested blocks and calls get the innermost statement's line
+    "func f(x) {\n  if (x > 0) {\n    return f(x - 1);\n  }\n  return x + \"s\";\n}\nfunc main() {\n  print(f(3));\n}",
+    # a function without a return gives nil
+    "func f() { var x; } func main() { print(f() == nil); }",
+    # shadowing in blocks, and a variable leaking out of neither
+    "func main() { var x; x = 1; if (true) { var x; x = 2; print(x); } print(x); }",
+    "func main() { if (true) { var y; } print(y); }",
+    # chains, comparisons across types, unary operators
+    "func main() { print(1 + 2 + 3 - 4 - 5, 1 == \"1\", nil != 0, -3 * -3, !false && true && !!true); }",
+    "func main() { print(!3); }",
+    "func main() { print(1 / 0); }",
+]
+
+FIB = """
+func fib(n) {
+  if (n == 0 || n == 1) {
+    return 1;
+  }
+  return fib(n - 1) + fib(n - 2);
+}
+func main() {
+  print(fib(%d));
+}
+"""
+
+LOOP = """
+func main() {
+  var i;
+  var j;
+  var total;
+  total = 0;
+  for (i = 0; i < %d; i = i + 1) {
+    for (j = 0; j < 100; j = j + 1) {
+      if (j / 2 * 2 == j) {
+        total = total + j;
+      } else {
+        total = total - 1;
+      }
+    }
+  }
+  print(total);
+}
+"""
+
+STRINGS = """
+func main() {
+  var i;
+  var s;
+  s = "";
+  for (i = 0; i < %d; i = i + 1) {
+    if (s == "xxxxxxxxxx") {
+      s = "";
+    }
+    s = s + "x";
+  }
+  print(s);
+}
+"""
+
+
+# the input lines in a test program's *IN* comment
+def test_input(source):
+    match = re.search(r"\*IN\*\n(.*?)\*IN\*", source, re.S)
+    return match.group(1).splitlines() if match else None
+
+
+# (output, error) from running program with engine
+def run(program, engine, inp=None):
+    interpreter = Interpreter(console_output=False, inp=inp, engine=engine)
+    error = None
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return interpreter.get_output(), error
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    corpus = os.path.join(REPO_ROOT, "interpreter_v_2", "")
+    programs = []
+    for path in corpus_files():
+        if path.startswith(corpus):
+            source = read_source(path)
+            programs.append((os.path.relpath(path, corpus), source, test_input(source)))
+    programs += [(f"corner case {i}", source, None) for i, source in enumerate(CORNER_CASES)]
+    mismatches = 0
+    for name, source, inp in programs:
+        walked, compiled = run(source, "ast", inp), run(source, "closures", inp)
+        if walked != compiled:
+            mismatches += 1
+            print(f"MISMATCH {name}: {compiled} instead of {walked}")
+    print(f"parity: {len(programs)} programs, {mismatches} mismatches")
+
+    print(f"{'program':16} {'ast':>9} {'closures':>9} {'speedup':>8}")
+    for name, program in (("fib(18)", FIB % 18), ("loop 200x100", LOOP % 200), ("strings 20000", STRINGS % 20000)):
+        walked = best_time(lambda: run(program, "ast"), args.repeat)
+        compiled = best_time(lambda: run(program, "closures"), args.repeat)
+        print(f"{name:16} {walked * 1e3:7.1f}ms {compiled * 1e3:7.1f}ms {walked / compiled:7.2f}x")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
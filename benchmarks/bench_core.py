@@ -0,0 +1,219 @@
+# Checks and measures the shared tree walker (core.py), which the four interpreter
+# versions became thin facades over:
+#   - parity: every corpus program, on every engine of its version, plus the corner
+#     cases of the other benchmarks and some v1 programs, must print the same and
+#     fail with the same error, on the same line, as in a checkout of the commit
+#     before the shared core,
+#   - recursion: the deepest recursion of a Brewin function, in an expression and as
+#     a statement, each version runs on its default engine, which mustn't be less
+#     than before (every Python frame the walker adds per call costs levels),
+#   - startup: the time, memory (tracemalloc's peak) and modules it takes to import
+#     an interpreter, in a fresh process; the web app used to import all four
+#     versions, with every engine of each, where it now imports the one a request
+#     asks for, and an engine only once it's used.
+#   python -m benchmarks.bench_core [--repeat N] [--baseline REV]
+import argparse
+import os
+
+from benchmarks.bench_chains import parity_cases
+from benchmarks.bench_quicken import SHIFTING_CASES, SHIFTING_CASES_V4
+from benchmarks.bench_transpile import V2_CORNER_CASES
+from benchmarks.bench_typed import CORNER_CASES, test_input
+from benchmarks.common import REPO_ROOT, baseline_before, corpus_files, read_source, run_in, worktree
+
+ENGINES = {
+    "1": [None],
+    "2": ["ast", "tiered", "closures", "python"],
+    "3": ["ast", "tiered", "closures", "bytecode", "python"],
+    "4": [None],
+}
+
+V1_CASES = [
+    'func main() { var x; var y; x = inputi("n? "); y = x + 10 - 3; print("x=", x, " y=", y); }',
+    "func main() { var x; x = 5; var x; }",
+    "func main() { var x; y = 1; }",
+    "func main() { print(nosuchvar); }",
+    "func main() { var x; x = 1; foo(x); }",
+    "func main() { inputs(); }",
+    'func main() { print("a", 1 + 2, "b"); print(inputi("one", "two")); }',
+    "func f() { print(1); } func main() { print(2); } func main() { print(3); }",
+    "func helper() { print(1); }",
+    'func main() { var s; s = "abc"; print(s, s); s = 7 - -2; print(s); }',
+]
+
+# prints [output, error] for each (version, engine, program, input); error is the
+# type and message of whatever the run raised, or None
+RUN = """
+import contextlib, io, json, re, sys
+sys.path.insert(0, ".")
+sys.path.insert(0, "interpreter_v_1")
+from interpreterv1 import Interpreter as V1
+from interpreter_v_2.interpreterv2 import Interpreter as V2
+from interpreter_v_3.interpreterv3 import Interpreter as V3
+from interpreter_v_4.interpreterv4 import Interpreter as V4
+from tiering import Tiering
+versions = {{"1": V1, "2": V2, "3": V3, "4": V4}}
+results = []
+for version, engine, program, inp in {cases!r}:
+    if engine is None:
+        interpreter = versions[version](console_output=False, inp=inp)
+    else:
+        # thresholds low enough that nearly everything tiers up
+        tiering = Tiering(1, 1) if engine == "tiered" else None
+        interpreter = versions[version](console_output=False, inp=inp, engine=engine, tiering=tiering)
+    error = None
+    stdin = sys.stdin
+    sys.stdin = io.StringIO()  # with no input given, the interpreter reads the console
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program)
+    except Exception as e:
+        error = type(e).__name__ + ": " + str(e)
+        # objects by their class alone: the classes moved modules
+        error = re.sub(r"<[\\w.]*?(\\w+) object at 0x[0-9a-f]+>", r"<\\1 object>", error)
+    finally:
+        sys.stdin = stdin
+    results.append([interpreter.get_output(), error])
+print(json.dumps(results))
+"""
+
+# recursive programs, by version, for the recursion check: N is the depth, and each
+# prints it if it gets there
+RECURSIVE = {
+    "2": [
+        ("expression", "func f(n) { if (n == 0) { return 0; } return 1 + f(n - 1); } func main() { print(f(N)); }"),
+        ("statement", "func f(n) { if (n > 0) { f(n - 1); } } func main() { f(N); print(N); }"),
+    ],
+    "3": [
+        ("expression", "func f(n: int) : int { if (n == 0) { return 0; } return 1 + f(n - 1); }"
+                       " func main() : void { print(f(N)); }"),
+        ("statement", "func f(n: int) : void { if (n > 0) { f(n - 1); } } func main() : void { f(N); print(N); }"),
+    ],
+}
+RECURSIVE["4"] = RECURSIVE["2"]
+
+# prints the deepest N (up to 5000) each of programs, [(version, program)], runs to
+# the end at
+RECURSION = """
+import contextlib, io, json, sys
+sys.path.insert(0, ".")
+from importlib import import_module
+def reaches(version, program, n):
+    interpreter = import_module(f"interpreter_v_{{version}}.interpreterv{{version}}").Interpreter(console_output=False)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program.replace("N", str(n)))
+    except Exception:
+        return False
+    return interpreter.get_output() == [str(n)]
+depths = []
+for version, program in {programs!r}:
+    low, high = 0, 5000
+    while low < high:
+        middle = (low + high + 1) // 2
+        low, high = (middle, high) if reaches(version, program, middle) else (low, middle - 1)
+    depths.append(low)
+print(json.dumps(depths))
+"""
+
+# prints [seconds, peak bytes, modules] for importing what the web app needs for
+# versions, in this process
+STARTUP = """
+import sys, time, tracemalloc
+sys.path.insert(0, ".")
+modules = len(sys.modules)
+tracemalloc.start()
+start = time.perf_counter()
+{imports}
+seconds = time.perf_counter() - start
+peak = tracemalloc.get_traced_memory()[1]
+import json
+print(json.dumps([seconds, peak, len(sys.modules) - modules]))
+"""
+
+# how app.py imported the interpreters before the shared core: all four, up front
+APP_BEFORE = """import os
+for version in range(1, 5):
+    sys.path.append(os.path.join(".", f"interpreter_v_{version}"))
+from interpreter_v_1.interpreterv1 import Interpreter as Interpreter1
+from interpreter_v_2.interpreterv2 import Interpreter as Interpreter2
+from interpreter_v_3.interpreterv3 import Interpreter as Interpreter3
+from interpreter_v_4.interpreterv4 import Interpreter as Interpreter4"""
+
+
+def app_now(versions):
+    return "import importlib\n" + "\n".join(
+        f"importlib.import_module('interpreter_v_{v}.interpreterv{v}').Interpreter" for v in versions
+    )
+
+
+# (min seconds, min peak bytes, modules) for imports, over repeat fresh processes
+def startup(tree, imports, repeat):
+    runs = [run_in(tree, STARTUP.format(imports=imports)) for _ in range(repeat)]
+    return min(r[0] for r in runs), min(r[1] for r in runs), runs[0][2]
+
+
+# (name, version, engine, program, input) for every run the parity check makes
+def core_cases():
+    cases = []
+    for path in corpus_files():
+        version = os.path.relpath(path, REPO_ROOT).split(os.sep)[0][-1]
+        source = read_source(path)
+        for engine in ENGINES[version]:
+            cases.append((f"{os.path.relpath(path, REPO_ROOT)} ({engine or 'ast'})", version, engine, source,
+                          test_input(source)))
+    extra = [("1", V1_CASES), ("2", V2_CORNER_CASES + SHIFTING_CASES), ("3", CORNER_CASES), ("4", SHIFTING_CASES_V4)]
+    for version, sources in extra:
+        for i, source in enumerate(sources):
+            for engine in ENGINES[version]:
+                cases.append((f"v{version} case {i} ({engine or 'ast'})", version, engine, source, ["7"]))
+    cases += [(f"chains {name}", version, None if version in "14" else "ast", source, None)
+              for name, version, source in parity_cases(12)]
+    return cases
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--baseline", help="commit without the shared core to compare against")
+    args = arg_parser.parse_args()
+    baseline = args.baseline or baseline_before("core.py")
+
+    cases = core_cases()
+    runs = [(version, engine, source, inp) for _, version, engine, source, inp in cases]
+    with worktree(baseline) as tmp:
+        before = run_in(tmp, RUN.format(cases=runs))
+        after = run_in(REPO_ROOT, RUN.format(cases=runs))
+        recursive = [(version, name, program) for version, programs in RECURSIVE.items() for name, program in programs]
+        programs = [(version, program) for version, _, program in recursive]
+        depths = zip(recursive, run_in(tmp, RECURSION.format(programs=programs)),
+                     run_in(REPO_ROOT, RECURSION.format(programs=programs)))
+        startups = [
+            ("before: all four (app.py)", startup(tmp, APP_BEFORE, args.repeat)),
+            ("now: all four", startup(REPO_ROOT, app_now("1234"), args.repeat)),
+        ]
+        startups += [(f"now: v{v} only", startup(REPO_ROOT, app_now(v), args.repeat)) for v in "1234"]
+
+    print(f"baseline {baseline}")
+    mismatches = 0
+    for (name, *_), old, new in zip(cases, before, after):
+        if old != new:
+            mismatches += 1
+            print(f"MISMATCH {name}: {new} instead of {old}")
+    print(f"parity: {len(cases)} runs, {mismatches} mismatches")
+
+    print(f"\n{'deepest recursion':28}{'before':>8}{'now':>8}")
+    for (version, name, _), old, new in depths:
+        if new < old:
+            mismatches += 1
+        print(f"{f'v{version} {name}':28}{old:8}{new:8}{'  LESS THAN BEFORE' if new < old else ''}")
+
+    print(f"\n{'imports':28}{'time':>9}{'peak memory':>14}{'modules':>9}")
+    for name, (seconds, peak, modules) in startups:
+        print(f"{name:28}{seconds * 1e3:7.1f}ms{peak / 1024:11.0f}KiB{modules:9}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
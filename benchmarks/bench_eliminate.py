@@ -0,0 +1,222 @@
+# Checks and measures dead-code elimination (eliminate.py), which every version runs
+# as a program's loaded, after constant folding, unless it's made with
+# eliminate=False:
+#   - parity: every run of bench_core's, plus programs with unreachable statements,
+#     constant branches and unused variables (some of them with initializers that
+#     fail, or print), raises where they do nothing (v2, v3), v1 programs with ifs
+#     and returns, which it never runs, and generated programs, must print the same
+#     and fail with the same error, on the same line, as in a checkout of the commit
+#     before,
+#   - what was removed from each function of a sample program,
+#   - the size (AST nodes) and run time of generated programs full of dead code,
+#     like our code generator emits, with elimination and without, and the time it
+#     takes to load them (parse, fold and eliminate) either way.
+#   python -m benchmarks.bench_eliminate [--repeat N] [--baseline REV]
+import argparse
+import contextlib
+import io
+import sys
+
+from benchmarks.bench_core import RUN, core_cases
+from benchmarks.common import REPO_ROOT, baseline_before, best_time, run_in, worktree
+from interpreter_v_1.interpreterv1 import Interpreter as InterpreterV1
+from interpreter_v_2.interpreterv2 import Interpreter as InterpreterV2
+from interpreter_v_3.interpreterv3 import Interpreter as InterpreterV3
+from interpreter_v_4.interpreterv4 import Interpreter as InterpreterV4
+
+INTERPRETERS = {"1": InterpreterV1, "2": InterpreterV2, "3": InterpreterV3, "4": InterpreterV4}
+
+DEAD_CASES_V2 = [
+    'func f(x) { return x * 2; print("no"); } func main() { print(f(2)); return; print("after"); }',
+    """func f(x) { if (x > 0) { return 1; } else { return 2; } print("no"); }
+func main() { print(f(1), f(-1)); }""",
+    # constant branches that define variables, and shadow
+    """func main() {
+  var x;
+  x = 1;
+  if (true) { var x; x = 2; print(x); } else { print("no"); }
+  print(x);
+  if (false) { print("no"); }
+  if (false) { var y; } else { var x; x = 3; print(x); }
+  if (true) { print("spliced"); return; }
+  print("unreachable");
+}""",
+    # unused variables, one of them given the input
+    'func main() { var a; var b; var c; a = 1; b = a; c = inputi(); print("done"); }',
+    'func main() { var a; a = 1 / 0; print("after"); }',
+    'func main() { var a; var a; print("x"); }',
+    'func main() { var a; a = b; print("x"); }',
+    'func main() { var i; for (i = 0; i < 2; i = i + 1) { var t; t = i; print("loop"); } }',
+    # a raise does nothing here, so it leaves nothing unreachable
+    'func main() { print("a"); raise "x"; print("b"); }',
+    """func f(x) { if (x) { raise "e"; } else { return 1; } print("after if"); return 2; }
+func main() { print(f(true)); }""",
+]
+
+DEAD_CASES_V3 = [
+    """struct point { x: int; }
+func main() : void { var a: int; var b: bool; var p: point; a = 5; b = 1; print("x"); return; print("y"); }""",
+    'func main() : void { var a: int; a = "s"; print("x"); }',
+    'func main() : void { var q: nosuchtype; print("x"); }',
+    'func main() : void { if (1) { print("one"); } if (false) { var z: int; } else { print("else"); } }',
+    'func f() : int { var unused: string; unused = "u"; return 3; return 4; } func main() : void { print(f()); }',
+    'func main() : void { print("a"); raise "x"; print("b"); }',
+]
+
+DEAD_CASES_V4 = DEAD_CASES_V2 + [
+    # an unread variable's initializer is never evaluated, whatever it does
+    'func main() { var a; a = print("lazy"); var x; x = 9 / 0; print("done"); }',
+    # a builtin in a lazy argument reads the variables of the function it runs in
+    "func f(p) { var k; k = 5; p; } func main() { var k; k = 1; f(print(k)); }",
+    'func main() { try { raise "x"; print("no"); } catch "x" { print("caught"); } }',
+    """func f(x) { if (x) { raise "e"; } else { return 1; } print("after if"); return 2; }
+func main() { try { print(f(true)); } catch "e" { print("caught"); } }""",
+]
+
+# v1 runs neither ifs nor returns, so nothing's unreachable and no branch is taken
+DEAD_CASES_V1 = [
+    'func main() { print("a"); return; print("after"); }',
+    'func main() { var x; x = 5; print(x); if (true) { var x; x = "foo"; print(x); } print(x); }',
+    'func main() { var x; x = 5; if (false) { print("no"); } else { x = 6; } print(x); }',
+    'func main() { var a; var b; a = 1; b = "s"; print("done"); }',
+]
+
+
+# A program like our code generator emits: n functions with unused variables, debug
+# branches that are off, and statements left after their returns
+def generated_program(n, typed=False, iterations=20):
+    def var(name, var_type):
+        return f"var {name}: {var_type};" if typed else f"var {name};"
+
+    parts = []
+    for i in range(n):
+        parts.append(
+            f"""func helper{i}(n{": int" if typed else ""}){" : int" if typed else ""} {{
+  {var(f"unused{i}", "int")}
+  {var("scratch", "string")}
+  {var("debug", "bool")}
+  {var("total", "int")}
+  {var("k", "int")}
+  debug = false;
+  scratch = "tmp";
+  unused{i} = {i};
+  total = 0;
+  for (k = 0; k < n; k = k + 1) {{
+    {var("t", "int")}
+    t = 0;
+    if (debug) {{ print("k=", k); }}
+    if (false) {{ total = total - 1; }} else {{ total = total + k * 2; }}
+    if (true) {{ total = total + 1; }}
+    if (total < 0) {{ return 0; }}
+  }}
+  return total;
+  print("never");
+  total = 0;
+}}
+"""
+        )
+    calls = " + ".join(f"helper{i}({iterations})" for i in range(n))
+    parts.append(
+        f"""func main(){" : void" if typed else ""} {{
+  {var("sum", "int")}
+  sum = {calls};
+  print(sum);
+}}
+"""
+    )
+    return "".join(parts)
+
+
+def run(version, program, eliminate, engine=None):
+    kwargs = {} if engine is None else {"engine": engine}
+    interpreter = INTERPRETERS[version](console_output=False, eliminate=eliminate, **kwargs)
+    stdin = sys.stdin
+    sys.stdin = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program)
+    finally:
+        sys.stdin = stdin
+    return interpreter
+
+
+def load(version, program, eliminate):
+    INTERPRETERS[version](console_output=False, eliminate=eliminate).load(program)
+
+
+# the number of AST nodes in the functions of the program interpreter has loaded
+def size(interpreter):
+    count = 0
+    stack = [func_ast for funcs in interpreter.func_name_to_ast.values() for func_ast in funcs.values()]
+    while stack:
+        node = stack.pop()
+        count += 1
+        for value in node.dict.values():
+            if isinstance(value, (list, tuple)):
+                stack.extend(v for v in value if hasattr(v, "elem_type"))
+            elif hasattr(value, "elem_type"):
+                stack.append(value)
+    return count
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--baseline", help="commit without dead-code elimination to compare against")
+    args = arg_parser.parse_args()
+    baseline = args.baseline or baseline_before("eliminate.py")
+
+    engines = {"1": [None], "2": ["ast", "tiered", "closures", "python"], "3": ["ast", "tiered", "closures", "bytecode", "python"],
+               "4": [None]}
+    extra = [
+        ("1", DEAD_CASES_V1),
+        ("2", DEAD_CASES_V2 + [generated_program(3)]),
+        ("3", DEAD_CASES_V3 + [generated_program(3, typed=True)]),
+        ("4", DEAD_CASES_V4 + [generated_program(3)]),
+    ]
+    cases = core_cases()
+    for version, sources in extra:
+        cases += [(f"v{version} dead code case {i} ({engine or 'ast'})", version, engine, source, ["7"])
+                  for i, source in enumerate(sources) for engine in engines[version]]
+    runs = [(version, engine, source, inp) for _, version, engine, source, inp in cases]
+    with worktree(baseline) as tmp:
+        before = run_in(tmp, RUN.format(cases=runs))
+    after = run_in(REPO_ROOT, RUN.format(cases=runs))
+
+    print(f"baseline {baseline}")
+    mismatches = 0
+    for (name, *_), old, new in zip(cases, before, after):
+        if old != new:
+            mismatches += 1
+            print(f"MISMATCH {name}: {new} instead of {old}")
+    print(f"parity: {len(cases)} runs, {mismatches} mismatches")
+
+    print("\nremoved from v2 generated_program(2), per function (line, what):")
+    for function, removed in run("2", generated_program(2), True).elimination.removed.items():
+        print(f"  {function}:")
+        for line, what in removed:
+            print(f"    {line}: {what}")
+
+    print(f"\n{'program':30}{'nodes':>7}{'kept':>7}{'kept':>6}{'as is':>10}{'pruned':>10}{'speedup':>9}{'load as is':>12}{'pruned':>10}")
+    workloads = (
+        ("v2 generated 40 (ast)", "2", generated_program(40, iterations=300), "ast"),
+        ("v2 generated 40 (closures)", "2", generated_program(40, iterations=300), "closures"),
+        ("v3 generated 40 (ast)", "3", generated_program(40, typed=True, iterations=300), "ast"),
+        ("v3 generated 40 (closures)", "3", generated_program(40, typed=True, iterations=300), "closures"),
+        ("v4 generated 40", "4", generated_program(40, iterations=300), None),
+    )
+    for name, version, program, engine in workloads:
+        sizes = [size(run(version, program, eliminate, engine)) for eliminate in (False, True)]
+        times = [best_time(lambda: run(version, program, eliminate, engine), args.repeat) for eliminate in (False, True)]
+        loads = [best_time(lambda: load(version, program, eliminate), args.repeat) for eliminate in (False, True)]
+        print(
+            f"{name:30}{sizes[0]:7}{sizes[1]:7}{sizes[1] / sizes[0]:6.0%}"
+            f"{times[0] * 1e3:8.1f}ms{times[1] * 1e3:8.1f}ms{times[0] / times[1]:8.2f}x"
+            f"{loads[0] * 1e3:10.1f}ms{loads[1] * 1e3:8.1f}ms"
+        )
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Measures what pre-split field paths save the v3 interpreter on struct-heavy code:
+# runs a linked-list build-and-traverse program and a deep-path program in this tree
+# and in a checkout of the commit before field paths (which split every dotted name
+# on each access), checks they print the same, and reports the time saved per
+# dotted-name access.
+#   python -m benchmarks.bench_fieldpath [--nodes N] [--rounds N] [--baseline REV]
+import argparse
+
+from benchmarks.common import REPO_ROOT, baseline_before, run_in, worktree
+
+# builds a list of n nodes (2 dotted assignments each), then sums it rounds times
+# (2 dotted reads per node per round)
+LINKED_LIST = """
+struct node {{
+  val: int;
+  next: node;
+}}
+func main(): void {{
+  var head: node;
+  var p: node;
+  var i: int;
+  var r: int;
+  var total: int;
+  for (i = 0; i < {n}; i = i + 1) {{
+    p = new node;
+    p.val = i;
+    p.next = head;
+    head = p;
+  }}
+  for (r = 0; r < {rounds}; r = r + 1) {{
+    total = 0;
+    for (p = head; p != nil; p = p.next) {{
+      total = total + p.val;
+    }}
+  }}
+  print(total);
+}}
+"""
+
+# reads a field 5 levels down n * rounds times
+DEEP_PATH = """
+struct box {{
+  inner: box;
+  val: int;
+}}
+func main(): void {{
+  var b: box;
+  var i: int;
+  var total: int;
+  b = new box;
+  b.inner = new box;
+  b.inner.inner = new box;
+  b.inner.inner.inner = new box;
+  b.inner.inner.inner.inner = new box;
+  b.inner.inner.inner.inner.val = 3;
+  for (i = 0; i < {accesses}; i = i + 1) {{
+    total = total + b.inner.inner.inner.inner.val;
+  }}
+  print(total);
+}}
+"""
+
+# prints [best seconds, output] for running the program in the tree it runs in
+TIMING = """
+import json, sys
+sys.path.insert(0, ".")
+from benchmarks.common import best_time
+from interpreter_v_3.interpreterv3 import Interpreter
+program = {program!r}
+interpreter = Interpreter(console_output=False)
+interpreter.run(program)  # warm the parse cache
+seconds = best_time(lambda: Interpreter(console_output=False).run(program), repeat={repeat})
+print(json.dumps([seconds, interpreter.get_output()]))
+"""
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--nodes", type=int, default=2000, help="length of the linked list")
+    arg_parser.add_argument("--rounds", type=int, default=5, help="traversals of the list")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--baseline", help="commit without field paths to compare against")
+    args = arg_parser.parse_args()
+    baseline = args.baseline or baseline_before("benchmarks/bench_fieldpath.py")
+
+    accesses = args.nodes * args.rounds
+    programs = [
+        ("linked list", LINKED_LIST.format(n=args.nodes, rounds=args.rounds), 2 * args.nodes + 2 * accesses),
+        ("5-deep path", DEEP_PATH.format(accesses=accesses), accesses),
+    ]
+    mismatches = 0
+    with worktree(baseline) as tmp:
+        print(f"baseline {baseline}")
+        print(f"{'program':12} {'accesses':>9} {'split':>9} {'path':>9} {'saved/access':>13}")
+        for name, program, n_accesses in programs:
+            timing = TIMING.format(program=program, repeat=args.repeat)
+            (before, before_output), (after, after_output) = run_in(tmp, timing), run_in(REPO_ROOT, timing)
+            if before_output != after_output:
+                mismatches += 1
+                print(f"MISMATCH: {name} printed {after_output} instead of {before_output}")
+            saved_us = (before - after) / n_accesses * 1e6
+            print(f"{name:12} {n_accesses:9} {before * 1e3:7.1f}ms {after * 1e3:7.1f}ms {saved_us:10.2f} us")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# Checks and measures constant folding and propagation (fold.py), which every
+# version runs as a program's loaded, unless it's made with fold=False:
+#   - parity: every run of bench_core's, plus programs that fold, propagate, and
+#     have expressions that fail (a type error, v4's div0) only if they're reached,
+#     must print the same and fail with the same error, on the same line, as in a
+#     checkout of the commit before folding,
+#   - the folds made in the corpus, per version, and the ones of a sample program,
+#   - the time of a loop full of constant expressions, with folding and without.
+#   python -m benchmarks.bench_fold [--repeat N] [--baseline REV]
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+from benchmarks.bench_core import RUN, core_cases
+from benchmarks.bench_typed import test_input
+from benchmarks.common import REPO_ROOT, baseline_before, best_time, corpus_sources, run_in, worktree
+from interpreter_v_1.interpreterv1 import Interpreter as InterpreterV1
+from interpreter_v_2.interpreterv2 import Interpreter as InterpreterV2
+from interpreter_v_3.interpreterv3 import Interpreter as InterpreterV3
+from interpreter_v_4.interpreterv4 import Interpreter as InterpreterV4
+
+INTERPRETERS = {"1": InterpreterV1, "2": InterpreterV2, "3": InterpreterV3, "4": InterpreterV4}
+
+FOLD_CASES_V2 = [
+    """func main() {
+  var day;
+  var week;
+  var label;
+  var i;
+  var total;
+  day = 60 * 60 * 24;
+  week = day * 7;
+  label = "seconds" + " per " + "week";
+  total = 0;
+  for (i = 0; i < 3; i = i + 1) { total = total + week / day; }
+  print(label, ": ", week, " ", total);
+  if (false) { print(1 + "a"); }
+  print(2 - -3, !(1 == 2), "x" == "x", nil == nil, 1 + 2 + i + 3, 1 < 2 == true);
+}""",
+    # assigned twice, read before it's assigned, shadowed, and defined in a loop
+    """func main() {
+  var x;
+  var y;
+  print(y);
+  y = 5;
+  print(y * 2);
+  x = 1;
+  if (true) { x = 6; var y; y = "inner"; print(y); }
+  print(x + 1, y);
+  var i;
+  for (i = 0; i < 3; i = i + 1) { var c; print(c); c = 10; print(c * i); }
+}""",
+    # the type error is reached
+    """func main() { var n; n = 3; print(n + 1); print(n + "a"); }""",
+    "func f(a) { var k; k = 4; return k * a; } func main() { var k; k = 2; print(f(k) + k); }",
+]
+
+FOLD_CASES_V3 = [
+    """func main() : void {
+  var b: bool;
+  var s: string;
+  var n: int;
+  b = 1;
+  s = "a" + "b";
+  n = 3 * 4;
+  print(b, " ", s + "c", " ", n / 5, " ", !b, " ", 1 == 1 && 2 > 1);
+  if (false) { print(1 + "a"); }
+  print(5 || false, n > 1);
+}""",
+    "func main() : void { var n: int; n = 2; print(n * \"x\"); }",
+    "func f() : int { var k: int; k = 7; return k - 10; } func main() : void { var b: bool; b = f(); print(b, f()); }",
+]
+
+FOLD_CASES_V4 = FOLD_CASES_V2 + [
+    # div0 only when, and if, it's needed
+    """func main() {
+  var x;
+  var y;
+  x = 9 / 0;
+  y = 10 / 5;
+  print("before");
+  try { print(y, " ", x); } catch "div0" { print("caught"); }
+  try { raise "a" + "b"; } catch "ab" { print("ab"); }
+  print(y * 3);
+}""",
+    "func main() { var x; x = 9 / 0; print(\"never read\"); }",
+    "func main() { var x; x = 9 / 0; print(x); }",
+    # a builtin in a lazy argument reads the variables of the function it runs in
+    "func f(a) { var k; k = 5; a; } func main() { var k; k = 1; f(print(k + 1)); print(k + 2); }",
+]
+
+FOLD_CASES_V1 = [
+    'func main() { var x; x = 1 + 2 - 3; print(x, "a" + "b", x - 1); }',
+    'func main() { var x; x = 1 + "a"; }',
+]
+
+# a loop full of constant expressions, as generated code has
+CONSTANTS_V2 = """
+func main() {
+  var i;
+  var total;
+  var day;
+  var scale;
+  day = 60 * 60 * 24;
+  scale = 1000;
+  total = 0;
+  for (i = 0; i < %d; i = i + 1) {
+    total = total + day * 7 / 86400 + scale / 10 - 100 * 1 + 3;
+    if (total > 2 * 1000 * 1000) {
+      total = 0;
+    }
+  }
+  print(total);
+}
+"""
+
+CONSTANTS_V3 = (
+    CONSTANTS_V2.replace("func main() {", "func main() : void {")
+    .replace("var i;", "var i: int;")
+    .replace("var total;", "var total: int;")
+    .replace("var day;", "var day: int;")
+    .replace("var scale;", "var scale: int;")
+)
+
+
+def run(version, program, fold, engine=None):
+    kwargs = {} if engine is None else {"engine": engine}
+    interpreter = INTERPRETERS[version](console_output=False, fold=fold, **kwargs)
+    stdin = sys.stdin
+    sys.stdin = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program)
+    finally:
+        sys.stdin = stdin
+    return interpreter
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--baseline", help="commit without folding to compare against")
+    args = arg_parser.parse_args()
+    baseline = args.baseline or baseline_before("fold.py")
+
+    engines = {"1": [None], "2": ["ast", "tiered", "closures", "python"],
+               "3": ["ast", "tiered", "closures", "bytecode", "python"], "4": [None]}
+    cases = core_cases()
+    for version, sources in (("1", FOLD_CASES_V1), ("2", FOLD_CASES_V2), ("3", FOLD_CASES_V3), ("4", FOLD_CASES_V4)):
+        cases += [(f"v{version} fold case {i} ({engine or 'ast'})", version, engine, source, ["7"])
+                  for i, source in enumerate(sources) for engine in engines[version]]
+    runs = [(version, engine, source, inp) for _, version, engine, source, inp in cases]
+    with worktree(baseline) as tmp:
+        before = run_in(tmp, RUN.format(cases=runs))
+    after = run_in(REPO_ROOT, RUN.format(cases=runs))
+
+    print(f"baseline {baseline}")
+    mismatches = 0
+    for (name, *_), old, new in zip(cases, before, after):
+        if old != new:
+            mismatches += 1
+            print(f"MISMATCH {name}: {new} instead of {old}")
+    print(f"parity: {len(cases)} runs, {mismatches} mismatches")
+
+    folds = {version: [0, 0] for version in INTERPRETERS}  # version -> [folds, programs with any]
+    for path, source in corpus_sources():
+        version = os.path.relpath(path, REPO_ROOT).split(os.sep)[0][-1]
+        interpreter = INTERPRETERS[version](console_output=False, inp=test_input(source))
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                interpreter.load(source)
+        except Exception:  # a struct or function the program can't define
+            continue
+        folds[version][0] += len(interpreter.folding.folds)
+        folds[version][1] += bool(interpreter.folding.folds)
+    print("\ncorpus: " + ", ".join(f"v{v} {n} folds in {p} programs" for v, (n, p) in folds.items()))
+
+    print("\nfolds of v2 fold case 0 (line, as written, literal):")
+    for fold in run("2", FOLD_CASES_V2[0], True).folding.folds:
+        print(f"  {fold}")
+
+    print(f"\n{'program':32}{'unfolded':>10}{'folded':>10}{'speedup':>9}")
+    workloads = (
+        ("v2 constants 20000 (ast)", "2", CONSTANTS_V2 % 20000, "ast"),
+        ("v2 constants 20000 (closures)", "2", CONSTANTS_V2 % 20000, "closures"),
+        ("v3 constants 20000 (ast)", "3", CONSTANTS_V3 % 20000, "ast"),
+        ("v3 constants 20000 (closures)", "3", CONSTANTS_V3 % 20000, "closures"),
+        ("v4 constants 20000", "4", CONSTANTS_V2 % 20000, None),
+    )
+    for name, version, program, engine in workloads:
+        times = [best_time(lambda: run(version, program, fold, engine), args.repeat) for fold in (False, True)]
+        print(f"{name:32}{times[0] * 1e3:8.1f}ms{times[1] * 1e3:8.1f}ms{times[0] / times[1]:8.2f}x")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# Checks and times the tree walker's flat frames (see resolve.py), which replaced
+# the dicts of variables it kept per block:
+#   - parity: every run of bench_core's, plus some programs that shadow, redefine
+#     and capture variables across blocks, must print the same and fail with the
+#     same error, on the same line, as in a checkout of the commit before them,
+#   - loop-heavy programs, and a read of a variable from six blocks down, are timed
+#     on both, in fresh processes,
+#   - the variable errors the resolver finds in the corpus before anything runs are
+#     counted.
+#   python -m benchmarks.bench_frames [--repeat N] [--baseline REV]
+import argparse
+import contextlib
+import io
+import os
+
+from benchmarks.bench_core import RUN, core_cases
+from benchmarks.bench_quicken import LOOP_V4
+from benchmarks.bench_transpile import LOOP_V2
+from benchmarks.bench_typed import LOOP
+from benchmarks.common import REPO_ROOT, baseline_before, corpus_sources, run_in, worktree
+
+SCOPING_CASES_V2 = [
+    # a block's variable shadows the outer one from its definition on, and goes
+    # with the block
+    """func main() {
+  var x;
+  x = 1;
+  if (true) { print(x); var x; x = 2; print(x); if (x == 2) { x = 3; var y; y = x; print(y); } print(x); }
+  print(x);
+}""",
+    # a loop's body is a new block each time around, so its definitions are new too
+    """func main() {
+  var i;
+  for (i = 0; i < 3; i = i + 1) { var t; print(t); t = i * 2; print(t); }
+  print(i);
+}""",
+    # parameters, a repeated one, and the body's own block over them
+    """func f(a, a) { print(a); var a; a = 9; print(a); return a; }
+func g(n) { var m; m = n; if (n > 0) { var m; m = g(n - 1); } return m; }
+func main() { print(f(1, 2), g(3)); }""",
+    "func main() { if (true) { var z; z = 1; } print(z); }",
+    "func main() { var x; if (true) { var x; var x; } }",
+    "func main() { var x; if (true) { var y; } y = 2; }",
+    """func main() { var i; for (i = 0; i < 2; i = i + 1) { var i; i = 5; print(i); } print(i); }""",
+]
+
+SCOPING_CASES_V3 = [
+    """struct point { x: int; y: int; }
+func main() : void {
+  var p: point;
+  p = new point;
+  p.x = 1;
+  if (true) { var p: point; p = new point; p.x = 7; print(p.x); }
+  print(p.x);
+  var q: point;
+  q = p;
+  q.y = 3;
+  print(p.y);
+}""",
+    """func f(a: int, b: bool) : int { if (b) { var a: string; a = "s"; print(a); } return a; }
+func main() : void { var i: int; for (i = 0; i < 3; i = i + 1) { var n: int; n = n + f(i, i == 1); print(n); } }""",
+    "struct point { x: int; } func main() : void { var p: point; p.x = 1; }",
+    "func main() : void { var x: int; if (true) { var x: bool; x = 3; print(x); } var x: string; }",
+    "func main() : void { if (true) { var y: int; } print(y); }",
+]
+
+SCOPING_CASES_V4 = SCOPING_CASES_V2 + [
+    # a lazy value sees its variables as they were where it was made
+    """func main() {
+  var x;
+  var y;
+  x = 1;
+  y = x + 1;
+  x = 5;
+  if (true) { var x; x = 10; y = y + x * 2; }
+  x = 100;
+  print(y, " ", x);
+}""",
+    # a builtin in a lazy value reads the variables of the function it runs in
+    """func f(a) { var x; x = 3; if (true) { var x; x = 4; return a; } }
+func main() { var x; var r; x = 1; r = f(inputi(x)); print(r); }""",
+    """func f(a) { var x; x = 3; a; print("after"); }
+func main() { var x; x = 1; f(print(x)); }""",
+    """func main() {
+  var e;
+  e = "a";
+  try { var e; e = "b"; raise e; } catch "b" { var e; print(e); e = 1; } catch "a" { print("a"); }
+  print(e);
+}""",
+    """func main() { var i; for (i = 0; i < 3; i = i + 1) { var d; d = 6 / (1 - i); print(i); } }""",
+    """func main() { var d; var i; for (i = 0; i < 3; i = i + 1) { var k; k = i; d = 6 / (1 - k); } print(d); }""",
+]
+
+# a variable read from six blocks below its definition, in a loop (and compared, so
+# that v4 evaluates it as it goes)
+DEEP_V2 = """
+func main() {
+  var total;
+  var i;
+  total = 0;
+  for (i = 0; i < %d; i = i + 1) {
+    if (true) { if (true) { if (true) { if (true) { if (true) {
+      total = total + i;
+      if (total < 0) { print("negative"); }
+    } } } } }
+  }
+  print(total);
+}
+"""
+
+# best [seconds] of running each (version, program) repeat times on the tree walker
+TIME = """
+import contextlib, io, json, sys, time
+sys.path.insert(0, ".")
+from interpreter_v_2.interpreterv2 import Interpreter as V2
+from interpreter_v_3.interpreterv3 import Interpreter as V3
+from interpreter_v_4.interpreterv4 import Interpreter as V4
+times = []
+for version, program in {workloads!r}:
+    best = None
+    for _ in range({repeat}):
+        if version == "4":
+            interpreter = V4(console_output=False)
+        else:
+            interpreter = {{"2": V2, "3": V3}}[version](console_output=False, engine="ast")
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    times.append(best)
+print(json.dumps(times))
+"""
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--baseline", help="commit with block dicts to compare against")
+    args = arg_parser.parse_args()
+    baseline = args.baseline or baseline_before("resolve.py")
+
+    cases = core_cases()
+    extra = [("2", "ast", SCOPING_CASES_V2), ("2", "tiered", SCOPING_CASES_V2), ("3", "ast", SCOPING_CASES_V3),
+             ("3", "tiered", SCOPING_CASES_V3), ("4", None, SCOPING_CASES_V4)]
+    for version, engine, sources in extra:
+        cases += [(f"v{version} scoping {i} ({engine or 'ast'})", version, engine, source, ["7"])
+                  for i, source in enumerate(sources)]
+    workloads = [
+        ("v2 loop 200x100", "2", LOOP_V2 % 200),
+        ("v2 six blocks down", "2", DEEP_V2 % 5000),
+        ("v3 loop 200x100", "3", LOOP % 200),
+        ("v4 loop 20000", "4", LOOP_V4 % 20000),
+        ("v4 six blocks down", "4", DEEP_V2 % 5000),
+    ]
+    runs = [(version, engine, source, inp) for _, version, engine, source, inp in cases]
+    timed = [(version, program) for _, version, program in workloads]
+    with worktree(baseline) as tmp:
+        before = run_in(tmp, RUN.format(cases=runs))
+        after = run_in(REPO_ROOT, RUN.format(cases=runs))
+        times_before = run_in(tmp, TIME.format(workloads=timed, repeat=args.repeat))
+        times_after = run_in(REPO_ROOT, TIME.format(workloads=timed, repeat=args.repeat))
+
+    print(f"baseline {baseline}")
+    mismatches = 0
+    for (name, *_), old, new in zip(cases, before, after):
+        if old != new:
+            mismatches += 1
+            print(f"MISMATCH {name}: {new} instead of {old}")
+    print(f"parity: {len(cases)} runs, {mismatches} mismatches")
+
+    print(f"\n{'program':22}{'blocks':>10}{'frames':>10}{'speedup':>9}")
+    for (name, *_), old, new in zip(workloads, times_before, times_after):
+        print(f"{name:22}{old * 1e3:8.1f}ms{new * 1e3:8.1f}ms{old / new:8.2f}x")
+
+    from interpreter_v_2.interpreterv2 import Interpreter as InterpreterV2
+    from interpreter_v_3.interpreterv3 import Interpreter as InterpreterV3
+    from interpreter_v_4.interpreterv4 import Interpreter as InterpreterV4
+
+    interpreters = {"2": InterpreterV2, "3": InterpreterV3, "4": InterpreterV4}
+    flagged = programs = 0
+    for path, source in corpus_sources():
+        version = os.path.relpath(path, REPO_ROOT).split(os.sep)[0][-1]
+        if version not in interpreters:
+            continue
+        interpreter = interpreters[version](console_output=False)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):  # the parser prints syntax errors
+                interpreter.load(source)
+        except Exception:  # a struct or function the program can't define
+            continue
+        flagged += len(interpreter.resolution.errors)
+        programs += bool(interpreter.resolution.errors)
+    print(f"\nresolver: {flagged} variable errors flagged before running, in {programs} corpus programs")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Measures cold-start cost in fresh interpreter processes: importing parser.brewparse
+# (as reported by `python -X importtime`), and importing it and parsing a first program,
+# with and without the eager lexer and parser construction that importing used to do.
+# Also checks that none of it writes any files into the package.
+#   python -m benchmarks.bench_import [--runs N]
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.common import REPO_ROOT
+
+PARSER_DIR = os.path.join(REPO_ROOT, "parser")
+
+# each prints how long it took from before the import
+COLD_START = """
+import time
+start = time.perf_counter()
+import parser.brewparse as brewparse
+brewparse.parse_program("func main() { print(1); }", use_cache=False)
+print(time.perf_counter() - start)
+"""
+# what importing brewparse used to do on top of that: reflect over brewlex to build
+# the lexer, and reflect over brewparse and check its signature to build the parser
+OLD_COLD_START = """
+import time
+start = time.perf_counter()
+import parser.brewparse as brewparse
+from parser import brewlex
+from ply import yacc
+brewlex.build_lexer()
+yacc.yacc(module=brewparse, tabmodule="parser.parsetab", outputdir="parser", write_tables=False, debug=False)
+brewparse.parse_program("func main() { print(1); }", use_cache=False)
+print(time.perf_counter() - start)
+"""
+
+
+def run(code, *options):
+    return subprocess.run(
+        [sys.executable, *options, "-c", code], cwd=REPO_ROOT, check=True, capture_output=True, text=True
+    )
+
+
+# cumulative microseconds -X importtime reports for the top-level import of module
+def import_time(module):
+    for line in run(f"import {module}", "-X", "importtime").stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1])
+    raise RuntimeError(f"no importtime entry for {module}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--runs", type=int, default=10)
+    args = arg_parser.parse_args()
+
+    before = {name: os.stat(os.path.join(PARSER_DIR, name)).st_mtime for name in os.listdir(PARSER_DIR)}
+    import_us = statistics.median(import_time("parser.brewparse") for _ in range(args.runs))
+    cold_start_ms = statistics.median(float(run(COLD_START).stdout) for _ in range(args.runs)) * 1e3
+    old_cold_start_ms = statistics.median(float(run(OLD_COLD_START).stdout) for _ in range(args.runs)) * 1e3
+    after = {name: os.stat(os.path.join(PARSER_DIR, name)).st_mtime for name in os.listdir(PARSER_DIR)}
+
+    print(f"import parser.brewparse (-X importtime)  {import_us / 1e3:7.1f} ms")
+    print(f"import + first parse                     {cold_start_ms:7.1f} ms")
+    print(f"import + first parse, old eager startup  {old_cold_start_ms:7.1f} ms")
+    written = sorted(name for name in after if before.get(name) != after[name])
+    written = [name for name in written if name != "__pycache__"]
+    print(f"files written into parser/: {', '.join(written) or 'none'}")
+    if written:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
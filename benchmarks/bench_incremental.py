@@ -0,0 +1,96 @@
+# Checks that incremental parsing builds the same trees as a full parse on every .br
+# file in the repo (source spans included) and on randomly damaged copies of them (where it has to give up on
+# any program with a syntax error), then times reparsing a large generated program
+# after editing one function, against parsing it from scratch.
+#   python -m benchmarks.bench_incremental [--funcs N] [--mutations N]
+import argparse
+import contextlib
+import io
+import random
+
+from benchmarks.bench_pratt import mutations
+from benchmarks.common import best_time, corpus_files, generated_program, read_source
+from parser.astbinary import dumps
+from parser.brewparse import parse_program
+from parser.incremental import IncrementalParser
+
+
+def full_parse(source):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        try:
+            ast = dumps(parse_program(source, use_cache=False))
+        except SyntaxError:
+            ast = None
+    return ast, out.getvalue()
+
+
+def check_parity(mutation_count):
+    rng = random.Random(0)
+    incremental = IncrementalParser()  # shared, so later programs reuse earlier chunks
+    checked = mismatches = gave_up = 0
+    for path in corpus_files():
+        source = read_source(path)
+        for variant in [source, *mutations(source, mutation_count, rng)]:
+            checked += 1
+            ast = incremental.parse(variant)
+            if ast is None:
+                gave_up += 1
+                continue
+            if (dumps(ast), "") != full_parse(variant):
+                mismatches += 1
+                print(f"MISMATCH: {path}")
+    return checked, gave_up, mismatches
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--funcs", type=int, default=2000, help="functions in the generated program")
+    arg_parser.add_argument("--mutations", type=int, default=10, help="damaged copies of each corpus file")
+    args = arg_parser.parse_args()
+
+    checked, gave_up, mismatches = check_parity(args.mutations)
+    print(f"parity: {checked} programs ({gave_up} left to the full parser), {mismatches} mismatches")
+
+    source = generated_program(args.funcs)
+    edits = [source.replace("total = 7 * 3", f"total = {i} * 3", 1) for i in range(1000)]
+    incremental = IncrementalParser()
+    incremental.parse(source)
+    edited = iter(edits)
+
+    def reparse():
+        assert incremental.parse(next(edited)) is not None
+
+    full_seconds = best_time(lambda: parse_program(source, use_cache=False), repeat=3)
+    first_seconds = best_time(lambda: IncrementalParser().parse(source), repeat=3)
+    edit_seconds = best_time(reparse, repeat=5)
+    one_func = generated_program(1)
+    func_seconds = best_time(lambda: parse_program(one_func, use_cache=False), repeat=5)
+    print(f"full parse (ply)            {full_seconds * 1e3:8.2f} ms")
+    print(f"incremental, first parse    {first_seconds * 1e3:8.2f} ms")
+    print(f"incremental, one func edit  {edit_seconds * 1e3:8.2f} ms  ({incremental.reparsed} chunk reparsed)")
+    print(f"parse of a one-func program {func_seconds * 1e3:8.2f} ms")
+
+    last = edits[4]
+    if dumps(incremental.parse(last)) != full_parse(last)[0]:
+        print("MISMATCH: edited program")
+        mismatches += 1
+    # a line added to the first function moves every later one down, which must move
+    # their source spans without reparsing them
+    shifted = last.replace("{", "{\n", 1)
+    if dumps(incremental.parse(shifted)) != full_parse(shifted)[0]:
+        print("MISMATCH: program with lines moved")
+        mismatches += 1
+    print(f"incremental, line added      {incremental.reparsed} chunk reparsed, {incremental.reused} reused")
+    # and text added within a line moves every later function on without moving it down
+    widened = shifted.replace("{", "{  ", 1)
+    if dumps(incremental.parse(widened)) != full_parse(widened)[0]:
+        print("MISMATCH: program with text moved along a line")
+        mismatches += 1
+    print(f"incremental, text widened    {incremental.reparsed} chunk reparsed, {incremental.reused} reused")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# Checks and measures inlining (inline.py), which v2 and v3 run as a program's
+# loaded, after dead-code elimination, unless they're made with inline=False (v4
+# never does, see interpreter_v_4/interpreterv4.py):
+#   - parity: every run of bench_core's, plus programs whose calls are inlined with
+#     names the caller has too, arguments that are coerced (an int to a bool, nil to
+#     a struct), that fail, or print, bodies that fail, and recursive functions,
+#     must print the same and fail with the same error, on the same line, as in a
+#     checkout of the commit before,
+#   - the calls inlined in the corpus, per version, and in a sample program,
+#   - the time of loops full of calls of small functions (getters, sq, abs, max),
+#     with inlining and without.
+#   python -m benchmarks.bench_inline [--repeat N] [--baseline REV]
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+from benchmarks.bench_core import RUN, core_cases
+from benchmarks.bench_typed import test_input
+from benchmarks.common import REPO_ROOT, baseline_before, best_time, corpus_sources, run_in, worktree
+from interpreter_v_2.interpreterv2 import Interpreter as InterpreterV2
+from interpreter_v_3.interpreterv3 import Interpreter as InterpreterV3
+
+INTERPRETERS = {"2": InterpreterV2, "3": InterpreterV3}
+
+INLINE_CASES_V2 = [
+    # a statement, an assignment, a return, and calls in calls
+    """func sq(x) { return x * x; }
+func max(a, b) { if (a > b) { return a; } return b; }
+func say(s) { print("say ", s); }
+func twice(n) { return sq(n) + sq(n); }
+func main() {
+  var x;
+  say("hi");
+  x = max(3, 7);
+  print(x, " ", sq(sq(2)), " ", twice(x), " ", max(sq(2), x));
+  print(top());
+}
+func top() { return sq(9); }""",
+    # the body's variables have the caller's names, and a parameter is given a
+    # variable of its own name, or of another parameter's
+    """func f(a, b) { var t; t = a - b; a = t * 2; return a; }
+func main() {
+  var t;
+  var a;
+  var b;
+  t = 100;
+  a = 5;
+  b = 1;
+  print(f(a, b), " ", f(b, a), " ", t, " ", a, " ", b);
+}""",
+    # arguments that aren't literals or variables: ones that print, or fail
+    """func add(a, b) { return a + b; }
+func noisy(n) { print("noisy ", n); return n; }
+func main() {
+  var i;
+  for (i = 0; i < 3; i = i + 1) { print(add(noisy(i), i * 10)); }
+  print(add(1, 2) + add(3, 4));
+  print(add(i / 0, noisy(99)));
+}""",
+    # the body fails, on the callee's line
+    """func half(n) {
+  return n / 2;
+}
+func main() { print(half(8)); print(half("x")); }""",
+    # a body that reads a variable the caller doesn't have, and one that has it
+    """func f() {
+  return y;
+}
+func main() { var y; y = 1; print(f()); }""",
+    # recursion, direct and mutual, and a call before it that fails
+    """func fact(n) { if (n <= 1) { return 1; } return n * fact(n - 1); }
+func even(n) { if (n == 0) { return true; } return odd(n - 1); }
+func odd(n) { if (n == 0) { return false; } return even(n - 1); }
+func main() { print(fact(6), " ", even(10), " ", odd(7)); print(nope(1) + fact(2)); }""",
+    # a void function's value, used, and one that returns only some of the time
+    """func maybe(n) { if (n > 0) { return n; } }
+func none() { print("none"); }
+func main() { print(maybe(1), " ", maybe(-1) == nil); var v; v = none(); print(v == nil); }""",
+    # an argument read from a variable that's never defined, and input
+    "func id(x) { return x; } func main() { print(id(inputi())); print(id(undefined)); }",
+]
+
+INLINE_CASES_V3 = [
+    # int arguments coerced to bool parameters, and a returned int to a bool
+    """func flag(b: bool) : bool { return b; }
+func yes() : bool { return 1; }
+func main() : void {
+  var b: bool;
+  b = flag(5);
+  print(b, " ", flag(0), " ", yes(), " ", !flag(3));
+}""",
+    # nil given to a struct parameter, fields read through a parameter, and one
+    # set through it
+    """struct point { x: int; y: int; }
+func getx(p: point) : int { return p.x; }
+func setx(p: point, v: int) : void { p.x = v; }
+func isnil(p: point) : bool { return p == nil; }
+func main() : void {
+  var p: point;
+  var x: int;
+  p = new point;
+  setx(p, 4);
+  x = getx(p) + getx(p);
+  print(x, " ", isnil(nil), " ", isnil(p));
+  print(getx(nil));
+}""",
+    # a parameter of a type its argument isn't, on the line of the call
+    """func sq(n: int) : int { return n * n; }
+func main() : void {
+  print(sq(3));
+  print(sq("a"));
+}""",
+    # the body's variables have the caller's names
+    """func sum(n: int) : int { var i: int; var t: int; t = 0; for (i = 0; i < n; i = i + 1) { t = t + i; } return t; }
+func abs(n: int) : int { if (n < 0) { return -n; } return n; }
+func main() : void {
+  var i: int;
+  var t: int;
+  t = 7;
+  for (i = -2; i < 3; i = i + 1) { print(abs(i), " ", abs(i - 3), " ", t); }
+  print(sum(4), " ", i);
+}""",
+    # a returned value of another type, and recursion
+    """func f(n: int) : string { if (n > 0) { return "pos"; } return n; }
+func g(n: int) : int { if (n == 0) { return 0; } return g(n - 1) + 1; }
+func main() : void { print(g(5)); print(f(1)); print(f(0)); }""",
+    # void functions, and a default value
+    """func hello(s: string) : void { print("hello ", s); return; }
+func blank() : string { return; }
+func main() : void { var s: string; hello("x"); s = blank(); print("[", s, "]"); }""",
+]
+
+
+# loops full of calls of small functions, getting, squaring, comparing
+CALLS_V2 = """
+func sq(x) { return x * x; }
+func abs(x) { if (x < 0) { return -x; } return x; }
+func max(a, b) { if (a > b) { return a; } return b; }
+func clamp(x, lo, hi) { return max(lo, -max(-hi, -x)); }
+func main() {
+  var i;
+  var total;
+  total = 0;
+  for (i = 0; i < %d; i = i + 1) {
+    total = total + sq(i - 50) + abs(i - 70);
+    total = max(total, i) - clamp(i, 10, 20);
+    if (total > 1000000) { total = 0; }
+  }
+  print(total);
+}
+"""
+
+CALLS_V3 = """
+struct counter { n: int; }
+func get(c: counter) : int { return c.n; }
+func sq(x: int) : int { return x * x; }
+func abs(x: int) : int { if (x < 0) { return -x; } return x; }
+func max(a: int, b: int) : int { if (a > b) { return a; } return b; }
+func positive(x: int) : bool { return x > 0; }
+func main() : void {
+  var i: int;
+  var total: int;
+  var c: counter;
+  c = new counter;
+  total = 0;
+  for (i = 0; i < %d; i = i + 1) {
+    c.n = i;
+    total = total + sq(get(c) - 50) + abs(i - 70);
+    total = max(total, i);
+    if (positive(total - 1000000)) { total = 0; }
+  }
+  print(total);
+}
+"""
+
+
+def run(version, program, inline, engine):
+    interpreter = INTERPRETERS[version](console_output=False, inline=inline, engine=engine)
+    stdin = sys.stdin
+    sys.stdin = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program)
+    finally:
+        sys.stdin = stdin
+    return interpreter
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--baseline", help="commit without inlining to compare against")
+    args = arg_parser.parse_args()
+    baseline = args.baseline or baseline_before("inline.py")
+
+    engines = {"2": ["ast", "tiered", "closures", "python"], "3": ["ast", "tiered", "closures", "bytecode", "python"]}
+    cases = core_cases()
+    for version, sources in (("2", INLINE_CASES_V2 + [CALLS_V2 % 30]), ("3", INLINE_CASES_V3 + [CALLS_V3 % 30])):
+        cases += [(f"v{version} inline case {i} ({engine})", version, engine, source, ["7"])
+                  for i, source in enumerate(sources) for engine in engines[version]]
+    runs = [(version, engine, source, inp) for _, version, engine, source, inp in cases]
+    with worktree(baseline) as tmp:
+        before = run_in(tmp, RUN.format(cases=runs))
+    after = run_in(REPO_ROOT, RUN.format(cases=runs))
+
+    print(f"baseline {baseline}")
+    mismatches = 0
+    for (name, *_), old, new in zip(cases, before, after):
+        if old != new:
+            mismatches += 1
+            print(f"MISMATCH {name}: {new} instead of {old}")
+    print(f"parity: {len(cases)} runs, {mismatches} mismatches")
+
+    inlined = {version: [0, 0] for version in INTERPRETERS}  # version -> [calls, programs with any]
+    for path, source in corpus_sources():
+        version = os.path.relpath(path, REPO_ROOT).split(os.sep)[0][-1]
+        if version not in INTERPRETERS:
+            continue
+        interpreter = INTERPRETERS[version](console_output=False, inp=test_input(source))
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                interpreter.load(source)
+        except Exception:  # a struct or function the program can't define
+            continue
+        calls = sum(len(sites) for sites in interpreter.inlining.inlined.values())
+        inlined[version][0] += calls
+        inlined[version][1] += bool(calls)
+    print("\ncorpus: " + ", ".join(f"v{v} {n} calls inlined in {p} programs" for v, (n, p) in inlined.items()))
+
+    print("\ninlined in v2's calls program, per function (line, function):")
+    for function, sites in run("2", CALLS_V2 % 1, True, "ast").inlining.inlined.items():
+        print(f"  {function}: " + ", ".join(f"{line}: {callee}" for line, callee in sites))
+
+    print(f"\n{'program':28}{'calls':>10}{'inlined':>10}{'speedup':>9}")
+    workloads = (
+        ("v2 calls 5000 (ast)", "2", CALLS_V2 % 5000, "ast"),
+        ("v2 calls 5000 (closures)", "2", CALLS_V2 % 5000, "closures"),
+        ("v3 calls 5000 (ast)", "3", CALLS_V3 % 5000, "ast"),
+        ("v3 calls 5000 (closures)", "3", CALLS_V3 % 5000, "closures"),
+    )
+    for name, version, program, engine in workloads:
+        times = [best_time(lambda: run(version, program, inline, engine), args.repeat) for inline in (False, True)]
+        print(f"{name:28}{times[0] * 1e3:8.1f}ms{times[1] * 1e3:8.1f}ms{times[0] / times[1]:8.2f}x")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
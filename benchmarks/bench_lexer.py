@@ -0,0 +1,117 @@
+# Checks that the fast tokenizer (parser/brewscan.py) produces exactly the token stream
+# of the PLY lexer in brewlex.py on every .br file in the repo, on randomly damaged
+# copies of them and on inputs built to trip up a backtracking scanner (unterminated
+# comments and strings), that the end of each token is found again from its lexpos,
+# shows that it stays linear on those inputs, and compares the
+# two lexers' throughput on a large generated program.
+#   python -m benchmarks.bench_lexer [--funcs N] [--mutations N]
+import argparse
+import random
+
+from benchmarks.bench_pratt import mutations
+from benchmarks.common import best_time, corpus_files, generated_program, read_source
+from parser import brewlex
+from parser.brewscan import token_end, tokenize
+
+
+def ply_tokens(source):
+    lexer = brewlex.lexer.clone()
+    lexer.lineno = 1
+    lexer.input(source)
+    return [(t.type, t.value, t.lineno, t.lexpos) for t in iter(lexer.token, None)]
+
+
+def fast_tokens(source):
+    return [(t.type, t.value, t.lineno, t.lexpos) for t in tokenize(source)]
+
+
+# tokens whose end token_end (which source spans use) doesn't find: the text from
+# their lexpos to it must scan as just that token
+def bad_ends(source):
+    bad = []
+    for t in tokenize(source):
+        text = source[t.lexpos:token_end(source, t.lexpos)]
+        if [(u.type, u.value) for u in tokenize(text)] != [(t.type, t.value)]:
+            bad.append(t)
+    return bad
+
+
+# small inputs around the tricky corners of the token set
+EDGE_CASES = [
+    "",
+    " \t ",
+    "\n\n\n",
+    "/* a */ b",
+    "/* a\n\nb */ c",
+    "/* unterminated",
+    "a /* b /* c */ d */ e",
+    "/*/ x */ y",
+    "/**/",
+    "*/",
+    '"unterminated',
+    '"a" "b\n"',
+    'x = "a /* b */ c";',
+    "a<=b>=c==d!=e&&f||!g",
+    "a.b.c = 1;",
+    "123abc 0x1F __x9",
+    "@ # $ ` ~ ? \\ \r",
+    "func main() {\n  print(1);\n}\n",
+]
+
+
+# inputs on which a scanner that retries the comment/string patterns at every
+# position would go quadratic
+def pathological(n):
+    return {
+        "unterminated comments": "/* " * n,
+        "unterminated strings": '" ' * n,
+        "long comment": "/*" + "x\n" * n + "*/",
+        "long string": '"' + "x" * n + '"',
+        "comment-ish operators": "/ * " * n,
+    }
+
+
+def check_parity(mutation_count):
+    rng = random.Random(0)
+    sources = list(EDGE_CASES) + list(pathological(200).values())
+    for path in corpus_files():
+        source = read_source(path)
+        sources += [source, *mutations(source, mutation_count, rng)]
+    mismatches = 0
+    for source in sources:
+        if ply_tokens(source) != fast_tokens(source) or bad_ends(source):
+            mismatches += 1
+            print(f"MISMATCH: {source[:60]!r}")
+    return len(sources), mismatches
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--funcs", type=int, default=2000, help="functions in the generated program")
+    arg_parser.add_argument("--mutations", type=int, default=10, help="damaged copies of each corpus file")
+    args = arg_parser.parse_args()
+
+    checked, mismatches = check_parity(args.mutations)
+    print(f"parity: {checked} inputs, {mismatches} mismatches")
+
+    # time per input character should stay flat as the input grows
+    print("pathological inputs (fast tokenizer, us per 1000 chars at 20k / 80k chars):")
+    for name in pathological(1):
+        per_kchar = []
+        for n in (20000, 80000):
+            source = pathological(n)[name]
+            seconds = best_time(lambda: fast_tokens(source), repeat=3)
+            per_kchar.append(seconds / len(source) * 1e9)
+        print(f"  {name:24} {per_kchar[0]:8.1f} {per_kchar[1]:8.1f}")
+
+    source = generated_program(args.funcs)
+    n_tokens = len(fast_tokens(source))
+    for name, lex in (("ply", ply_tokens), ("fast", fast_tokens)):
+        seconds = best_time(lambda: lex(source), repeat=3)
+        print(f"{name:6} {n_tokens / seconds / 1e6:6.2f} M tokens/s  ({seconds * 1e3:.1f} ms for {n_tokens} tokens)")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# Compares the slotted per-node-type AST classes against the old layout, where every
+# Element kept its fields in a per-instance dict read through get().
+#   python -m benchmarks.bench_nodes [--funcs N]
+import argparse
+import tracemalloc
+
+from benchmarks.common import best_time, corpus_sources, generated_program
+from parser.brewparse import parse_program
+from parser.element import Element
+
+
+# the Element layout before node classes: one dict per node, get() for every read
+class DictElement:
+    def __init__(self, elem_type, **kwargs):
+        self.elem_type = elem_type
+        self.dict = {}
+        for key, value in kwargs.items():
+            self.dict[key] = value
+
+    def get(self, key):
+        if key not in self.dict:
+            return None
+        return self.dict[key]
+
+
+def to_dict_elements(node):
+    if isinstance(node, Element):
+        return DictElement(node.elem_type, **{k: to_dict_elements(v) for k, v in node.dict.items()})
+    if isinstance(node, (list, tuple)):
+        return [to_dict_elements(v) for v in node]
+    return node
+
+
+# both layouts of the same trees, keeping only the fields each node type has
+def all_nodes(root, fields_of):
+    nodes, stack = [], [root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        for key in fields_of(node):
+            value = node.get(key)
+            if isinstance(value, (Element, DictElement)):
+                stack.append(value)
+            elif isinstance(value, (list, tuple)):
+                stack.extend(v for v in value if isinstance(v, (Element, DictElement)))
+    return nodes
+
+
+def allocated_by(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    trees = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return trees, size
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--funcs", type=int, default=2000, help="functions in the generated program")
+    args = arg_parser.parse_args()
+
+    sources = [src for _, src in corpus_sources()] + [generated_program(args.funcs)]
+    trees = [parse_program(src, use_cache=False) for src in sources]
+
+    # memory: build each layout from scratch while tracing allocations; the slotted
+    # trees are rebuilt from the dict trees so both sides allocate the same strings
+    dict_trees, dict_bytes = allocated_by(lambda: [to_dict_elements(t) for t in trees])
+    _, slot_bytes = allocated_by(lambda: [to_slotted(t) for t in dict_trees])
+
+    slot_nodes = [n for t in trees for n in all_nodes(t, lambda n: n._field_names)]
+    dict_nodes = [n for t in dict_trees for n in all_nodes(t, lambda n: n.dict)]
+    node_fields = [(n, n._field_names) for n in slot_nodes]
+    dict_fields = [(n, tuple(n.dict)) for n in dict_nodes]
+
+    def read_dict():
+        for node, fields in dict_fields:
+            for f in fields:
+                node.get(f)
+
+    def read_get():
+        for node, fields in node_fields:
+            for f in fields:
+                node.get(f)
+
+    # the interpreters read fixed field names, e.g. node.op1; time that access pattern
+    binops = [n for n in slot_nodes if n._field_names == ("op1", "op2")]
+    dict_binops = [n for n in dict_nodes if tuple(n.dict) == ("op1", "op2")]
+
+    def binop_dict():
+        for n in dict_binops:
+            n.get("op1")
+            n.get("op2")
+
+    def binop_attr():
+        for n in binops:
+            n.op1
+            n.op2
+
+    reads = sum(len(f) for _, f in node_fields)
+    print(f"{len(trees)} programs, {len(slot_nodes)} nodes, {reads} field reads per pass")
+    print(f"memory   dict Element   {dict_bytes / 1024:10.1f} KiB")
+    print(f"memory   slotted nodes  {slot_bytes / 1024:10.1f} KiB  ({dict_bytes / slot_bytes:.2f}x smaller)")
+    t_dict, t_get = best_time(read_dict), best_time(read_get)
+    print(f"get()    dict Element   {t_dict * 1e3:10.2f} ms")
+    print(f"get()    slotted nodes  {t_get * 1e3:10.2f} ms")
+    t_bd, t_ba = best_time(binop_dict), best_time(binop_attr)
+    print(f"op1/op2  dict get()     {t_bd * 1e3:10.2f} ms  ({len(binops)} binary ops)")
+    print(f"op1/op2  attributes     {t_ba * 1e3:10.2f} ms  ({t_bd / t_ba:.2f}x faster)")
+
+
+def to_slotted(node):
+    if isinstance(node, DictElement):
+        return Element(node.elem_type, **{k: to_slotted(v) for k, v in node.dict.items()})
+    if isinstance(node, list):
+        return [to_slotted(v) for v in node]
+    return node
+
+
+if __name__ == "__main__":
+    main()
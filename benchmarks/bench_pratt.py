@@ -0,0 +1,72 @@
+# Checks that the hand-written parser matches the PLY parser on every .br file in the
+# repo (and on randomly damaged copies of them, to exercise syntax error recovery),
+# then compares their throughput on a large generated program.
+#   python -m benchmarks.bench_pratt [--funcs N] [--mutations N]
+import argparse
+import contextlib
+import io
+import random
+import re
+
+from benchmarks.common import best_time, corpus_files, generated_program, read_source
+from parser.astbinary import dumps
+from parser.brewparse import parse_program
+
+
+# (serialized AST or None, everything the parser printed)
+def parse_result(source, engine):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        try:
+            ast = dumps(parse_program(source, use_cache=False, engine=engine))
+        except SyntaxError:
+            ast = None
+    return ast, out.getvalue()
+
+
+# copies of source with a few random tokens-worth of text deleted or duplicated
+def mutations(source, count, rng):
+    pieces = re.findall(r"\w+|\s+|.", source)
+    for _ in range(count):
+        damaged = list(pieces)
+        for _ in range(rng.randint(1, 3)):
+            i = rng.randrange(len(damaged))
+            if rng.random() < 0.5:
+                del damaged[i]
+            else:
+                damaged.insert(i, damaged[rng.randrange(len(damaged))])
+        yield "".join(damaged)
+
+
+def check_parity(mutation_count):
+    rng = random.Random(0)
+    checked = mismatches = 0
+    for path in corpus_files():
+        source = read_source(path)
+        for variant in [source, *mutations(source, mutation_count, rng)]:
+            checked += 1
+            if parse_result(variant, "ply") != parse_result(variant, "pratt"):
+                mismatches += 1
+                print(f"MISMATCH: {path}")
+    return checked, mismatches
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--funcs", type=int, default=2000, help="functions in the generated program")
+    arg_parser.add_argument("--mutations", type=int, default=20, help="damaged copies of each corpus file")
+    args = arg_parser.parse_args()
+
+    checked, mismatches = check_parity(args.mutations)
+    print(f"parity: {checked} programs, {mismatches} mismatches")
+
+    source = generated_program(args.funcs)
+    for engine in ("ply", "pratt"):
+        seconds = best_time(lambda: parse_program(source, use_cache=False, engine=engine), repeat=3)
+        print(f"{engine:6} {len(source) / seconds / 1e6:6.2f} MB/s  ({seconds * 1e3:.1f} ms for {len(source)} chars)")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
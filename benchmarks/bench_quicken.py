@@ -0,0 +1,172 @@
+# Checks and times quickening (quickening.py) in the v2 and v4 tree walkers. Every
+# v2 and v4 corpus program, bench_transpile's v2 corner cases and some programs whose
+# operators change operand types part way through (so their sites de-specialize, and
+# go megamorphic), must print the same and fail with the same error, on the same
+# line, with and without quickening; then loop-heavy programs are timed both ways,
+# and the hit rates of their operator sites listed.
+#   python -m benchmarks.bench_quicken [--repeat N]
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+
+from benchmarks.bench_transpile import FIB_V2, LOOP_V2, V2_CORNER_CASES
+from benchmarks.bench_typed import test_input
+from benchmarks.common import REPO_ROOT, best_time, corpus_files, read_source
+from interpreter_v_2.interpreterv2 import Interpreter as InterpreterV2
+from interpreter_v_4.interpreterv4 import Interpreter as InterpreterV4
+
+# operators whose operand types change
+SHIFTING_CASES = [
+    # int + int, then string + string, then back, over and over
+    """func add(a, b) { return a + b; }
+func main() {
+  var i;
+  for (i = 0; i < 12; i = i + 1) {
+    if (i / 3 * 3 == i) { print(add("s", "t")); } else { print(add(i, 1)); }
+  }
+}""",
+    # == on ints, then on anything against anything
+    """func same(a, b) { return a == b; }
+func main() {
+  var i;
+  for (i = 0; i < 6; i = i + 1) { print(same(i, i)); }
+  print(same(1, true), same(nil, nil), same("a", "a"), same(true, false), same(nil, 0), same(3, 3));
+}""",
+    # a specialized int - int that then gets a string, and fails
+    """func sub(a, b) { return a - b; }
+func main() {
+  var i;
+  for (i = 0; i < 5; i = i + 1) { print(sub(10, i)); }
+  print(sub("a", "b"));
+}""",
+    # a chain whose steps see different types
+    """func main() {
+  var i;
+  for (i = 0; i < 5; i = i + 1) { print(i == i == true, 1 + i + 2); }
+}""",
+]
+
+# the same for v4, plus lazy values and div0 at a specialized int / int
+SHIFTING_CASES_V4 = SHIFTING_CASES + [
+    """func ten() { return 10; }
+func half(n) { return n / 2; }
+func main() {
+  var i;
+  var x;
+  for (i = 0; i < 5; i = i + 1) { x = ten() + half(i) + ten(); print(x); }
+}""",
+    """func main() {
+  var i;
+  for (i = 3; i > -2; i = i - 1) {
+    try { print(12 / i); } catch "div0" { print("div0 at ", i); }
+  }
+  print(1 / (i + 1));
+}""",
+]
+
+LOOP_V4 = """
+func main() {
+  var i;
+  var total;
+  var even;
+  total = 0;
+  for (i = 0; i < %d; i = i + 1) {
+    even = i - i / 2 * 2 == 0;
+    if (even) {
+      total = total + i;
+    } else {
+      total = total - 1;
+    }
+    if (total < 0) {
+      print("negative");
+    }
+  }
+  print(total);
+}
+"""
+
+FIB_V4 = FIB_V2.replace("print(fib(%d));", "var n;\n  n = fib(%d);\n  print(n);")
+
+
+# (output, error) from running program on v2's tree walker or v4, with or without
+# quickening; error is the type and message of whatever the run raised, or None. The
+# interpreter is returned too, for its sites.
+def run(version, program, quicken, inp=None):
+    if version == "v2":
+        interpreter = InterpreterV2(console_output=False, inp=inp, engine="ast", quicken=quicken)
+    else:
+        interpreter = InterpreterV4(console_output=False, inp=inp, quicken=quicken)
+    error = None
+    stdin = sys.stdin
+    sys.stdin = io.StringIO()  # with no input given, the interpreter reads the console
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        sys.stdin = stdin
+    return (interpreter.get_output(), error and re.sub(r" at 0x[0-9a-f]+", "", error)), interpreter
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    programs = []
+    for version in ("v2", "v4"):
+        corpus = os.path.join(REPO_ROOT, f"interpreter_{version[0]}_{version[1]}", "")
+        for path in corpus_files():
+            if path.startswith(corpus):
+                source = read_source(path)
+                programs.append((version, os.path.relpath(path, REPO_ROOT), source, test_input(source)))
+    programs += [("v2", f"v2 corner case {i}", source, None) for i, source in enumerate(V2_CORNER_CASES)]
+    programs += [("v2", f"v2 shifting types {i}", source, None) for i, source in enumerate(SHIFTING_CASES)]
+    programs += [("v4", f"v4 shifting types {i}", source, None) for i, source in enumerate(SHIFTING_CASES_V4)]
+    mismatches = 0
+    hits = operations = despecialized = 0
+    for version, name, source, inp in programs:
+        generic, _ = run(version, source, False, inp)
+        quickened, interpreter = run(version, source, True, inp)
+        if quickened != generic:
+            mismatches += 1
+            print(f"MISMATCH {name}: {quickened} instead of {generic}")
+        program_hits, program_operations = interpreter.quickening.totals()
+        hits, operations = hits + program_hits, operations + program_operations
+        despecialized += sum(site.despecializations > 0 for site in interpreter.quickening.sites.values())
+    print(f"parity: {len(programs)} programs, {mismatches} mismatches")
+    print(
+        f"corpus: {hits} of {operations} operations specialized ({hits / max(operations, 1):.0%}),"
+        f" {despecialized} sites de-specialized"
+    )
+
+    print(f"\n{'program':22}{'generic':>10}{'quickened':>11}{'speedup':>9}{'hit rate':>10}")
+    workloads = (
+        ("v2 loop 200x100", "v2", LOOP_V2 % 200),
+        ("v2 fib(18)", "v2", FIB_V2 % 18),
+        ("v4 loop 20000", "v4", LOOP_V4 % 20000),
+        ("v4 fib(16)", "v4", FIB_V4 % 16),
+    )
+    for name, version, program in workloads:
+        times = [best_time(lambda: run(version, program, quicken), args.repeat) for quicken in (False, True)]
+        _, interpreter = run(version, program, True)
+        program_hits, program_operations = interpreter.quickening.totals()
+        print(
+            f"{name:22}{times[0] * 1e3:8.1f}ms{times[1] * 1e3:9.1f}ms{times[0] / times[1]:8.2f}x"
+            f"{program_hits / program_operations:10.1%}"
+        )
+
+    _, interpreter = run("v2", SHIFTING_CASES[0], True)
+    print("\nsites of v2 shifting types 0 (hits, generic, de-specializations, state):")
+    for site, counters in interpreter.quickening.counters().items():
+        print(f"  {site}: {counters}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# Measures what recording source spans costs the parsers: parse time of a large
+# generated program with each engine, in this tree and in a copy of it with the span
+# bookkeeping cut out of the two parsers (see strip_spans), so the parsers are
+# otherwise the same. Then checks that the spans expression_spans works out for the
+# expressions of the corpus, which the parsers give none, are those of their text.
+#   python -m benchmarks.bench_spans [--funcs N] [--repeat N] [--rounds N]
+import argparse
+import contextlib
+import io
+import os
+import re
+import shutil
+import tempfile
+
+from benchmarks.common import REPO_ROOT, corpus_sources, run_in
+from intbase import InterpreterBase
+from parser.brewparse import parse_program
+from parser.spans import expression_spans, span_offsets
+
+# prints {engine: best parse seconds} for the tree it runs in. The cycle collector
+# is run before each parse and kept out of it, as its passes over whatever the runs
+# before left behind swamp the difference.
+TIMING = """
+import gc, json, sys, time
+sys.path.insert(0, ".")
+from benchmarks.common import generated_program
+from parser.brewparse import ENGINES, parse_program
+source = generated_program({funcs})
+best = {{}}
+gc.disable()
+for engine in ENGINES:
+    for _ in range({repeat}):
+        gc.collect()
+        start = time.perf_counter()
+        parse_program(source, use_cache=False, engine=engine)
+        elapsed = time.perf_counter() - start
+        best[engine] = min(best.get(engine, elapsed), elapsed)
+print(json.dumps(best))
+"""
+
+# (file, pattern, replacement) edits that take spans out of the parsers: the span
+# arguments and assignments, PLY's hand-on of first tokens and the Pratt parser's
+# note of the last token
+STRIPS = (
+    ("parser/brewparse.py", r"\n *span=rule_span\(p\),", ""),
+    ("parser/brewparse.py", r", span=rule_span\(p\)", ""),
+    ("parser/brewparse.py", r"\n *p\[0\]\.span = statement_span\(p\)", ""),
+    ("parser/brewparse.py", r"\n *(p\.slice|symbols)\[0\]\.start = .*", ""),
+    ("parser/brewpratt.py", r"\n *span=self\.__span\(start\),", ""),
+    ("parser/brewpratt.py", r", span=self\.__span\(start\)", ""),
+    ("parser/brewpratt.py", r"\n *statement\.span = self\.__span\(start\)", ""),
+    ("parser/brewpratt.py", r"\n *self\.__last = self\.__tok", ""),
+)
+
+
+# Applies STRIPS to tree, a copy of this one. Fails if an edit no longer matches,
+# rather than measure a parser that still records spans.
+def strip_spans(tree):
+    sources = {}
+    for path, pattern, replacement in STRIPS:
+        if path not in sources:
+            with open(os.path.join(tree, path)) as f:
+                sources[path] = f.read()
+        sources[path], count = re.subn(pattern, replacement, sources[path])
+        if not count:
+            raise SystemExit(f"{pattern!r} matches nothing in {path}; update STRIPS")
+    for path, source in sources.items():
+        with open(os.path.join(tree, path), "w") as f:
+            f.write(source)
+
+
+# the number of corpus expressions whose worked-out span isn't that of their text,
+# which they're checked against by parsing that text again on its own
+def check_expression_spans():
+    checked = failures = 0
+    for path, source in corpus_sources():
+        with contextlib.redirect_stdout(io.StringIO()):  # programs the parser recovers in
+            ast = parse_program(source, use_cache=False)
+        for func_ast in ast.functions:
+            for expr, span in expression_spans(func_ast, source).items():
+                if expr.elem_type in ("=", InterpreterBase.FIELD_PATH_NODE):
+                    continue  # not expressions on their own
+                start, end = span_offsets(span, source)
+                text = source[start:end]
+                checked += 1
+                again = _expression(text)
+                if again is None or str(again) != str(expr):
+                    failures += 1
+                    print(f"FAILED: {path}: {text!r} isn't the text of {expr}")
+    return checked, failures
+
+
+# the tree of text parsed as an expression, or None if it isn't one
+def _expression(text):
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # the parser prints syntax errors
+            ast = parse_program(f"func main() {{ return {text}; }}", use_cache=False)
+    except SyntaxError:
+        return None
+    return ast.functions[0].statements[0].expression
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--funcs", type=int, default=300, help="functions in the generated program")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--rounds", type=int, default=12, help="runs of each tree, taking turns")
+    args = arg_parser.parse_args()
+
+    checked, failures = check_expression_spans()
+    print(f"expression spans: {checked} checked, {failures} failures")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = shutil.copytree(REPO_ROOT, os.path.join(tmp, "tree"), ignore=shutil.ignore_patterns(".git", "__pycache__"))
+        strip_spans(tmp)
+        timing = TIMING.format(funcs=args.funcs, repeat=args.repeat)
+        # alternate the two trees so drift in machine load hits both alike
+        runs = [(run_in(tmp, timing), run_in(REPO_ROOT, timing)) for _ in range(args.rounds)]
+        before = {engine: min(b[engine] for b, _ in runs) for engine in runs[0][0]}
+        after = {engine: min(a[engine] for _, a in runs) for engine in runs[0][1]}
+
+    print(f"{args.funcs}-function program")
+    print(f"{'engine':8} {'no spans':>10} {'spans':>10} {'overhead':>9}")
+    for engine, seconds in after.items():
+        old = before[engine]
+        print(f"{engine:8} {old * 1e3:8.1f}ms {seconds * 1e3:8.1f}ms {(seconds / old - 1) * 100:+8.1f}%")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
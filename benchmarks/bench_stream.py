@@ -0,0 +1,117 @@
+# Checks that parse_file (streaming the source in chunks) builds the same trees and
+# reports the same syntax errors as parse_program on every .br file in the repo, with
+# chunk sizes small enough to split tokens, comments and lines in every possible place.
+# Then parses one large generated program both ways, each in a fresh process, and
+# compares wall time and peak RSS.
+#   python -m benchmarks.bench_stream [--mb N] [--engine ply|pratt]
+import argparse
+import contextlib
+import io
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_pratt import mutations
+from benchmarks.common import REPO_ROOT, corpus_files, generated_program, read_source
+from parser.astbinary import dumps
+from parser.brewparse import parse_file, parse_program
+
+CHUNK_SIZES = (1, 2, 7, 64, 1 << 20)
+
+
+# (serialized AST or None, everything the parser printed) for parse()
+def parse_result(parse):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        try:
+            ast = dumps(parse())
+        except SyntaxError:
+            ast = None
+    return ast, out.getvalue()
+
+
+def check_parity(mutation_count):
+    rng = random.Random(0)
+    checked = mismatches = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "program.br")
+        for source_path in corpus_files():
+            source = read_source(source_path)
+            for variant in [source, *mutations(source, mutation_count, rng)]:
+                with open(path, "w") as f:
+                    f.write(variant)
+                for engine in ("ply", "pratt"):
+                    expected = parse_result(lambda: parse_program(variant, use_cache=False, engine=engine))
+                    for chunk_size in CHUNK_SIZES:
+                        checked += 1
+                        streamed = parse_result(
+                            lambda: parse_file(path, use_cache=False, engine=engine, chunk_size=chunk_size)
+                        )
+                        if streamed != expected:
+                            mismatches += 1
+                            print(f"MISMATCH: {source_path} ({engine}, chunk size {chunk_size})")
+    return checked, mismatches
+
+
+# run in a child process: parse path one way and report time and peak RSS
+def child(mode, path, engine):
+    start = time.perf_counter()
+    if mode == "stream":
+        ast = parse_file(path, use_cache=False, engine=engine)
+    else:
+        with open(path) as f:
+            ast = parse_program(f.read(), use_cache=False, engine=engine)
+    seconds = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # kilobytes on Linux
+    print(f"{seconds} {peak_kb} {len(ast.functions)}")
+
+
+def measure(mode, path, engine):
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_stream", "--child", mode, path, "--engine", engine],
+        cwd=REPO_ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    return float(out[0]), int(out[1]) / 1024, int(out[2])
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--mb", type=float, default=50, help="size of the generated program in MB")
+    arg_parser.add_argument("--engine", default="ply", choices=("ply", "pratt"))
+    arg_parser.add_argument("--mutations", type=int, default=3, help="damaged copies of each corpus file")
+    arg_parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    if args.child:
+        child(*args.child, args.engine)
+        return
+
+    checked, mismatches = check_parity(args.mutations)
+    print(f"parity: {checked} parses, {mismatches} mismatches")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "big.br")
+        chunk = generated_program(1000)
+        n_copies = max(1, int(args.mb * 1e6 / len(chunk)))
+        with open(path, "w") as f:
+            for i in range(n_copies):
+                # rename the helpers so each copy defines its own functions
+                f.write(chunk.replace("func main()", f"func main{i}()").replace("helper", f"h{i}_"))
+            f.write("func main() {\n  print(0);\n}\n")
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"{size_mb:.1f} MB program, {args.engine} engine")
+        for mode in ("string", "stream"):
+            seconds, peak_mb, n_funcs = measure(mode, path, args.engine)
+            print(f"  {mode:7} {seconds:7.2f} s  peak RSS {peak_mb:8.1f} MB  ({n_funcs} functions)")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
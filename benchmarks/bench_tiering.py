@@ -0,0 +1,141 @@
+# Checks and times the tiered engine (tiering.py) of the v2 and v3 interpreters.
+# Every v2 and v3 corpus program, and the corner cases of bench_transpile and
+# bench_typed, must print the same and fail with the same error, on the same line,
+# as under the tree walker, with thresholds low enough that nearly everything tiers
+# up, part way through, too. Then the whole corpus (short programs) and some long
+# workloads are timed under the tree walker, the tiered engine with its default
+# thresholds, and the closure compiler, and the tier-ups of one run are listed.
+#   python -m benchmarks.bench_tiering [--repeat N] [--calls N] [--back-edges N]
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+
+from benchmarks.bench_transpile import FIB_V2, LOOP_V2, V2_CORNER_CASES
+from benchmarks.bench_typed import CORNER_CASES, FIB, LOOP, test_input
+from benchmarks.common import REPO_ROOT, best_time, corpus_files, read_source
+from interpreter_v_2.interpreterv2 import Interpreter as InterpreterV2
+from interpreter_v_3.interpreterv3 import Interpreter as InterpreterV3
+from tiering import Tiering
+
+INTERPRETERS = {"v2": InterpreterV2, "v3": InterpreterV3}
+
+# a hot loop in a function that's called once
+LOOP_IN_FUNCTION_V3 = """
+func count(n: int) : int {
+  var i: int;
+  var total: int;
+  for (i = 0; i < n; i = i + 1) {
+    if (i - i / 3 * 3 == 0) {
+      total = total + i;
+    }
+  }
+  return total;
+}
+func main() : void {
+  print(count(%d));
+}
+"""
+
+# recursion, then a long loop in main (v2)
+DEMO_V2 = """
+func fib(n) {
+  if (n < 2) {
+    return 1;
+  }
+  return fib(n - 1) + fib(n - 2);
+}
+func main() {
+  var i;
+  var total;
+  print(fib(12));
+  total = 0;
+  for (i = 0; i < 5000; i = i + 1) {
+    total = total + i;
+  }
+  print(total);
+}
+"""
+
+
+# (output, error) from running program on version with engine; the interpreter's
+# tiering if it has one, else None
+def run(version, program, engine, inp=None, tiering=None):
+    interpreter = INTERPRETERS[version](console_output=False, inp=inp, engine=engine, tiering=tiering)
+    error = None
+    stdin = sys.stdin
+    sys.stdin = io.StringIO()  # with no input given, the interpreter reads the console
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        sys.stdin = stdin
+    return interpreter.get_output(), error and re.sub(r" at 0x[0-9a-f]+", "", error)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--calls", type=int, default=Tiering().call_threshold)
+    arg_parser.add_argument("--back-edges", type=int, default=Tiering().back_edge_threshold)
+    args = arg_parser.parse_args()
+
+    programs = []
+    for version in INTERPRETERS:
+        corpus = os.path.join(REPO_ROOT, f"interpreter_{version[0]}_{version[1]}", "")
+        for path in corpus_files():
+            if path.startswith(corpus):
+                source = read_source(path)
+                programs.append((version, os.path.relpath(path, REPO_ROOT), source, test_input(source)))
+    corner_cases = [("v2", f"v2 corner case {i}", source, None) for i, source in enumerate(V2_CORNER_CASES)]
+    corner_cases += [("v3", f"v3 corner case {i}", source, None) for i, source in enumerate(CORNER_CASES)]
+    mismatches = 0
+    for version, name, source, inp in programs + corner_cases:
+        walked = run(version, source, "ast", inp)
+        for calls, back_edges in ((1, 1), (2, 3)):
+            tiered = run(version, source, "tiered", inp, Tiering(calls, back_edges))
+            if tiered != walked:
+                mismatches += 1
+                print(f"MISMATCH {name} at thresholds {calls}/{back_edges}: {tiered} instead of {walked}")
+    print(f"parity: {len(programs + corner_cases)} programs at 2 sets of thresholds, {mismatches} mismatches")
+
+    def tiering():
+        return Tiering(args.calls, args.back_edges)
+
+    engines = ("ast", "tiered", "closures")
+    print(f"thresholds: {args.calls} calls, {args.back_edges} back edges")
+    print(f"{'workload':24}" + "".join(f"{engine:>10}" for engine in engines) + f"{'tiered vs ast':>15}")
+    tests = [(version, source, inp) for version, path, source, inp in programs if f"{os.sep}tests{os.sep}" in path]
+
+    def run_corpus(engine):
+        for version, source, inp in tests:
+            run(version, source, engine, inp, tiering() if engine == "tiered" else None)
+
+    workloads = [
+        (f"corpus tests/ ({len(tests)})", run_corpus),
+        ("v2 fib(20)", lambda engine: run("v2", FIB_V2 % 20, engine, tiering=tiering())),
+        ("v2 loop in main 300x100", lambda engine: run("v2", LOOP_V2 % 300, engine, tiering=tiering())),
+        ("v3 fib(20)", lambda engine: run("v3", FIB % 20, engine, tiering=tiering())),
+        ("v3 loop in main 300x100", lambda engine: run("v3", LOOP % 300, engine, tiering=tiering())),
+        ("v3 loop in count(30000)", lambda engine: run("v3", LOOP_IN_FUNCTION_V3 % 30000, engine, tiering=tiering())),
+    ]
+    for name, workload in workloads:
+        times = [best_time(lambda: workload(engine), args.repeat) for engine in engines]
+        print(f"{name:24}" + "".join(f"{t * 1e3:8.1f}ms" for t in times) + f"{times[0] / times[1]:14.2f}x")
+
+    events = tiering()
+    run("v2", DEMO_V2, "tiered", tiering=events)
+    print("\ntier-ups running fib(12) then a loop in main (v2):")
+    for event in events.events:
+        print(f"  {event}")
+    print("counters (calls, back edges, tier):", events.counters())
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# Compares the Python-source engine (transpile.py, interpreter_v_2/transpile_v2.py,
+# interpreter_v_3/transpile_v3.py) against the tree walker. Every v2 and v3 corpus
+# program, plus bench_typed's corner cases and some of the same for v2's dynamic
+# types, must print the same and fail with the same error, on the same line, on
+# both; then arithmetic loops and recursion are timed against the tree walker and
+# the closure compiler, and the Python one program translates to is shown.
+#   python -m benchmarks.bench_transpile [--repeat N]
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+
+from benchmarks.bench_typed import CORNER_CASES, FIB, LOOP, run, test_input
+from benchmarks.common import REPO_ROOT, best_time, corpus_files, read_source
+from interpreter_v_2.interpreterv2 import Interpreter as InterpreterV2
+from interpreter_v_3.interpreterv3 import Interpreter as InterpreterV3
+from transpile import CACHE
+
+V2_CORNER_CASES = [
+    # operators on values whose types are only known at run time
+    'func id(x) { return x; } func main() { print(id(1) + id(2), id("a") + id("b"), id(7) / id(2), -id(3), !id(false)); }',
+    'func id(x) { return x; } func main() { print(id(1) == id(1), id(1) == id(true), id(nil) == nil, nil != id(0), id("s") == "s"); }',
+    'func id(x) { return x; } func main() { print(id(true) && id(false), id(false) || id(true), 1 < 2 == true); }',
+    # type errors, raised once every operand has been evaluated
+    'func id(x) { print("id ", x); return x; } func main() { print(id(1) + id("s")); }',
+    'func id(x) { return x; } func main() { print(id("a") - "b"); }',
+    'func id(x) { return x; } func main() { print(id(true) < id(false)); }',
+    'func main() { print(-"s"); }',
+    'func main() { var x; print(!x); }',
+    'func main() { if (1) { print("no"); } }',
+    'func main() { var i; for (i = 0; i; i = i + 1) { print("no"); } }',
+    'func main() { var x; print("a", x); }',
+    'func main() { var x; print(x + 1); }',
+    'func main() { print(1 / 0); }',
+    # names: undefined, duplicate and shadowed variables, missing functions
+    'func main() { print(y); }',
+    'func main() { x = print("evaluated first"); }',
+    'func main() { var x; var x; }',
+    'func main() { var x; x = 1; if (true) { var x; x = "inner"; print(x); } print(x); }',
+    'func f(a, a) { print(a); } func main() { f(1, 2); }',
+    'func f(a) { var a; a = 2; print(a); } func main() { f(1); }',
+    'func main() { f(1); }',
+    'func f() { print("f"); } func main() { f(1); }',
+    # the for update runs once more after the condition is false; returns from loops
+    'func main() { var i; for (i = 0; i < 3; i = i + 1) { print(i); } print(i); }',
+    'func f() { var i; for (i = 0; i < 10; i = i + 1) { if (i == 4) { return i; } } } func main() { print(f()); }',
+    'func f() { } func main() { print(f() == nil); }',
+    # a long chain of one operator
+    "func main() { var x; x = 1; print(" + " + ".join(["x"] * 40) + "); print(" + " + ".join(['"a"'] * 40) + "); }",
+]
+
+LOOP_V2 = """
+func main() {
+  var i;
+  var j;
+  var total;
+  var even;
+  total = 0;
+  for (i = 0; i < %d; i = i + 1) {
+    for (j = 0; j < 100; j = j + 1) {
+      even = j - j / 2 * 2 == 0;
+      if (even) {
+        total = total + j;
+      } else {
+        total = total - 1;
+      }
+    }
+  }
+  print(total);
+}
+"""
+
+FIB_V2 = """
+func fib(n) {
+  if (n == 0 || n == 1) {
+    return 1;
+  }
+  return fib(n - 1) + fib(n - 2);
+}
+func main() {
+  print(fib(%d));
+}
+"""
+
+
+# (output, error) from running program on version with engine
+def run_v2(program, engine, inp=None):
+    interpreter = InterpreterV2(console_output=False, inp=inp, engine=engine)
+    error = None
+    stdin = sys.stdin
+    sys.stdin = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        sys.stdin = stdin
+    return interpreter.get_output(), error
+
+
+RUNNERS = {"v2": run_v2, "v3": run}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    programs = []
+    for version in RUNNERS:
+        corpus = os.path.join(REPO_ROOT, f"interpreter_{version[0]}_{version[1]}", "")
+        for path in corpus_files():
+            if path.startswith(corpus):
+                source = read_source(path)
+                programs.append((version, os.path.relpath(path, REPO_ROOT), source, test_input(source)))
+    programs += [("v2", f"v2 corner case {i}", source, None) for i, source in enumerate(V2_CORNER_CASES)]
+    programs += [("v3", f"v3 corner case {i}", source, None) for i, source in enumerate(CORNER_CASES)]
+    mismatches = 0
+    for version, name, source, inp in programs:
+        walked, transpiled = RUNNERS[version](source, "ast", inp), RUNNERS[version](source, "python", inp)
+        if walked != transpiled:
+            mismatches += 1
+            print(f"MISMATCH {name}: {transpiled} instead of {walked}")
+    print(f"parity: {len(programs)} programs, {mismatches} mismatches")
+    print(f"cache: {CACHE.hits} hits, {CACHE.misses} misses")
+
+    engines = ("ast", "closures", "python")
+    print(f"{'program':20}" + "".join(f"{engine:>10}" for engine in engines) + f"{'vs ast':>9}{'vs closures':>12}")
+    workloads = (
+        ("v2 loop 200x100", "v2", LOOP_V2 % 200),
+        ("v2 fib(18)", "v2", FIB_V2 % 18),
+        ("v3 loop 200x100", "v3", LOOP % 200),
+        ("v3 fib(18)", "v3", FIB % 18),
+    )
+    for name, version, program in workloads:
+        times = [best_time(lambda: RUNNERS[version](program, engine), args.repeat) for engine in engines]
+        print(
+            f"{name:20}" + "".join(f"{t * 1e3:8.1f}ms" for t in times)
+            + f"{times[0] / times[2]:8.1f}x{times[1] / times[2]:11.1f}x"
+        )
+
+    # the same loop written directly in Python, for what "native" speed is
+    def native(n):
+        total = 0
+        for i in range(n):
+            for j in range(100):
+                if j - j // 2 * 2 == 0:
+                    total = total + j
+                else:
+                    total = total - 1
+        return total
+
+    print(f"{'native Python loop':20}{best_time(lambda: native(200), args.repeat) * 1e3:28.1f}ms")
+
+    interpreter = InterpreterV3()
+    interpreter.load(LOOP % 200)
+    from interpreter_v_3.transpile_v3 import Transpiler
+
+    print("\nv3 loop as Python:\n" + re.sub(r"(?m)^", "  ", Transpiler(interpreter).transpile().source))
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# Compares the v3 interpreter's two engines: walking the AST, and type-checking it
+# and compiling it to closures over bare Python values (interpreter_v_3/compile_v3.py).
+# Every v3 test program, plus programs aimed at the type rules and at type errors
+# that must only fire once reached, must print the same and fail with the same
+# error on both; then recursion-, loop- and struct-heavy programs are timed.
+#   python -m benchmarks.bench_typed [--repeat N]
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+
+from benchmarks.common import REPO_ROOT, best_time, corpus_files, read_source
+from interpreter_v_3.interpreterv3 import Interpreter
+
+STRUCTS = "struct node { value: int; next: node; } struct pair { a: node; flag: bool; } "
+
+CORNER_CASES = [
+    # coercions: int into bool variables, parameters, returns, fields and conditions
+    "func f(b: bool) : bool { return 5; } func main() : void { var b: bool; b = 3; print(b, f(0), f(2)); if (7) { print(!0, !3, 0 || 2, 1 && 0); } }",
+    STRUCTS + "func main() : void { var p: pair; p = new pair; p.flag = 9; print(p.flag, p.a == nil, nil == p.a); }",
+    # comparisons: structs by reference, int against bool, nil against structs
+    STRUCTS + "func main() : void { var a: node; var b: node; a = new node; b = new node; print(a == b, a != b, a == a, b == nil); b = a; print(a == b, 1 == true, 0 != false, nil == nil); }",
+    # a chain whose running value changes type
+    "func main() : void { print(1 < 2 == true, 1 + 2 + 3 == 6 == true, \"a\" + \"b\" + \"c\"); }",
+    # type errors only fire when their line is reached
+    "func main() : void { if (false) { var x: int; x = \"s\"; print(x + true); } print(\"ok\"); var y: string; y = 1; }",
+    "func f() : int { return \"s\"; } func main() : void { print(\"before\"); print(f()); }",
+    "func main() : void { print(\"a\"); var z: nosuchtype; }",
+    "func main() : void { var x: int; var x: bool; }",
+    "func main() : void { print(\"a\"); print(1 + nosuchvar, \"b\"); }",
+    "func g() : int { print(\"g ran\"); return 1; } func main() : void { print(g() + \"s\"); }",
+    "func main() : void { var i: int; for (i = 0; \"s\"; i = i + 1) { print(i); } }",
+    "func main() : void { print(-\"s\"); }",
+    "func main() : void { print(!\"s\"); }",
+    "func main() : void { print(print(1)); }",
+    "func f(a: int, b: bool) : void { print(a); } func main() : void { f(print(\"x\"), \"s\"); }",
+    "func f() : void { return 1; } func main() : void { f(); }",
+    "func f() : void { print(\"f\"); } func main() : void { var x: int; x = f() == 1; }",
+    "func main() : void { print(nil == 1); }",
+    "func main() : void { print(\"s\" == 1); }",
+    "func main() : void { print(\"s\" || true); }",
+    "func main() : void { print(\"s\" - \"t\"); }",
+    "func main() : void { print(1 / 0); }",
+    "func main() : void { var s: int; print(s.x); }",
+    "func main() : void { var s: int; s.x = 1; }",
+    STRUCTS + "func main() : void { var p: pair; p.flag = true; }",
+    STRUCTS + "func main() : void { var p: pair; p = new pair; print(p.a.value); }",
+    STRUCTS + "func main() : void { var p: pair; p = new pair; p.a = new node; p.a.next.value = 1; }",
+    STRUCTS + "func main() : void { var p: pair; p = new pair; p.a = new node; print(p.a.value.x); }",
+    STRUCTS + "func main() : void { var p: pair; p = new pair; print(p.nosuchfield); }",
+    STRUCTS + "func main() : void { var p: pair; p = new pair; p.a = new pair; }",
+    STRUCTS + "func main() : void { var p: pair; p = new nosuchstruct; }",
+    STRUCTS + "func main() : void { var p: pair; p = new pair; print(p); }",
+    "func main() : void { f(1); } func f() : void { print(\"f\"); }",
+    # returns: defaults for every type, and from inside loops
+    STRUCTS + "func i() : int { print(\"i\"); } func b() : bool { return; } func s() : string { print(\"s\"); } func n() : node { return nil; } func main() : void { print(i(), b(), s(), n() == nil); }",
+    "func f(n: int) : int { var i: int; for (i = 0; i < 10; i = i + 1) { if (i == n) { return i * 10; } } return -1; } func main() : void { print(f(3), f(20)); }",
+    # shadowing parameters and outer blocks
+    "func f(x: int) : int { var x: string; x = \"inner\"; print(x); return 1; } func main() : void { var x: bool; if (true) { var x: int; x = 2; print(x); } print(x, f(4)); }",
+    # argument errors come after the arguments before them are evaluated
+    "func f(a: int, b: string) : void { print(a); } func main() : void { f(print(\"first\"), 1); }",
+]
+
+FIB = """
+func fib(n: int) : int {
+  if (n == 0 || n == 1) {
+    return 1;
+  }
+  return fib(n - 1) + fib(n - 2);
+}
+func main() : void {
+  print(fib(%d));
+}
+"""
+
+LOOP = """
+func main() : void {
+  var i: int;
+  var j: int;
+  var total: int;
+  var even: bool;
+  for (i = 0; i < %d; i = i + 1) {
+    for (j = 0; j < 100; j = j + 1) {
+      even = j - j / 2 * 2 == 0;
+      if (even) {
+        total = total + j;
+      } else {
+        total = total - 1;
+      }
+    }
+  }
+  print(total);
+}
+"""
+
+LIST = """
+struct node {
+  value: int;
+  next: node;
+}
+func main() : void {
+  var head: node;
+  var n: node;
+  var i: int;
+  var total: int;
+  for (i = 0; i < %d; i = i + 1) {
+    n = new node;
+    n.value = i;
+    n.next = head;
+    head = n;
+  }
+  for (n = head; n != nil; n = n.next) {
+    total = total + n.value;
+  }
+  print(total);
+}
+"""
+
+
+# the input lines in a test program's *IN* comment
+def test_input(source):
+    match = re.search(r"\*IN\*\n(.*?)\*IN\*", source, re.S)
+    return match.group(1).splitlines() if match else None
+
+
+# (output, error) from running program with engine
+def run(program, engine, inp=None):
+    interpreter = Interpreter(console_output=False, inp=inp, engine=engine)
+    error = None
+    stdin = sys.stdin
+    sys.stdin = io.StringIO()  # with no input given, the interpreter reads the console
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        sys.stdin = stdin
+    # the tree walker names a Variable, at some address, in one of its messages
+    return interpreter.get_output(), error and re.sub(r" at 0x[0-9a-f]+", "", error)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    corpus = os.path.join(REPO_ROOT, "interpreter_v_3", "")
+    programs = []
+    for path in corpus_files():
+        if path.startswith(corpus):
+            source = read_source(path)
+            programs.append((os.path.relpath(path, corpus), source, test_input(source)))
+    programs += [(f"corner case {i}", source, None) for i, source in enumerate(CORNER_CASES)]
+    mismatches = 0
+    for name, source, inp in programs:
+        walked, compiled = run(source, "ast", inp), run(source, "closures", inp)
+        if walked != compiled:
+            mismatches += 1
+            print(f"MISMATCH {name}: {compiled} instead of {walked}")
+    print(f"parity: {len(programs)} programs, {mismatches} mismatches")
+
+    print(f"{'program':16} {'ast':>9} {'closures':>9} {'speedup':>8}")
+    for name, program in (("fib(18)", FIB % 18), ("loop 200x100", LOOP % 200), ("list 20000", LIST % 20000)):
+        walked = best_time(lambda: run(program, "ast"), args.repeat)
+        compiled = best_time(lambda: run(program, "closures"), args.repeat)
+        print(f"{name:16} {walked * 1e3:7.1f}ms {compiled * 1e3:7.1f}ms {walked / compiled:7.2f}x")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# Compares the v3 bytecode VM (interpreter_v_3/bytecode_v3.py, vm_v3.py) against
+# the tree walker, with the closure compiler alongside. Every v3 test program and
+# bench_typed's corner cases must print the same and fail with the same error, on
+# the same line, as under the tree walker; then fib(25), nested loops and
+# struct-heavy programs are timed on all three engines, and a recursion too deep for
+# the tree walker is run on the VM.
+#
+# v4 programs (interpreter_v_4/bytecode_v4.py) get the same treatment: every v4 test
+# program and the corner cases below, for laziness, raise and try/catch, must match
+# the tree walker; a raise out of a lazy value the tree walker forces for print is
+# checked against what v4 says should happen instead, since the tree walker fails on
+# it. Then fib(18), a loop and a raise-heavy loop are timed, and a chain of lazy
+# values too deep for the tree walker is run on the VM.
+#   python -m benchmarks.bench_vm [--repeat N]
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+from benchmarks.bench_typed import CORNER_CASES, FIB, LIST, run, test_input
+from benchmarks.common import REPO_ROOT, best_time, corpus_files, read_source
+from interpreter_v_4.interpreterv4 import Interpreter as InterpreterV4
+
+LOOPS = """
+func main() : void {
+  var i: int;
+  var j: int;
+  var k: int;
+  var total: int;
+  for (i = 0; i < %d; i = i + 1) {
+    for (j = 0; j < 30; j = j + 1) {
+      for (k = 0; k < 30; k = k + 1) {
+        if (k > j) {
+          total = total + k - j;
+        }
+      }
+    }
+  }
+  print(total);
+}
+"""
+
+# a binary tree of points, built and then summed
+TREE = """
+struct point {
+  x: int;
+  y: int;
+}
+struct tree {
+  p: point;
+  left: tree;
+  right: tree;
+}
+func build(depth: int, x: int) : tree {
+  var t: tree;
+  if (depth == 0) {
+    return nil;
+  }
+  t = new tree;
+  t.p = new point;
+  t.p.x = x;
+  t.p.y = depth;
+  t.left = build(depth - 1, x * 2);
+  t.right = build(depth - 1, x * 2 + 1);
+  return t;
+}
+func total(t: tree) : int {
+  if (t == nil) {
+    return 0;
+  }
+  return t.p.x + t.p.y + total(t.left) + total(t.right);
+}
+func main() : void {
+  print(total(build(%d, 1)));
+}
+"""
+
+DEEP = """
+func down(n: int) : int {
+  if (n == 0) {
+    return 0;
+  }
+  return 1 + down(n - 1);
+}
+func main() : void {
+  print(down(%d));
+}
+"""
+
+V4_CASES = [
+    # laziness: a value is computed when read, from the variables as they were
+    'func f(x) { print("f ", x); return x; } func main() { var a; var b; b = 1; a = f(b) + 1; b = 5; print("before"); print(a, a, b); }',
+    'func g(x) { print("g"); return 0; } func main() { g(print("never")); g(1 / 0); print("done"); }',
+    'func p(s) { print(s); return 1; } func a() { return p("a"); } func b() { return p("b"); } func main() { print(a() + b()); print(a() == b()); }',
+    'func f(x) { print("f", x); return x; } func main() { print(f(1) + f(2) * f(3) - f(4)); }',
+    'func g() { return print("side"); } func main() { var x; x = g(); print("then"); print(x == nil); print(x == nil); }',
+    # builtins in a lazy value see the running function's variables
+    'func f(y) { var x; x = "callee"; return y; } func main() { var x; var r; x = "caller"; r = f(print(x)); print(r); }',
+    'func show(v) { var inner; inner = 7; print(v); } func main() { var v; v = 3; show(inputi(v)); }',
+    # short circuits, type and name errors, on the line they're found
+    'func t(s) { print(s); return true; } func main() { print(false && t("no"), true || t("no"), true && t("yes"), false || 5); }',
+    'func main() { var x; x = 1 + "s"; print("lazy"); print(x); }',
+    'func main() { print(1 < "a"); }',
+    'func main() { var i; for (i = 0; i; i = i + 1) { print("x"); } }',
+    'func main() {\n var x;\n x = 1;\n if (x == 1) {\n  print(y);\n }\n}',
+    'func foo(a) { } func main() { foo(); }',
+    # raise and try
+    'func main() { try { print("a"); raise "x"; print("b"); } catch "y" { print("y"); } catch "x" { print("x"); } print("end"); }',
+    'func f(n) { if (n == 0) { raise "bottom"; } f(n - 1); print("unreached"); } func main() { try { f(5); } catch "bottom" { print("caught"); } }',
+    'func f() { try { try { return 1; } catch "q" { } } catch "r" { } } func main() { try { print(f()); raise "z"; } catch "z" { print("z caught"); } }',
+    'func main() { try { raise "a"; } catch "a" { try { raise "b"; } catch "b" { print("b"); } print("after b"); } print("end"); }',
+    'func f() { raise "inner"; } func g() { try { f(); } catch "other" { print("no"); } } func main() { try { g(); } catch "inner" { print("main caught"); } }',
+    'func main() { raise 1; }',
+    'func main() { try { raise "a"; } catch "a" { raise "b"; } }',
+    # div0, and raises out of lazy values, wherever they're forced
+    'func main() { var x; x = 10 / 0; print("assigned"); try { print(x); } catch "div0" { print("div0 caught"); } print(x); }',
+    'func bad() { raise "r"; } func main() { var x; x = bad(); try { print(x); } catch "r" { print("r from thunk"); } try { print(x); } catch "r" { print("again"); } }',
+    'func r() { raise "e"; return 1; } func main() { try { print(1 + r()); } catch "e" { print("e"); } try { if (r()) { } } catch "e" { print("e2"); } }',
+    'func main() { try { var i; for (i = 0; i < 3 / (i - 2); i = i + 1) { print(i); } } catch "div0" { print("loop div0"); } }',
+]
+
+# (program, output, error) for raises out of a function's lazy return value, forced
+# for print: the tree walker fails on these, with an AttributeError
+V4_EXPECTED = [
+    ('func f(n) { if (n == 0) { raise "deep"; } return f(n - 1); } func main() { try { print(f(50)); } catch "deep" { print("deep caught"); } }',
+     ["deep caught"], None),
+    ('func f(a, b) { return a; } func main() { print(f(1, 1 / 0)); print(f(1 / 0, 1)); }',
+     ["1"], "BrewinError: ErrorType.FAULT_ERROR: Unhandled exception: div0"),
+]
+
+FIB_V4 = """
+func fib(n) {
+  if (n < 2) {
+    return n;
+  }
+  return fib(n - 1) + fib(n - 2);
+}
+func main() {
+  print(fib(%d));
+}
+"""
+
+# the total is read each time round, so it never builds up a chain of lazy values
+LOOPS_V4 = """
+func main() {
+  var i;
+  var j;
+  var total;
+  total = 0;
+  for (i = 0; i < %d; i = i + 1) {
+    for (j = 0; j < 30; j = j + 1) {
+      total = total + j - i;
+      if (total == -1) {
+        print("never");
+      }
+    }
+  }
+  print(total);
+}
+"""
+
+RAISE_V4 = """
+func check(i) {
+  if (i / 3 * 3 == i) {
+    raise "three";
+  }
+  return i;
+}
+func main() {
+  var i;
+  var n;
+  n = 0;
+  for (i = 0; i < %d; i = i + 1) {
+    try {
+      n = n + check(i);
+    } catch "three" {
+      n = n + 1;
+    }
+  }
+  print(n);
+}
+"""
+
+# each value of x is computed from the one before, all at once when it's printed
+CHAIN_V4 = """
+func main() {
+  var i;
+  var x;
+  x = 0;
+  for (i = 0; i < %d; i = i + 1) {
+    x = x + 1;
+  }
+  print(x);
+}
+"""
+
+
+# (output, error) from running v4 program with engine, like bench_typed.run
+def run_v4(program, engine, inp=None):
+    interpreter = InterpreterV4(console_output=False, inp=inp, engine=engine)
+    error = None
+    stdin = sys.stdin
+    sys.stdin = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.run(program)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        sys.stdin = stdin
+    return interpreter.get_output(), error
+
+
+def v4(repeat):
+    corpus = os.path.join(REPO_ROOT, "interpreter_v_4", "")
+    programs = []
+    for path in corpus_files():
+        if path.startswith(corpus):
+            source = read_source(path)
+            programs.append((os.path.relpath(path, corpus), source, test_input(source)))
+    programs += [(f"v4 corner case {i}", source, ["Ann", "41"]) for i, source in enumerate(V4_CASES)]
+    mismatches = 0
+    for name, source, inp in programs:
+        walked, vm = run_v4(source, "ast", inp), run_v4(source, "bytecode", inp)
+        if walked != vm:
+            mismatches += 1
+            print(f"MISMATCH {name}: {vm} instead of {walked}")
+    for i, (source, output, error) in enumerate(V4_EXPECTED):
+        vm = run_v4(source, "bytecode")
+        if vm != (output, error):
+            mismatches += 1
+            print(f"MISMATCH v4 expected case {i}: {vm} instead of {(output, error)}")
+    print(f"v4 parity: {len(programs) + len(V4_EXPECTED)} programs, {mismatches} mismatches")
+
+    engines = ("ast", "bytecode")
+    print(f"{'v4 program':16}" + "".join(f"{engine:>10}" for engine in engines) + f"{'vm vs ast':>11}")
+    workloads = (("fib(18)", FIB_V4 % 18), ("loops 300x30", LOOPS_V4 % 300), ("raise 5000", RAISE_V4 % 5000))
+    for name, program in workloads:
+        times = [best_time(lambda: run_v4(program, engine), repeat) for engine in engines]
+        print(f"{name:16}" + "".join(f"{t * 1e3:8.0f}ms" for t in times) + f"{times[0] / times[-1]:10.2f}x")
+
+    chain = CHAIN_V4 % 20000
+    print(f"chain(20000): ast {run_v4(chain, 'ast')[1]}; bytecode {run_v4(chain, 'bytecode')}")
+    return mismatches
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    corpus = os.path.join(REPO_ROOT, "interpreter_v_3", "")
+    programs = []
+    for path in corpus_files():
+        if path.startswith(corpus):
+            source = read_source(path)
+            programs.append((os.path.relpath(path, corpus), source, test_input(source)))
+    programs += [(f"corner case {i}", source, None) for i, source in enumerate(CORNER_CASES)]
+    mismatches = 0
+    for name, source, inp in programs:
+        walked, vm = run(source, "ast", inp), run(source, "bytecode", inp)
+        if walked != vm:
+            mismatches += 1
+            print(f"MISMATCH {name}: {vm} instead of {walked}")
+    print(f"parity: {len(programs)} programs, {mismatches} mismatches")
+
+    engines = ("ast", "closures", "bytecode")
+    print(f"{'program':16}" + "".join(f"{engine:>10}" for engine in engines) + f"{'vm vs ast':>11}")
+    workloads = (("fib(25)", FIB % 25), ("loops 100x30x30", LOOPS % 100), ("list 20000", LIST % 20000), ("tree 2^13", TREE % 13))
+    for name, program in workloads:
+        times = [best_time(lambda: run(program, engine), args.repeat) for engine in engines]
+        print(f"{name:16}" + "".join(f"{t * 1e3:8.0f}ms" for t in times) + f"{times[0] / times[-1]:10.2f}x")
+
+    deep = DEEP % 100000
+    print(f"down(100000): ast {run(deep, 'ast')[1]}; bytecode {run(deep, 'bytecode')}")
+
+    mismatches += v4(args.repeat)
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
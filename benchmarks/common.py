@@ -0,0 +1,110 @@
+# Shared helpers for the benchmark scripts. Run every benchmark from the repository
+# root as a module, e.g. `python -m benchmarks.bench_nodes`.
+import contextlib
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+# every .br program in the interpreters' test corpora (tests/ and fails/)
+def corpus_files(kinds=("tests", "fails")):
+    files = []
+    for kind in kinds:
+        files += glob.glob(os.path.join(REPO_ROOT, "interpreter_v_*", "test_cases_v*", kind, "*"))
+    return sorted(f for f in files if not os.path.basename(f).startswith("."))
+
+
+def read_source(path):
+    with open(path) as f:
+        return f.read()
+
+
+# (path, source) for each corpus program that parses
+def corpus_sources(kinds=("tests", "fails")):
+    from parser.brewparse import parse_program
+
+    sources = []
+    for path in corpus_files(kinds):
+        source = read_source(path)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):  # the parser prints syntax errors
+                parse_program(source, use_cache=False)
+        except SyntaxError:
+            continue
+        sources.append((path, source))
+    return sources
+
+
+# A large v2-style program made of n_funcs small, independent functions plus a main
+def generated_program(n_funcs):
+    parts = []
+    for i in range(n_funcs):
+        parts.append(
+            f"""/* generated helper {i} */
+func helper{i}(n, s) {{
+  var total;
+  var i;
+  total = {i} * 3 + n - (n / 2);
+  for (i = 0; i < n; i = i + 1) {{
+    if (i == {i % 7} || total > 100 && !(i <= 2)) {{
+      total = total + i * 2;
+    }} else {{
+      s = s + "x";
+    }}
+  }}
+  return total;
+}}
+"""
+        )
+    parts.append("func main() {\n  print(helper0(3, \"a\"));\n}\n")
+    return "".join(parts)
+
+
+# best wall time of repeat runs of fn(), in seconds
+def best_time(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def git(*args):
+    return subprocess.run(["git", *args], cwd=REPO_ROOT, check=True, capture_output=True, text=True).stdout
+
+
+# The commit before the one that added path, to compare a change against; HEAD if
+# path isn't committed yet
+def baseline_before(path):
+    added = git("log", "--diff-filter=A", "--format=%H", "--", path).split()
+    return added[-1] + "~" if added else "HEAD"
+
+
+# a temporary checkout of rev, removed again on exit
+@contextlib.contextmanager
+def worktree(rev):
+    with tempfile.TemporaryDirectory() as tmp:
+        git("worktree", "add", "--detach", tmp, rev)
+        try:
+            yield tmp
+        finally:
+            git("worktree", "remove", "--force", tmp)
+
+
+# Runs code in a fresh interpreter in tree (a checkout of the repo) and returns
+# what it printed, as JSON. The code goes in on stdin, so it can be any size.
+def run_in(tree, code):
+    output = subprocess.run([sys.executable, "-"], input=code, cwd=tree, check=True, capture_output=True, text=True)
+    return json.loads(output.stdout)
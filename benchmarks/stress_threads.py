@@ -0,0 +1,71 @@
+# Parses the whole test corpus from many threads at once and checks that every thread
+# gets byte-for-byte the same AST (or the same syntax error) for every program as a
+# single-threaded parse does, with each engine and with and without the caches.
+#   python -m benchmarks.stress_threads [--threads N] [--rounds N]
+import argparse
+import contextlib
+import os
+import random
+import sys
+import threading
+
+from benchmarks.common import corpus_files, read_source
+from parser import brewparse
+from parser.astbinary import dumps
+from parser.brewparse import ENGINES, parse_program
+
+
+def parse_result(source, engine, use_cache):
+    try:
+        return dumps(parse_program(source, use_cache=use_cache, engine=engine))
+    except SyntaxError:
+        return None
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--threads", type=int, default=32)
+    arg_parser.add_argument("--rounds", type=int, default=3, help="passes over the corpus per thread")
+    args = arg_parser.parse_args()
+
+    sources = [read_source(path) for path in corpus_files()]
+    modes = [(engine, use_cache) for engine in ENGINES for use_cache in (False, True)]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # syntax error messages
+        expected = {
+            (i, engine): parse_result(source, engine, False)
+            for i, source in enumerate(sources)
+            for engine in ENGINES
+        }
+        brewparse.set_incremental(True)
+        brewparse.parse_cache.clear()
+
+        sys.setswitchinterval(1e-5)  # switch threads often, to interleave parses finely
+        start = threading.Barrier(args.threads)
+        mismatches = []
+
+        def worker(seed):
+            rng = random.Random(seed)
+            jobs = [(i, mode) for i in range(len(sources)) for mode in modes] * args.rounds
+            rng.shuffle(jobs)
+            start.wait()
+            for i, (engine, use_cache) in jobs:
+                if parse_result(sources[i], engine, use_cache) != expected[i, engine]:
+                    mismatches.append((i, engine, use_cache))
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        brewparse.set_incremental(False)
+
+    n_parses = args.threads * args.rounds * len(sources) * len(modes)
+    print(f"{args.threads} threads, {n_parses} parses, {len(mismatches)} mismatches")
+    for i, engine, use_cache in sorted(set(mismatches))[:20]:
+        print(f"MISMATCH: {corpus_files()[i]} ({engine}, use_cache={use_cache})")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
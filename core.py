@@ -0,0 +1,1297 @@
+# The tree walker every version of Brewin runs on. The versions differ in what the
+# language has and in how it's evaluated, and a Semantics, given when an interpreter
+# is made, picks between those:
+#   - dynamic or static typing: v3 declares the types of variables, parameters and
+#     return values, checks them as it goes and coerces ints to bools, where the
+#     other versions type values, not variables
+#   - eager or lazy evaluation: v4 evaluates an assignment, argument or return
+#     value only once it's needed, in the variables as they were when it was
+#     written, and short-circuits && and ||
+#   - exceptions: v4's raise and try/catch, and div0 for a division by zero
+#   - structs: v3's struct types, new, and dotted field access
+#   - and what's smaller: v1's language has only main, and v2 runs a for loop's
+#     update once more when its condition turns false
+# Each choice is made once, as the interpreter is made, by which handlers go into
+# its dispatch tables (node type -> method), so the tree walker doesn't test
+# them as it runs. interpreter_v_N/interpreterv*.py are thin facades that pick their
+# version's Semantics, and for v2 and v3 the other ways they have to run a program.
+#
+# Variables live in flat frames, one list per call, at the slots resolve.py gives
+# them when a program's loaded. The EnvironmentManager is left to the closure
+# compilers, and to compiled code the tiered engine switches to.
+import copy
+from enum import Enum
+
+from intbase import BrewinError, InterpreterBase, ErrorType
+from parser.brewparse import parse_program
+from eliminate import DeadCodeEliminator
+from fold import ConstantFolder
+from inline import Inliner
+from quickening import Quickening
+from resolve import NO_SLOT, Resolver
+
+
+class ExecStatus(Enum):
+    CONTINUE = 1
+    RETURN = 2
+    RAISE = 3
+
+
+# Enumerated type for our different language data types
+class Type:
+    INT = "int"
+    BOOL = "bool"
+    STRING = "string"
+    NIL = "nil"
+    VOID = "void"
+
+
+# Represents a value, which has a type and its value
+class Value:
+    def __init__(self, type, value=None):
+        self.t = type
+        self.v = value
+
+    def value(self):
+        return self.v
+
+    def type(self):
+        return self.t
+
+
+# A statically typed variable (v3): its declared type, and the Value it holds
+class Variable:
+    # var_value must be an object of type Value
+    def __init__(self, var_type, var_value=None):
+        self.t = var_type
+        self.v = var_value
+
+    def value(self):
+        return self.v
+
+    def type(self):
+        return self.t
+
+    def set_value(self, new_value):
+        self.v = new_value
+
+
+def create_value(val):
+    if val == InterpreterBase.TRUE_DEF:
+        return Value(Type.BOOL, True)
+    elif val == InterpreterBase.FALSE_DEF:
+        return Value(Type.BOOL, False)
+    elif val == InterpreterBase.NIL_DEF:
+        return Value(Type.NIL, None)
+    elif isinstance(val, str):
+        return Value(Type.STRING, val)
+    elif isinstance(val, int):
+        return Value(Type.INT, val)
+    else:
+        raise ValueError("Unknown value type")
+
+
+def get_printable(val):
+    if val.type() == Type.INT:
+        return str(val.value())
+    if val.type() == Type.STRING:
+        return val.value()
+    if val.type() == Type.BOOL:
+        if val.value() is True:
+            return "true"
+        return "false"
+    return None
+
+
+# The valid types and the structs of a statically typed program
+class TypeManager:
+    def __init__(self):
+        self.__setup_valid_var_types()
+        self.struct_defs = {}
+
+    @staticmethod
+    def create_value(val):
+        if val == InterpreterBase.VOID_DEF:
+            return Value(Type.VOID, None)
+        return create_value(val)
+
+    def create_default_value(self, for_type):
+        if for_type == Type.BOOL:
+            return Value(Type.BOOL, False)
+        if for_type == Type.INT:
+            return Value(Type.INT, 0)
+        if for_type == Type.STRING:
+            return Value(Type.STRING, "")
+        if for_type == Type.VOID:
+            return Value(Type.VOID, None)
+        if for_type == Type.NIL or for_type in self.struct_defs:
+            return Value(for_type, None)
+
+        return None
+
+    def create_variable_with_default_value(self, for_type):
+        return Variable(for_type, self.create_default_value(for_type))
+
+    def new_struct_value(self, struct_type):
+        if struct_type not in self.struct_defs:
+            return None
+        return Value(struct_type, copy.deepcopy(self.struct_defs[struct_type]))
+
+    def define_struct(self, struct_ast):
+        struct_type_name = struct_ast.name
+        fields = struct_ast.fields
+        if struct_type_name in self.valid_var_types or struct_type_name == Type.VOID:
+            return False
+
+        default_struct = {}
+        # track the type name up front so the struct can self-reference it (DOCUMENT)
+        self.valid_var_types.add(struct_type_name)
+        self.struct_defs[struct_type_name] = default_struct
+        for var_def_node in fields:
+            field_name = var_def_node.name
+            field_type = var_def_node.var_type
+            default_value = Variable(field_type, self.create_default_value(field_type))
+            if default_value.value() is None:
+                return False
+            default_struct[field_name] = default_value
+
+        return True
+
+    # DOCUMENT need to be able to print "nil" now, undefined for a struct
+    @staticmethod
+    def get_printable(val):
+        printable = get_printable(val)
+        if printable is None and (val.type() == Type.NIL or val.value() is None):
+            return "nil"
+        return printable
+
+    def valid_var_type(self, var_type):
+        return var_type in self.valid_var_types
+
+    def is_struct_type(self, var_type):
+        return var_type in self.struct_defs
+
+    def __setup_valid_var_types(self):
+        self.valid_var_types = {Type.BOOL, Type.INT, Type.STRING}
+
+
+# The EnvironmentManager class keeps a mapping between each variable name (aka symbol)
+# in a brewin program and what it holds: a Value, a Variable (static typing) or a
+# LazyObject (lazy evaluation).
+class EnvironmentManager:
+    def __init__(self):
+        self.environment = []
+
+    # DOCUMENT: Deep copy outer structure but keep references for inner scopes
+    def custom_copy(self):
+        copied_env = EnvironmentManager()
+        copied_env.environment = [
+            [{key: value for key, value in scope.items()} for scope in stack] for stack in self.environment
+        ]
+        return copied_env
+
+    def get(self, symbol):
+        cur_func_env = self.environment[-1]
+        for env in reversed(cur_func_env):
+            if symbol in env:
+                return env[symbol]
+        return None
+
+    def set(self, symbol, value):
+        cur_func_env = self.environment[-1]
+        for env in reversed(cur_func_env):
+            if symbol in env:
+                env[symbol] = value
+                return True
+        return False
+
+    # create a new symbol in the top-most environment, regardless of whether that symbol exists
+    # in a lower environment
+    def create(self, symbol, value):
+        cur_func_env = self.environment[-1]
+        if symbol in cur_func_env[-1]:  # symbol already defined in current scope
+            return False
+        cur_func_env[-1][symbol] = value
+        return True
+
+    # used when we enter a new function - start with empty dictionary to hold parameters.
+    def push_func(self):
+        self.environment.append([{}])  # [[...]] -> [[...], [{}]]
+
+    def push_block(self):
+        cur_func_env = self.environment[-1]
+        cur_func_env.append({})  # [[...],[{....}] -> [[...],[{...}, {}]]
+
+    def pop_block(self):
+        cur_func_env = self.environment[-1]
+        cur_func_env.pop()
+
+    # used when we exit a nested block to discard the environment for that block
+    def pop_func(self):
+        self.environment.pop()
+
+
+# An expression to evaluate once its value is needed (lazy evaluation), in the
+# variables it had when it was written
+class LazyObject:
+    def __init__(self, expr_ast, captured_env, eval_func):
+        self.expr_ast = expr_ast
+        self.captured_env = captured_env
+        self.eval_func = eval_func
+        self._evaluated = False
+        self._value = None
+
+    def evaluate(self):
+        if not self._evaluated:
+            self._value = self.eval_func(self.expr_ast, self.captured_env)
+            if isinstance(self._value, tuple) and self._value[0] == ExecStatus.RAISE:
+                return self._value
+            self._evaluated = True
+        return self._value
+
+    def value(self):
+        return self.evaluate().value()
+
+    def type(self):
+        return self.evaluate().type()
+
+
+ALL_OPERATORS = frozenset({"+", "-", "*", "/", "==", "!=", ">", ">=", "<", "<=", "||", "&&"})
+
+
+class Semantics:
+    # functions=False is v1's language: a main of variable definitions, assignments
+    # and calls to print and inputi, on ints and strings. update_after_loop runs a
+    # for loop's update once more after its condition turns false, as v2 does.
+    def __init__(
+        self,
+        static_typing=False,
+        lazy=False,
+        exceptions=False,
+        structs=False,
+        operators=ALL_OPERATORS,
+        functions=True,
+        update_after_loop=False,
+    ):
+        if structs and not static_typing:
+            raise ValueError("Structs need static typing")
+        self.static_typing = static_typing
+        self.lazy = lazy
+        self.exceptions = exceptions
+        self.structs = structs
+        self.operators = frozenset(operators)
+        self.functions = functions
+        self.update_after_loop = update_after_loop
+
+
+_CONTINUE = (ExecStatus.CONTINUE, None)
+
+
+class CoreInterpreter(InterpreterBase):
+    # constants
+    NIL_VALUE = create_value(InterpreterBase.NIL_DEF)
+    TRUE_VALUE = create_value(InterpreterBase.TRUE_DEF)
+    VOID_VALUE = TypeManager.create_value(InterpreterBase.VOID_DEF)
+
+    # methods
+    def __init__(
+        self,
+        semantics,
+        console_output=True,
+        inp=None,
+        trace_output=False,
+        quicken=True,
+        fold=True,
+        eliminate=True,
+        inline=False,
+    ):
+        super().__init__(console_output, inp)
+        self.semantics = semantics
+        self.trace_output = trace_output
+        self.BIN_OPS = set(semantics.operators)
+        self.__static_typing = semantics.static_typing
+        self.__exceptions = semantics.exceptions
+        self.__update_after_loop = semantics.update_after_loop
+        # a facade's tiered engine (see tiering.py) sets this; compiled bodies are
+        # called with the arguments as the tree walker holds them, and give the
+        # tree walker's return value
+        self.tiering = None
+        self.__setup_ops()
+        # type feedback for the operators (see quickening.py); && and || aren't
+        # quickened under lazy evaluation, as they evaluate their right operand only
+        # if they need it
+        self.quickening = None
+        if quicken and not semantics.static_typing:
+            self.quickening = Quickening(Value, Type, self.op_to_lambda)
+        self.__setup_dispatch()
+        # constant folding and propagation (see fold.py), made as a program's loaded;
+        # not with trace output, which shows the statements as they're written
+        self.folding = None
+        if fold and not trace_output:
+            self.folding = ConstantFolder(
+                self.__evaluate_constant, fields=semantics.structs, typed=semantics.static_typing, lazy=semantics.lazy
+            )
+        # and dead-code elimination after it (see eliminate.py)
+        self.elimination = None
+        if eliminate and not trace_output:
+            self.elimination = DeadCodeEliminator(
+                fields=semantics.structs,
+                typed=semantics.static_typing,
+                lazy=semantics.lazy,
+                exceptions=semantics.exceptions,
+                functions=semantics.functions,
+            )
+        # and inlining after that (see inline.py), which a version has to ask for
+        self.inlining = None
+        if inline and not trace_output:
+            self.inlining = Inliner(
+                fields=semantics.structs,
+                typed=semantics.static_typing,
+                operators={value_type: tuple(ops) for value_type, ops in self.op_to_lambda.items()},
+            )
+        self.env = EnvironmentManager()
+        self.func_name_to_ast = {}
+        self.type_manager = TypeManager() if semantics.static_typing else None
+        self.resolution = None
+        self.__call_stack = []
+        self.__frame = None  # the running function's variables
+        self.__frames = []  # its callers'
+        # under lazy evaluation, the variables defined where the running function
+        # is (see __dynamic_view)
+        self.__scope = {}
+
+    def run(self, program):
+        self.load(program)
+        self.walk()
+
+    # parse a program and set up its struct and function tables, ready to run it
+    def load(self, program):
+        ast = parse_program(program)
+        self.env = EnvironmentManager()
+        self.__call_stack = []
+        if self.__static_typing:
+            self.type_manager = TypeManager()
+            if self.semantics.structs:
+                self.__set_up_struct_table(ast)
+        functions = ast.functions
+        if self.folding is not None:
+            functions = self.folding.fold(functions, program)
+        if self.elimination is not None:
+            functions = self.elimination.eliminate(functions)
+        if self.inlining is not None:
+            functions = self.inlining.inline(functions, ast.structs)
+        self.__set_up_function_table(functions)
+        functions = [func_ast for funcs in self.func_name_to_ast.values() for func_ast in funcs.values()]
+        self.resolution = Resolver(fields=self.semantics.structs).resolve(functions)
+        self.__slots = self.resolution.slots
+        self.__frame = None
+        self.__frames = []
+        self.__scope = {}
+        if self.quickening is not None:
+            self.quickening.reset(functions)
+
+    # run the loaded program's main on the tree walker
+    def walk(self):
+        if not self.semantics.functions:
+            if "main" not in self.func_name_to_ast:
+                super().error(ErrorType.NAME_ERROR, "Function main not found")
+            main_func = self.__last_defined["main"]
+            self.__frame = [None] * self.resolution.frame_sizes[main_func]
+            self.__run_block(main_func.statements)
+            return
+        result = self.__call_user_func("main", [], [])
+        if isinstance(result, tuple) and result[0] == ExecStatus.RAISE:
+            self.error(ErrorType.FAULT_ERROR, f"Unhandled exception: {result[1].value()}")
+
+    def __setup_dispatch(self):
+        semantics = self.semantics
+        static, lazy = semantics.static_typing, semantics.lazy
+        self.__statements = {
+            InterpreterBase.FCALL_NODE: self.__fcall_statement,
+            "=": self.__assign_static if static else self.__assign_lazy if lazy else self.__assign,
+            InterpreterBase.VAR_DEF_NODE: self.__var_def_static if static else self.__var_def,
+        }
+        self.__expressions = {
+            InterpreterBase.INT_NODE: lambda expr_ast, env: Value(Type.INT, expr_ast.val),
+            InterpreterBase.STRING_NODE: lambda expr_ast, env: Value(Type.STRING, expr_ast.val),
+            InterpreterBase.VAR_NODE: self.__eval_var_static if static else self.__eval_var_lazy if lazy else self.__eval_var,
+            InterpreterBase.FCALL_NODE: self.__call_func,
+            InterpreterBase.CHAIN_NODE: self.__eval_op_lazy if lazy else self.__eval_chain,
+        }
+        eval_op = self.__eval_op_lazy if lazy else self.__eval_op
+        for oper in semantics.operators:
+            self.__expressions[oper] = eval_op
+        self.__builtins = {"print": self.__call_print, "inputi": self.__call_input}
+        self.__default_value = Value(Type.INT, 0)  # of a new variable
+        self.__print_result = None
+        if semantics.functions:
+            self.__statements[InterpreterBase.RETURN_NODE] = (
+                self.__do_return_static if static else self.__do_return_lazy if lazy else self.__do_return
+            )
+            self.__statements[InterpreterBase.IF_NODE] = self.__do_if
+            self.__statements[InterpreterBase.FOR_NODE] = self.__do_for
+            self.__expressions[InterpreterBase.NIL_NODE] = lambda expr_ast, env: CoreInterpreter.NIL_VALUE
+            self.__expressions[InterpreterBase.BOOL_NODE] = lambda expr_ast, env: Value(Type.BOOL, expr_ast.val)
+            self.__expressions[InterpreterBase.NEG_NODE] = self.__eval_neg
+            self.__expressions[InterpreterBase.NOT_NODE] = self.__eval_not_static if static else self.__eval_not
+            self.__builtins["inputs"] = self.__call_input
+            self.__default_value = CoreInterpreter.NIL_VALUE
+            self.__print_result = CoreInterpreter.VOID_VALUE if static else CoreInterpreter.NIL_VALUE
+        if semantics.structs:
+            self.__expressions[InterpreterBase.NEW_NODE] = self.__new_struct
+        if semantics.exceptions:
+            self.__statements[InterpreterBase.TRY_NODE] = self.__do_try
+            self.__statements[InterpreterBase.RAISE_NODE] = self.__do_raise
+        self.__run_block = self.__run_statements_tracking_scope if lazy else self.__run_statements
+        self.__apply = self.__apply_op_static if static else self.__apply_op
+        self.__bind = self.__bind_args_static if static else self.__bind_args_lazy if lazy else self.__bind_args
+        self.__condition_types = (Type.BOOL, Type.INT) if static else (Type.BOOL,)
+        self.__printable = TypeManager.get_printable if static else get_printable
+
+    def __set_up_struct_table(self, ast):
+        struct_asts = ast.structs
+        if struct_asts is None:
+            return
+        for struct_ast in struct_asts:
+            struct_type_name = struct_ast.name
+            if not self.type_manager.define_struct(struct_ast):
+                super().error(
+                    ErrorType.TYPE_ERROR,
+                    f"Invalid type when defining struct {struct_type_name}"
+                )
+
+    def __set_up_function_table(self, functions):
+        self.func_name_to_ast = {}
+        self.__last_defined = {}  # name -> its last definition, whatever its params
+        for func_def in functions:
+            func_name = func_def.name
+            self.__last_defined[func_name] = func_def
+            num_params = len(func_def.args)
+            if func_name not in self.func_name_to_ast:
+                self.func_name_to_ast[func_name] = {}
+            self.func_name_to_ast[func_name][num_params] = func_def
+            if self.__static_typing:
+                self.__validate_formal_parameter_types_and_return(func_name, func_def.args, func_def.return_type)
+
+    # DOCUMENT
+    def __validate_formal_parameter_types_and_return(self, func_name, formal_args, return_type):
+        for formal_ast in formal_args:
+            arg_name = formal_ast.name
+            arg_type = formal_ast.var_type
+            if not self.type_manager.valid_var_type(arg_type):
+                super().error(
+                    ErrorType.TYPE_ERROR,
+                    f"Invalid type for formal parameter {arg_name} in function {func_name}"
+                )
+        if not self.type_manager.valid_var_type(return_type) and return_type != Type.VOID:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Invalid return type {return_type} in function {func_name}"
+            )
+
+    def __get_func_by_name(self, name, num_params):
+        if name not in self.func_name_to_ast:
+            super().error(ErrorType.NAME_ERROR, f"Function {name} not found")
+        candidate_funcs = self.func_name_to_ast[name]
+        if num_params not in candidate_funcs:
+            super().error(
+                ErrorType.NAME_ERROR,
+                f"Function {name} taking {num_params} params not found",
+            )
+        return candidate_funcs[num_params]
+
+    # A block needs nothing done on the way in or out, as its variables have slots of
+    # their own in the frame (see resolve.py). Each statement's handler is looked up
+    # here rather than in __run_statement, a frame less for each level of recursion
+    # of a Brewin program; statements the version doesn't have do nothing
+    def __run_statements(self, statements):
+        handlers = self.__statements
+        for statement in statements:
+            if self.trace_output:
+                print(statement)
+            handler = handlers.get(statement.elem_type)
+            if handler is None:
+                continue
+            try:
+                status, return_val = handler(statement)
+            except BrewinError as error:
+                self.locate_error(error, statement)
+                raise
+            if status != ExecStatus.CONTINUE:
+                return (status, return_val)
+
+        return (ExecStatus.CONTINUE, CoreInterpreter.NIL_VALUE)
+
+    # the same, keeping track of the variables defined where each statement runs
+    def __run_statements_tracking_scope(self, statements):
+        outer_scope = self.__scope
+        scopes = self.resolution.scopes
+        handlers = self.__statements
+        for statement in statements:
+            if self.trace_output:
+                print(statement)
+            self.__scope = scopes[statement]
+            handler = handlers.get(statement.elem_type)
+            if handler is None:
+                continue
+            try:
+                status, return_val = handler(statement)
+            except BrewinError as error:
+                self.locate_error(error, statement)
+                raise
+            if status != ExecStatus.CONTINUE:
+                self.__scope = outer_scope
+                return (status, return_val)
+
+        self.__scope = outer_scope
+        return (ExecStatus.CONTINUE, CoreInterpreter.NIL_VALUE)
+
+    # (status, return value or exception) of a statement; statements the version
+    # doesn't have do nothing
+    def __run_statement(self, statement):
+        handler = self.__statements.get(statement.elem_type)
+        if handler is None:
+            return _CONTINUE
+        return handler(statement)
+
+    # calls the function itself rather than through __call_func, a frame less for
+    # each level of recursion of a Brewin program
+    def __fcall_statement(self, call_ast):
+        builtin = self.__builtins.get(call_ast.name)
+        if builtin is not None:
+            result = builtin(call_ast, self.__frame)
+        else:
+            result = self.__call_user_func(call_ast.name, call_ast.args, self.__frame)
+        if self.__exceptions and isinstance(result, tuple) and result[0] == ExecStatus.RAISE:
+            return result
+        return _CONTINUE
+
+    def __call_func(self, call_node, env):
+        builtin = self.__builtins.get(call_node.name)
+        if builtin is not None:
+            return builtin(call_node, env)
+        return self.__call_user_func(call_node.name, call_node.args, env)
+
+    def __call_user_func(self, func_name, actual_args, env):
+        if not self.semantics.functions:
+            super().error(ErrorType.NAME_ERROR, f"Function {func_name} not found")
+
+        func_ast = self.__get_func_by_name(func_name, len(actual_args))
+        if self.__static_typing:
+            self.__call_stack.append(func_ast)
+        formal_args = func_ast.args
+        if len(actual_args) != len(formal_args):
+            super().error(
+                ErrorType.NAME_ERROR,
+                f"Function {func_ast.name} with {len(actual_args)} args not found",
+            )
+
+        # first evaluate all of the actual parameters, in order
+        args = self.__bind(formal_args, actual_args, env)
+
+        compiled_body = None if self.tiering is None else self.tiering.call(func_ast)
+        if compiled_body is not None:
+            status, return_val = ExecStatus.RETURN, compiled_body(args)
+        else:
+            # then create the new activation record, with the arguments in the slots
+            # of their parameters
+            frame = [None] * self.resolution.frame_sizes[func_ast]
+            for slot, value in zip(self.resolution.param_slots[func_ast], args):
+                frame[slot] = value
+            self.__frames.append(self.__frame)
+            self.__frame = frame
+            status, return_val = self.__run_block(func_ast.statements)
+            self.__frame = self.__frames.pop()
+        if self.__static_typing:
+            self.__call_stack.pop()
+            if status != ExecStatus.RETURN:
+                # DOCUMENT no return statement returns default value
+                return self.type_manager.create_default_value(func_ast.return_type)
+        elif status == ExecStatus.RAISE:
+            return (status, return_val)
+        return return_val
+
+    def __bind_args(self, formal_args, actual_args, env):
+        return [copy.copy(self.__eval_expr(actual_ast, env)) for actual_ast in actual_args]
+
+    def __bind_args_static(self, formal_args, actual_args, env):
+        args = []
+        for formal_ast, actual_ast in zip(formal_args, actual_args):
+            result = copy.copy(self.__eval_expr(actual_ast, env))
+            arg_name = formal_ast.name
+            arg_type = formal_ast.var_type
+            if not self.__compatible_types_for_assignment(Variable(arg_type), result):
+                super().error(
+                    ErrorType.TYPE_ERROR,
+                    f"Type mismatch on formal parameter {arg_name}"
+                )
+            args.append(Variable(arg_type, self.__coerce(arg_type, result)))
+        return args
+
+    # lazy evaluate parameters
+    def __bind_args_lazy(self, formal_args, actual_args, env):
+        captured_env = self.__capture(env)
+        return [LazyObject(actual_ast, captured_env, self.__eval_expr) for actual_ast in actual_args]
+
+    # The variables to evaluate an expression in later, as they are now: a copy of
+    # the running function's, or env itself if it's already a copy, as those never
+    # change
+    def __capture(self, env):
+        return env[:] if env is self.__frame else env
+
+    def __coerce(self, target_type, value_obj):
+        if target_type == Type.BOOL and value_obj.type() == Type.INT:
+            return Value(Type.BOOL, bool(value_obj.value()))
+        # We "coerce" nil when assigning it to an variable with declared structure type
+        if self.type_manager.is_struct_type(target_type) and value_obj.type() == Type.NIL:
+            return self.type_manager.create_default_value(target_type)
+
+        return value_obj
+
+    # A builtin's arguments are evaluated in the running function's variables, even
+    # where the call is part of an expression evaluated lazily, in the variables of
+    # the function it's written in (env), which can be another one. The names in the
+    # arguments are looked up in the running function where it is, then, and put in
+    # the slots they have where they're written, in a copy of env.
+    def __dynamic_view(self, call_ast, env):
+        if env is self.__frame:
+            return env
+        view = env[:]
+        frame, scope = self.__frame, self.__scope
+        for slot, name in self.resolution.builtin_variables[call_ast]:
+            running_slot = scope.get(name)
+            view[slot] = None if running_slot is None else frame[running_slot]
+        return view
+
+    def __call_print(self, call_ast, env):
+        env = self.__dynamic_view(call_ast, env) if self.semantics.lazy else self.__frame
+        output = ""
+        for arg in call_ast.args:
+            result = self.__eval_expr(arg, env)  # result is a Value object
+            if self.__exceptions and isinstance(result, tuple) and result[0] == ExecStatus.RAISE:
+                return result
+            if self.__static_typing and result.type() == Type.VOID:
+                super().error(ErrorType.TYPE_ERROR, "Void not allowed as argument")
+            output = output + self.__printable(result)
+        super().output(output)
+        return self.__print_result
+
+    def __call_input(self, call_ast, env):
+        name, args = call_ast.name, call_ast.args
+        if args is not None and len(args) == 1:
+            env = self.__dynamic_view(call_ast, env) if self.semantics.lazy else self.__frame
+            result = self.__eval_expr(args[0], env)
+            if self.__static_typing and result.type() == Type.VOID:
+                super().error(ErrorType.TYPE_ERROR, "Void not allowed as argument")
+            super().output(self.__printable(result))
+        elif args is not None and len(args) > 1:
+            super().error(
+                ErrorType.NAME_ERROR, "No inputi() function that takes > 1 parameter"
+            )
+        inp = super().get_input()
+        if name == "inputi":
+            return Value(Type.INT, int(inp))
+        if name == "inputs":
+            return Value(Type.STRING, inp)
+
+    def __assign(self, assign_ast):
+        var_name = assign_ast.name
+        value_obj = self.__eval_expr(assign_ast.expression, self.__frame)
+        slot = self.__slots[assign_ast]
+        if slot == NO_SLOT:
+            super().error(
+                ErrorType.NAME_ERROR, f"Undefined variable {var_name} in assignment"
+            )
+        self.__frame[slot] = value_obj
+        return _CONTINUE
+
+    def __assign_lazy(self, assign_ast):
+        var_name = assign_ast.name
+        # Don't want to evaluate here (lazy eval)- create a lazy obj with captured env instead
+        value_obj = LazyObject(assign_ast.expression, self.__frame[:], self.__eval_expr)
+        slot = self.__slots[assign_ast]
+        if slot == NO_SLOT:
+            super().error(
+                ErrorType.NAME_ERROR, f"Undefined variable {var_name} in assignment"
+            )
+        self.__frame[slot] = value_obj
+        return _CONTINUE
+
+    def __assign_static(self, assign_ast):
+        lhs_var = self.__get_variable(assign_ast, self.__frame)
+        rhs_val = self.__eval_expr(assign_ast.expression, self.__frame)
+        if not self.__compatible_types_for_assignment(lhs_var, rhs_val):  # DOCUMENT
+            super().error(
+                ErrorType.TYPE_ERROR, f"Type mismatch {lhs_var.type()} vs {rhs_val.type()} in assignment"
+            )
+
+        # perform coercion
+        if lhs_var.type() == Type.BOOL:
+            rhs_val = self.__coerce(Type.BOOL, rhs_val)
+        elif self.type_manager.is_struct_type(lhs_var.type()) and rhs_val.type() == Type.NIL:
+            rhs_val = self.__coerce(lhs_var.type(), rhs_val)
+
+        lhs_var.set_value(rhs_val)
+        return _CONTINUE
+
+    # The Variable a var or = node names, in env. Its name is the whole (possibly
+    # dotted) name, and its path the name's fieldpath node, or None if it has no dots
+    def __get_variable(self, node, env):
+        var_name, path = node.name, node.path
+        slot = self.__slots[node]
+        base_var = None if slot == NO_SLOT else env[slot]
+        if path is None:
+            if base_var is None:
+                super().error(
+                    ErrorType.NAME_ERROR, f"Undefined variable {var_name}"
+                )
+            return base_var
+        if not self.semantics.structs:
+            super().error(ErrorType.NAME_ERROR, f"Undefined variable {var_name}")
+        base_name = path.base
+        if base_var is None:
+            super().error(
+                ErrorType.NAME_ERROR, f"Undefined variable {base_name}"
+            )
+        for field_name in path.fields:
+            val_type = base_var.value().type()
+            var_val = base_var.value().value()
+            if val_type == Type.NIL or (self.type_manager.is_struct_type(val_type) and var_val is None):
+                super().error(
+                    ErrorType.FAULT_ERROR, f"Error dereferencing nil value {base_name} in {var_name}"
+                )
+            if not self.type_manager.is_struct_type(val_type):
+                super().error(
+                    ErrorType.TYPE_ERROR, f"Dot used with non-struct {base_var} in {var_name}"
+                )
+            base_var = var_val.get(field_name, None)  # var_val is a dictionary which implements the struct "field" -> Variable object
+            if base_var is None:
+                super().error(
+                    ErrorType.NAME_ERROR, f"Unknown member {field_name} in {var_name}"
+                )
+            base_name = field_name
+
+        return base_var
+
+    def __var_def(self, var_ast):
+        var_name = var_ast.name
+        slot = self.__slots[var_ast]
+        if slot == NO_SLOT:
+            super().error(
+                ErrorType.NAME_ERROR, f"Duplicate definition for variable {var_name}"
+            )
+        self.__frame[slot] = self.__default_value
+        return _CONTINUE
+
+    def __var_def_static(self, var_ast):
+        var_name = var_ast.name
+        var_type = var_ast.var_type  # DOCUMENT change in AST and in syntax
+        default_value = self.type_manager.create_default_value(var_type)  # DOCUMENT: default value for defined variables
+        variable = Variable(var_type, default_value)
+        if default_value is None or not self.type_manager.valid_var_type(var_type):
+            super().error(
+                ErrorType.TYPE_ERROR, f"Unknown/invalid type specified {var_type}"
+            )
+        slot = self.__slots[var_ast]
+        if slot == NO_SLOT:
+            super().error(
+                ErrorType.NAME_ERROR, f"Duplicate definition for variable {var_name}"
+            )
+        self.__frame[slot] = variable
+        return _CONTINUE
+
+    # The value of an expression; env holds the variables it's evaluated with, which
+    # are the running function's frame but for a lazily evaluated expression (see
+    # LazyObject). Expressions the version doesn't have give None.
+    def __eval_expr(self, expr_ast, env):
+        handler = self.__expressions.get(expr_ast.elem_type)
+        if handler is None:
+            return None
+        return handler(expr_ast, env)
+
+    # the Value of expr_ast, an expression of literals, or None if evaluating it
+    # fails, for folding it (see fold.py); nothing's left of a failure, which is
+    # then the program's to have when it gets there
+    def __evaluate_constant(self, expr_ast):
+        error_type, error_line = self.error_type, self.error_line
+        try:
+            value = self.__eval_expr(expr_ast, [])
+        except Exception:
+            self.error_type, self.error_line = error_type, error_line
+            return None
+        return value if isinstance(value, Value) else None
+
+    def __eval_var(self, var_ast, env):
+        val = env[self.__slots[var_ast]]
+        if val is None:
+            super().error(ErrorType.NAME_ERROR, f"Variable {var_ast.name} not found")
+        return val
+
+    def __eval_var_lazy(self, var_ast, env):
+        val = env[self.__slots[var_ast]]
+        while isinstance(val, LazyObject):
+            val = val.evaluate()
+        if val is None:
+            super().error(ErrorType.NAME_ERROR, f"Variable {var_ast.name} not found")
+        return val
+
+    def __eval_var_static(self, var_ast, env):
+        variable = self.__get_variable(var_ast, env)  # error checks
+        return variable.value()
+
+    def __new_struct(self, new_ast, env):
+        var_type = new_ast.var_type
+        default_value = self.type_manager.new_struct_value(var_type)
+        if default_value is None:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Invalid type {var_type} for new operation",
+            )
+        return default_value
+
+    def __eval_op(self, arith_ast, env):
+        left_value_obj = self.__eval_expr(arith_ast.op1, env)
+        right_value_obj = self.__eval_expr(arith_ast.op2, env)
+        return self.__apply(arith_ast.elem_type, left_value_obj, right_value_obj, arith_ast)
+
+    # a binary node, or a chain, under lazy evaluation: an operand can be a lazy value,
+    # or a raise, which stops the chain, and && and || skip the operands after one
+    # that decides the result. Each operator is applied here, in the loop, rather
+    # than in a helper, as an operand that's a call is evaluated from this frame: a
+    # frame more here is a level less of recursion for a Brewin program
+    def __eval_op_lazy(self, op_ast, env):
+        if op_ast.elem_type == InterpreterBase.CHAIN_NODE:
+            oper, operands = op_ast.op, op_ast.operands
+        else:
+            oper, operands = op_ast.elem_type, (op_ast.op1, op_ast.op2)
+        quickening = self.quickening
+        value_obj = None
+        try:
+            for operand in operands:
+                if value_obj is None:
+                    value_obj = self.__eval_expr(operand, env)
+                    continue
+                if isinstance(value_obj, tuple) and value_obj[0] == ExecStatus.RAISE:
+                    return value_obj
+                if isinstance(value_obj, LazyObject):
+                    value_obj = value_obj.evaluate()
+                if oper in ("&&", "||"):
+                    value_obj = self.__short_circuit(oper, value_obj, operand, env)
+                    continue
+                right_value_obj = self.__eval_expr(operand, env)
+                if isinstance(right_value_obj, tuple) and right_value_obj[0] == ExecStatus.RAISE:
+                    return right_value_obj
+                if isinstance(right_value_obj, LazyObject):
+                    right_value_obj = right_value_obj.evaluate()
+                # a lazy value can evaluate to another lazy value, which takes the generic path
+                if quickening is not None and value_obj.__class__ is Value and right_value_obj.__class__ is Value:
+                    site = quickening.sites.get(op_ast)
+                    if site is not None and value_obj.t is site.left_type and right_value_obj.t is site.right_type:
+                        site.hits += 1
+                        value_obj = site.fast(value_obj, right_value_obj)
+                        continue
+                value_obj = self.__apply_op_generic(oper, value_obj, right_value_obj, op_ast)
+        except ZeroDivisionError:
+            if not self.__exceptions:
+                raise
+            return ExecStatus.RAISE, Value(Type.STRING, "div0")  # v4 raises it as an exception
+        return value_obj
+
+    # a + b + c ... as one chain node (see parser/chains.py): fold the operands in
+    # from the left, in a loop rather than a recursive call per operator, each step
+    # the same as for a binary node
+    def __eval_chain(self, chain_ast, env):
+        oper = chain_ast.op
+        if oper not in self.BIN_OPS:
+            return None
+        operands = iter(chain_ast.operands)
+        value_obj = self.__eval_expr(next(operands), env)
+        for operand in operands:
+            value_obj = self.__apply(oper, value_obj, self.__eval_expr(operand, env), chain_ast)
+        return value_obj
+
+    # left_value_obj oper right_value_obj, for the operator node op_ast
+    def __apply_op(self, oper, left_value_obj, right_value_obj, op_ast):
+        quickening = self.quickening
+        if quickening is not None:
+            site = quickening.sites.get(op_ast)
+            if site is not None and left_value_obj.t is site.left_type and right_value_obj.t is site.right_type:
+                site.hits += 1
+                return site.fast(left_value_obj, right_value_obj)
+        return self.__apply_op_generic(oper, left_value_obj, right_value_obj, op_ast)
+
+    def __apply_op_generic(self, oper, left_value_obj, right_value_obj, op_ast):
+        quickening = self.quickening
+        if not self.__compatible_types(oper, left_value_obj, right_value_obj):
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Incompatible types for {oper} operation",
+            )
+        if oper not in self.op_to_lambda.get(left_value_obj.type(), ()):
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Incompatible operator {oper} for type {left_value_obj.type()}",
+            )
+        f = self.op_to_lambda[left_value_obj.type()][oper]
+        result = f(left_value_obj, right_value_obj)
+        if quickening is not None:
+            quickening.observe(op_ast, oper, left_value_obj, right_value_obj)
+        return result
+
+    def __short_circuit(self, op, left_value_obj, right_expr_ast, env):
+        if isinstance(left_value_obj, tuple) and left_value_obj[0] == ExecStatus.RAISE:
+            return left_value_obj
+        if left_value_obj.type() != Type.BOOL:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                "Incompatible type",
+            )
+        if op == "&&":
+            if not left_value_obj.value():  # If False, no need to evaluate the right operand
+                return Value(Type.BOOL, False)
+        elif op == "||":
+            if left_value_obj.value():  # If True, no need to evaluate the right operand
+                return Value(Type.BOOL, True)
+
+        right_value_obj = self.__eval_expr(right_expr_ast, env)
+        if isinstance(right_value_obj, tuple) and right_value_obj[0] == ExecStatus.RAISE:
+            return right_value_obj
+
+        f = self.op_to_lambda[left_value_obj.type()][op]
+        return f(left_value_obj, right_value_obj)
+
+    def __compatible_types(self, oper, obj1, obj2):
+        # DOCUMENT: allow comparisons ==/!= of anything against anything
+        if oper in ["==", "!="]:
+            return True
+        return obj1.type() == obj2.type()
+
+    # v3's operators coerce, and aren't quickened, so op_ast goes unused
+    def __apply_op_static(self, oper, left_value_obj, right_value_obj, op_ast):
+        ltype = left_value_obj.type()
+        rtype = right_value_obj.type()
+        if ltype == rtype and ltype in self.op_to_lambda:
+            f = self.op_to_lambda[ltype].get(oper)
+            if f is not None:
+                return f(left_value_obj, right_value_obj)
+
+        if oper in ["==", "!="]:
+            return self.__eval_compare(oper, left_value_obj, right_value_obj)
+
+        if oper in ["||", "&&"]:
+            return self.__eval_and_or(oper, left_value_obj, right_value_obj)
+
+        super().error(
+            ErrorType.TYPE_ERROR,
+            f"Incompatible operator {oper} for types {left_value_obj.type()} and {right_value_obj.type()}",
+        )
+
+    def __eval_and_or(self, oper, obj1, obj2):
+        # DOCUMENT:  coercion comparison rules
+        type1 = obj1.type()
+        type2 = obj2.type()
+        if Type.VOID in (type1, type2):
+            super().error(
+                ErrorType.TYPE_ERROR,
+                "Can't compare void type"
+            )
+        allowed_types = (Type.BOOL, Type.INT)
+        if type1 not in allowed_types or type2 not in allowed_types:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Invalid types used with operator {oper}"
+            )
+
+        obj1 = self.__coerce(Type.BOOL, obj1)
+        obj2 = self.__coerce(Type.BOOL, obj2)
+
+        if oper == "||":
+            return Value(Type.BOOL, obj1.value() or obj2.value())
+
+        return Value(Type.BOOL, obj1.value() and obj2.value())
+
+    def __eval_compare(self, oper, obj1, obj2):
+        type1 = obj1.type()
+        type2 = obj2.type()
+
+        # No comparison allowed against void, period
+        if Type.VOID in (type1, type2):
+            super().error(
+                ErrorType.TYPE_ERROR,
+                "Can't compare void type"
+            )
+
+        # Create a comparison function based on operation == or !=
+        cmp = (lambda x, y: x == y) if oper == "==" else (lambda x, y: x != y)
+
+        # If the two types match, then just compare their values and get a result
+        if type1 == type2:
+            return Value(Type.BOOL, cmp(obj1.value(), obj2.value()))  # DOCUMENT that we compare object references for structs
+
+        # Handle the case where we're comparing a valid struct to nil
+        if Type.NIL in (type1, type2):
+            # two literal nils already handled by the case above
+            if self.type_manager.is_struct_type(type1):
+                return Value(Type.BOOL, cmp(obj1.value(), None))
+            elif self.type_manager.is_struct_type(type2):
+                return Value(Type.BOOL, cmp(obj2.value(), None))
+
+            # trying to compare some type other than a struct to nil; error
+            super().error(
+                ErrorType.TYPE_ERROR,
+                "Can't compare type to nil"
+            )
+
+        # Handle the case where we're comparing int to bool, or bool to int (already handled bool to bool up above)
+        # For this case we need to do our coercion to bool before comparing
+        if Type.BOOL in (type1, type2):
+            if Type.INT in (type1, type2):
+                obj1 = self.__coerce(Type.BOOL, obj1)
+                obj2 = self.__coerce(Type.BOOL, obj2)
+                return Value(Type.BOOL, cmp(obj1.value(), obj2.value()))
+
+        super().error(
+            ErrorType.TYPE_ERROR,
+            f"Can't compare unrelated types {type1} and {type2}"
+        )
+
+    def __compatible_types_for_assignment(self, lhs_variable, rhs_value):
+        lhs_type = lhs_variable.type()
+        rhs_type = rhs_value.type()
+        if lhs_type == rhs_type:
+            return True
+
+        if lhs_type == Type.BOOL and rhs_type == Type.INT:
+            return True
+
+        return self.type_manager.is_struct_type(lhs_type) and rhs_value.type() == Type.NIL
+
+    def __eval_neg(self, arith_ast, env):
+        value_obj = self.__eval_expr(arith_ast.op1, env)
+        if value_obj.type() != Type.INT:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Incompatible type for {arith_ast.elem_type} operation",
+            )
+        return Value(Type.INT, -value_obj.value())
+
+    def __eval_not(self, arith_ast, env):
+        value_obj = self.__eval_expr(arith_ast.op1, env)
+        if value_obj.type() != Type.BOOL:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Incompatible type for {arith_ast.elem_type} operation",
+            )
+        return Value(Type.BOOL, not value_obj.value())
+
+    def __eval_not_static(self, arith_ast, env):
+        value_obj = self.__eval_expr(arith_ast.op1, env)
+        val_type = value_obj.type()
+
+        if val_type != Type.BOOL and val_type != Type.INT:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Incompatible type for {arith_ast.elem_type} operation",
+            )
+
+        return Value(Type.BOOL, not self.__coerce(Type.BOOL, value_obj).value())
+
+    def __setup_ops(self):
+        self.op_to_lambda = {}
+        # set up operations on integers
+        self.op_to_lambda[Type.INT] = {}
+        self.op_to_lambda[Type.INT]["+"] = lambda x, y: Value(
+            x.type(), x.value() + y.value()
+        )
+        self.op_to_lambda[Type.INT]["-"] = lambda x, y: Value(
+            x.type(), x.value() - y.value()
+        )
+        self.op_to_lambda[Type.INT]["*"] = lambda x, y: Value(
+            x.type(), x.value() * y.value()
+        )
+        self.op_to_lambda[Type.INT]["/"] = lambda x, y: Value(
+            x.type(), x.value() // y.value()
+        )
+        self.op_to_lambda[Type.INT]["=="] = lambda x, y: Value(
+            Type.BOOL, x.type() == y.type() and x.value() == y.value()
+        )
+        self.op_to_lambda[Type.INT]["!="] = lambda x, y: Value(
+            Type.BOOL, x.type() != y.type() or x.value() != y.value()
+        )
+        self.op_to_lambda[Type.INT]["<"] = lambda x, y: Value(
+            Type.BOOL, x.value() < y.value()
+        )
+        self.op_to_lambda[Type.INT]["<="] = lambda x, y: Value(
+            Type.BOOL, x.value() <= y.value()
+        )
+        self.op_to_lambda[Type.INT][">"] = lambda x, y: Value(
+            Type.BOOL, x.value() > y.value()
+        )
+        self.op_to_lambda[Type.INT][">="] = lambda x, y: Value(
+            Type.BOOL, x.value() >= y.value()
+        )
+        #  set up operations on strings
+        self.op_to_lambda[Type.STRING] = {}
+        self.op_to_lambda[Type.STRING]["+"] = lambda x, y: Value(
+            x.type(), x.value() + y.value()
+        )
+        if self.__static_typing:
+            # the rest of v3's operators coerce (see __apply_op_static)
+            self.op_to_lambda[Type.VOID] = {}
+            return
+        self.op_to_lambda[Type.STRING]["=="] = lambda x, y: Value(
+            Type.BOOL, x.value() == y.value()
+        )
+        self.op_to_lambda[Type.STRING]["!="] = lambda x, y: Value(
+            Type.BOOL, x.value() != y.value()
+        )
+        #  set up operations on bools
+        self.op_to_lambda[Type.BOOL] = {}
+        self.op_to_lambda[Type.BOOL]["&&"] = lambda x, y: Value(
+            x.type(), x.value() and y.value()
+        )
+        self.op_to_lambda[Type.BOOL]["||"] = lambda x, y: Value(
+            x.type(), x.value() or y.value()
+        )
+        self.op_to_lambda[Type.BOOL]["=="] = lambda x, y: Value(
+            Type.BOOL, x.type() == y.type() and x.value() == y.value()
+        )
+        self.op_to_lambda[Type.BOOL]["!="] = lambda x, y: Value(
+            Type.BOOL, x.type() != y.type() or x.value() != y.value()
+        )
+
+        #  set up operations on nil
+        self.op_to_lambda[Type.NIL] = {}
+        self.op_to_lambda[Type.NIL]["=="] = lambda x, y: Value(
+            Type.BOOL, x.type() == y.type() and x.value() == y.value()
+        )
+        self.op_to_lambda[Type.NIL]["!="] = lambda x, y: Value(
+            Type.BOOL, x.type() != y.type() or x.value() != y.value()
+        )
+        if not self.semantics.functions:
+            # v1 has only + and - on ints
+            self.op_to_lambda = {Type.INT: {oper: self.op_to_lambda[Type.INT][oper] for oper in ("+", "-")}}
+
+    def __do_if(self, if_ast):
+        cond_ast = if_ast.condition
+        result = self.__eval_expr(cond_ast, self.__frame)
+        if self.__exceptions and isinstance(result, tuple) and result[0] == ExecStatus.RAISE:
+            return result
+        if result.type() not in self.__condition_types:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                "Incompatible type for if condition",
+            )
+        if result.value():
+            statements = if_ast.statements
+            status, return_val = self.__run_block(statements)
+            return (status, return_val)
+        else:
+            else_statements = if_ast.else_statements
+            if else_statements is not None:
+                status, return_val = self.__run_block(else_statements)
+                return (status, return_val)
+
+        return (ExecStatus.CONTINUE, CoreInterpreter.NIL_VALUE)
+
+    def __do_for(self, for_ast):
+        init_ast = for_ast.init
+        cond_ast = for_ast.condition
+        update_ast = for_ast.update
+
+        self.__run_statement(init_ast)  # initialize counter variable
+        while True:
+            run_for = self.__eval_expr(cond_ast, self.__frame)  # check for-loop condition
+            if self.__exceptions and isinstance(run_for, tuple) and run_for[0] == ExecStatus.RAISE:
+                return run_for
+            if run_for.type() not in self.__condition_types:
+                super().error(
+                    ErrorType.TYPE_ERROR,
+                    "Incompatible type for for condition",
+                )
+            if run_for.value():
+                statements = for_ast.statements
+                status, return_val = self.__run_block(statements)
+                if status != ExecStatus.CONTINUE:
+                    return status, return_val
+            elif not self.__update_after_loop:
+                break
+            self.__run_statement(update_ast)  # update counter variable
+            if not run_for.value():
+                break
+            if self.tiering is not None:
+                loop = self.tiering.back_edge(for_ast)
+                if loop is not None:
+                    # carry on with the loop compiled, on the variables defined where
+                    # it is, by name; it gives None when the loop ends, or the
+                    # function's return value, in a tuple
+                    frame, scope = self.__frame, self.resolution.scopes[for_ast]
+                    variables = {name: frame[slot] for name, slot in scope.items()}
+                    returned = loop(variables)
+                    for name, slot in scope.items():
+                        frame[slot] = variables[name]
+                    if returned is None:
+                        break
+                    return (ExecStatus.RETURN, returned[0])
+
+        return (ExecStatus.CONTINUE, CoreInterpreter.NIL_VALUE)
+
+    def __do_return(self, return_ast):
+        expr_ast = return_ast.expression
+        if expr_ast is None:
+            return (ExecStatus.RETURN, CoreInterpreter.NIL_VALUE)
+        value_obj = copy.copy(self.__eval_expr(expr_ast, self.__frame))
+        return (ExecStatus.RETURN, value_obj)
+
+    def __do_return_lazy(self, return_ast):
+        expr_ast = return_ast.expression
+        if expr_ast is None:
+            return (ExecStatus.RETURN, CoreInterpreter.NIL_VALUE)
+        # lazy evaluate the return expression
+        return_val = LazyObject(expr_ast, self.__frame[:], self.__eval_expr)
+        return (ExecStatus.RETURN, return_val)
+
+    def __do_return_static(self, return_ast):
+        expr_ast = return_ast.expression
+        func_ret_type = self.__call_stack[-1].return_type
+        if expr_ast is None:
+            return (ExecStatus.RETURN, self.type_manager.create_default_value(func_ret_type))  # DOCUMENT return; as returning default value
+        value_obj = copy.copy(self.__eval_expr(expr_ast, self.__frame))  # DOCUMENT
+        if value_obj.type() == Type.VOID:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                "Cannot use void in return value"
+            )
+        if not self.__compatible_types_for_assignment(Variable(func_ret_type), value_obj):
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Returned value's type {value_obj.type()} is inconsistent with function's return type {func_ret_type}"
+            )
+        return (ExecStatus.RETURN, self.__coerce(func_ret_type, value_obj))  # DOCUMENT all coercions!
+
+    def __do_try(self, try_ast):
+        try_statements = try_ast.statements
+        status, return_val = self.__run_block(try_statements)
+        if status != ExecStatus.RAISE:
+            return (status, return_val)
+        exception_value = return_val
+        catchers = try_ast.catchers
+        for catcher in catchers:
+            if exception_value.value() == catcher.exception_type:
+                catch_statements = catcher.statements
+                return self.__run_block(catch_statements)
+
+        # no catchers matched, propagate the exception
+        return (status, exception_value)
+
+    def __do_raise(self, raise_ast):
+        expr_ast = raise_ast.exception_type
+        value_obj = self.__eval_expr(expr_ast, self.__frame)
+        if isinstance(value_obj, tuple) and value_obj[0] == ExecStatus.RAISE:
+            value_obj = value_obj[1]
+        if value_obj.type() != Type.STRING:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                "Incompatible type for raise exception type",
+            )
+        return (ExecStatus.RAISE, value_obj)
@@ -0,0 +1,258 @@
+# Dead-code elimination: a pass over a program's functions, made as it's loaded, after
+# constant folding (see CoreInterpreter.load), that removes
+#   - the statements of a block after one that always leaves it: a return, a raise
+#     (in a version with exceptions; v2 and v3 do nothing on one), or an if whose
+#     branches both do,
+#   - the branch an if with a literal true or false condition never takes; the one
+#     it does take replaces the if, if it defines no variables of its own (it's
+#     kept as an if (true) otherwise, as its block is a scope),
+#   - a local variable that's never read, with its definition and the assignments
+#     to it, when those can't fail or do anything: they assign a literal (of the
+#     variable's declared type, under static typing) or a variable that's defined
+#     where they are. Under lazy evaluation an assignment evaluates nothing, so any
+#     assignment goes with its variable, but a variable whose name is in the
+#     arguments of a builtin anywhere is kept, as those are read by name in the
+#     function the builtin runs in (see CoreInterpreter.__dynamic_view).
+# A variable that's defined twice in a block, assigned in a for's init or update, or
+# given a field (v3's a.b = c), is kept, as is anything else that could fail. v1 runs
+# neither ifs nor returns, so without functions only unused variables go.
+# Removing one thing can leave another dead (an assignment that was the only read
+# of a variable, say), so the pass goes round until there's nothing left to remove.
+#
+# AST nodes are frozen and shared (see parser/element.py), so the pass makes new
+# nodes for what it changes, and the nodes above them, and leaves the rest shared.
+from intbase import InterpreterBase
+from parser.element import Element
+from resolve import NO_SLOT, Resolver, declares_variables
+
+_LITERALS = (InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE, InterpreterBase.NIL_NODE)
+
+# the types a variable can be defined with that never fail (v3's structs can)
+_PRIMITIVE_TYPES = (InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE)
+
+# the fields of each kind of statement holding lists of statements (a try's catchers
+# are statements holding a block)
+_BLOCK_FIELDS = {
+    InterpreterBase.IF_NODE: ("statements", "else_statements"),
+    InterpreterBase.FOR_NODE: ("statements",),
+    InterpreterBase.TRY_NODE: ("statements", "catchers"),
+    InterpreterBase.CATCH_NODE: ("statements",),
+}
+
+
+class DeadCodeEliminator:
+    # fields: whether a dotted name (v3's a.b.c) is its base variable
+    # typed: whether variables have declared types
+    # lazy: whether assignments are evaluated lazily, and builtins read variables
+    # where they run
+    # exceptions: whether a raise leaves the block it's in
+    # functions: whether ifs and returns are run at all (v1 has neither)
+    def __init__(self, fields=False, typed=False, lazy=False, exceptions=False, functions=True, max_rounds=16):
+        self.fields = fields
+        self.typed = typed
+        self.lazy = lazy
+        self.functions = functions
+        # the kinds of statement that leave the block they're in
+        self.__leaving = ()
+        if functions:
+            self.__leaving = (InterpreterBase.RETURN_NODE, InterpreterBase.RAISE_NODE) if exceptions else (InterpreterBase.RETURN_NODE,)
+        self.max_rounds = max_rounds  # of removing, per function
+        # "name/number of parameters" -> [(line, what was removed)] for each function
+        # of the last program that had anything removed
+        self.removed = {}
+
+    def eliminate(self, functions):
+        self.removed = {}
+        # the names a builtin can read in a function it's run in
+        self.__dynamic = set()
+        if self.lazy:
+            resolution = Resolver(fields=self.fields).resolve(functions)
+            for variables in resolution.builtin_variables.values():
+                self.__dynamic.update(name for _, name in variables)
+        return [self.__function(func_ast).freeze() for func_ast in functions]
+
+    def __function(self, func_ast):
+        self.__report = []
+        for _ in range(self.max_rounds):
+            self.__unused = self.__unused_variables(func_ast)
+            statements = self.__block(func_ast.statements)
+            if statements is func_ast.statements:
+                break
+            func_ast = _rebuilt(func_ast, {"statements": statements})
+        if self.__report:
+            self.removed[f"{func_ast.name}/{len(func_ast.args)}"] = sorted(self.__report, key=lambda removed: removed[0] or 0)
+        return func_ast
+
+    def __block(self, statements):
+        if not statements:
+            return statements
+        kept = []
+        for index, statement in enumerate(statements):
+            kind = statement.elem_type
+            if statement in self.__unused:
+                self.__report.append((statement.line, self.__unused[statement]))
+                continue
+            if self.functions and kind == InterpreterBase.IF_NODE and statement.condition.elem_type == InterpreterBase.BOOL_NODE:
+                taken = self.__constant_if(statement)
+                if taken is not None:
+                    kept.extend(taken)
+                    if any(_leaves(s, self.__leaving) for s in taken):
+                        self.__unreachable(statements[index + 1:])
+                        break
+                    continue
+            statement = _rebuilt(statement, {field: self.__block(getattr(statement, field)) for field in _BLOCK_FIELDS.get(kind, ())})
+            kept.append(statement)
+            if _leaves(statement, self.__leaving):
+                self.__unreachable(statements[index + 1:])
+                break
+        if len(kept) == len(statements) and all(new is old for new, old in zip(kept, statements)):
+            return statements
+        return kept
+
+    # The statements to put in place of if_ast, whose condition is a literal true or
+    # false, or None to keep it as it is
+    def __constant_if(self, if_ast):
+        if if_ast.condition.val:
+            condition, taken, skipped, branch = "true", if_ast.statements, if_ast.else_statements, "then"
+        else:
+            condition, taken, skipped, branch = "false", if_ast.else_statements, if_ast.statements, "else"
+        if not taken:
+            self.__report.append((if_ast.line, f"if ({condition}) that does nothing"))
+            return []
+        if not declares_variables(taken):
+            self.__report.append((if_ast.line, f"if ({condition}), replaced by its {branch} branch"))
+            return list(self.__block(taken))
+        if not skipped and if_ast.condition.val:
+            return None  # an if (true) with no else, kept for its branch's scope
+        # the branch keeps a scope of its own
+        self.__report.append((if_ast.line, f"if ({condition}), replaced by an if (true) of its {branch} branch"))
+        condition_ast = Element(InterpreterBase.BOOL_NODE, val=True, span=if_ast.condition.span)
+        return [Element(InterpreterBase.IF_NODE, condition=condition_ast, statements=self.__block(taken),
+                        else_statements=None, span=if_ast.span)]
+
+    def __unreachable(self, statements):
+        for statement in statements:
+            self.__report.append((statement.line, f"unreachable {_describe(statement)}"))
+
+    # var def and = node -> why it's removed, for each local variable of func_ast that
+    # goes, with its definition and assignments
+    def __unused_variables(self, func_ast):
+        resolution = Resolver(fields=self.fields).resolve([func_ast])
+        slots = resolution.slots
+        # slots of the variables defined before they're used
+        defined = set(resolution.param_slots[func_ast])
+        definitions = {}  # slot -> its var def node
+        assignments = {}  # slot -> the = nodes assigning it
+        kept = set()  # slots read, or given a field, or assigned in a for's init or update
+        names = {}  # (block, name) -> the number of definitions of name in the block
+        blocks = [func_ast.statements or ()]
+        while blocks:
+            block = blocks.pop()
+            for statement in block:
+                stack = [statement]
+                while stack:
+                    node = stack.pop()
+                    kind = node.elem_type
+                    if kind == InterpreterBase.VAR_DEF_NODE:
+                        slot = slots[node]
+                        names[(id(block), node.name)] = names.get((id(block), node.name), 0) + 1
+                        if slot != NO_SLOT:
+                            defined.add(slot)
+                            definitions[slot] = (node, block)
+                    elif kind == InterpreterBase.VAR_NODE:
+                        kept.add(slots.get(node))  # not resolved as a statement of its own, which does nothing
+                    elif kind == "=":
+                        if node.path is not None or node is not statement:
+                            kept.add(slots[node])
+                        assignments.setdefault(slots[node], []).append(node)
+                        stack.append(node.expression)
+                    elif kind == InterpreterBase.FOR_NODE:
+                        stack.extend((node.init, node.update, node.condition))
+                        blocks.append(node.statements or ())
+                    elif kind in _BLOCK_FIELDS:
+                        for field in _BLOCK_FIELDS[kind]:
+                            if field == "catchers":
+                                stack.extend(getattr(node, field) or ())
+                            else:
+                                blocks.append(getattr(node, field) or ())
+                        if kind == InterpreterBase.IF_NODE:
+                            stack.append(node.condition)
+                    else:
+                        stack.extend(_operands(node))
+        unused = {}
+        for slot, (var_def, block) in definitions.items():
+            name = var_def.name
+            if slot in kept or names[(id(block), name)] > 1 or name in self.__dynamic:
+                continue
+            if self.typed and var_def.var_type not in _PRIMITIVE_TYPES:
+                continue
+            assigns = assignments.get(slot, ())
+            if not all(self.__harmless(assign_ast.expression, var_def, slots, defined) for assign_ast in assigns):
+                continue
+            unused[var_def] = f"unused variable {name}"
+            for assign_ast in assigns:
+                unused[assign_ast] = f"assignment to unused variable {name}"
+        return unused
+
+    # whether assigning expr_ast to the variable var_def defines can neither fail nor
+    # do anything
+    def __harmless(self, expr_ast, var_def, slots, defined):
+        if self.lazy:
+            return True  # it's never evaluated, as the variable's never read
+        kind = expr_ast.elem_type
+        if self.typed:
+            return kind == var_def.var_type
+        if kind in _LITERALS:
+            return True
+        return kind == InterpreterBase.VAR_NODE and expr_ast.path is None and slots.get(expr_ast) in defined
+
+
+# node with the fields in changes changed, or node itself if none are
+def _rebuilt(node, changes):
+    changes = {field: value for field, value in changes.items() if value is not getattr(node, field)}
+    if not changes:
+        return node
+    fields = node.dict
+    fields.update(changes)
+    return Element(node.elem_type, span=node.span, **fields)
+
+
+# whether statement always leaves the block it's in: one of the kinds in leaving, or
+# an if whose branches both have one that does
+def _leaves(statement, leaving):
+    kind = statement.elem_type
+    if kind in leaving:
+        return True
+    if kind == InterpreterBase.IF_NODE and leaving:
+        return any(_leaves(s, leaving) for s in statement.statements or ()) and any(
+            _leaves(s, leaving) for s in statement.else_statements or ()
+        )
+    return False
+
+
+# the nodes an expression, or a statement that's one, is made of
+def _operands(node):
+    kind = node.elem_type
+    if kind == InterpreterBase.FCALL_NODE:
+        return node.args
+    if kind == InterpreterBase.CHAIN_NODE:
+        return node.operands
+    if kind in (InterpreterBase.NEG_NODE, InterpreterBase.NOT_NODE):
+        return (node.op1,)
+    if hasattr(node, "op2"):
+        return (node.op1, node.op2)
+    if kind in (InterpreterBase.RETURN_NODE, InterpreterBase.RAISE_NODE):
+        expr_ast = node.expression if kind == InterpreterBase.RETURN_NODE else node.exception_type
+        return () if expr_ast is None else (expr_ast,)
+    return ()
+
+
+def _describe(statement):
+    kind = statement.elem_type
+    if kind == InterpreterBase.FCALL_NODE:
+        return f"call of {statement.name}"
+    if kind == "=":
+        return f"assignment to {statement.name}"
+    if kind == InterpreterBase.VAR_DEF_NODE:
+        return f"definition of {statement.name}"
+    return f"{kind} statement"
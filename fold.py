@@ -0,0 +1,319 @@
+# Constant folding and propagation: a pass over a program's functions, made as it's
+# loaded (see CoreInterpreter.load), ahead of whichever engine then runs it.
+#
+# Folding replaces an expression of literals alone (60 * 60 * 24, "a" + "b", !true,
+# or the first operands of a chain, like 60 * 60 in 60 * 60 * x) with a literal of
+# its value. The value is worked out by the interpreter itself (evaluate), so it's
+# what the expression gives in that version, and an expression that fails (1 / 0,
+# 1 + "a", or one with an operator the version doesn't have) is left as it is, to
+# fail when (and if) it's reached, as before. Under v4's lazy evaluation, 9 / 0 so
+# still raises div0 only once it's needed.
+#
+# Propagation replaces the reads of a variable that's assigned once in its function,
+# a literal, in the block it's defined in, with that literal, wherever they come
+# after the assignment in that block, and folds again. Anywhere else the variable
+# may still hold the value it was defined with, so its reads are left alone. Under
+# static typing the literal must be of the variable's declared type, as it would be
+# coerced otherwise, and under lazy evaluation a read in the arguments of a builtin
+# isn't replaced, as those are read by name in the function the builtin runs in
+# (see CoreInterpreter.__dynamic_view).
+#
+# AST nodes are frozen and shared (see parser/element.py), so the pass makes new
+# nodes for what it changes, and the nodes above them, and leaves the rest shared.
+#
+# The report gives each fold's line and text, but expressions have no spans of their
+# own (see parser/spans.py), so the spans of a function's expressions are worked out
+# from its text the first time one of them is folded, and a node the pass makes is
+# placed by the one it was made from.
+from intbase import InterpreterBase
+from parser.element import Element
+from parser.spans import OFFSET_BITS, OFFSET_MASK, expression_spans, join_spans, span_line, span_offsets
+from resolve import NO_SLOT, Resolver
+
+_LITERALS = (InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE, InterpreterBase.NIL_NODE)
+
+# the Python type of the value of each kind of literal a value can be folded into
+_LITERAL_TYPES = {InterpreterBase.INT_NODE: int, InterpreterBase.STRING_NODE: str, InterpreterBase.BOOL_NODE: bool}
+
+_BUILTINS = ("print", "inputi", "inputs")
+
+# the fields of each kind of statement that are expressions, statements, and lists
+# of statements (a try's catchers are statements holding a block)
+_EXPRESSION_FIELDS = {
+    "=": ("expression",),
+    InterpreterBase.RETURN_NODE: ("expression",),
+    InterpreterBase.IF_NODE: ("condition",),
+    InterpreterBase.FOR_NODE: ("condition",),
+    InterpreterBase.RAISE_NODE: ("exception_type",),
+}
+_STATEMENT_FIELDS = {InterpreterBase.FOR_NODE: ("init", "update")}
+_BLOCK_FIELDS = {
+    InterpreterBase.IF_NODE: ("statements", "else_statements"),
+    InterpreterBase.FOR_NODE: ("statements",),
+    InterpreterBase.TRY_NODE: ("statements", "catchers"),
+    InterpreterBase.CATCH_NODE: ("statements",),
+}
+
+
+class ConstantFolder:
+    # evaluate: the Value of an expression of literals, or None if evaluating it fails
+    # fields: whether a dotted name (v3's a.b.c) is its base variable
+    # typed: whether variables have declared types
+    # lazy: whether builtins read variables where they run
+    def __init__(self, evaluate, fields=False, typed=False, lazy=False, max_rounds=8):
+        self.evaluate = evaluate
+        self.fields = fields
+        self.typed = typed
+        self.lazy = lazy
+        self.max_rounds = max_rounds  # of propagating and folding again, per function
+        # (line, expression as written, literal) for each fold of the last program, in
+        # the order they're written, where a fold inside another one is part of it
+        self.folds = []
+
+    # functions, folded; program is their source, for the report
+    def fold(self, functions, program=""):
+        self.__folds = []  # (span, fold), in the order they're made
+        self.__program = program
+        self.__origins = {}  # node made by the pass -> the node of the parse it was made from
+        folded = [self.__function(func_ast).freeze() for func_ast in functions]
+        # a fold of a later round can take in ones of earlier rounds, as a chain
+        # whose first operands were folded is folded whole once a variable in it is
+        # propagated
+        kept = [
+            (span, fold) for i, (span, fold) in enumerate(self.__folds)
+            if not any(_within(span, later) for later, _ in self.__folds[i + 1:])
+        ]
+        self.folds = [fold for _, fold in sorted(kept, key=lambda kept_fold: kept_fold[0])]
+        return folded
+
+    def __function(self, func_ast):
+        self.__function_ast = func_ast
+        self.__spans = None  # node -> span, for the expressions of func_ast, once needed
+        self.__replace = {}
+        func_ast = self.__rebuilt(func_ast, {"statements": self.__block(func_ast.statements)})
+        for _ in range(self.max_rounds):
+            self.__replace = self.__propagated(func_ast)
+            if not self.__replace:
+                break
+            func_ast = self.__rebuilt(func_ast, {"statements": self.__block(func_ast.statements)})
+        return func_ast
+
+    # node with the fields in changes changed, or node itself if none are
+    def __rebuilt(self, node, changes):
+        changes = {field: value for field, value in changes.items() if not _same(value, getattr(node, field))}
+        if not changes:
+            return node
+        fields = node.dict
+        fields.update(changes)
+        return self.__made(Element(node.elem_type, span=node.span, **fields), node)
+
+    # new, made in place of old
+    def __made(self, new, old):
+        if not new.span:
+            self.__origins[new] = self.__origins.get(old, old)
+        return new
+
+    # the span of node, a node of the function being folded or one made from one
+    def __span(self, node):
+        node = self.__origins.get(node, node)
+        if node.span:
+            return node.span
+        if self.__spans is None:
+            self.__spans = expression_spans(self.__function_ast, self.__program) if self.__program else {}
+        return self.__spans.get(node, 0)
+
+    def __block(self, statements):
+        if statements is None:
+            return None
+        folded = [self.__statement(statement) for statement in statements]
+        return statements if _same(folded, statements) else folded
+
+    def __statement(self, statement):
+        kind = statement.elem_type
+        if kind == InterpreterBase.FCALL_NODE:
+            return self.__expression(statement)
+        changes = {}
+        for field in _EXPRESSION_FIELDS.get(kind, ()):
+            expr_ast = getattr(statement, field)
+            if expr_ast is not None:
+                changes[field] = self.__expression(expr_ast)
+        for field in _STATEMENT_FIELDS.get(kind, ()):
+            changes[field] = self.__statement(getattr(statement, field))
+        for field in _BLOCK_FIELDS.get(kind, ()):
+            changes[field] = self.__block(getattr(statement, field))
+        return self.__rebuilt(statement, changes)
+
+    def __expression(self, expr_ast):
+        kind = expr_ast.elem_type
+        if kind == InterpreterBase.VAR_NODE:
+            literal = self.__replace.get(expr_ast)
+            if literal is None:
+                return expr_ast
+            span = self.__span(expr_ast)
+            self.__folds.append((span, (span_line(span), expr_ast.name, _text(literal))))
+            return literal
+        folds = len(self.__folds)
+        if kind == InterpreterBase.FCALL_NODE:
+            return self.__rebuilt(expr_ast, {"args": [self.__expression(arg) for arg in expr_ast.args]})
+        if kind == InterpreterBase.CHAIN_NODE:
+            return self.__chain(expr_ast)
+        if kind in (InterpreterBase.NEG_NODE, InterpreterBase.NOT_NODE):
+            folded = self.__rebuilt(expr_ast, {"op1": self.__expression(expr_ast.op1)})
+            if folded.op1.elem_type in _LITERALS:
+                return self.__literal(folded, expr_ast, folds)
+            return folded
+        if hasattr(expr_ast, "op2"):
+            folded = self.__rebuilt(expr_ast, {"op1": self.__expression(expr_ast.op1), "op2": self.__expression(expr_ast.op2)})
+            if folded.op1.elem_type in _LITERALS and folded.op2.elem_type in _LITERALS:
+                return self.__literal(folded, expr_ast, folds)
+            return folded
+        return expr_ast
+
+    # A chain's operands are applied from the left, so its literal first operands can
+    # be folded into one, whatever follows them
+    def __chain(self, chain_ast):
+        operands = []
+        marks = []  # the number of folds before each operand's
+        for operand in chain_ast.operands:
+            marks.append(len(self.__folds))
+            operands.append(self.__expression(operand))
+        constant = 0
+        while constant < len(operands) and operands[constant].elem_type in _LITERALS:
+            constant += 1
+        if constant == len(operands):
+            return self.__literal(self.__rebuilt(chain_ast, {"operands": operands}), chain_ast, marks[0])
+        if constant >= 2:
+            span = join_spans(self.__span(chain_ast.operands[0]), self.__span(chain_ast.operands[constant - 1]))
+            first = _operation(chain_ast.op, operands[:constant], span)
+            literal = self.__literal(first, first, marks[0], marks[constant])
+            if literal is not first:
+                operands[:constant] = [literal]
+        if len(operands) == 2:
+            return self.__made(Element(chain_ast.op, op1=operands[0], op2=operands[1]), chain_ast)
+        return self.__rebuilt(chain_ast, {"operands": operands})
+
+    # A literal of the value of expr_ast, an expression of literals, in place of
+    # original (what it was written as), or expr_ast if it can't be folded. It takes
+    # the place of the folds from folds to end (the folds of its operands).
+    def __literal(self, expr_ast, original, folds, end=None):
+        value = self.evaluate(expr_ast)
+        if value is None or type(value.value()) is not _LITERAL_TYPES.get(value.type()):
+            return expr_ast
+        literal = self.__made(Element(value.type(), val=value.value()), original)
+        span = self.__span(original)
+        del self.__folds[folds:end]
+        self.__folds.insert(folds, (span, (span_line(span), self.__source(original, span), _text(literal))))
+        return literal
+
+    # the text of node, whose span is span, in the program, on one line
+    def __source(self, node, span):
+        if not span or span & OFFSET_MASK >= len(self.__program):
+            return str(node)
+        start, end = span_offsets(span, self.__program)
+        return " ".join(part.strip() for part in self.__program[start:end].splitlines())
+
+    # var node -> the literal to replace it with, for the variables of func_ast that
+    # can be propagated
+    def __propagated(self, func_ast):
+        slots = Resolver(fields=self.fields).resolve([func_ast]).slots
+        definitions = {}  # slot -> var def node
+        assignments = {}  # slot -> the = nodes assigning it
+        places = {}  # var def and = node -> (its block, its index there)
+        blocks = [func_ast.statements or ()]
+        while blocks:
+            block = blocks.pop()
+            for index, statement in enumerate(block):
+                places[statement] = (block, index)
+                for node in _statements_in(statement, blocks):
+                    if node.elem_type == InterpreterBase.VAR_DEF_NODE:
+                        definitions[slots[node]] = node
+                    elif node.elem_type == "=":
+                        assignments.setdefault(slots[node], []).append(node)
+        replace = {}
+        for slot, (assign_ast, *others) in assignments.items():
+            var_def = definitions.get(slot)
+            literal = assign_ast.expression
+            if slot == NO_SLOT or others or var_def is None or assign_ast.path is not None:
+                continue
+            if literal.elem_type not in _LITERAL_TYPES or (self.typed and literal.elem_type != var_def.var_type):
+                continue
+            block, index = places.get(assign_ast, (None, None))
+            if block is None or places[var_def][0] is not block:
+                continue
+            for statement in block[index + 1:]:
+                for var_ast in self.__reads(statement):
+                    if slots.get(var_ast) == slot and var_ast.path is None:
+                        replace[var_ast] = self.__made(Element(literal.elem_type, val=literal.val), var_ast)
+        return replace
+
+    # the var nodes in statement, and the blocks inside it, but under lazy evaluation
+    # not those in the arguments of builtins
+    def __reads(self, statement):
+        stack = [statement]
+        while stack:
+            node = stack.pop()
+            kind = node.elem_type
+            if kind == InterpreterBase.VAR_NODE:
+                yield node
+            elif kind == InterpreterBase.FCALL_NODE:
+                if not (self.lazy and node.name in _BUILTINS):
+                    stack.extend(node.args)
+            elif kind == InterpreterBase.CHAIN_NODE:
+                stack.extend(node.operands)
+            elif kind in (InterpreterBase.NEG_NODE, InterpreterBase.NOT_NODE):
+                stack.append(node.op1)
+            elif hasattr(node, "op2"):
+                stack.append(node.op1)
+                stack.append(node.op2)
+            else:
+                for field in _EXPRESSION_FIELDS.get(kind, ()):
+                    if getattr(node, field) is not None:
+                        stack.append(getattr(node, field))
+                for field in _STATEMENT_FIELDS.get(kind, ()):
+                    stack.append(getattr(node, field))
+                for field in _BLOCK_FIELDS.get(kind, ()):
+                    stack.extend(getattr(node, field) or ())
+
+
+# statement, and the statements it runs outside of blocks of its own (a for's init
+# and update); the blocks inside it go on blocks
+def _statements_in(statement, blocks):
+    yield statement
+    for field in _STATEMENT_FIELDS.get(statement.elem_type, ()):
+        yield getattr(statement, field)
+    for field in _BLOCK_FIELDS.get(statement.elem_type, ()):
+        statements = getattr(statement, field)
+        if statements:
+            if field == "catchers":
+                blocks.extend(catcher.statements or () for catcher in statements)
+            else:
+                blocks.append(statements)
+
+
+# whether new, a field's value, is the same as old: the same node, or a list of the
+# same nodes
+def _same(new, old):
+    if isinstance(new, list):
+        return old is not None and len(new) == len(old) and all(a is b for a, b in zip(new, old))
+    return new is old
+
+
+# whether span is inside outer
+def _within(span, outer):
+    return outer >> OFFSET_BITS <= span >> OFFSET_BITS and span & OFFSET_MASK <= outer & OFFSET_MASK
+
+
+# op applied to operands, from the left, as the parser would build it
+def _operation(op, operands, span):
+    if len(operands) == 2:
+        return Element(op, op1=operands[0], op2=operands[1], span=span)
+    return Element(InterpreterBase.CHAIN_NODE, op=op, operands=list(operands), span=span)
+
+
+# literal as it would be written
+def _text(literal):
+    if literal.elem_type == InterpreterBase.STRING_NODE:
+        return f'"{literal.val}"'
+    if literal.elem_type == InterpreterBase.BOOL_NODE:
+        return "true" if literal.val else "false"
+    return str(literal.val)
@@ -0,0 +1,602 @@
+# Inlining: a pass over a program's functions, made as it's loaded, after constant
+# folding and dead-code elimination (see CoreInterpreter.load), that puts the body of
+# a small function where it's called, saving the call: looking the function up,
+# binding the arguments, making a frame and running the body as a block of its own.
+# A call graph decides what's inlined and in which order. A function that calls
+# itself, directly or not, never is, and the rest are worked through callees first,
+# so a body has the calls in it inlined by the time it's inlined itself, and counts
+# against the budget (max_size AST nodes) with them.
+#
+# A call is inlined where it's a statement (f(a);), the right side of an assignment
+# (x = f(a);) or what's returned (return f(a);), or where it's part of one of those,
+# or of an if's condition, and nothing evaluated before it can fail or do anything
+# (as in x + f(a), but not in g(b) + f(a)). The body is then put ahead of the
+# statement, and gives its value to a new variable the statement reads instead.
+#  - parameters: one that's never assigned, and given a literal or a variable that's
+#    defined where the call is, has its reads replaced by its argument; the others
+#    are defined and assigned their arguments, in order, which under static typing
+#    coerces them as binding them does (an int to a bool, nil to a struct). An
+#    argument only replaces reads of a parameter of its own type.
+#  - capture: the body's variables keep their names, but where the caller has a
+#    variable of the same name, when they get new ones. Errors name the variable of
+#    a dotted name (v3's p.x), so one read that way isn't renamed, and isn't inlined
+#    where it would have to be, but for a parameter given a variable of its name.
+#  - returns: the returns become assignments of the value, or the caller's returns.
+#    That takes a body whose every way through ends at a return, which one with ifs
+#    that return is made into by moving what follows an if into its branches. One
+#    with a return in a loop isn't inlined. Under static typing what's returned must
+#    be of the return type, so that returning it can't fail or coerce.
+# The statements the pass makes take the position of the call's statement, and the
+# body's keep their own, so an error is reported on the line it was before.
+#
+# AST nodes are frozen and shared, and the passes after this one key tables by them
+# (see resolve.py), so every inlined body is a new copy.
+from intbase import InterpreterBase
+from parser.element import Element
+from resolve import NO_SLOT, Resolver, declares_variables
+
+_LITERALS = (InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE, InterpreterBase.NIL_NODE)
+
+# the type of what each builtin gives
+_BUILTINS = {"print": "void", "inputi": "int", "inputs": "string"}
+
+_COMPARISONS = ("==", "!=", "<", "<=", ">", ">=", "&&", "||")
+
+_BLOCK_FIELDS = {
+    InterpreterBase.IF_NODE: ("statements", "else_statements"),
+    InterpreterBase.FOR_NODE: ("statements",),
+    InterpreterBase.TRY_NODE: ("statements", "catchers"),
+    InterpreterBase.CATCH_NODE: ("statements",),
+}
+
+
+# What's known of a function that can be inlined
+class _Callee:
+    def __init__(self, func_ast, resolution, always, sink):
+        self.func_ast = func_ast
+        self.slots = resolution.slots
+        self.param_slots = resolution.param_slots[func_ast]
+        self.always = always  # whether every way through its body returns a value
+        self.sink = sink  # whether a return in it has to be evaluated where it's called as a statement
+        self.names = {}  # slot -> name, of each of its variables (parameters included)
+        self.counts = {}  # name -> its variables of that name
+        self.assigned = set()  # slots of the variables assigned with =
+        self.dotted = set()  # slots of the variables in a dotted name
+        for formal_ast, slot in zip(func_ast.args, self.param_slots):
+            self.names[slot] = formal_ast.name
+        for node in _nodes(func_ast):
+            kind = node.elem_type
+            if kind == InterpreterBase.VAR_DEF_NODE:
+                self.names[self.slots[node]] = node.name
+            elif kind in (InterpreterBase.VAR_NODE, "="):
+                slot = self.slots.get(node)  # not resolved as a statement of its own, which does nothing
+                if node.path is not None:
+                    self.dotted.add(slot)
+                elif kind == "=":
+                    self.assigned.add(slot)
+        for name in self.names.values():
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+
+class Inliner:
+    # fields: whether a dotted name (v3's a.b.c) is its base variable
+    # typed: whether variables have declared types
+    # operators: type -> the operators applying to two values of that type, under
+    # static typing
+    def __init__(self, fields=False, typed=False, operators=None, max_size=32):
+        self.fields = fields
+        self.typed = typed
+        self.operators = operators or {}
+        self.max_size = max_size  # AST nodes in the body of a function that's inlined
+        # "name/number of parameters" -> [(line, function inlined there)] for each
+        # function of the last program that had calls inlined
+        self.inlined = {}
+
+    # functions, with calls inlined; structs are the program's struct definitions
+    def inline(self, functions, structs=()):
+        self.inlined = {}
+        self.__struct_fields = {struct_ast.name: {field.name: field.var_type for field in struct_ast.fields}
+                                for struct_ast in structs or ()}
+        # the definitions calls find, the last of a name and number of parameters
+        table = {(func_ast.name, len(func_ast.args)): func_ast for func_ast in functions}
+        self.__table = table
+        calls = {key: {(node.name, len(node.args)) for node in _nodes(func_ast)
+                       if node.elem_type == InterpreterBase.FCALL_NODE and (node.name, len(node.args)) in table}
+                 for key, func_ast in table.items()}
+        order, recursive = _call_order(calls)
+        self.__callees = {}  # (name, number of parameters) -> _Callee of a function that can be inlined
+        done = {}
+        for key in order:
+            done[key] = self.__function(table[key])
+            if key not in recursive:
+                self.__callees[key] = self.__callee(done[key])
+        inlined = []
+        for func_ast in functions:
+            key = (func_ast.name, len(func_ast.args))
+            inlined.append((done[key] if table[key] is func_ast else func_ast).freeze())
+        return inlined
+
+    # The _Callee of func_ast, or None if it can't be inlined
+    def __callee(self, func_ast):
+        if len({formal_ast.name for formal_ast in func_ast.args}) != len(func_ast.args):
+            return None  # a repeated parameter
+        resolution = Resolver(fields=self.fields).resolve([func_ast])
+        if resolution.errors:
+            return None  # a variable that isn't defined where it's used would be the caller's
+        tail = _tail(func_ast.statements or (), lambda return_ast: [return_ast])
+        if tail is None or _size(tail[0]) > self.max_size:
+            return None
+        returns = [node for node in _nodes(func_ast) if node.elem_type == InterpreterBase.RETURN_NODE]
+        if self.typed:
+            types = self.__declared_types(func_ast, resolution)
+            return_type = func_ast.return_type
+            for return_ast in returns:
+                expr_ast = return_ast.expression
+                if expr_ast is None:
+                    continue
+                if return_type == "void" or self.__type(expr_ast, resolution.slots, types) != return_type:
+                    return None
+        always = tail[1] and all(return_ast.expression is not None for return_ast in returns)
+        sink = any(return_ast.expression is not None and not _harmless_result(return_ast.expression)
+                   for return_ast in returns)
+        return _Callee(func_ast, resolution, always, sink)
+
+    # func_ast, with the calls in it inlined
+    def __function(self, func_ast):
+        resolution = Resolver(fields=self.fields).resolve([func_ast])
+        self.__slots = resolution.slots
+        self.__types = self.__declared_types(func_ast, resolution) if self.typed else {}
+        # slots of the variables defined before they're used
+        self.__defined = set(resolution.param_slots[func_ast])
+        self.__taken = set()  # names of the function's variables, and of the ones inlining gives it
+        for node in _nodes(func_ast):
+            kind = node.elem_type
+            if kind == InterpreterBase.VAR_DEF_NODE and resolution.slots[node] != NO_SLOT:
+                self.__defined.add(resolution.slots[node])
+            if kind in (InterpreterBase.VAR_NODE, "=", InterpreterBase.VAR_DEF_NODE, InterpreterBase.ARG_NODE):
+                self.__taken.add(node.path.base if getattr(node, "path", None) is not None else node.name)
+        self.__return_type = func_ast.return_type
+        self.__temps = {}  # var node reading the value of an inlined call -> its type
+        self.__head = []  # definitions of variables to put at the top of the function
+        self.__report = []
+        statements = self.__block(func_ast.statements)
+        if self.__head:
+            statements = self.__head + list(statements)
+        if self.__report:
+            self.inlined[f"{func_ast.name}/{len(func_ast.args)}"] = self.__report
+        return _rebuilt(func_ast, {"statements": statements})
+
+    # slot -> declared type of each variable of func_ast, under static typing
+    def __declared_types(self, func_ast, resolution):
+        types = dict(zip(resolution.param_slots[func_ast], (formal_ast.var_type for formal_ast in func_ast.args)))
+        for node in _nodes(func_ast):
+            if node.elem_type == InterpreterBase.VAR_DEF_NODE:
+                types[resolution.slots[node]] = node.var_type
+        return types
+
+    def __block(self, statements):
+        if not statements:
+            return statements
+        rewritten = []
+        for statement in statements:
+            rewritten.extend(self.__statement(statement))
+        if len(rewritten) == len(statements) and all(new is old for new, old in zip(rewritten, statements)):
+            return statements
+        return rewritten
+
+    # the statements to put in place of statement
+    def __statement(self, statement):
+        kind = statement.elem_type
+        if kind in _BLOCK_FIELDS:
+            changes = {}
+            for field in _BLOCK_FIELDS[kind]:
+                block = getattr(statement, field)
+                if field == "catchers":
+                    changes[field] = _same_or([self.__statement(catcher)[0] for catcher in block], block)
+                else:
+                    changes[field] = self.__block(block)
+            statement = _rebuilt(statement, changes)
+            return self.__hoisting(statement, "condition") if kind == InterpreterBase.IF_NODE else [statement]
+        if kind == InterpreterBase.FCALL_NODE:
+            return self.__hoisting(statement, None, "statement")
+        if kind == "=":
+            if self.typed and (statement.path is not None or self.__slots.get(statement) not in self.__defined):
+                return [statement]  # the variable's looked up before the expression's evaluated
+            return self.__hoisting(statement, "expression", "assign")
+        if kind == InterpreterBase.RETURN_NODE and statement.expression is not None:
+            return self.__hoisting(statement, "expression", "return")
+        return [statement]
+
+    # statement, with the calls in its field that can be inlined put ahead of it (in
+    # the statement itself, a call, for field None); if the field is a call, it's
+    # inlined in the given mode (see __inlined) if it can be
+    def __hoisting(self, statement, field, mode=None):
+        self.__clean = True  # whether everything evaluated so far can neither fail nor do anything
+        self.__hoisted = []
+        self.__site = statement
+        expr_ast = statement if field is None else getattr(statement, field)
+        if mode is not None and expr_ast.elem_type == InterpreterBase.FCALL_NODE:
+            call_ast = self.__arguments(expr_ast)
+            region = self.__inlined(call_ast, statement, mode)
+            if region is not None:
+                return self.__hoisted + region
+            expr_ast = call_ast if mode == "statement" else self.__value(call_ast, True)
+        else:
+            expr_ast = self.__expression(expr_ast)
+        return self.__hoisted + [expr_ast if field is None else _rebuilt(statement, {field: expr_ast})]
+
+    # expr_ast, with the calls in it that can be inlined, in the order it's evaluated,
+    # replaced by reads of their values
+    def __expression(self, expr_ast):
+        kind = expr_ast.elem_type
+        if kind == InterpreterBase.VAR_NODE:
+            self.__clean = self.__clean and self.__clean_read(expr_ast)
+            return expr_ast
+        if kind == InterpreterBase.FCALL_NODE:
+            clean = self.__clean
+            return self.__value(self.__arguments(expr_ast), clean)
+        if kind == InterpreterBase.CHAIN_NODE:
+            operands = [self.__expression(expr_ast.operands[0])]
+            value_type = self.__type_of(operands[0])
+            for operand in expr_ast.operands[1:]:
+                operands.append(self.__expression(operand))
+                value_type = self.__operation_type(expr_ast.op, value_type, self.__type_of(operands[-1]))
+                self.__clean = self.__clean and _infallible(expr_ast.op, value_type)
+            return _rebuilt(expr_ast, {"operands": _same_or(operands, expr_ast.operands)})
+        if kind in (InterpreterBase.NEG_NODE, InterpreterBase.NOT_NODE):
+            op1 = self.__expression(expr_ast.op1)
+            self.__clean = self.__clean and self.__unary_type(kind, self.__type_of(op1)) is not None
+            return _rebuilt(expr_ast, {"op1": op1})
+        if hasattr(expr_ast, "op2"):
+            op1 = self.__expression(expr_ast.op1)
+            op2 = self.__expression(expr_ast.op2)
+            value_type = self.__operation_type(kind, self.__type_of(op1), self.__type_of(op2))
+            self.__clean = self.__clean and _infallible(kind, value_type)
+            return _rebuilt(expr_ast, {"op1": op1, "op2": op2})
+        if kind not in _LITERALS:
+            self.__clean = False  # a new of a type that may not be a struct's
+        return expr_ast
+
+    # call_ast, with the calls in its arguments that can be inlined replaced by reads
+    # of their values
+    def __arguments(self, call_ast):
+        if call_ast.name in _BUILTINS:
+            args = [self.__expression(arg_ast) for arg_ast in call_ast.args]
+        else:
+            callee_ast = self.__table.get((call_ast.name, len(call_ast.args)))
+            if callee_ast is None:
+                self.__clean = False  # it fails looking the function up
+                return call_ast
+            args = []
+            for formal_ast, arg_ast in zip(callee_ast.args, call_ast.args):
+                args.append(self.__expression(arg_ast))
+                # under static typing each argument is bound, and checked, in turn
+                if self.typed and not self.__assignable(formal_ast.var_type, self.__type_of(args[-1])):
+                    self.__clean = False
+        return _rebuilt(call_ast, {"args": _same_or(args, call_ast.args)})
+
+    # a read of the value of call_ast, inlined, or call_ast itself if it can't be;
+    # clean is whether everything evaluated before its arguments can neither fail
+    # nor do anything
+    def __value(self, call_ast, clean):
+        if clean:
+            value_ast = self.__inlined(call_ast, self.__site, "value")
+            if value_ast is not None:
+                self.__clean = True  # the arguments are evaluated where it's inlined
+                return value_ast
+        self.__clean = False
+        return call_ast
+
+    # whether reading var_ast can't fail: it's a variable defined where it's read
+    def __clean_read(self, var_ast):
+        return var_ast.path is None and (var_ast in self.__temps or self.__slots.get(var_ast) in self.__defined)
+
+    # The call call_ast, in statement, inlined:
+    #   - mode "statement": the statements to put in place of statement, which is the call
+    #   - mode "assign": those to put in place of statement, which assigns its value
+    #   - mode "return": those to put in place of statement, which returns its value
+    #   - mode "value": a var node to read its value from, with the statements
+    #     giving it to that variable added to the ones to put ahead of statement
+    # or None if it can't be inlined there
+    def __inlined(self, call_ast, statement, mode):
+        callee = self.__callees.get((call_ast.name, len(call_ast.args)))
+        if callee is None:
+            return None
+        func_ast = callee.func_ast
+        return_type = func_ast.return_type
+        if mode != "statement" and self.typed and return_type == "void":
+            return None
+        if mode in ("assign", "return") and not callee.always:
+            return None
+        if mode == "assign":
+            slot = self.__slots.get(statement)
+            if statement.path is not None or slot not in self.__defined:
+                return None
+            if self.typed and not self.__assignable(self.__types[slot], return_type):
+                return None
+        if mode == "return" and self.typed and self.__return_type != return_type:
+            return None
+
+        values = {}  # slot of a parameter -> the argument that replaces its reads
+        bound = []  # (slot, formal, argument) of each parameter that's assigned its argument
+        for formal_ast, slot, arg_ast in zip(func_ast.args, callee.param_slots, call_ast.args):
+            arg_type = self.__type_of(arg_ast)
+            if self.typed and not self.__assignable(formal_ast.var_type, arg_type):
+                return None
+            if (arg_ast.elem_type in _LITERALS or (arg_ast.elem_type == InterpreterBase.VAR_NODE and self.__clean_read(arg_ast))) \
+                    and self.__replaces(callee, slot, formal_ast, arg_ast, arg_type):
+                values[slot] = arg_ast
+            else:
+                bound.append((slot, formal_ast, arg_ast))
+        names = {}  # slot -> new name, of each variable of the body that needs one
+        for slot, name in callee.names.items():
+            if slot not in values and name in self.__taken and slot in callee.dotted:
+                return None
+        for slot, name in callee.names.items():
+            if slot in values:
+                continue
+            if name in self.__taken:
+                names[slot] = self.__fresh(f"{func_ast.name}_{name}")
+            else:
+                self.__taken.add(name)
+
+        region = []
+        value_name = None  # of the variable the value goes to
+        value_type = return_type if self.typed else None
+        if mode == "value" or (mode == "statement" and callee.sink):
+            value_name = self.__fresh(f"{func_ast.name}_result")
+            value_def = Element(InterpreterBase.VAR_DEF_NODE, name=value_name, var_type=value_type, span=statement.span)
+            # it's defined where it's assigned unless it's assigned every time
+            if mode == "value" and callee.always:
+                self.__head.append(value_def)
+            else:
+                region.append(value_def)
+
+        def assignment(name, return_ast):
+            return [Element("=", name=name, expression=return_ast.expression, path=None, span=return_ast.span)]
+
+        def on_return(return_ast):
+            expr_ast = return_ast.expression
+            if mode == "return":
+                return [return_ast]
+            if mode == "assign":
+                return assignment(statement.name, return_ast)
+            if expr_ast is None:
+                return []  # the value's variable has its default
+            if mode == "statement" and not callee.sink:
+                if expr_ast.elem_type == InterpreterBase.FCALL_NODE:
+                    return [Element(InterpreterBase.FCALL_NODE, name=expr_ast.name, args=expr_ast.args, span=return_ast.span)]
+                return []
+            return assignment(value_name, return_ast)
+
+        for slot, formal_ast, arg_ast in bound:
+            name = names.get(slot, formal_ast.name)
+            region.append(Element(InterpreterBase.VAR_DEF_NODE, name=name, var_type=formal_ast.var_type, span=statement.span))
+            region.append(Element("=", name=name, expression=_copy(arg_ast, {}, {}, {}), path=None, span=statement.span))
+        body, _ = _tail(func_ast.statements or (), on_return)
+        region.extend(_copy(node, callee.slots, names, values) for node in body)
+        self.__report.append((statement.line, f"{func_ast.name}/{len(func_ast.args)}"))
+        if mode != "value":
+            return region
+        self.__hoisted.extend(region)
+        value_ast = Element(InterpreterBase.VAR_NODE, name=value_name, path=None, span=call_ast.span)
+        self.__temps[value_ast] = value_type
+        return value_ast
+
+    # whether arg_ast, of type arg_type, can replace the reads of the parameter
+    # formal_ast, whose slot is slot, in callee
+    def __replaces(self, callee, slot, formal_ast, arg_ast, arg_type):
+        if slot in callee.assigned:
+            return False
+        if self.typed and arg_type != formal_ast.var_type:
+            return False  # it's coerced
+        if arg_ast.elem_type != InterpreterBase.VAR_NODE:
+            return slot not in callee.dotted
+        name = arg_ast.name
+        if name == formal_ast.name:
+            return callee.counts[name] == 1
+        return name not in callee.counts and slot not in callee.dotted
+
+    def __fresh(self, name):
+        fresh = name
+        n = 1
+        while fresh in self.__taken:
+            n += 1
+            fresh = f"{name}{n}"
+        self.__taken.add(fresh)
+        return fresh
+
+    def __assignable(self, target_type, value_type):
+        if value_type is None:
+            return False
+        if target_type == value_type:
+            return True
+        if target_type == "bool" and value_type == "int":
+            return True
+        return target_type in self.__struct_fields and value_type == "nil"
+
+    def __type_of(self, expr_ast):
+        return self.__type(expr_ast, self.__slots, self.__types)
+
+    # the type of the value of expr_ast under static typing, where the variables in
+    # slots have the types in types, or None if it isn't known
+    def __type(self, expr_ast, slots, types):
+        if not self.typed:
+            return None
+        kind = expr_ast.elem_type
+        if kind in _LITERALS:
+            return kind
+        if kind == InterpreterBase.VAR_NODE:
+            if expr_ast in self.__temps:
+                return self.__temps[expr_ast]
+            var_type = types.get(slots.get(expr_ast))
+            if expr_ast.path is not None:
+                for field_name in expr_ast.path.fields:
+                    var_type = self.__struct_fields.get(var_type, {}).get(field_name)
+            return var_type
+        if kind == InterpreterBase.FCALL_NODE:
+            if expr_ast.name in _BUILTINS:
+                return _BUILTINS[expr_ast.name]
+            callee_ast = self.__table.get((expr_ast.name, len(expr_ast.args)))
+            return None if callee_ast is None else callee_ast.return_type
+        if kind == InterpreterBase.NEW_NODE:
+            return expr_ast.var_type if expr_ast.var_type in self.__struct_fields else None
+        if kind == InterpreterBase.CHAIN_NODE:
+            value_type = self.__type(expr_ast.operands[0], slots, types)
+            for operand in expr_ast.operands[1:]:
+                value_type = self.__operation_type(expr_ast.op, value_type, self.__type(operand, slots, types))
+            return value_type
+        if kind in (InterpreterBase.NEG_NODE, InterpreterBase.NOT_NODE):
+            return self.__unary_type(kind, self.__type(expr_ast.op1, slots, types))
+        if hasattr(expr_ast, "op2"):
+            return self.__operation_type(kind, self.__type(expr_ast.op1, slots, types), self.__type(expr_ast.op2, slots, types))
+        return None
+
+    # the type of oper applied to values of the types given, if it's one that applies
+    # to them as they are, or None
+    def __operation_type(self, oper, left_type, right_type):
+        if left_type is None or left_type != right_type or oper not in self.operators.get(left_type, ()):
+            return None
+        return "bool" if oper in _COMPARISONS else left_type
+
+    def __unary_type(self, kind, value_type):
+        if kind == InterpreterBase.NEG_NODE:
+            return "int" if value_type == "int" else None
+        return "bool" if value_type in ("bool", "int") else None
+
+
+# (the names and numbers of parameters of the functions in calls, callees first,
+# the ones that call themselves), where calls maps each to the ones it calls
+def _call_order(calls):
+    order = []
+    seen = set()
+    for root in calls:
+        if root in seen:
+            continue
+        seen.add(root)
+        stack = [(root, iter(calls[root]))]
+        while stack:
+            key, callees = stack[-1]
+            for callee in callees:
+                if callee not in seen:
+                    seen.add(callee)
+                    stack.append((callee, iter(calls[callee])))
+                    break
+            else:
+                stack.pop()
+                order.append(key)
+    recursive = set()
+    for key in calls:
+        reached = set()
+        stack = list(calls[key])
+        while stack:
+            callee = stack.pop()
+            if callee == key:
+                recursive.add(key)
+                break
+            if callee not in reached:
+                reached.add(callee)
+                stack.extend(calls[callee])
+    return order, recursive
+
+
+# (statements, with each return replaced by on_return's statements for it, and
+# whether every way through them ends at one), or None if there's a return they
+# can't end at: one in a loop, or in an if whose branches define variables that the
+# statements after it would then see
+def _tail(statements, on_return):
+    rewritten = []
+    for index, statement in enumerate(statements):
+        kind = statement.elem_type
+        if kind == InterpreterBase.RETURN_NODE:
+            rewritten.extend(on_return(statement))
+            return rewritten, True
+        if any(node.elem_type == InterpreterBase.RETURN_NODE for node in _nodes(statement)):
+            if kind != InterpreterBase.IF_NODE:
+                return None
+            rest = list(statements[index + 1:])
+            branches = []
+            for block in (statement.statements, statement.else_statements):
+                if rest and declares_variables(block):
+                    return None
+                branch = _tail(list(block or ()) + rest, on_return)
+                if branch is None:
+                    return None
+                branches.append(branch)
+            (then_statements, then_returns), (else_statements, else_returns) = branches
+            if statement.else_statements is None and not rest:
+                else_statements = None
+            rewritten.append(Element(InterpreterBase.IF_NODE, condition=statement.condition, statements=then_statements,
+                                     else_statements=else_statements, span=statement.span))
+            return rewritten, then_returns and else_returns
+        rewritten.append(statement)
+    return rewritten, False
+
+
+# whether a return of expr_ast, called as a statement, needs nothing of expr_ast
+# but a call, if it's one: a literal or a variable of the function is read without
+# failing or doing anything
+def _harmless_result(expr_ast):
+    kind = expr_ast.elem_type
+    if kind in _LITERALS or kind == InterpreterBase.FCALL_NODE:
+        return True
+    return kind == InterpreterBase.VAR_NODE and expr_ast.path is None
+
+
+# whether applying oper, giving a value of value_type, can't fail: it's an operator
+# for its operands' types, but for /, which fails dividing by 0
+def _infallible(oper, value_type):
+    return value_type is not None and oper != "/"
+
+
+# A new copy of node, with the variables of the slots in names renamed, and the
+# reads of the ones in values replaced by their arguments; a dotted read of one is
+# of a variable of the same name, which it's left reading
+def _copy(node, slots, names, values):
+    kind = node.elem_type
+    slot = slots.get(node) if kind in (InterpreterBase.VAR_NODE, "=", InterpreterBase.VAR_DEF_NODE) else None
+    if kind == InterpreterBase.VAR_NODE and slot in values and node.path is None:
+        value = values[slot]
+        return Element(value.elem_type, span=node.span, **value.dict)
+    fields = node.dict
+    for field, value in fields.items():
+        if isinstance(value, Element):
+            fields[field] = _copy(value, slots, names, values)
+        elif isinstance(value, (list, tuple)):
+            fields[field] = [_copy(v, slots, names, values) if isinstance(v, Element) else v for v in value]
+    if slot in names:
+        fields["name"] = names[slot]
+    return Element(kind, span=node.span, **fields)
+
+
+# node with the fields in changes changed, or node itself if none are
+def _rebuilt(node, changes):
+    changes = {field: value for field, value in changes.items() if value is not getattr(node, field)}
+    if not changes:
+        return node
+    fields = node.dict
+    fields.update(changes)
+    return Element(node.elem_type, span=node.span, **fields)
+
+
+# new, or old if new holds the same nodes
+def _same_or(new, old):
+    if len(new) == len(old) and all(n is o for n, o in zip(new, old)):
+        return old
+    return new
+
+
+def _nodes(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        for value in node.dict.values():
+            if isinstance(value, Element):
+                stack.append(value)
+            elif isinstance(value, (list, tuple)):
+                stack.extend(v for v in value if isinstance(v, Element))
+
+
+def _size(statements):
+    return sum(1 for statement in statements for _ in _nodes(statement))
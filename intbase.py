@@ -9,6 +9,24 @@ class ErrorType(Enum):
     # Add others here
 
 
+# What InterpreterBase.error raises. line_num is filled in from the source span of the
+# statement that was running if the interpreter didn't know it when raising, and span
+# is that statement's whole packed span (see parser/spans.py), for tooling.
+class BrewinError(Exception):
+    def __init__(self, error_type, description=None, line_num=None):
+        super().__init__(error_type, description, line_num)
+        self.error_type = error_type
+        self.description = description
+        self.line_num = line_num
+        self.span = 0
+
+    def __str__(self):
+        description = ": " + self.description if self.description else ""
+        if not self.line_num:
+            return f"{self.error_type}{description}"
+        return f"{self.error_type} on line {self.line_num}{description}"
+
+
 class InterpreterBase:
     # AST node types
     PROGRAM_NODE = "program"
@@ -32,6 +50,8 @@ class InterpreterBase:
     TRY_NODE = "try"
     CATCH_NODE = "catch"
     RAISE_NODE = "raise"
+    FIELD_PATH_NODE = "fieldpath"
+    CHAIN_NODE = "chain"
 
     # other constants
     TRUE_DEF = "true"
@@ -70,14 +90,16 @@ class InterpreterBase:
         # log the error before we throw
         self.error_line = line_num
         self.error_type = error_type
+        raise BrewinError(error_type, description, line_num)
 
-        if description:
-            description = ": " + description
-        else:
-            description = ""
-        if not line_num:
-            raise Exception(f"{error_type}{description}")
-        raise Exception(f"{error_type} on line {line_num}{description}")
+    # Called with the innermost statement node an error escaped from, to give the
+    # error that statement's position if it doesn't have one yet
+    def locate_error(self, error, node):
+        if error.span or not node.span:
+            return
+        error.span = node.span
+        if not error.line_num:
+            error.line_num = self.error_line = node.line
 
     def output(self, v):
         if self.console_output:
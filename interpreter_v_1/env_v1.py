@@ -1,26 +1,2 @@
-# The EnvironmentManager class keeps a mapping between each variable (aka symbol)
-# in a brewin program and the value of that variable - the value that's passed in can be
-# anything you like. In our implementation we pass in a Value object which holds a type
-# and a value (e.g., Int, 10).
-class EnvironmentManager:
-    def __init__(self):
-        self.environment = {}
-
-    # Gets the data associated a variable name
-    def get(self, symbol):
-        if symbol in self.environment:
-            return self.environment[symbol]
-        return None
-
-    # Sets the data associated with a variable name
-    def set(self, symbol, value):
-        if symbol not in self.environment:
-            return False
-        self.environment[symbol] = value
-        return True
-
-    def create(self, symbol, start_val):
-        if symbol not in self.environment: 
-          self.environment[symbol] = start_val 
-          return True
-        return False
\ No newline at end of file
+# v1's environment is the shared tree walker's (see core.py)
+from core import EnvironmentManager
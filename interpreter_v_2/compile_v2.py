@@ -0,0 +1,372 @@
+# Compiles a v2 program into trees of Python closures, one per AST node, so that
+# running a statement or evaluating an expression is a single call. Which kind of
+# node it is, its children, its constants and the operator functions it can apply
+# are all worked out once, when the closure is built, rather than every time the
+# node runs. The closures do exactly what the tree-walking methods of interpreterv2
+# do, in the same order, with the same output and the same errors.
+#
+# A statement closure returns None, or the value being returned when it (or a
+# statement inside it) executes a return. Expression closures return Values.
+# Values are never changed once made, so the copies the tree walker makes of
+# arguments and return values aren't needed here.
+from intbase import BrewinError, ErrorType, InterpreterBase
+from interpreter_v_2.type_v2 import Type, Value, get_printable
+from resolve import declares_variables
+
+NIL_VALUE = Value(Type.NIL, None)
+
+# the Type of each literal node's value
+LITERAL_TYPES = {
+    InterpreterBase.INT_NODE: Type.INT,
+    InterpreterBase.STRING_NODE: Type.STRING,
+    InterpreterBase.BOOL_NODE: Type.BOOL,
+}
+
+# what a return statement's closure gives back for an expression that has no value
+# (e.g. `new` in v2), since None means there was no return
+NO_VALUE = object()
+
+
+class Compiler:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.env = interpreter.env
+        self.bodies = {}  # function AST node -> closure running its body
+        self.__statement_compilers = {
+            InterpreterBase.FCALL_NODE: self.__fcall_statement,
+            "=": self.__assign,
+            InterpreterBase.VAR_DEF_NODE: self.__var_def,
+            InterpreterBase.RETURN_NODE: self.__return,
+            InterpreterBase.IF_NODE: self.__if,
+            InterpreterBase.FOR_NODE: self.__for,
+        }
+        self.__expression_compilers = {
+            InterpreterBase.NIL_NODE: self.__nil,
+            InterpreterBase.INT_NODE: self.__constant,
+            InterpreterBase.STRING_NODE: self.__constant,
+            InterpreterBase.BOOL_NODE: self.__constant,
+            InterpreterBase.VAR_NODE: self.__variable,
+            InterpreterBase.FCALL_NODE: lambda fcall_ast: self.compile_call(fcall_ast.name, fcall_ast.args),
+            InterpreterBase.CHAIN_NODE: self.__chain,
+            InterpreterBase.NEG_NODE: lambda neg_ast: self.__unary(neg_ast, Type.INT, lambda x: -1 * x),
+            InterpreterBase.NOT_NODE: lambda not_ast: self.__unary(not_ast, Type.BOOL, lambda x: not x),
+        }
+        for oper in interpreter.BIN_OPS:
+            self.__expression_compilers[oper] = self.__binary_op
+
+    # statements
+
+    # a closure running statements in a block of their own, if they need one
+    def compile_block(self, statements):
+        interpreter = self.interpreter
+        compiled = tuple((self.compile_statement(statement), statement) for statement in statements)
+        trace_output = interpreter.trace_output
+        locate_error = interpreter.locate_error
+
+        def run_statements():
+            for run, statement in compiled:
+                if trace_output:
+                    print(statement)
+                try:
+                    return_val = run()
+                except BrewinError as error:
+                    locate_error(error, statement)
+                    raise
+                if return_val is not None:
+                    return return_val
+            return None
+
+        # a block that defines no variables of its own needs no scope: the
+        # variables its statements use are all in the blocks around it
+        if not declares_variables(statements):
+            return run_statements
+        push_block = self.env.push_block
+        pop_block = self.env.pop_block
+
+        def run_block():
+            push_block()
+            for run, statement in compiled:
+                if trace_output:
+                    print(statement)
+                try:
+                    return_val = run()
+                except BrewinError as error:
+                    locate_error(error, statement)
+                    raise
+                if return_val is not None:
+                    pop_block()
+                    return return_val
+            pop_block()
+            return None
+
+        return run_block
+
+    def compile_statement(self, statement):
+        compile_fn = self.__statement_compilers.get(statement.elem_type)
+        if compile_fn is None:
+            return lambda: None  # e.g. an expression statement other than a call
+        return compile_fn(statement)
+
+    def __fcall_statement(self, call_ast):
+        call = self.compile_call(call_ast.name, call_ast.args)
+
+        def run_call():
+            call()
+
+        return run_call
+
+    def __assign(self, assign_ast):
+        var_name = assign_ast.name
+        expression = self.compile_expr(assign_ast.expression)
+        env_set = self.env.set
+        error = self.interpreter.error
+
+        def assign():
+            if not env_set(var_name, expression()):
+                error(ErrorType.NAME_ERROR, f"Undefined variable {var_name} in assignment")
+
+        return assign
+
+    def __var_def(self, var_ast):
+        var_name = var_ast.name
+        env_create = self.env.create
+        error = self.interpreter.error
+
+        def var_def():
+            if not env_create(var_name, NIL_VALUE):
+                error(ErrorType.NAME_ERROR, f"Duplicate definition for variable {var_name}")
+
+        return var_def
+
+    def __return(self, return_ast):
+        if return_ast.expression is None:
+            return lambda: NIL_VALUE
+        expression = self.compile_expr(return_ast.expression)
+
+        def run_return():
+            return_val = expression()
+            if return_val is None:
+                return NO_VALUE
+            return return_val
+
+        return run_return
+
+    def __if(self, if_ast):
+        condition = self.compile_expr(if_ast.condition)
+        then_block = self.compile_block(if_ast.statements)
+        else_block = None
+        if if_ast.else_statements is not None:
+            else_block = self.compile_block(if_ast.else_statements)
+        error = self.interpreter.error
+
+        def run_if():
+            result = condition()
+            if result.t != Type.BOOL:
+                error(ErrorType.TYPE_ERROR, "Incompatible type for if condition")
+            if result.v:
+                return then_block()
+            if else_block is not None:
+                return else_block()
+            return None
+
+        return run_if
+
+    def __for(self, for_ast):
+        init = self.compile_statement(for_ast.init)
+        loop = self.compile_loop(for_ast)
+
+        def run_for():
+            init()
+            return loop()
+
+        return run_for
+
+    # a closure running a for loop from its condition check on, i.e. all of it but the
+    # init; the tree walker switches a loop that's already running over to it
+    def compile_loop(self, for_ast):
+        condition = self.compile_expr(for_ast.condition)
+        update = self.compile_statement(for_ast.update)
+        body = self.compile_block(for_ast.statements)
+        error = self.interpreter.error
+
+        def loop():
+            while True:
+                run = condition()
+                if run.t != Type.BOOL:
+                    error(ErrorType.TYPE_ERROR, "Incompatible type for for condition")
+                if run.v:
+                    return_val = body()
+                    if return_val is not None:
+                        return return_val
+                update()  # the tree walker runs the update after the last check too
+                if not run.v:
+                    return None
+
+        return loop
+
+    # calls
+
+    # a closure calling function name with the expressions args as arguments
+    def compile_call(self, name, args):
+        interpreter = self.interpreter
+        error = interpreter.error
+        if name == "print":
+            return self.__print(args)
+        if name == "inputi" or name == "inputs":
+            return self.__input(name, args)
+
+        candidate_funcs = interpreter.func_name_to_ast.get(name)
+        if candidate_funcs is None:
+            return lambda: error(ErrorType.NAME_ERROR, f"Function {name} not found")
+        func_ast = candidate_funcs.get(len(args))
+        if func_ast is None:
+            return lambda: error(ErrorType.NAME_ERROR, f"Function {name} taking {len(args)} params not found")
+
+        compiled_args = tuple(self.compile_expr(arg) for arg in args)
+        formal_names = tuple(formal_ast.name for formal_ast in func_ast.args)
+        frames = self.env.environment
+        pop_func = self.env.pop_func
+        body = None
+
+        def call():
+            nonlocal body
+            values = [arg() for arg in compiled_args]
+            if body is None:
+                body = self.function_body(func_ast)
+            frames.append([dict(zip(formal_names, values))])  # push_func, and create each argument
+            return_val = body()
+            pop_func()
+            if return_val is None:
+                return NIL_VALUE
+            if return_val is NO_VALUE:
+                return None
+            return return_val
+
+        return call
+
+    # a closure running the body of the function func_ast in the frame the caller has
+    # pushed; functions are compiled on their first call, so unused ones cost nothing
+    def function_body(self, func_ast):
+        body = self.bodies.get(func_ast)
+        if body is None:
+            body = self.bodies[func_ast] = self.compile_block(func_ast.statements)
+        return body
+
+    def __print(self, args):
+        compiled_args = tuple(self.compile_expr(arg) for arg in args)
+        output_fn = self.interpreter.output
+
+        def call_print():
+            output = ""
+            for arg in compiled_args:
+                output = output + get_printable(arg())
+            output_fn(output)
+            return NIL_VALUE
+
+        return call_print
+
+    def __input(self, name, args):
+        interpreter = self.interpreter
+        prompt = self.compile_expr(args[0]) if len(args) == 1 else None
+
+        def call_input():
+            if prompt is not None:
+                interpreter.output(get_printable(prompt()))
+            elif len(args) > 1:
+                interpreter.error(ErrorType.NAME_ERROR, "No inputi() function that takes > 1 parameter")
+            inp = interpreter.get_input()
+            if name == "inputi":
+                return Value(Type.INT, int(inp))
+            return Value(Type.STRING, inp)
+
+        return call_input
+
+    # expressions
+
+    def compile_expr(self, expr_ast):
+        compile_fn = self.__expression_compilers.get(expr_ast.elem_type)
+        if compile_fn is None:
+            return lambda: None  # the tree walker has no value for it either
+        return compile_fn(expr_ast)
+
+    def __nil(self, nil_ast):
+        return lambda: NIL_VALUE
+
+    def __constant(self, literal_ast):
+        value = Value(LITERAL_TYPES[literal_ast.elem_type], literal_ast.val)
+        return lambda: value
+
+    def __variable(self, var_ast):
+        var_name = var_ast.name
+        env_get = self.env.get
+        error = self.interpreter.error
+
+        def variable():
+            val = env_get(var_name)
+            if val is None:
+                error(ErrorType.NAME_ERROR, f"Variable {var_name} not found")
+            return val
+
+        return variable
+
+    def __binary_op(self, arith_ast):
+        oper = arith_ast.elem_type
+        op1 = self.compile_expr(arith_ast.op1)
+        op2 = self.compile_expr(arith_ast.op2)
+        op_by_type = self.__op_by_type(oper)
+        any_types = oper in ("==", "!=")  # see Interpreter.__compatible_types
+        error = self.interpreter.error
+
+        def binary_op():
+            left_value_obj = op1()
+            right_value_obj = op2()
+            left_type = left_value_obj.t
+            if not any_types and left_type != right_value_obj.t:
+                error(ErrorType.TYPE_ERROR, f"Incompatible types for {oper} operation")
+            f = op_by_type.get(left_type)
+            if f is None:
+                error(ErrorType.TYPE_ERROR, f"Incompatible operator {oper} for type {left_type}")
+            return f(left_value_obj, right_value_obj)
+
+        return binary_op
+
+    def __chain(self, chain_ast):
+        oper = chain_ast.op
+        first, *rest = (self.compile_expr(operand) for operand in chain_ast.operands)
+        rest = tuple(rest)
+        op_by_type = self.__op_by_type(oper)
+        any_types = oper in ("==", "!=")
+        error = self.interpreter.error
+
+        def chain():
+            value_obj = first()
+            for operand in rest:
+                right_value_obj = operand()
+                left_type = value_obj.t
+                if not any_types and left_type != right_value_obj.t:
+                    error(ErrorType.TYPE_ERROR, f"Incompatible types for {oper} operation")
+                f = op_by_type.get(left_type)
+                if f is None:
+                    error(ErrorType.TYPE_ERROR, f"Incompatible operator {oper} for type {left_type}")
+                value_obj = f(value_obj, right_value_obj)
+            return value_obj
+
+        return chain
+
+    # the interpreter's function for oper, for each type it applies to
+    def __op_by_type(self, oper):
+        op_to_lambda = self.interpreter.op_to_lambda
+        return {t: ops[oper] for t, ops in op_to_lambda.items() if oper in ops}
+
+    def __unary(self, arith_ast, t, f):
+        op1 = self.compile_expr(arith_ast.op1)
+        oper = arith_ast.elem_type
+        error = self.interpreter.error
+
+        def unary():
+            value_obj = op1()
+            if value_obj.t != t:
+                error(ErrorType.TYPE_ERROR, f"Incompatible type for {oper} operation")
+            return Value(t, f(value_obj.v))
+
+        return unary
@@ -1,48 +1,2 @@
-# The EnvironmentManager class keeps a mapping between each variable name (aka symbol)
-# in a brewin program and the Value object, which stores a type, and a value.
-class EnvironmentManager:
-    def __init__(self):
-        self.environment = []
-
-    # returns a VariableDef object
-    def get(self, symbol):
-        cur_func_env = self.environment[-1]
-        for env in reversed(cur_func_env):
-            if symbol in env:
-                return env[symbol]
-
-        return None
-
-    def set(self, symbol, value):
-        cur_func_env = self.environment[-1]
-        for env in reversed(cur_func_env):
-            if symbol in env:
-                env[symbol] = value
-                return True
-
-        return False
-
-    # create a new symbol in the top-most environment, regardless of whether that symbol exists
-    # in a lower environment
-    def create(self, symbol, value):
-        cur_func_env = self.environment[-1]
-        if symbol in cur_func_env[-1]:   # symbol already defined in current scope
-            return False
-        cur_func_env[-1][symbol] = value
-        return True
-
-    # used when we enter a new function - start with empty dictionary to hold parameters.
-    def push_func(self):
-        self.environment.append([{}])  # [[...]] -> [[...], [{}]]
-
-    def push_block(self):
-        cur_func_env = self.environment[-1]
-        cur_func_env.append({})  # [[...],[{....}] -> [[...],[{...}, {}]]
-
-    def pop_block(self):
-        cur_func_env = self.environment[-1]
-        cur_func_env.pop() 
-
-    # used when we exit a nested block to discard the environment for that block
-    def pop_func(self):
-        self.environment.pop()
\ No newline at end of file
+# v2's environment is the shared tree walker's (see core.py)
+from core import EnvironmentManager
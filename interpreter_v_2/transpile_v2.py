@@ -0,0 +1,456 @@
+# Translates a v2 program into Python source (see transpile.py for how it's run),
+# one Python function per Brewin function, working on bare Python values: an int, a
+# bool, a str, and nil as None.
+#
+# v2 is dynamically typed, so an operator can't know its operands' types until it
+# runs. Each one is guarded instead: `a - b` becomes
+#   (a - b if type(a) is type(b) is int else _sub(a, b))
+# which does the native subtraction when the tree walker would, and otherwise calls a
+# helper that raises the tree walker's error (or, for `+` on strings, adds them).
+# Where an operand's type is known from the program text, e.g. a literal, the result
+# of a comparison or of another arithmetic operator, the guard is left out. Operands
+# that aren't a variable or a literal are evaluated once, into a temporary, with :=.
+#
+# Variables are resolved from the program text as the blocks of a function nest,
+# which is how the tree walker's environment finds them at run time: each `var`
+# statement gets a Python local of its own, which it resets to nil each time it
+# runs, and a variable that can't be found, or a duplicate definition, compiles to
+# a call raising the tree walker's error where it would.
+#
+# A program using `new`, which has no value in v2, can't be translated.
+#
+# To print the Python a program translates to:
+#   python -m interpreter_v_2.transpile_v2 PROGRAM.br
+import argparse
+import itertools
+
+from intbase import ErrorType, InterpreterBase
+from interpreter_v_2.type_v2 import Type
+from transpile import CACHE, PythonSource, TranspiledProgram, Untranslatable, cache_key
+from transpile import runtime as common_runtime
+
+LITERAL_TYPES = {
+    InterpreterBase.INT_NODE: Type.INT,
+    InterpreterBase.STRING_NODE: Type.STRING,
+    InterpreterBase.BOOL_NODE: Type.BOOL,
+    InterpreterBase.NIL_NODE: Type.NIL,
+}
+
+# the Python type of the values of each Type
+PYTHON_TYPES = {Type.INT: "int", Type.BOOL: "bool", Type.STRING: "str", Type.NIL: "type(None)"}
+
+# Python operator, the one type it's applied natively to, result type (None where
+# it depends on the operands, i.e. for strings) and the runtime helper applying it
+# otherwise, for each Brewin operator but == and !=
+BINARY_OPS = {
+    "+": ("+", Type.INT, None, "_add"),
+    "-": ("-", Type.INT, Type.INT, "_sub"),
+    "*": ("*", Type.INT, Type.INT, "_mul"),
+    "/": ("//", Type.INT, Type.INT, "_div"),
+    "<": ("<", Type.INT, Type.BOOL, "_lt"),
+    "<=": ("<=", Type.INT, Type.BOOL, "_le"),
+    ">": (">", Type.INT, Type.BOOL, "_gt"),
+    ">=": (">=", Type.INT, Type.BOOL, "_ge"),
+    "&&": ("&", Type.BOOL, Type.BOOL, "_and"),  # & rather than and, as both sides are evaluated
+    "||": ("|", Type.BOOL, Type.BOOL, "_or"),
+}
+
+# the most operands of a chain folded in one nested expression; longer chains are
+# folded in a tuple of assignments, as Python limits how deeply expressions nest
+MAX_NESTED_CHAIN = 16
+
+
+# An expression's Python text, its Type if that's known (None if not), and whether
+# it's a variable or a literal, which can be evaluated again, at no cost
+class Expression:
+    def __init__(self, text, value_type=None, simple=False):
+        self.text = text
+        self.value_type = value_type
+        self.simple = simple
+
+
+class Transpiler:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.source = PythonSource()
+        self.__scopes = []  # Brewin name -> Python name, for each block of the function being translated
+        self.__names = None  # Python names given out in the function being translated
+        self.__temporaries = None
+
+    def transpile(self):
+        for candidate_funcs in self.interpreter.func_name_to_ast.values():
+            for func_ast in candidate_funcs.values():
+                self.__function(func_ast)
+        self.source.add(0, "def _run():")
+        self.source.add(1, f"return {self.__call('main', []).text}")
+        return TranspiledProgram(self.source)
+
+    @staticmethod
+    def function_name(name, n_args):
+        return f"{name}_f{n_args}"
+
+    def __function(self, func_ast):
+        self.__names = {}
+        self.__temporaries = itertools.count()
+        param_names = [self.__new_name(formal_ast.name) for formal_ast in func_ast.args]
+        # the last of a repeated name is the one the body sees
+        self.__scopes = [{formal_ast.name: name for formal_ast, name in zip(func_ast.args, param_names)}]
+        self.source.add(0, f"def {self.function_name(func_ast.name, len(func_ast.args))}({', '.join(param_names)}):")
+        self.__block(func_ast.statements, 1)
+        self.source.add(0, "")
+        self.__scopes = []
+
+    def __new_name(self, var_name):
+        n = self.__names.get(var_name, 0)
+        self.__names[var_name] = n + 1
+        return f"{var_name}_v{n}"
+
+    def __temporary(self):
+        return f"_t{next(self.__temporaries)}"
+
+    def __lookup(self, var_name):
+        for scope in reversed(self.__scopes):
+            if var_name in scope:
+                return scope[var_name]
+        return None
+
+    # statements
+
+    def __block(self, statements, depth):
+        self.__scopes.append({})
+        n_lines = len(self.source.lines)
+        for statement in statements:
+            if self.interpreter.trace_output:
+                self.source.add_trace(depth, statement)
+            self.__statement(statement, depth)
+        if len(self.source.lines) == n_lines:
+            self.source.add(depth, "pass")
+        self.__scopes.pop()
+
+    def __statement(self, statement, depth):
+        elem_type = statement.elem_type
+        if elem_type == InterpreterBase.FCALL_NODE:
+            self.source.add(depth, self.__call(statement.name, statement.args).text, statement)
+        elif elem_type == "=":
+            self.source.add(depth, self.__assign(statement), statement)
+        elif elem_type == InterpreterBase.VAR_DEF_NODE:
+            self.source.add(depth, self.__var_def(statement), statement)
+        elif elem_type == InterpreterBase.RETURN_NODE:
+            expression = "None" if statement.expression is None else self.__expression(statement.expression).text
+            self.source.add(depth, f"return {expression}", statement)
+        elif elem_type == InterpreterBase.IF_NODE:
+            self.__if(statement, depth)
+        elif elem_type == InterpreterBase.FOR_NODE:
+            self.__for(statement, depth)
+        # any other expression statement does nothing
+
+    def __assign(self, assign_ast):
+        var_name = assign_ast.name
+        expression = self.__expression(assign_ast.expression).text
+        python_name = self.__lookup(var_name)
+        if python_name is None:
+            message = f"Undefined variable {var_name} in assignment"
+            return f"_fail(ErrorType.NAME_ERROR, {message!r}, {expression})"
+        return f"{python_name} = {expression}"
+
+    def __var_def(self, var_ast):
+        var_name = var_ast.name
+        scope = self.__scopes[-1]
+        if var_name in scope:
+            return f"_fail(ErrorType.NAME_ERROR, {'Duplicate definition for variable ' + var_name!r})"
+        scope[var_name] = self.__new_name(var_name)
+        return f"{scope[var_name]} = None"
+
+    # the condition of an if or for statement, checked to be a bool
+    def __condition(self, condition_ast, statement_name):
+        condition = self.__expression(condition_ast)
+        if condition.value_type == Type.BOOL:
+            return condition.text
+        return f"_{statement_name}_condition({condition.text})"
+
+    def __if(self, if_ast, depth):
+        self.source.add(depth, f"if {self.__condition(if_ast.condition, 'if')}:", if_ast)
+        self.__block(if_ast.statements, depth + 1)
+        if if_ast.else_statements is not None:
+            self.source.add(depth, "else:", if_ast)
+            self.__block(if_ast.else_statements, depth + 1)
+
+    # the tree walker runs the update once more after the condition is false
+    def __for(self, for_ast, depth):
+        init = self.__assign(for_ast.init)
+        condition = self.__condition(for_ast.condition, "for")
+        update = self.__assign(for_ast.update)
+        self.source.add(depth, init, for_ast)
+        self.source.add(depth, f"while {condition}:", for_ast)
+        self.__block(for_ast.statements, depth + 1)
+        self.source.add(depth + 1, update, for_ast)
+        self.source.add(depth, update, for_ast)
+
+    # calls
+
+    def __call(self, name, args):
+        if name == "print":
+            return self.__print(args)
+        if name == "inputi" or name == "inputs":
+            return self.__input(name, args)
+        candidate_funcs = self.interpreter.func_name_to_ast.get(name)
+        if candidate_funcs is None:
+            return Expression(f"_fail(ErrorType.NAME_ERROR, {'Function ' + name + ' not found'!r})")
+        if len(args) not in candidate_funcs:
+            message = f"Function {name} taking {len(args)} params not found"
+            return Expression(f"_fail(ErrorType.NAME_ERROR, {message!r})")
+        arg_texts = ", ".join(self.__expression(arg).text for arg in args)
+        return Expression(f"{self.function_name(name, len(args))}({arg_texts})")
+
+    # Text of an argument to print: what get_printable gives for it, but failing as
+    # print's concatenation would for nil
+    def __printed(self, arg_ast):
+        arg = self.__expression(arg_ast)
+        if arg.value_type == Type.INT:
+            return f"str({arg.text})"
+        if arg.value_type == Type.STRING:
+            return arg.text
+        if arg.value_type == Type.BOOL:
+            return f'("true" if {arg.text} else "false")'
+        return f"_text({arg.text})"
+
+    def __print(self, args):
+        output = " + ".join(self.__printed(arg) for arg in args) or '""'
+        return Expression(f"_output({output})", Type.NIL)
+
+    def __input(self, name, args):
+        value_type = Type.INT if name == "inputi" else Type.STRING
+        if len(args) > 1:
+            return Expression("_fail(ErrorType.NAME_ERROR, 'No inputi() function that takes > 1 parameter')", value_type)
+        prompt = self.__expression(args[0]).text if args else ""
+        return Expression(f"_{name}({prompt})", value_type)
+
+    # expressions
+
+    def __expression(self, expr_ast):
+        elem_type = expr_ast.elem_type
+        if elem_type in LITERAL_TYPES:
+            return Expression("None" if elem_type == InterpreterBase.NIL_NODE else repr(expr_ast.val), LITERAL_TYPES[elem_type], True)
+        if elem_type == InterpreterBase.VAR_NODE:
+            python_name = self.__lookup(expr_ast.name)
+            if python_name is None:
+                return Expression(f"_fail(ErrorType.NAME_ERROR, {'Variable ' + expr_ast.name + ' not found'!r})")
+            return Expression(python_name, simple=True)
+        if elem_type == InterpreterBase.FCALL_NODE:
+            return self.__call(expr_ast.name, expr_ast.args)
+        if elem_type in self.interpreter.BIN_OPS:
+            return self.__binary_op(elem_type, self.__expression(expr_ast.op1), self.__expression(expr_ast.op2))
+        if elem_type == InterpreterBase.CHAIN_NODE:
+            return self.__chain(expr_ast)
+        if elem_type == InterpreterBase.NEG_NODE:
+            return self.__unary(expr_ast, Type.INT, "-", "_neg")
+        if elem_type == InterpreterBase.NOT_NODE:
+            return self.__unary(expr_ast, Type.BOOL, "not ", "_not")
+        raise Untranslatable(f"no value for {elem_type} expressions in v2")
+
+    # (text giving expression's value, text of it for use again after that); values
+    # that aren't simple are put in a temporary
+    def __once(self, expression):
+        if expression.simple:
+            return expression.text, expression.text
+        temporary = self.__temporary()
+        return f"({temporary} := {expression.text})", temporary
+
+    def __binary_op(self, oper, left, right):
+        left_type, right_type = left.value_type, right.value_type
+        if oper in ("==", "!="):
+            return self.__equality(oper, left, right)
+
+        python_op, native_type, result_type, helper = BINARY_OPS[oper]
+        if oper == "+":
+            # the native add is the one for the type of whichever side's type is known
+            known = [t for t in (left_type, right_type) if t in (Type.INT, Type.STRING)]
+            if known:
+                native_type = result_type = known[0]
+        if left_type == right_type == native_type:
+            return Expression(f"({left.text} {python_op} {right.text})", native_type if result_type is None else result_type)
+        first, left_again = self.__once(left)
+        second, right_again = self.__once(right)
+        python_type = PYTHON_TYPES[native_type]
+        # a literal's type needn't be checked
+        if left.simple and left_type == native_type:
+            guard = f"type({second}) is {python_type}"
+        elif right.simple and right_type == native_type:
+            guard = f"type({first}) is {python_type}"
+        else:
+            guard = f"type({first}) is type({second}) is {python_type}"
+        return Expression(
+            f"({left_again} {python_op} {right_again} if {guard} else {helper}({left_again}, {right_again}))",
+            result_type,
+        )
+
+    # == and != compare values of any two types: values of different types are never
+    # equal
+    def __equality(self, oper, left, right):
+        left_type, right_type = left.value_type, right.value_type
+        equal = oper == "=="
+        if left_type is not None and left_type == right_type:
+            return Expression(f"({left.text} {oper} {right.text})", Type.BOOL)
+        if left_type is not None and right_type is not None:
+            if left.simple and right.simple:
+                return Expression(repr(not equal), Type.BOOL, True)
+            return Expression(f"({left.text}, {right.text}, {not equal!r})[2]", Type.BOOL)
+        literal = other = None
+        if right.simple and right_type is not None:
+            literal, other = right, left
+        elif left.simple and left_type is not None:
+            literal, other = left, right
+        if literal is not None:
+            # against a literal: check the other side is of its type
+            first, again = self.__once(other)
+            if literal.value_type == Type.NIL:
+                return Expression(f"({first} is {'' if equal else 'not '}None)", Type.BOOL)
+            python_type = PYTHON_TYPES[literal.value_type]
+            if equal:
+                return Expression(f"(type({first}) is {python_type} and {again} == {literal.text})", Type.BOOL)
+            return Expression(f"(type({first}) is not {python_type} or {again} != {literal.text})", Type.BOOL)
+        first, left_again = self.__once(left)
+        second, right_again = self.__once(right)
+        # both sides are evaluated before their types are compared
+        if equal:
+            return Expression(f"(type({first}) is type({second}) and {left_again} == {right_again})", Type.BOOL)
+        return Expression(f"(type({first}) is not type({second}) or {left_again} != {right_again})", Type.BOOL)
+
+    # each step of the fold is an operation of its own
+    def __chain(self, chain_ast):
+        oper = chain_ast.op
+        operands = [self.__expression(operand_ast) for operand_ast in chain_ast.operands]
+        if len(operands) <= MAX_NESTED_CHAIN:
+            value = operands[0]
+            for operand in operands[1:]:
+                value = self.__binary_op(oper, value, operand)
+            return value
+        temporary = self.__temporary()
+        steps = [f"({temporary} := {operands[0].text})"]
+        value = Expression(temporary, operands[0].value_type, True)
+        for operand in operands[1:]:
+            step = self.__binary_op(oper, value, operand)
+            steps.append(f"({temporary} := {step.text})")
+            value = Expression(temporary, step.value_type, True)
+        return Expression(f"({', '.join(steps)})[-1]", value.value_type)
+
+    def __unary(self, arith_ast, t, python_op, helper):
+        operand = self.__expression(arith_ast.op1)
+        if operand.value_type == t:
+            return Expression(f"({python_op}{operand.text})", t)
+        first, again = self.__once(operand)
+        return Expression(f"({python_op}{again} if type({first}) is {PYTHON_TYPES[t]} else {helper}({again}))", t)
+
+
+# the Type of a value
+def _type_of(value):
+    if value is None:
+        return Type.NIL
+    return {int: Type.INT, bool: Type.BOOL, str: Type.STRING}[type(value)]
+
+
+# The helpers a transpiled v2 program calls, bound to interpreter. Those for
+# operators are only called once the inline guard has failed, and do what
+# Interpreter.__apply_op does from there.
+def runtime(interpreter):
+    error = interpreter.error
+    helpers = common_runtime(interpreter)
+
+    def make_binary_helper(oper, native_type, python_op):
+        allowed = (native_type, Type.STRING) if oper == "+" else (native_type,)
+        apply = {
+            "+": lambda x, y: x + y, "-": lambda x, y: x - y, "*": lambda x, y: x * y, "//": lambda x, y: x // y,
+            "<": lambda x, y: x < y, "<=": lambda x, y: x <= y, ">": lambda x, y: x > y, ">=": lambda x, y: x >= y,
+            "&": lambda x, y: x & y, "|": lambda x, y: x | y,
+        }[python_op]
+
+        def binary_helper(x, y):
+            x_type = _type_of(x)
+            if x_type != _type_of(y):
+                error(ErrorType.TYPE_ERROR, f"Incompatible types for {oper} operation")
+            if x_type not in allowed:
+                error(ErrorType.TYPE_ERROR, f"Incompatible operator {oper} for type {x_type}")
+            return apply(x, y)
+
+        return binary_helper
+
+    for oper, (python_op, native_type, _, helper) in BINARY_OPS.items():
+        helpers[helper] = make_binary_helper(oper, native_type, python_op)
+
+    def make_unary_helper(oper, t, apply):
+        def unary_helper(x):
+            if _type_of(x) != t:
+                error(ErrorType.TYPE_ERROR, f"Incompatible type for {oper} operation")
+            return apply(x)
+
+        return unary_helper
+
+    helpers["_neg"] = make_unary_helper(InterpreterBase.NEG_NODE, Type.INT, lambda x: -x)
+    helpers["_not"] = make_unary_helper(InterpreterBase.NOT_NODE, Type.BOOL, lambda x: not x)
+
+    def make_condition_check(statement_name):
+        def condition_check(value):
+            if type(value) is not bool:
+                error(ErrorType.TYPE_ERROR, f"Incompatible type for {statement_name} condition")
+            return value
+
+        return condition_check
+
+    helpers["_if_condition"] = make_condition_check("if")
+    helpers["_for_condition"] = make_condition_check("for")
+
+    def printable(value):
+        if value is None:
+            return None
+        if type(value) is bool:
+            return "true" if value else "false"
+        return str(value)
+
+    def text(value):
+        if value is None:
+            return "" + value  # print fails adding nil to its output
+        return printable(value)
+
+    no_prompt = object()
+
+    def make_input(convert):
+        def read_input(prompt=no_prompt):
+            if prompt is not no_prompt:
+                interpreter.output(printable(prompt))
+            inp = interpreter.get_input()
+            return convert(inp)
+
+        return read_input
+
+    helpers["_text"] = text
+    helpers["_inputi"] = make_input(int)
+    helpers["_inputs"] = make_input(lambda inp: inp)
+    return helpers
+
+
+# The transpiled program for program, or None if it can't be translated. The
+# interpreter must have its function table set up for program.
+def transpile(interpreter, program):
+    key = cache_key(
+        "v2", program, interpreter.trace_output, interpreter.folding is not None, interpreter.elimination is not None,
+        interpreter.inlining is not None
+    )
+    return CACHE.get_or_make(key, lambda: Transpiler(interpreter).transpile())
+
+
+def main():
+    from interpreter_v_2.interpreterv2 import Interpreter
+
+    arg_parser = argparse.ArgumentParser(description="Print the Python a v2 Brewin program translates to.")
+    arg_parser.add_argument("path")
+    args = arg_parser.parse_args()
+
+    with open(args.path) as f:
+        program = f.read()
+    interpreter = Interpreter(engine="python")
+    interpreter.load(program)
+    print(Transpiler(interpreter).transpile().source, end="")
+
+
+if __name__ == "__main__":
+    main()
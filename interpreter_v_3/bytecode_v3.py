@@ -0,0 +1,575 @@
+# A bytecode format for v3 programs, the compiler from their ASTs to it, and a
+# disassembler. vm_v3.py runs the result.
+#
+# Each function compiles to a CodeObject: a list of (opcode, argument) instructions
+# for a stack machine. Variables live in numbered slots of their function's frame,
+# worked out from the program text: the blocks of a function are nested scopes, and
+# a `var` statement gets a slot of its own that it resets to the type's default each
+# time it runs. Types are checked as the code is generated, with the same rules as
+# compile_v3.py, so the instructions never look at a value's type: `a + b` on ints
+# is an ADD, coercing an int to a bool a TO_BOOL where one is stored in a bool slot,
+# and code that fails a type check becomes a FAIL, reached only if the faulty line
+# is.
+#
+# A CodeObject's line table maps each instruction back to the statement it came
+# from (for a for loop's init, condition and update, the for statement), so errors
+# name the same line as in the tree walker.
+#
+# The same format, run by the same VM, carries v4 programs, which
+# interpreter_v_4/bytecode_v4.py compiles: the opcodes after TRACE are only in their
+# code, for lazy values, raise and try/catch.
+#
+# To print the bytecode of a program:
+#   python -m interpreter_v_3.bytecode_v3 PROGRAM.br
+import argparse
+import bisect
+import operator
+
+from intbase import ErrorType, InterpreterBase
+from interpreter_v_3.compile_v3 import DEFAULTS, LITERAL_TYPES, conversion, operation, printable, resolve_path
+from interpreter_v_3.type_v3 import Type, Value
+
+# opcodes, most used first, which is the order the VM tests for them in; v4's come
+# after all of v3's, so that v3's code doesn't pay for them
+OPCODES = (
+    "LOAD",  # push the local in slot arg
+    "CONST",  # push arg
+    "STORE",  # pop into the local in slot arg
+    "GET_FIELD",  # replace the struct on top with its field arg[0], failing with message arg[1] if it's nil
+    "ADD",
+    "SUB",
+    "MUL",
+    "DIV",
+    "LT",
+    "LE",
+    "GT",
+    "GE",
+    "EQ",
+    "NE",
+    "JUMP_IF_FALSE",  # pop, and go to instruction arg if it's false (or 0)
+    "JUMP",
+    "CALL",  # call CodeObject arg[0] with the top arg[1] values as its arguments
+    "RETURN",  # return the top value to the caller
+    "POP",
+    "SET_FIELD",  # pop a value, then a struct, and set the struct's field arg to the value
+    "CHECK_NIL",  # fail with message arg if the struct on top is nil
+    "IS",
+    "IS_NOT",
+    "APPLY",  # replace the top two values with arg(second, top)
+    "NEG",
+    "NOT",
+    "TO_BOOL",
+    "NEW",  # push a new struct with the fields and defaults in dict arg
+    "CONCAT",  # pop a value and add it to the string below, turned into text by arg
+    "PRINT",  # pop a string and print it, then push void
+    "PROMPT",  # pop a value and output it, turned into text by arg
+    "INPUT",  # read a line of input and push it, converted by arg if it isn't None
+    "FAIL",  # raise an error of type arg[0] with message arg[1]
+    "TRACE",  # print statement arg, when running with trace output
+    "FORCE",  # evaluate the lazy value on top, and what that gives, failing with message arg if it's undefined
+    "FORCE_ONCE",  # evaluate the lazy value on top, but not what that gives
+    "THUNK",  # push a lazy value of CodeObject arg[0], in the locals, or a copy of them if arg[1]
+    "END_THUNK",  # return the top value from a lazy value's code, as the value it keeps
+    # call CodeObject arg[0], with lazy values of arg[2] (CodeObjects, or Values as they are) in its slots arg[1],
+    # each in the locals, or in one copy of them if arg[3]
+    "CALL_LAZY",
+    "COND",  # replace the Value on top with its value, failing with message arg[1] unless it's of type arg[0]
+    "SWAP",
+    # fail unless the Value on top is of type arg[0]; if its truth is arg[1], make it arg[2] and go to arg[3]
+    "SHORT_CIRCUIT",
+    "APPLY1",  # replace the top value with arg(top)
+    "VIEW",  # save the locals under the top, and run on a copy holding the running function's variables arg
+    "END_VIEW",  # drop the view, leaving the top value, and go back to the locals saved under it
+    "RAISE",  # pop a Value and raise it, failing with message arg[1] unless it's of type arg[0]
+    "SETUP_TRY",  # until the matching POP_TRY, catch what's raised at instruction arg, with the stack as it is now
+    "POP_TRY",
+    "CATCH",  # pop what was raised and go to the instruction arg gives for its value, or raise it again
+)
+(
+    LOAD, CONST, STORE, GET_FIELD, ADD, SUB, MUL, DIV, LT, LE, GT, GE, EQ, NE, JUMP_IF_FALSE, JUMP, CALL, RETURN,
+    POP, SET_FIELD, CHECK_NIL, IS, IS_NOT, APPLY, NEG, NOT, TO_BOOL, NEW, CONCAT, PRINT, PROMPT, INPUT, FAIL, TRACE,
+    FORCE, FORCE_ONCE, THUNK, END_THUNK, CALL_LAZY, COND, SWAP, SHORT_CIRCUIT, APPLY1, VIEW, END_VIEW, RAISE,
+    SETUP_TRY, POP_TRY, CATCH,
+) = range(len(OPCODES))
+
+# the opcode for each function operation() gives that has one
+OPERATOR_OPCODES = {
+    operator.add: ADD,
+    operator.sub: SUB,
+    operator.mul: MUL,
+    operator.floordiv: DIV,
+    operator.lt: LT,
+    operator.le: LE,
+    operator.gt: GT,
+    operator.ge: GE,
+    operator.eq: EQ,
+    operator.ne: NE,
+    operator.is_: IS,
+    operator.is_not: IS_NOT,
+}
+
+JUMPS = (JUMP, JUMP_IF_FALSE, SETUP_TRY)
+
+
+class CodeObject:
+    def __init__(self, name, n_params):
+        self.name = name
+        self.n_params = n_params  # arguments arrive in the first n_params slots
+        self.n_locals = n_params
+        self.slot_names = []
+        self.instructions = []
+        self.line_pcs = []  # the first instruction of each run from one statement
+        self.line_statements = []  # and that statement
+        self.lazy = False  # code evaluating a lazy value (v4), rather than a function's
+
+    # the statement instruction pc came from, or None
+    def statement_at(self, pc):
+        i = bisect.bisect_right(self.line_pcs, pc) - 1
+        return self.line_statements[i] if i >= 0 else None
+
+
+class BytecodeCompiler:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.type_manager = interpreter.type_manager
+        self.error = interpreter.error
+        self.codes = {}  # function AST node -> its CodeObject
+        for candidate_funcs in interpreter.func_name_to_ast.values():
+            for func_ast in candidate_funcs.values():
+                self.codes[func_ast] = CodeObject(func_ast.name, len(func_ast.args))
+        self.__code = None  # being compiled
+        self.__scopes = []  # name -> (slot, declared type), for each block of the function being compiled
+        self.__return_type = None
+        self.__statement = None  # the statement instructions are being generated for
+        self.__statement_compilers = {
+            InterpreterBase.FCALL_NODE: self.__fcall_statement,
+            "=": self.__assign,
+            InterpreterBase.VAR_DEF_NODE: self.__var_def,
+            InterpreterBase.RETURN_NODE: self.__return,
+            InterpreterBase.IF_NODE: self.__if,
+            InterpreterBase.FOR_NODE: self.__for,
+        }
+        self.__expression_compilers = {
+            InterpreterBase.NIL_NODE: self.__nil,
+            InterpreterBase.INT_NODE: self.__constant,
+            InterpreterBase.STRING_NODE: self.__constant,
+            InterpreterBase.BOOL_NODE: self.__constant,
+            InterpreterBase.VAR_NODE: self.__variable,
+            InterpreterBase.FCALL_NODE: lambda fcall_ast: self.__call(fcall_ast.name, fcall_ast.args),
+            InterpreterBase.NEW_NODE: self.__new,
+            InterpreterBase.CHAIN_NODE: self.__chain,
+            InterpreterBase.NEG_NODE: self.__neg,
+            InterpreterBase.NOT_NODE: self.__not,
+        }
+        for oper in interpreter.BIN_OPS:
+            self.__expression_compilers[oper] = self.__binary_op
+
+    # the CodeObject the program starts from, which calls main; every function is
+    # compiled along with it
+    def compile_program(self):
+        for func_ast, code in self.codes.items():
+            self.__compile_function(code, func_ast)
+        entry = CodeObject("<program>", 0)
+        self.__code = entry
+        self.__call("main", [])
+        self.__emit(RETURN)
+        self.__finish(entry)
+        return entry
+
+    def __compile_function(self, code, func_ast):
+        self.__code = code
+        self.__scopes = [{}]
+        for slot, formal_ast in enumerate(func_ast.args):
+            # a repeated parameter name is the last argument given for it
+            self.__scopes[0][formal_ast.name] = (slot, formal_ast.var_type)
+            code.slot_names.append(formal_ast.name)
+        self.__return_type = func_ast.return_type
+        self.__block(func_ast.statements)
+        self.__emit(CONST, DEFAULTS.get(func_ast.return_type))  # no return statement gives the default
+        self.__emit(RETURN)
+        self.__finish(code)
+
+    def __emit(self, opcode, arg=None):
+        code = self.__code
+        if not code.line_statements or code.line_statements[-1] is not self.__statement:
+            code.line_pcs.append(len(code.instructions))
+            code.line_statements.append(self.__statement)
+        code.instructions.append((opcode, arg))
+        return len(code.instructions) - 1
+
+    def __here(self):
+        return len(self.__code.instructions)
+
+    # point the jump at instruction pc to the next instruction to be generated
+    def __land(self, pc):
+        opcode, _ = self.__code.instructions[pc]
+        self.__code.instructions[pc] = (opcode, self.__here())
+
+    def __fail(self, error_type, message):
+        self.__emit(FAIL, (error_type, message))
+
+    @staticmethod
+    def __finish(code):
+        code.instructions = tuple(code.instructions)
+
+    # statements
+
+    def __block(self, statements):
+        trace_output = self.interpreter.trace_output
+        self.__scopes.append({})
+        outer_statement = self.__statement
+        for statement in statements:
+            self.__statement = statement
+            if trace_output:
+                self.__emit(TRACE, statement)
+            compile_fn = self.__statement_compilers.get(statement.elem_type)
+            if compile_fn is not None:  # anything else, e.g. an expression statement other than a call, does nothing
+                compile_fn(statement)
+        self.__statement = outer_statement
+        self.__scopes.pop()
+
+    def __statement_in_place(self, statement):
+        compile_fn = self.__statement_compilers.get(statement.elem_type)
+        if compile_fn is not None:
+            compile_fn(statement)
+
+    def __fcall_statement(self, call_ast):
+        self.__call(call_ast.name, call_ast.args)
+        self.__emit(POP)
+
+    def __assign(self, assign_ast):
+        var_name = assign_ast.name
+        path = assign_ast.path
+        if path is None:
+            variable = self.__lookup(var_name)
+            if variable is None:
+                self.__fail(ErrorType.NAME_ERROR, f"Undefined variable {var_name}")
+                return
+            slot, lhs_type = variable
+        else:
+            lhs_type = self.__field_path(var_name, path, to_holder=True)
+            if lhs_type is None:
+                return  # fails finding the field, before the right side is evaluated
+        rhs_type = self.__expression(assign_ast.expression)
+        convert = conversion(lhs_type, rhs_type, self.type_manager)
+        if convert is False:
+            self.__fail(ErrorType.TYPE_ERROR, f"Type mismatch {lhs_type} vs {rhs_type} in assignment")
+            return
+        if convert is bool:
+            self.__emit(TO_BOOL)
+        if path is None:
+            self.__emit(STORE, slot)
+        else:
+            self.__emit(SET_FIELD, path.fields[-1])
+
+    def __var_def(self, var_ast):
+        var_name = var_ast.name
+        var_type = var_ast.var_type
+        type_manager = self.type_manager
+        if type_manager.create_default_value(var_type) is None or not type_manager.valid_var_type(var_type):
+            self.__fail(ErrorType.TYPE_ERROR, f"Unknown/invalid type specified {var_type}")
+            return
+        scope = self.__scopes[-1]
+        if var_name in scope:
+            self.__fail(ErrorType.NAME_ERROR, f"Duplicate definition for variable {var_name}")
+            return
+        code = self.__code
+        slot = code.n_locals
+        code.n_locals += 1
+        code.slot_names.append(var_name)
+        scope[var_name] = (slot, var_type)
+        self.__emit(CONST, DEFAULTS.get(var_type))
+        self.__emit(STORE, slot)
+
+    def __return(self, return_ast):
+        return_type = self.__return_type
+        if return_ast.expression is None:
+            self.__emit(CONST, DEFAULTS.get(return_type))
+            self.__emit(RETURN)
+            return
+        value_type = self.__expression(return_ast.expression)
+        if value_type == Type.VOID:
+            self.__fail(ErrorType.TYPE_ERROR, "Cannot use void in return value")
+            return
+        convert = conversion(return_type, value_type, self.type_manager)
+        if convert is False:
+            self.__fail(
+                ErrorType.TYPE_ERROR,
+                f"Returned value's type {value_type} is inconsistent with function's return type {return_type}",
+            )
+            return
+        if convert is bool:
+            self.__emit(TO_BOOL)
+        self.__emit(RETURN)
+
+    # evaluate the condition of an if or for statement, and jump if it's false; gives
+    # the jump, to be landed
+    def __condition(self, condition_ast, statement_name):
+        condition_type = self.__expression(condition_ast)
+        if condition_type not in (Type.BOOL, Type.INT, None):
+            self.__fail(ErrorType.TYPE_ERROR, f"Incompatible type for {statement_name} condition")
+        return self.__emit(JUMP_IF_FALSE)
+
+    def __if(self, if_ast):
+        to_else = self.__condition(if_ast.condition, "if")
+        self.__block(if_ast.statements)
+        if if_ast.else_statements is None:
+            self.__land(to_else)
+            return
+        to_end = self.__emit(JUMP)
+        self.__land(to_else)
+        self.__block(if_ast.else_statements)
+        self.__land(to_end)
+
+    def __for(self, for_ast):
+        self.__statement_in_place(for_ast.init)
+        loop = self.__here()
+        to_end = self.__condition(for_ast.condition, "for")
+        self.__block(for_ast.statements)
+        self.__statement_in_place(for_ast.update)
+        self.__emit(JUMP, loop)
+        self.__land(to_end)
+
+    # calls
+
+    # generate a call of function name with the expressions args as arguments; gives
+    # the type it returns
+    def __call(self, name, args):
+        if name == "print":
+            self.__print(args)
+            return Type.VOID
+        if name == "inputi" or name == "inputs":
+            return self.__input(name, args)
+
+        candidate_funcs = self.interpreter.func_name_to_ast.get(name)
+        if candidate_funcs is None:
+            self.__fail(ErrorType.NAME_ERROR, f"Function {name} not found")
+            return None
+        func_ast = candidate_funcs.get(len(args))
+        if func_ast is None:
+            self.__fail(ErrorType.NAME_ERROR, f"Function {name} taking {len(args)} params not found")
+            return None
+        for formal_ast, actual_ast in zip(func_ast.args, args):
+            arg_type = self.__expression(actual_ast)
+            convert = conversion(formal_ast.var_type, arg_type, self.type_manager)
+            if convert is False:
+                self.__fail(ErrorType.TYPE_ERROR, f"Type mismatch on formal parameter {formal_ast.name}")
+            elif convert is bool:
+                self.__emit(TO_BOOL)
+        self.__emit(CALL, (self.codes[func_ast], len(args)))
+        return func_ast.return_type
+
+    # the argument of print or inputi evaluated, and failing if it's void; gives the
+    # function turning it into text
+    def __printed_arg(self, arg_ast):
+        arg_type = self.__expression(arg_ast)
+        if arg_type == Type.VOID:
+            self.__fail(ErrorType.TYPE_ERROR, "Void not allowed as argument")
+        return printable(arg_type)
+
+    def __print(self, args):
+        self.__emit(CONST, "")
+        for arg in args:
+            self.__emit(CONCAT, self.__printed_arg(arg))
+        self.__emit(PRINT)
+
+    def __input(self, name, args):
+        if len(args) > 1:
+            self.__fail(ErrorType.NAME_ERROR, "No inputi() function that takes > 1 parameter")
+            return None
+        if args:
+            self.__emit(PROMPT, self.__printed_arg(args[0]))
+        if name == "inputi":
+            self.__emit(INPUT, int)
+            return Type.INT
+        self.__emit(INPUT, None)
+        return Type.STRING
+
+    # expressions
+
+    # generate code leaving the expression's value on the stack; gives its type
+    def __expression(self, expr_ast):
+        compile_fn = self.__expression_compilers.get(expr_ast.elem_type)
+        if compile_fn is None:
+            self.__emit(CONST, None)  # the tree walker has no value for it either
+            return None
+        return compile_fn(expr_ast)
+
+    def __nil(self, nil_ast):
+        self.__emit(CONST, None)
+        return Type.NIL
+
+    def __constant(self, literal_ast):
+        self.__emit(CONST, literal_ast.val)
+        return LITERAL_TYPES[literal_ast.elem_type]
+
+    # (slot, declared type) of the variable var_name can see at this point, or None
+    def __lookup(self, var_name):
+        for scope in reversed(self.__scopes):
+            if var_name in scope:
+                return scope[var_name]
+        return None
+
+    def __variable(self, var_ast):
+        var_name = var_ast.name
+        path = var_ast.path
+        if path is None:
+            variable = self.__lookup(var_name)
+            if variable is None:
+                self.__fail(ErrorType.NAME_ERROR, f"Undefined variable {var_name}")
+                return None
+            slot, var_type = variable
+            self.__emit(LOAD, slot)
+            return var_type
+        return self.__field_path(var_name, path)
+
+    # generate code leaving the value of the last field in path on the stack, or with
+    # to_holder the struct holding it; gives the field's type, or None if a dot in
+    # path can't be followed, having generated the code failing there
+    def __field_path(self, var_name, path, to_holder=False):
+        base_name = path.base
+        base = self.__lookup(base_name)
+        if base is None:
+            self.__fail(ErrorType.NAME_ERROR, f"Undefined variable {base_name}")
+            return None
+        slot, base_type = base
+        steps, field_type, failure = resolve_path(var_name, path, base_type, self.type_manager.struct_defs)
+        self.__emit(LOAD, slot)
+        if failure is None and not to_holder:
+            for field_name, owner_name in steps:
+                self.__emit(GET_FIELD, (field_name, f"Error dereferencing nil value {owner_name} in {var_name}"))
+            return field_type
+        for field_name, owner_name in steps[:-1]:
+            self.__emit(GET_FIELD, (field_name, f"Error dereferencing nil value {owner_name} in {var_name}"))
+        if steps:
+            self.__emit(CHECK_NIL, f"Error dereferencing nil value {steps[-1][1]} in {var_name}")
+        if failure is not None:
+            self.__fail(*failure)
+        return field_type
+
+    def __new(self, new_ast):
+        var_type = new_ast.var_type
+        fields = self.type_manager.struct_defs.get(var_type)
+        if fields is None:
+            self.__fail(ErrorType.TYPE_ERROR, f"Invalid type {var_type} for new operation")
+            return None
+        self.__emit(NEW, {field_name: DEFAULTS.get(field.type()) for field_name, field in fields.items()})
+        return var_type
+
+    # apply oper to the two values on top of the stack; gives the result's type
+    def __operation(self, oper, left_type, right_type):
+        f, result_type = operation(oper, left_type, right_type, self.type_manager, self.error)
+        if f is None:
+            return None  # an operand always fails before this is reached
+        opcode = OPERATOR_OPCODES.get(f)
+        if opcode is not None:
+            self.__emit(opcode)
+        else:
+            self.__emit(APPLY, f)
+        return result_type
+
+    def __binary_op(self, arith_ast):
+        left_type = self.__expression(arith_ast.op1)
+        right_type = self.__expression(arith_ast.op2)
+        return self.__operation(arith_ast.elem_type, left_type, right_type)
+
+    def __chain(self, chain_ast):
+        oper = chain_ast.op
+        value_type = self.__expression(chain_ast.operands[0])
+        for operand_ast in chain_ast.operands[1:]:
+            operand_type = self.__expression(operand_ast)
+            value_type = self.__operation(oper, value_type, operand_type)
+        return value_type
+
+    def __neg(self, neg_ast):
+        op_type = self.__expression(neg_ast.op1)
+        if op_type is None:
+            return None
+        if op_type != Type.INT:
+            self.__fail(ErrorType.TYPE_ERROR, f"Incompatible type for {neg_ast.elem_type} operation")
+            return None
+        self.__emit(NEG)
+        return Type.INT
+
+    def __not(self, not_ast):
+        op_type = self.__expression(not_ast.op1)
+        if op_type is None:
+            return None
+        if op_type not in (Type.BOOL, Type.INT):
+            self.__fail(ErrorType.TYPE_ERROR, f"Incompatible type for {not_ast.elem_type} operation")
+            return None
+        self.__emit(NOT)
+        return Type.BOOL
+
+
+# the instructions of code as text, one per line, with the line of the statement
+# each run of them came from
+def disassemble(code):
+    lines = [f"{code.name} ({code.n_params} params, {code.n_locals} locals):"]
+    starts = set(code.line_pcs)
+    for pc, (opcode, arg) in enumerate(code.instructions):
+        statement = code.statement_at(pc)
+        line = statement.line if pc in starts and statement is not None else ""
+        lines.append(f"{line:>6} {pc:5d} {OPCODES[opcode]:14}{_describe(code, opcode, arg)}".rstrip())
+    return "\n".join(lines)
+
+
+def _describe(code, opcode, arg):
+    if opcode in (LOAD, STORE):
+        return f"{arg} ({code.slot_names[arg]})"
+    if opcode == CALL:
+        callee, n_args = arg
+        return f"{callee.name} ({n_args} args)"
+    if opcode == CALL_LAZY:
+        callee, _, args, _ = arg
+        return f"{callee.name} ({', '.join(_lazy_name(arg) for arg in args)})"
+    if opcode == THUNK:
+        return _lazy_name(arg[0]) + (" (copying the locals)" if arg[1] else "")
+    if opcode == VIEW:
+        return ", ".join(name for _, name in arg)
+    if opcode == SHORT_CIRCUIT:
+        return f"to {arg[3]} if {str(arg[1]).lower()}"
+    if opcode == CATCH:
+        return ", ".join(f"{exception_type!r} to {pc}" for exception_type, pc in arg.items())
+    if opcode in (COND, RAISE):
+        return arg[1]
+    if opcode == CONST and isinstance(arg, Value):  # v4's
+        return _lazy_name(arg)
+    if opcode in JUMPS:
+        return f"to {arg}"
+    if opcode == GET_FIELD:
+        return arg[0]
+    if opcode == FAIL:
+        return f"{arg[0]}: {arg[1]}"
+    if opcode in (APPLY, APPLY1, CONCAT, PROMPT, INPUT):
+        return getattr(arg, "__name__", "") if arg is not None else ""
+    if opcode == TRACE:
+        return ""
+    return "" if arg is None else repr(arg)
+
+
+# an argument of CALL_LAZY: the CodeObject of a lazy value, or a Value
+def _lazy_name(arg):
+    if isinstance(arg, CodeObject):
+        return arg.name
+    return "nil" if arg.t == Type.NIL else repr(arg.v)
+
+
+def main():
+    from interpreter_v_3.interpreterv3 import Interpreter
+
+    arg_parser = argparse.ArgumentParser(description="Print the bytecode a v3 Brewin program compiles to.")
+    arg_parser.add_argument("path")
+    args = arg_parser.parse_args()
+
+    with open(args.path) as f:
+        program = f.read()
+    interpreter = Interpreter()
+    interpreter.load(program)
+    compiler = BytecodeCompiler(interpreter)
+    entry = compiler.compile_program()
+    print("\n\n".join(disassemble(code) for code in [entry, *compiler.codes.values()]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,635 @@
+# Compiles a v3 program into trees of Python closures, like compile_v2 does for v2,
+# but type-checking each function as it goes. Every variable, parameter, field and
+# return has a declared type, and each v3 operation's result type follows from its
+# operands' types alone, so the type of every expression is known before it runs.
+# The checks, coercions and operator lookups the tree walker does on every step are
+# done here once per node instead: `a + b` on two ints compiles to a plain integer
+# add, an int is turned into a bool only where one flows into a bool slot, and a
+# well-typed program runs without looking at a single type.
+#
+# Since the types are known, values are kept as bare Python values rather than
+# Values: an int, a bool, a str, a struct as a dict of field name -> value, and nil
+# (or a nil struct, or void) as None. Code that would fail a type check compiles to
+# a closure that evaluates whatever the tree walker would have evaluated first and
+# then raises the same error, so a type error still only fires when its line is
+# reached. Dereferencing nil is the one check left at run time, as it depends on the
+# value rather than the type.
+#
+# The type of an expression is None when it can never produce a value, e.g. a call
+# to a function that doesn't exist; nothing after it is ever run.
+#
+# A statement closure returns None, or a 1-tuple of the value being returned when it
+# (or a statement inside it) executes a return.
+import operator
+
+from intbase import BrewinError, ErrorType, InterpreterBase
+from interpreter_v_3.type_v3 import Type, Variable
+from resolve import declares_variables
+
+# the value a variable or field of each non-struct type starts out with; structs
+# start out nil
+DEFAULTS = {Type.INT: 0, Type.BOOL: False, Type.STRING: "", Type.VOID: None}
+
+LITERAL_TYPES = {
+    InterpreterBase.INT_NODE: Type.INT,
+    InterpreterBase.STRING_NODE: Type.STRING,
+    InterpreterBase.BOOL_NODE: Type.BOOL,
+}
+
+# (function, result type) of each operator the tree walker finds in op_to_lambda,
+# by operand type
+TYPED_OPS = {
+    Type.INT: {
+        "+": (operator.add, Type.INT),
+        "-": (operator.sub, Type.INT),
+        "*": (operator.mul, Type.INT),
+        "/": (operator.floordiv, Type.INT),
+        "==": (operator.eq, Type.BOOL),
+        "!=": (operator.ne, Type.BOOL),
+        "<": (operator.lt, Type.BOOL),
+        "<=": (operator.le, Type.BOOL),
+        ">": (operator.gt, Type.BOOL),
+        ">=": (operator.ge, Type.BOOL),
+    },
+    Type.STRING: {"+": (operator.add, Type.STRING)},
+    Type.VOID: {},
+}
+
+PRINTABLE = {
+    Type.INT: str,
+    Type.STRING: lambda v: v,
+    Type.BOOL: lambda v: "true" if v is True else "false",
+    Type.NIL: lambda v: "nil",
+}
+
+
+# what get_printable gives for a struct: nothing for one that isn't nil, which
+# print then fails to add to its output
+def _printable_struct(v):
+    return "nil" if v is None else None
+
+
+def _bool_or(x, y):
+    return bool(x) or bool(y)
+
+
+def _bool_and(x, y):
+    return bool(x) and bool(y)
+
+
+def _bool_eq(x, y):
+    return bool(x) == bool(y)
+
+
+def _bool_ne(x, y):
+    return bool(x) != bool(y)
+
+
+# None if a value of value_type is stored as is in a slot (a variable, parameter,
+# field or return value) of slot_type, the function coercing it if it has to be, or
+# False if it can't be stored there
+def conversion(slot_type, value_type, type_manager):
+    if value_type is None or slot_type == value_type:
+        return None
+    if slot_type == Type.BOOL and value_type == Type.INT:
+        return bool
+    if type_manager.is_struct_type(slot_type) and value_type == Type.NIL:
+        return None  # nil and a nil struct are both None
+    return False
+
+
+def printable(value_type):
+    return PRINTABLE.get(value_type, _printable_struct)
+
+
+# (function applying oper to values of types left_type and right_type, the type of
+# its result, failure), decided as the tree walker's __apply_op decides. failure is
+# None, or the (error type, message) the tree walker raises once both operands are
+# evaluated, if the types don't go with oper; the function and type are None then.
+# All three are None if an operand never has a value.
+def resolve_operation(oper, left_type, right_type, type_manager):
+    if left_type is None or right_type is None:
+        return None, None, None  # never applied
+    if left_type == right_type and oper in TYPED_OPS.get(left_type, ()):
+        return (*TYPED_OPS[left_type][oper], None)
+    is_struct_type = type_manager.is_struct_type
+    types = (left_type, right_type)
+
+    def failing(error_type, message):
+        return None, None, (error_type, message)
+
+    if oper in ("==", "!="):
+        equal = oper == "=="
+        if Type.VOID in types:
+            return failing(ErrorType.TYPE_ERROR, "Can't compare void type")
+        if left_type == right_type:
+            if left_type == Type.NIL or is_struct_type(left_type):
+                return operator.is_ if equal else operator.is_not, Type.BOOL, None  # by reference
+            return operator.eq if equal else operator.ne, Type.BOOL, None
+        if Type.NIL in types:
+            if is_struct_type(left_type) or is_struct_type(right_type):
+                return operator.is_ if equal else operator.is_not, Type.BOOL, None  # nil is None too
+            return failing(ErrorType.TYPE_ERROR, "Can't compare type to nil")
+        if Type.BOOL in types and Type.INT in types:
+            return _bool_eq if equal else _bool_ne, Type.BOOL, None
+        return failing(ErrorType.TYPE_ERROR, f"Can't compare unrelated types {left_type} and {right_type}")
+
+    if oper in ("||", "&&"):
+        if Type.VOID in types:
+            return failing(ErrorType.TYPE_ERROR, "Can't compare void type")
+        if left_type not in (Type.BOOL, Type.INT) or right_type not in (Type.BOOL, Type.INT):
+            return failing(ErrorType.TYPE_ERROR, f"Invalid types used with operator {oper}")
+        # both sides are always evaluated, as in the tree walker
+        if types == (Type.BOOL, Type.BOOL):
+            return operator.or_ if oper == "||" else operator.and_, Type.BOOL, None
+        return _bool_or if oper == "||" else _bool_and, Type.BOOL, None
+
+    return failing(ErrorType.TYPE_ERROR, f"Incompatible operator {oper} for types {left_type} and {right_type}")
+
+
+# resolve_operation's function and result type, with a function raising the tree
+# walker's error through error in place of a failure
+def operation(oper, left_type, right_type, type_manager, error):
+    f, result_type, failure = resolve_operation(oper, left_type, right_type, type_manager)
+    if failure is not None:
+        return (lambda x, y: error(*failure)), None
+    return f, result_type
+
+
+# The dots in the dotted name var_name, whose fieldpath node is path, followed through
+# the declared types starting from base_type: (steps, field type, failure). steps
+# are (field, name of the struct it's in) for each dot. failure is None, or the
+# (error type, message) the tree walker raises at the first dot that can't be
+# followed, once every step but the last has been taken and the struct the last
+# one is in has been checked for nil; the field type is None then.
+def resolve_path(var_name, path, base_type, struct_defs):
+    steps = []
+    owner_name = path.base
+    field_type = base_type
+    for field_name in path.fields:
+        if field_type not in struct_defs:
+            # the tree walker names the Variable holding the value, at some address
+            return steps, None, (ErrorType.TYPE_ERROR, f"Dot used with non-struct {Variable(field_type)} in {var_name}")
+        steps.append((field_name, owner_name))
+        field = struct_defs[field_type].get(field_name)
+        if field is None:
+            return steps, None, (ErrorType.NAME_ERROR, f"Unknown member {field_name} in {var_name}")
+        field_type = field.type()
+        owner_name = field_name
+    return steps, field_type, None
+
+
+class Compiler:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.env = interpreter.env
+        self.type_manager = interpreter.type_manager
+        self.bodies = {}  # function AST node -> closure running its body
+        self.__scopes = []  # name -> declared type, for each block of the function being compiled
+        self.__return_type = None  # of the function being compiled
+        self.__statement_compilers = {
+            InterpreterBase.FCALL_NODE: self.__fcall_statement,
+            "=": self.__assign,
+            InterpreterBase.VAR_DEF_NODE: self.__var_def,
+            InterpreterBase.RETURN_NODE: self.__return,
+            InterpreterBase.IF_NODE: self.__if,
+            InterpreterBase.FOR_NODE: self.__for,
+        }
+        self.__expression_compilers = {
+            InterpreterBase.NIL_NODE: lambda nil_ast: (lambda: None, Type.NIL),
+            InterpreterBase.INT_NODE: self.__constant,
+            InterpreterBase.STRING_NODE: self.__constant,
+            InterpreterBase.BOOL_NODE: self.__constant,
+            InterpreterBase.VAR_NODE: self.__variable,
+            InterpreterBase.FCALL_NODE: lambda fcall_ast: self.compile_call(fcall_ast.name, fcall_ast.args),
+            InterpreterBase.NEW_NODE: self.__new,
+            InterpreterBase.CHAIN_NODE: self.__chain,
+            InterpreterBase.NEG_NODE: self.__neg,
+            InterpreterBase.NOT_NODE: self.__not,
+        }
+        for oper in interpreter.BIN_OPS:
+            self.__expression_compilers[oper] = self.__binary_op
+
+    # a closure that evaluates each of closures in turn, then raises error_type
+    def __failing(self, error_type, message, *closures):
+        error = self.interpreter.error
+
+        def fail():
+            for closure in closures:
+                closure()
+            error(error_type, message)
+
+        return fail
+
+    # statements
+
+    # a closure running statements in a block of their own, if they need one
+    def compile_block(self, statements):
+        interpreter = self.interpreter
+        self.__scopes.append({})
+        compiled = tuple((self.compile_statement(statement), statement) for statement in statements)
+        self.__scopes.pop()
+        trace_output = interpreter.trace_output
+        locate_error = interpreter.locate_error
+
+        def run_statements():
+            for run, statement in compiled:
+                if trace_output:
+                    print(statement)
+                try:
+                    returned = run()
+                except BrewinError as error:
+                    locate_error(error, statement)
+                    raise
+                if returned is not None:
+                    return returned
+            return None
+
+        # a block that defines no variables of its own needs no scope: the
+        # variables its statements use are all in the blocks around it
+        if not declares_variables(statements):
+            return run_statements
+        push_block = self.env.push_block
+        pop_block = self.env.pop_block
+
+        def run_block():
+            push_block()
+            for run, statement in compiled:
+                if trace_output:
+                    print(statement)
+                try:
+                    returned = run()
+                except BrewinError as error:
+                    locate_error(error, statement)
+                    raise
+                if returned is not None:
+                    pop_block()
+                    return returned
+            pop_block()
+            return None
+
+        return run_block
+
+    def compile_statement(self, statement):
+        compile_fn = self.__statement_compilers.get(statement.elem_type)
+        if compile_fn is None:
+            return lambda: None  # e.g. an expression statement other than a call
+        return compile_fn(statement)
+
+    def __fcall_statement(self, call_ast):
+        call, _ = self.compile_call(call_ast.name, call_ast.args)
+
+        def run_call():
+            call()
+
+        return run_call
+
+    def __assign(self, assign_ast):
+        var_name = assign_ast.name
+        path = assign_ast.path
+        expression, rhs_type = self.compile_expr(assign_ast.expression)
+        if path is None:
+            lhs_type = self.__lookup(var_name)
+            if lhs_type is None:
+                return self.__failing(ErrorType.NAME_ERROR, f"Undefined variable {var_name}")
+        else:
+            holder, lhs_type = self.__field_holder(var_name, path)
+            if lhs_type is None:
+                return holder  # fails finding the field, before the right side is evaluated
+        convert = conversion(lhs_type, rhs_type, self.type_manager)
+        if convert is False:
+            evaluated = (expression,) if path is None else (holder, expression)
+            return self.__failing(
+                ErrorType.TYPE_ERROR, f"Type mismatch {lhs_type} vs {rhs_type} in assignment", *evaluated
+            )
+        if convert is not None:
+            expression = self.__converting(expression, convert)
+
+        if path is None:
+            env_set = self.env.set
+
+            def assign():
+                env_set(var_name, expression())
+
+            return assign
+
+        field_name = path.fields[-1]
+
+        def assign_field():
+            fields = holder()
+            fields[field_name] = expression()
+
+        return assign_field
+
+    def __var_def(self, var_ast):
+        var_name = var_ast.name
+        var_type = var_ast.var_type
+        type_manager = self.type_manager
+        if type_manager.create_default_value(var_type) is None or not type_manager.valid_var_type(var_type):
+            return self.__failing(ErrorType.TYPE_ERROR, f"Unknown/invalid type specified {var_type}")
+        scope = self.__scopes[-1]
+        if var_name in scope:
+            return self.__failing(ErrorType.NAME_ERROR, f"Duplicate definition for variable {var_name}")
+        scope[var_name] = var_type
+        default = DEFAULTS.get(var_type)
+        env_create = self.env.create
+
+        def var_def():
+            env_create(var_name, default)
+
+        return var_def
+
+    def __return(self, return_ast):
+        return_type = self.__return_type
+        if return_ast.expression is None:
+            returned = (DEFAULTS.get(return_type),)
+            return lambda: returned
+        expression, value_type = self.compile_expr(return_ast.expression)
+        if value_type == Type.VOID:
+            return self.__failing(ErrorType.TYPE_ERROR, "Cannot use void in return value", expression)
+        convert = conversion(return_type, value_type, self.type_manager)
+        if convert is False:
+            return self.__failing(
+                ErrorType.TYPE_ERROR,
+                f"Returned value's type {value_type} is inconsistent with function's return type {return_type}",
+                expression,
+            )
+        if convert is not None:
+            return lambda: (convert(expression()),)
+        return lambda: (expression(),)
+
+    @staticmethod
+    def __converting(expression, convert):
+        return lambda: convert(expression())
+
+    # the condition of an if or for statement, which the tree walker checks is a bool or int
+    def __condition(self, condition_ast, statement_name):
+        condition, condition_type = self.compile_expr(condition_ast)
+        if condition_type not in (Type.BOOL, Type.INT, None):
+            return self.__failing(ErrorType.TYPE_ERROR, f"Incompatible type for {statement_name} condition", condition)
+        return condition
+
+    def __if(self, if_ast):
+        condition = self.__condition(if_ast.condition, "if")
+        then_block = self.compile_block(if_ast.statements)
+        else_block = None
+        if if_ast.else_statements is not None:
+            else_block = self.compile_block(if_ast.else_statements)
+
+        def run_if():
+            if condition():
+                return then_block()
+            if else_block is not None:
+                return else_block()
+            return None
+
+        return run_if
+
+    def __for(self, for_ast):
+        init = self.compile_statement(for_ast.init)
+        condition = self.__condition(for_ast.condition, "for")
+        update = self.compile_statement(for_ast.update)
+        body = self.compile_block(for_ast.statements)
+
+        def run_for():
+            init()
+            while condition():
+                returned = body()
+                if returned is not None:
+                    return returned
+                update()
+            return None
+
+        return run_for
+
+    # calls
+
+    # (closure calling function name with the expressions args as arguments, the type
+    # it returns)
+    def compile_call(self, name, args):
+        interpreter = self.interpreter
+        if name == "print":
+            return self.__print(args), Type.VOID
+        if name == "inputi" or name == "inputs":
+            return self.__input(name, args), Type.INT if name == "inputi" else Type.STRING
+
+        candidate_funcs = interpreter.func_name_to_ast.get(name)
+        if candidate_funcs is None:
+            return self.__failing(ErrorType.NAME_ERROR, f"Function {name} not found"), None
+        func_ast = candidate_funcs.get(len(args))
+        if func_ast is None:
+            return self.__failing(ErrorType.NAME_ERROR, f"Function {name} taking {len(args)} params not found"), None
+
+        compiled_args = []
+        for formal_ast, actual_ast in zip(func_ast.args, args):
+            arg, arg_type = self.compile_expr(actual_ast)
+            convert = conversion(formal_ast.var_type, arg_type, self.type_manager)
+            if convert is False:
+                # the arguments before it are evaluated first
+                arg = self.__failing(
+                    ErrorType.TYPE_ERROR, f"Type mismatch on formal parameter {formal_ast.name}", arg
+                )
+            elif convert is not None:
+                arg = self.__converting(arg, convert)
+            compiled_args.append(arg)
+        compiled_args = tuple(compiled_args)
+        formal_names = tuple(formal_ast.name for formal_ast in func_ast.args)
+        return_type = func_ast.return_type
+        default = DEFAULTS.get(return_type)
+        frames = self.env.environment
+        pop_func = self.env.pop_func
+        body = None
+
+        def call():
+            nonlocal body
+            values = [arg() for arg in compiled_args]
+            if body is None:
+                body = self.function_body(func_ast)
+            frames.append([dict(zip(formal_names, values))])  # push_func, and create each argument
+            returned = body()
+            pop_func()
+            if returned is None:
+                return default
+            return returned[0]
+
+        return call, return_type
+
+    # a closure running the body of the function func_ast in the frame the caller has
+    # pushed; functions are compiled on their first call, so unused ones cost nothing
+    # (and their type errors are only raised if they run)
+    def function_body(self, func_ast):
+        body = self.bodies.get(func_ast)
+        if body is None:
+            scopes, return_type = self.__scopes, self.__return_type
+            self.__scopes = [{formal_ast.name: formal_ast.var_type for formal_ast in func_ast.args}]
+            self.__return_type = func_ast.return_type
+            body = self.bodies[func_ast] = self.compile_block(func_ast.statements)
+            self.__scopes, self.__return_type = scopes, return_type
+        return body
+
+    # (closure, function turning its value into text) for an argument of print or inputi
+    def __printed_arg(self, arg_ast):
+        arg, arg_type = self.compile_expr(arg_ast)
+        if arg_type == Type.VOID:
+            return self.__failing(ErrorType.TYPE_ERROR, "Void not allowed as argument", arg), None
+        return arg, printable(arg_type)
+
+    def __print(self, args):
+        compiled_args = tuple(self.__printed_arg(arg) for arg in args)
+        output_fn = self.interpreter.output
+
+        def call_print():
+            output = ""
+            for arg, printable in compiled_args:
+                output = output + printable(arg())
+            output_fn(output)
+
+        return call_print
+
+    def __input(self, name, args):
+        interpreter = self.interpreter
+        if len(args) > 1:
+            return self.__failing(ErrorType.NAME_ERROR, "No inputi() function that takes > 1 parameter")
+        prompt = self.__printed_arg(args[0]) if args else None
+        convert = int if name == "inputi" else None
+
+        def call_input():
+            if prompt is not None:
+                arg, printable = prompt
+                interpreter.output(printable(arg()))
+            inp = interpreter.get_input()
+            if convert is not None:
+                return convert(inp)
+            return inp
+
+        return call_input
+
+    # expressions
+
+    # (closure, type of the value it gives)
+    def compile_expr(self, expr_ast):
+        compile_fn = self.__expression_compilers.get(expr_ast.elem_type)
+        if compile_fn is None:
+            return (lambda: None), None  # the tree walker has no value for it either
+        return compile_fn(expr_ast)
+
+    def __constant(self, literal_ast):
+        value = literal_ast.val
+        return (lambda: value), LITERAL_TYPES[literal_ast.elem_type]
+
+    # the declared type of the variable var_name can see at this point, or None if
+    # there isn't one
+    def __lookup(self, var_name):
+        for scope in reversed(self.__scopes):
+            if var_name in scope:
+                return scope[var_name]
+        return None
+
+    def __variable(self, var_ast):
+        var_name = var_ast.name
+        path = var_ast.path
+        if path is None:
+            var_type = self.__lookup(var_name)
+            if var_type is None:
+                return self.__failing(ErrorType.NAME_ERROR, f"Undefined variable {var_name}"), None
+            env_get = self.env.get
+            return (lambda: env_get(var_name)), var_type
+        holder, field_type = self.__field_holder(var_name, path)
+        if field_type is None:
+            return holder, None
+        field_name = path.fields[-1]
+        return (lambda: holder()[field_name]), field_type
+
+    # (closure giving the fields of the struct holding the last field in path, the
+    # field's type). If a dot in path can't be followed, it's (closure failing at
+    # that dot, None) instead.
+    def __field_holder(self, var_name, path):
+        base_name = path.base
+        base_type = self.__lookup(base_name)
+        if base_type is None:
+            return self.__failing(ErrorType.NAME_ERROR, f"Undefined variable {base_name}"), None
+        steps, field_type, failure = resolve_path(var_name, path, base_type, self.type_manager.struct_defs)
+        last_owner = steps[-1][1] if steps else None
+        steps = tuple(steps[:-1])
+        error = self.interpreter.error
+        env_get = self.env.get
+
+        def walk():
+            fields = env_get(base_name)
+            for field_name, owner_name in steps:
+                if fields is None:
+                    error(ErrorType.FAULT_ERROR, f"Error dereferencing nil value {owner_name} in {var_name}")
+                fields = fields[field_name]
+            if last_owner is not None and fields is None:
+                error(ErrorType.FAULT_ERROR, f"Error dereferencing nil value {last_owner} in {var_name}")
+            return fields
+
+        if failure is None:
+            return walk, field_type
+        return self.__failing(*failure, walk), None
+
+    def __new(self, new_ast):
+        var_type = new_ast.var_type
+        fields = self.type_manager.struct_defs.get(var_type)
+        if fields is None:
+            return self.__failing(ErrorType.TYPE_ERROR, f"Invalid type {var_type} for new operation"), None
+        defaults = {field_name: DEFAULTS.get(field.type()) for field_name, field in fields.items()}
+        return (lambda: dict(defaults)), var_type
+
+    def __binary_op(self, arith_ast):
+        op1, left_type = self.compile_expr(arith_ast.op1)
+        op2, right_type = self.compile_expr(arith_ast.op2)
+        f, result_type = operation(arith_ast.elem_type, left_type, right_type, self.type_manager, self.interpreter.error)
+        if f is None:
+            return (lambda: (op1(), op2())), None  # one of them always fails
+
+        def binary_op():
+            return f(op1(), op2())
+
+        return binary_op, result_type
+
+    # each step of the fold has its own operation, as the type of the running value
+    # can change along the chain (e.g. 1 < 2 == true)
+    def __chain(self, chain_ast):
+        oper = chain_ast.op
+        first, value_type = self.compile_expr(chain_ast.operands[0])
+        type_manager = self.type_manager
+        error = self.interpreter.error
+        steps = []
+        for operand_ast in chain_ast.operands[1:]:
+            operand, operand_type = self.compile_expr(operand_ast)
+            f, value_type = operation(oper, value_type, operand_type, type_manager, error)
+            if f is None:
+                f = _never_applied
+            steps.append((f, operand))
+        steps = tuple(steps)
+
+        def chain():
+            value = first()
+            for f, operand in steps:
+                value = f(value, operand())
+            return value
+
+        return chain, value_type
+
+    def __neg(self, neg_ast):
+        op1, op_type = self.compile_expr(neg_ast.op1)
+        if op_type is None:
+            return op1, None
+        if op_type != Type.INT:
+            return self.__failing(ErrorType.TYPE_ERROR, f"Incompatible type for {neg_ast.elem_type} operation", op1), None
+        return (lambda: -op1()), Type.INT
+
+    def __not(self, not_ast):
+        op1, op_type = self.compile_expr(not_ast.op1)
+        if op_type is None:
+            return op1, None
+        if op_type not in (Type.BOOL, Type.INT):
+            return self.__failing(ErrorType.TYPE_ERROR, f"Incompatible type for {not_ast.elem_type} operation", op1), None
+        return (lambda: not op1()), Type.BOOL
+
+
+# the operation for a step of a chain that's never reached, since an operand before
+# it always fails
+def _never_applied(x, y):
+    return None
@@ -0,0 +1,462 @@
+# Translates a v3 program into Python source (see transpile.py for how it's run),
+# one Python function per Brewin function. The program is type-checked as it's
+# translated, with the same rules as compile_v3.py, and values are kept as bare
+# Python values in the same way: an int, a bool, a str, a struct as a dict of field
+# name -> value, and nil (or a nil struct, or void) as None. So `a + b` on ints is
+# just `(a + b)`, an int is turned into a bool with bool() only where one flows into
+# a bool slot, and code that fails a type check becomes a call to _fail, given as
+# arguments whatever the tree walker would have evaluated first, so the error only
+# fires when its line is reached.
+#
+# Variables are resolved from the program text as the blocks of a function nest:
+# each `var` statement gets a Python local of its own, which it resets to the type's
+# default each time it runs. Following a dot checks the struct it's in for nil inline:
+#   (p if p is not None else _fault("..."))["x"]
+# with the value being checked put in a temporary, _s, if it isn't a variable.
+#
+# To print the Python a program translates to:
+#   python -m interpreter_v_3.transpile_v3 PROGRAM.br
+import argparse
+import operator
+
+from intbase import ErrorType, InterpreterBase
+from interpreter_v_3.compile_v3 import (
+    DEFAULTS, LITERAL_TYPES, _bool_and, _bool_eq, _bool_ne, _bool_or, conversion, resolve_operation, resolve_path,
+)
+from interpreter_v_3.type_v3 import Type
+from transpile import CACHE, PythonSource, TranspiledProgram, cache_key
+from transpile import runtime as common_runtime
+
+# the Python each function resolve_operation gives is applied with
+OPERATION_FORMATS = {
+    operator.add: "({} + {})",
+    operator.sub: "({} - {})",
+    operator.mul: "({} * {})",
+    operator.floordiv: "({} // {})",
+    operator.lt: "({} < {})",
+    operator.le: "({} <= {})",
+    operator.gt: "({} > {})",
+    operator.ge: "({} >= {})",
+    operator.eq: "({} == {})",
+    operator.ne: "({} != {})",
+    operator.is_: "({} is {})",
+    operator.is_not: "({} is not {})",
+    operator.or_: "({} | {})",  # | and & rather than or and and, as both sides are evaluated
+    operator.and_: "({} & {})",
+    _bool_or: "(bool({}) | bool({}))",
+    _bool_and: "(bool({}) & bool({}))",
+    _bool_eq: "(bool({}) == bool({}))",
+    _bool_ne: "(bool({}) != bool({}))",
+}
+
+# the most operands of a chain folded in one nested expression; longer chains are
+# folded in a tuple of assignments, as Python limits how deeply expressions nest
+MAX_NESTED_CHAIN = 16
+
+
+# An expression's Python text, its type (None if it never has a value), and whether
+# it's a variable or a literal, which can be evaluated again, at no cost
+class Expression:
+    def __init__(self, text, value_type, simple=False):
+        self.text = text
+        self.value_type = value_type
+        self.simple = simple
+
+
+# text calling _fail with error_type and message, once the texts in evaluated are
+def _failing(error_type, message, *evaluated):
+    return f"_fail({', '.join([f'ErrorType.{error_type.name}', repr(message), *evaluated])})"
+
+
+class Transpiler:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.type_manager = interpreter.type_manager
+        self.source = PythonSource()
+        self.__scopes = []  # Brewin name -> (Python name, declared type), for each block of the function
+        self.__names = None  # Python names given out in the function being translated
+        self.__n_temporaries = 0
+        self.__return_type = None  # of the function being translated
+
+    def transpile(self):
+        for candidate_funcs in self.interpreter.func_name_to_ast.values():
+            for func_ast in candidate_funcs.values():
+                self.__function(func_ast)
+        self.source.add(0, "def _run():")
+        self.source.add(1, f"return {self.__call('main', []).text}")
+        return TranspiledProgram(self.source)
+
+    @staticmethod
+    def function_name(name, n_args):
+        return f"{name}_f{n_args}"
+
+    def __function(self, func_ast):
+        self.__names = {}
+        self.__n_temporaries = 0
+        self.__return_type = func_ast.return_type
+        param_names = [self.__new_name(formal_ast.name) for formal_ast in func_ast.args]
+        # the last of a repeated name is the one the body sees
+        self.__scopes = [
+            {formal_ast.name: (name, formal_ast.var_type) for formal_ast, name in zip(func_ast.args, param_names)}
+        ]
+        self.source.add(0, f"def {self.function_name(func_ast.name, len(func_ast.args))}({', '.join(param_names)}):")
+        self.__block(func_ast.statements, 1)
+        self.source.add(1, f"return {DEFAULTS.get(func_ast.return_type)!r}")
+        self.source.add(0, "")
+        self.__scopes = []
+
+    def __new_name(self, var_name):
+        n = self.__names.get(var_name, 0)
+        self.__names[var_name] = n + 1
+        return f"{var_name}_v{n}"
+
+    def __temporary(self):
+        self.__n_temporaries += 1
+        return f"_t{self.__n_temporaries}"
+
+    # (Python name, declared type) of the variable var_name can see at this point, or
+    # None if there isn't one
+    def __lookup(self, var_name):
+        for scope in reversed(self.__scopes):
+            if var_name in scope:
+                return scope[var_name]
+        return None
+
+    # statements
+
+    def __block(self, statements, depth):
+        self.__scopes.append({})
+        n_lines = len(self.source.lines)
+        for statement in statements:
+            if self.interpreter.trace_output:
+                self.source.add_trace(depth, statement)
+            self.__statement(statement, depth)
+        if len(self.source.lines) == n_lines:
+            self.source.add(depth, "pass")
+        self.__scopes.pop()
+
+    def __statement(self, statement, depth):
+        elem_type = statement.elem_type
+        if elem_type == InterpreterBase.FCALL_NODE:
+            self.source.add(depth, self.__call(statement.name, statement.args).text, statement)
+        elif elem_type == "=":
+            self.source.add(depth, self.__assign(statement), statement)
+        elif elem_type == InterpreterBase.VAR_DEF_NODE:
+            self.source.add(depth, self.__var_def(statement), statement)
+        elif elem_type == InterpreterBase.RETURN_NODE:
+            self.source.add(depth, self.__return(statement), statement)
+        elif elem_type == InterpreterBase.IF_NODE:
+            self.__if(statement, depth)
+        elif elem_type == InterpreterBase.FOR_NODE:
+            self.__for(statement, depth)
+        # any other expression statement does nothing
+
+    def __assign(self, assign_ast):
+        var_name = assign_ast.name
+        path = assign_ast.path
+        expression = self.__expression(assign_ast.expression)
+        if path is None:
+            variable = self.__lookup(var_name)
+            if variable is None:
+                return _failing(ErrorType.NAME_ERROR, f"Undefined variable {var_name}")
+            target, lhs_type = variable
+        else:
+            holder, lhs_type = self.__field_holder(var_name, path)
+            if lhs_type is None:
+                return holder  # fails finding the field, before the right side is evaluated
+        convert = conversion(lhs_type, expression.value_type, self.type_manager)
+        if convert is False:
+            evaluated = (expression.text,) if path is None else (holder, expression.text)
+            message = f"Type mismatch {lhs_type} vs {expression.value_type} in assignment"
+            return _failing(ErrorType.TYPE_ERROR, message, *evaluated)
+        value = expression.text if convert is None else f"bool({expression.text})"
+        if path is None:
+            return f"{target} = {value}"
+        # the holder is found before the right side is evaluated
+        return f"_h = {holder}; _h[{path.fields[-1]!r}] = {value}"
+
+    def __var_def(self, var_ast):
+        var_name = var_ast.name
+        var_type = var_ast.var_type
+        type_manager = self.type_manager
+        if type_manager.create_default_value(var_type) is None or not type_manager.valid_var_type(var_type):
+            return _failing(ErrorType.TYPE_ERROR, f"Unknown/invalid type specified {var_type}")
+        scope = self.__scopes[-1]
+        if var_name in scope:
+            return _failing(ErrorType.NAME_ERROR, f"Duplicate definition for variable {var_name}")
+        python_name = self.__new_name(var_name)
+        scope[var_name] = (python_name, var_type)
+        return f"{python_name} = {DEFAULTS.get(var_type)!r}"
+
+    def __return(self, return_ast):
+        return_type = self.__return_type
+        if return_ast.expression is None:
+            return f"return {DEFAULTS.get(return_type)!r}"
+        expression = self.__expression(return_ast.expression)
+        value_type = expression.value_type
+        if value_type == Type.VOID:
+            return _failing(ErrorType.TYPE_ERROR, "Cannot use void in return value", expression.text)
+        convert = conversion(return_type, value_type, self.type_manager)
+        if convert is False:
+            message = f"Returned value's type {value_type} is inconsistent with function's return type {return_type}"
+            return _failing(ErrorType.TYPE_ERROR, message, expression.text)
+        if convert is not None:
+            return f"return bool({expression.text})"
+        return f"return {expression.text}"
+
+    # the condition of an if or for statement, which the tree walker checks is a bool or int
+    def __condition(self, condition_ast, statement_name):
+        condition = self.__expression(condition_ast)
+        if condition.value_type not in (Type.BOOL, Type.INT, None):
+            return _failing(ErrorType.TYPE_ERROR, f"Incompatible type for {statement_name} condition", condition.text)
+        return condition.text
+
+    def __if(self, if_ast, depth):
+        self.source.add(depth, f"if {self.__condition(if_ast.condition, 'if')}:", if_ast)
+        self.__block(if_ast.statements, depth + 1)
+        if if_ast.else_statements is not None:
+            self.source.add(depth, "else:", if_ast)
+            self.__block(if_ast.else_statements, depth + 1)
+
+    def __for(self, for_ast, depth):
+        self.source.add(depth, self.__assign(for_ast.init), for_ast)
+        self.source.add(depth, f"while {self.__condition(for_ast.condition, 'for')}:", for_ast)
+        update = self.__assign(for_ast.update)
+        self.__block(for_ast.statements, depth + 1)
+        self.source.add(depth + 1, update, for_ast)
+
+    # calls
+
+    def __call(self, name, args):
+        if name == "print":
+            return self.__print(args)
+        if name == "inputi" or name == "inputs":
+            return self.__input(name, args)
+
+        candidate_funcs = self.interpreter.func_name_to_ast.get(name)
+        if candidate_funcs is None:
+            return Expression(_failing(ErrorType.NAME_ERROR, f"Function {name} not found"), None)
+        func_ast = candidate_funcs.get(len(args))
+        if func_ast is None:
+            return Expression(_failing(ErrorType.NAME_ERROR, f"Function {name} taking {len(args)} params not found"), None)
+
+        arg_texts = []
+        for formal_ast, actual_ast in zip(func_ast.args, args):
+            arg = self.__expression(actual_ast)
+            convert = conversion(formal_ast.var_type, arg.value_type, self.type_manager)
+            if convert is False:
+                # the arguments before it are evaluated first
+                message = f"Type mismatch on formal parameter {formal_ast.name}"
+                return Expression(_failing(ErrorType.TYPE_ERROR, message, *arg_texts, arg.text), None)
+            arg_texts.append(arg.text if convert is None else f"bool({arg.text})")
+        return Expression(f"{self.function_name(name, len(args))}({', '.join(arg_texts)})", func_ast.return_type)
+
+    # (text of an argument to print or inputi as text, or of its failing if it's
+    # void, whether it failed); a struct's text fails as print's concatenation would
+    # if print_struct, and is None otherwise
+    def __printed_arg(self, arg_ast, print_struct):
+        arg = self.__expression(arg_ast)
+        value_type, text = arg.value_type, arg.text
+        if value_type == Type.VOID:
+            return text, True
+        if value_type == Type.INT:
+            return f"str({text})", False
+        if value_type == Type.STRING:
+            return text, False
+        if value_type == Type.BOOL:
+            return f'("true" if {text} else "false")', False
+        if value_type == Type.NIL:
+            return f'({text}, "nil")[1]', False  # "nil", once it's evaluated
+        return f"{'_struct_text' if print_struct else '_printable_struct'}({text})", False
+
+    def __print(self, args):
+        parts = []
+        for arg_ast in args:
+            text, void = self.__printed_arg(arg_ast, True)
+            if void:
+                return Expression(_failing(ErrorType.TYPE_ERROR, "Void not allowed as argument", *parts, text), Type.VOID)
+            parts.append(text)
+        return Expression(f"_output({' + '.join(parts) or repr('')})", Type.VOID)
+
+    def __input(self, name, args):
+        value_type = Type.INT if name == "inputi" else Type.STRING
+        if len(args) > 1:
+            return Expression(_failing(ErrorType.NAME_ERROR, "No inputi() function that takes > 1 parameter"), value_type)
+        prompt = ""
+        if args:
+            prompt, void = self.__printed_arg(args[0], False)
+            if void:
+                return Expression(_failing(ErrorType.TYPE_ERROR, "Void not allowed as argument", prompt), value_type)
+        return Expression(f"_{name}({prompt})", value_type)
+
+    # expressions
+
+    def __expression(self, expr_ast):
+        elem_type = expr_ast.elem_type
+        if elem_type == InterpreterBase.NIL_NODE:
+            return Expression("None", Type.NIL, True)
+        if elem_type in LITERAL_TYPES:
+            return Expression(repr(expr_ast.val), LITERAL_TYPES[elem_type], True)
+        if elem_type == InterpreterBase.VAR_NODE:
+            return self.__variable(expr_ast)
+        if elem_type == InterpreterBase.FCALL_NODE:
+            return self.__call(expr_ast.name, expr_ast.args)
+        if elem_type == InterpreterBase.NEW_NODE:
+            return self.__new(expr_ast)
+        if elem_type in self.interpreter.BIN_OPS:
+            left, right = self.__expression(expr_ast.op1), self.__expression(expr_ast.op2)
+            return self.__operation(elem_type, left, right)
+        if elem_type == InterpreterBase.CHAIN_NODE:
+            return self.__chain(expr_ast)
+        if elem_type == InterpreterBase.NEG_NODE:
+            return self.__unary(expr_ast, (Type.INT,), "-", Type.INT)
+        if elem_type == InterpreterBase.NOT_NODE:
+            return self.__unary(expr_ast, (Type.BOOL, Type.INT), "not ", Type.BOOL)
+        return Expression("None", None)  # the tree walker has no value for it either
+
+    def __variable(self, var_ast):
+        var_name = var_ast.name
+        path = var_ast.path
+        if path is None:
+            variable = self.__lookup(var_name)
+            if variable is None:
+                return Expression(_failing(ErrorType.NAME_ERROR, f"Undefined variable {var_name}"), None)
+            return Expression(variable[0], variable[1], True)
+        holder, field_type = self.__field_holder(var_name, path)
+        if field_type is None:
+            return Expression(holder, None)
+        return Expression(f"{holder}[{path.fields[-1]!r}]", field_type)
+
+    # (text giving the fields of the struct holding the last field in path, the
+    # field's type). If a dot in path can't be followed, it's (text failing at that
+    # dot, None) instead.
+    def __field_holder(self, var_name, path):
+        base_name = path.base
+        base = self.__lookup(base_name)
+        if base is None:
+            return _failing(ErrorType.NAME_ERROR, f"Undefined variable {base_name}"), None
+        base_text, base_type = base
+        steps, field_type, failure = resolve_path(var_name, path, base_type, self.type_manager.struct_defs)
+        text = base_text
+        for i, (field_name, owner_name) in enumerate(steps):
+            text = _not_nil(text, f"Error dereferencing nil value {owner_name} in {var_name}", i == 0)
+            if i < len(steps) - 1:
+                text = f"{text}[{field_name!r}]"
+        if failure is None:
+            return text, field_type
+        return _failing(*failure, text), None
+
+    def __new(self, new_ast):
+        var_type = new_ast.var_type
+        fields = self.type_manager.struct_defs.get(var_type)
+        if fields is None:
+            return Expression(_failing(ErrorType.TYPE_ERROR, f"Invalid type {var_type} for new operation"), None)
+        defaults = ", ".join(f"{field_name!r}: {DEFAULTS.get(field.type())!r}" for field_name, field in fields.items())
+        return Expression(f"{{{defaults}}}", var_type)
+
+    def __operation(self, oper, left, right):
+        f, result_type, failure = resolve_operation(oper, left.value_type, right.value_type, self.type_manager)
+        if failure is not None:
+            return Expression(_failing(*failure, left.text, right.text), None)
+        if f is None:
+            return Expression(f"({left.text}, {right.text})", None)  # one of them always fails
+        return Expression(OPERATION_FORMATS[f].format(left.text, right.text), result_type)
+
+    # each step of the fold has its own operation, as the type of the running value
+    # can change along the chain (e.g. 1 < 2 == true)
+    def __chain(self, chain_ast):
+        oper = chain_ast.op
+        operands = [self.__expression(operand_ast) for operand_ast in chain_ast.operands]
+        if len(operands) <= MAX_NESTED_CHAIN:
+            value = operands[0]
+            for operand in operands[1:]:
+                value = self.__operation(oper, value, operand)
+            return value
+        temporary = self.__temporary()
+        steps = [f"({temporary} := {operands[0].text})"]
+        value_type = operands[0].value_type
+        for operand in operands[1:]:
+            step = self.__operation(oper, Expression(temporary, value_type, True), operand)
+            steps.append(f"({temporary} := {step.text})")
+            value_type = step.value_type
+        return Expression(f"({', '.join(steps)})[-1]", value_type)
+
+    def __unary(self, arith_ast, operand_types, python_op, result_type):
+        operand = self.__expression(arith_ast.op1)
+        if operand.value_type is None:
+            return operand
+        if operand.value_type not in operand_types:
+            message = f"Incompatible type for {arith_ast.elem_type} operation"
+            return Expression(_failing(ErrorType.TYPE_ERROR, message, operand.text), None)
+        return Expression(f"({python_op}{operand.text})", result_type)
+
+
+# text giving the value of text, failing with message if it's nil; simple if text
+# is a variable, which can be read twice, rather than put in the temporary _s
+def _not_nil(text, message, simple):
+    if simple:
+        return f"({text} if {text} is not None else _fault({message!r}))"
+    return f"(_s if (_s := {text}) is not None else _fault({message!r}))"
+
+
+# The helpers a transpiled v3 program calls, bound to interpreter
+def runtime(interpreter):
+    error = interpreter.error
+    helpers = common_runtime(interpreter)
+
+    def fault(message):
+        error(ErrorType.FAULT_ERROR, message)
+
+    # a struct as get_printable gives it
+    def printable_struct(value):
+        return "nil" if value is None else None
+
+    def struct_text(value):
+        if value is None:
+            return "nil"
+        return "" + None  # print fails adding anything else to its output
+
+    no_prompt = object()
+
+    def make_input(convert):
+        def read_input(prompt=no_prompt):
+            if prompt is not no_prompt:
+                interpreter.output(prompt)
+            inp = interpreter.get_input()
+            return inp if convert is None else convert(inp)
+
+        return read_input
+
+    helpers["_fault"] = fault
+    helpers["_printable_struct"] = printable_struct
+    helpers["_struct_text"] = struct_text
+    helpers["_inputi"] = make_input(int)
+    helpers["_inputs"] = make_input(None)
+    return helpers
+
+
+# The transpiled program for program. The interpreter must have loaded program.
+def transpile(interpreter, program):
+    key = cache_key(
+        "v3", program, interpreter.trace_output, interpreter.folding is not None,
+        interpreter.elimination is not None, interpreter.inlining is not None, tuple(interpreter.type_manager.struct_defs)
+    )
+    return CACHE.get_or_make(key, lambda: Transpiler(interpreter).transpile())
+
+
+def main():
+    from interpreter_v_3.interpreterv3 import Interpreter
+
+    arg_parser = argparse.ArgumentParser(description="Print the Python a v3 Brewin program translates to.")
+    arg_parser.add_argument("path")
+    args = arg_parser.parse_args()
+
+    with open(args.path) as f:
+        program = f.read()
+    interpreter = Interpreter()
+    interpreter.load(program)
+    print(Transpiler(interpreter).transpile().source, end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+# Runs the bytecode bytecode_v3.py compiles v3 programs to.
+#
+# One loop fetches and dispatches every instruction of every function. Calls don't
+# recurse in Python: the VM keeps its own stack of frames, each the caller's code,
+# where it was in it and its locals, so a Brewin program can recurse as deep as
+# memory allows. All frames share one operand stack; a call's arguments are taken
+# off it into the callee's locals, and the value a function returns is simply left
+# on it for the caller.
+#
+# When an error escapes, the line tables of the code being run, and of each caller
+# in turn, give the statement it's located at, as the tree walker's __run_statements
+# would.
+#
+# v4's code (see interpreter_v_4/bytecode_v4.py) runs here too. A lazy value is a
+# Thunk: the code of its expression and the locals to run it in. Evaluating it is
+# a call of that code like any other, with a frame of its own, after which the
+# Thunk keeps the value, so a chain of them is evaluated without recursing in Python
+# either. What a v4 program raises (and a division by zero, as div0) is a Python
+# exception inside the loop: each try block being run has a handler, which notes
+# the frame it's in and how deep the stack is, and the innermost one takes the VM
+# back there and on to the catch blocks. What nothing catches ends the program.
+from intbase import BrewinError, ErrorType
+from interpreter_v_3.bytecode_v3 import (
+    ADD, APPLY, APPLY1, CALL, CALL_LAZY, CATCH, CHECK_NIL, CONCAT, COND, CONST, DIV, END_THUNK, END_VIEW, EQ, FAIL,
+    FORCE, FORCE_ONCE, GE, GET_FIELD, GT, INPUT, IS, IS_NOT, JUMP, JUMP_IF_FALSE, LE, LOAD, LT, MUL, NE, NEG, NEW,
+    NOT, POP, POP_TRY, PRINT, PROMPT, RAISE, RETURN, SET_FIELD, SETUP_TRY, SHORT_CIRCUIT, STORE, SUB, SWAP, THUNK,
+    TO_BOOL, TRACE, VIEW, CodeObject,
+)
+
+
+# A lazy value: code is None once it's evaluated, and value what it gave, or _BUSY
+# while it's being evaluated
+class Thunk:
+    __slots__ = ("code", "locals", "value")
+
+    def __init__(self, code, local_vars):
+        self.code = code
+        self.locals = local_vars
+        self.value = None
+
+
+_BUSY = object()
+
+
+# A lazy value that needs its own value to be evaluated (one a builtin's argument
+# reads by name; see bytecode_v4.py) is never done. The tree walker runs out of Python
+# stack evaluating it, and the VM, which would grow its frames until memory ran out
+# instead, fails the same way.
+def _needs_itself():
+    return RecursionError("maximum recursion depth exceeded")
+
+
+# what a v4 program raises, on its way to a handler
+class _Raised(Exception):
+    def __init__(self, value):
+        self.value = value
+
+
+class VM:
+    # div0: the Value a division by zero raises, or None if it isn't caught
+    def __init__(self, interpreter, div0=None):
+        self.interpreter = interpreter
+        self.div0 = div0
+
+    # run code, which takes no arguments, to the end; gives the value it returns
+    def run(self, code):
+        interpreter = self.interpreter
+        error = interpreter.error
+        scopes = interpreter.resolution.scopes
+        div0 = self.div0
+        frames = []  # (code, instructions, pc, locals) of each caller
+        handlers = []  # (len(frames), code, instructions, locals, len(stack), pc) of each try block being run
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        instructions = code.instructions
+        pc = 0
+        local_vars = [None] * code.n_locals
+        try:
+            while True:
+                try:
+                    while True:
+                        opcode, arg = instructions[pc]
+                        pc += 1
+                        if opcode < FORCE:  # v3's
+                            if opcode == LOAD:
+                                push(local_vars[arg])
+                            elif opcode == CONST:
+                                push(arg)
+                            elif opcode == STORE:
+                                local_vars[arg] = pop()
+                            elif opcode == GET_FIELD:
+                                fields = stack[-1]
+                                if fields is None:
+                                    error(ErrorType.FAULT_ERROR, arg[1])
+                                stack[-1] = fields[arg[0]]
+                            elif opcode == ADD:
+                                right = pop()
+                                stack[-1] = stack[-1] + right
+                            elif opcode == SUB:
+                                right = pop()
+                                stack[-1] = stack[-1] - right
+                            elif opcode == MUL:
+                                right = pop()
+                                stack[-1] = stack[-1] * right
+                            elif opcode == DIV:
+                                right = pop()
+                                stack[-1] = stack[-1] // right
+                            elif opcode == LT:
+                                right = pop()
+                                stack[-1] = stack[-1] < right
+                            elif opcode == LE:
+                                right = pop()
+                                stack[-1] = stack[-1] <= right
+                            elif opcode == GT:
+                                right = pop()
+                                stack[-1] = stack[-1] > right
+                            elif opcode == GE:
+                                right = pop()
+                                stack[-1] = stack[-1] >= right
+                            elif opcode == EQ:
+                                right = pop()
+                                stack[-1] = stack[-1] == right
+                            elif opcode == NE:
+                                right = pop()
+                                stack[-1] = stack[-1] != right
+                            elif opcode == JUMP_IF_FALSE:
+                                if not pop():
+                                    pc = arg
+                            elif opcode == JUMP:
+                                pc = arg
+                            elif opcode == CALL:
+                                callee, n_args = arg
+                                callee_locals = [None] * callee.n_locals
+                                if n_args:
+                                    callee_locals[:n_args] = stack[-n_args:]
+                                    del stack[-n_args:]
+                                frames.append((code, instructions, pc, local_vars))
+                                code = callee
+                                instructions = callee.instructions
+                                pc = 0
+                                local_vars = callee_locals
+                            elif opcode == RETURN:
+                                if not frames:
+                                    return pop()
+                                code, instructions, pc, local_vars = frames.pop()
+                            elif opcode == POP:
+                                pop()
+                            elif opcode == SET_FIELD:
+                                value = pop()
+                                pop()[arg] = value
+                            elif opcode == CHECK_NIL:
+                                if stack[-1] is None:
+                                    error(ErrorType.FAULT_ERROR, arg)
+                            elif opcode == IS:
+                                right = pop()
+                                stack[-1] = stack[-1] is right
+                            elif opcode == IS_NOT:
+                                right = pop()
+                                stack[-1] = stack[-1] is not right
+                            elif opcode == APPLY:
+                                right = pop()
+                                stack[-1] = arg(stack[-1], right)
+                            elif opcode == NEG:
+                                stack[-1] = -stack[-1]
+                            elif opcode == NOT:
+                                stack[-1] = not stack[-1]
+                            elif opcode == TO_BOOL:
+                                stack[-1] = bool(stack[-1])
+                            elif opcode == NEW:
+                                push(dict(arg))
+                            elif opcode == CONCAT:
+                                value = pop()
+                                stack[-1] = stack[-1] + arg(value)
+                            elif opcode == PRINT:
+                                interpreter.output(pop())
+                                push(None)
+                            elif opcode == PROMPT:
+                                interpreter.output(arg(pop()))
+                            elif opcode == INPUT:
+                                inp = interpreter.get_input()
+                                push(inp if arg is None else arg(inp))
+                            elif opcode == FAIL:
+                                error(*arg)
+                            elif opcode == TRACE:
+                                print(arg)
+                        elif opcode == FORCE:  # and v4's
+                            value = stack[-1]
+                            if value.__class__ is Thunk:
+                                if value.code is None:
+                                    stack[-1] = value.value
+                                    pc -= 1  # and force what it was again
+                                else:
+                                    if value.value is _BUSY:
+                                        raise _needs_itself()
+                                    value.value = _BUSY
+                                    frames.append((code, instructions, pc - 1, local_vars))
+                                    code = value.code
+                                    instructions = code.instructions
+                                    pc = 0
+                                    local_vars = value.locals
+                            elif value is None and arg is not None:
+                                error(ErrorType.NAME_ERROR, arg)
+                        elif opcode == FORCE_ONCE:
+                            value = stack[-1]
+                            if value.__class__ is Thunk:
+                                if value.code is None:
+                                    stack[-1] = value.value
+                                else:
+                                    if value.value is _BUSY:
+                                        raise _needs_itself()
+                                    value.value = _BUSY
+                                    frames.append((code, instructions, pc, local_vars))
+                                    code = value.code
+                                    instructions = code.instructions
+                                    pc = 0
+                                    local_vars = value.locals
+                        elif opcode == THUNK:
+                            push(Thunk(arg[0], local_vars[:] if arg[1] else local_vars))
+                        elif opcode == END_THUNK:
+                            value = pop()
+                            thunk = stack[-1]  # which the FORCE left there
+                            thunk.value = value
+                            thunk.code = thunk.locals = None
+                            stack[-1] = value
+                            code, instructions, pc, local_vars = frames.pop()
+                        elif opcode == CALL_LAZY:
+                            callee, param_slots, args, copy = arg
+                            captured = local_vars[:] if copy else local_vars
+                            callee_locals = [None] * callee.n_locals
+                            for slot, value in zip(param_slots, args):
+                                if value.__class__ is CodeObject:
+                                    value = Thunk(value, captured)
+                                callee_locals[slot] = value
+                            frames.append((code, instructions, pc, local_vars))
+                            code = callee
+                            instructions = callee.instructions
+                            pc = 0
+                            local_vars = callee_locals
+                        elif opcode == COND:
+                            value = stack[-1]
+                            if value.t != arg[0]:
+                                error(ErrorType.TYPE_ERROR, arg[1])
+                            stack[-1] = value.v
+                        elif opcode == SWAP:
+                            stack[-1], stack[-2] = stack[-2], stack[-1]
+                        elif opcode == SHORT_CIRCUIT:
+                            value = stack[-1]
+                            if value.t != arg[0]:
+                                error(ErrorType.TYPE_ERROR, "Incompatible type")
+                            if bool(value.v) is arg[1]:
+                                stack[-1] = arg[2]
+                                pc = arg[3]
+                        elif opcode == APPLY1:
+                            stack[-1] = arg(stack[-1])
+                        elif opcode == VIEW:
+                            # the variables of the function running, as its statement at hand sees them
+                            for running_code, _, running_pc, running_locals in reversed(frames):
+                                if not running_code.lazy:
+                                    break
+                            scope = scopes[running_code.statement_at(running_pc - 1)]
+                            view = local_vars[:]
+                            for slot, name in arg:
+                                running_slot = scope.get(name)
+                                view[slot] = None if running_slot is None else running_locals[running_slot]
+                            push(local_vars)
+                            local_vars = view
+                        elif opcode == END_VIEW:
+                            value = pop()
+                            local_vars = stack[-1]
+                            stack[-1] = value
+                        elif opcode == RAISE:
+                            value = pop()
+                            if value.t != arg[0]:
+                                error(ErrorType.TYPE_ERROR, arg[1])
+                            raise _Raised(value)
+                        elif opcode == SETUP_TRY:
+                            handlers.append((len(frames), code, instructions, local_vars, len(stack), arg))
+                        elif opcode == POP_TRY:
+                            handlers.pop()
+                        elif opcode == CATCH:
+                            value = pop()
+                            pc = arg.get(value.v)
+                            if pc is None:
+                                raise _Raised(value)  # to the try block around this one
+                        else:
+                            raise ValueError(f"Unknown opcode {opcode} at {pc - 1} in {code.name}")
+                except ZeroDivisionError:
+                    if div0 is None:
+                        raise
+                    raised = div0
+                except _Raised as exception:
+                    raised = exception.value
+                if not handlers:
+                    break
+                # back to the innermost try block, to see if one of its catch blocks takes it
+                depth, code, instructions, local_vars, stack_depth, pc = handlers.pop()
+                del frames[depth:]
+                for value in stack[stack_depth:]:
+                    if value.__class__ is Thunk and value.value is _BUSY:
+                        value.value = None  # left unevaluated, to be tried again
+                del stack[stack_depth:]
+                push(raised)
+        except BrewinError as brewin_error:
+            located = [(code, pc)] + [(caller, caller_pc) for caller, _, caller_pc, _ in reversed(frames)]
+            for frame_code, frame_pc in located:
+                statement = frame_code.statement_at(frame_pc - 1)
+                if statement is not None:
+                    interpreter.locate_error(brewin_error, statement)
+            raise
+        error(ErrorType.FAULT_ERROR, f"Unhandled exception: {raised.v}")
@@ -0,0 +1,461 @@
+# Compiles v4 programs to the bytecode of interpreter_v_3/bytecode_v3.py, for the VM
+# v3's programs run on (interpreter_v_3/vm_v3.py).
+#
+# The code does what the tree walker (core.py) does under v4's Semantics, in the
+# same order, with the same output and the same errors. Variables live in the slots
+# resolve.py gives them, as they do in the tree walker's frames, and values are the
+# tree walker's Values, so the operators and print are the very functions it applies.
+#
+# An assignment, argument or return value is a lazy value: its expression compiles to
+# a CodeObject of its own (lazy, and ending in END_THUNK), and what's stored, passed or
+# returned is a Thunk of it over the locals as they are then (see vm_v3.py), or the
+# Value itself for a literal, which can't fail or have effects. Reading a variable
+# forces what it holds, all the way; a call gives what the function returned, which
+# is forced where its value's needed, except that an operand of an operator other
+# than && and || is forced a step, then, once the operand after it has been too, the
+# rest of the way, as in the tree walker. A builtin called in a lazy value's code
+# sees the variables of the function running, by name (VIEW; see the tree walker's
+# __dynamic_view).
+#
+# raise and div0 unwind to the innermost try block being run (SETUP_TRY), whose CATCH
+# picks its catch block for the value raised. A return inside try blocks pops their
+# handlers first. Errors the tree walker finds as it runs, like a name that isn't
+# defined, are FAILs, reached only if the faulty line is. One place the two differ: a
+# raise out of a function's lazy return value, forced for print (e.g. print(f())
+# where f returns a call that raises), goes on to the nearest try block here, where
+# the tree walker fails with an AttributeError.
+#
+# To print the bytecode of a program:
+#   python -m interpreter_v_4.bytecode_v4 PROGRAM.br
+import argparse
+
+from intbase import ErrorType, InterpreterBase
+from interpreter_v_3.bytecode_v3 import (
+    APPLY, APPLY1, CALL_LAZY, CATCH, CONCAT, COND, CONST, END_THUNK, END_VIEW, FAIL, FORCE, FORCE_ONCE, INPUT,
+    JUMP, JUMP_IF_FALSE, LOAD, POP, POP_TRY, PRINT, PROMPT, RAISE, RETURN, SETUP_TRY, SHORT_CIRCUIT, STORE, SWAP,
+    THUNK, TRACE, VIEW, CodeObject, disassemble,
+)
+from interpreter_v_4.type_v4 import Type, Value, get_printable
+from resolve import NO_SLOT
+
+NIL_VALUE = Value(Type.NIL, None)
+DIV0 = Value(Type.STRING, "div0")  # what a division by zero raises
+
+# the Type of each literal node's value
+LITERAL_TYPES = {
+    InterpreterBase.INT_NODE: Type.INT,
+    InterpreterBase.STRING_NODE: Type.STRING,
+    InterpreterBase.BOOL_NODE: Type.BOOL,
+}
+
+
+def input_int(inp):
+    return Value(Type.INT, int(inp))
+
+
+def input_string(inp):
+    return Value(Type.STRING, inp)
+
+
+class BytecodeCompiler:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.error = interpreter.error
+        self.resolution = interpreter.resolution
+        self.codes = {}  # function AST node -> its CodeObject
+        for candidate_funcs in interpreter.func_name_to_ast.values():
+            for func_ast in candidate_funcs.values():
+                code = CodeObject(func_ast.name, len(func_ast.args))
+                code.n_locals = self.resolution.frame_sizes[func_ast]
+                code.slot_names = [""] * code.n_locals  # filled in as the slots are used
+                self.codes[func_ast] = code
+        self.lazy_codes = []  # the CodeObject of each lazy value, as they're compiled
+        self.__code = None  # being compiled
+        self.__function_name = None  # of the function it's in
+        self.__statement = None  # the statement instructions are being generated for
+        self.__tries = 0  # try blocks around it, in its function
+        self.__statement_compilers = {
+            InterpreterBase.FCALL_NODE: self.__fcall_statement,
+            "=": self.__assign,
+            InterpreterBase.VAR_DEF_NODE: self.__var_def,
+            InterpreterBase.RETURN_NODE: self.__return,
+            InterpreterBase.IF_NODE: self.__if,
+            InterpreterBase.FOR_NODE: self.__for,
+            InterpreterBase.TRY_NODE: self.__try,
+            InterpreterBase.RAISE_NODE: self.__raise,
+        }
+        self.__expression_compilers = {
+            InterpreterBase.NIL_NODE: lambda nil_ast: self.__emit(CONST, NIL_VALUE),
+            InterpreterBase.INT_NODE: self.__constant,
+            InterpreterBase.STRING_NODE: self.__constant,
+            InterpreterBase.BOOL_NODE: self.__constant,
+            InterpreterBase.VAR_NODE: self.__variable,
+            InterpreterBase.FCALL_NODE: self.__call,
+            InterpreterBase.CHAIN_NODE: lambda chain_ast: self.__operation(chain_ast.op, chain_ast.operands),
+            InterpreterBase.NEG_NODE: lambda neg_ast: self.__unary(neg_ast, self.__negate),
+            InterpreterBase.NOT_NODE: lambda not_ast: self.__unary(not_ast, self.__invert),
+        }
+        for oper in interpreter.BIN_OPS:
+            self.__expression_compilers[oper] = self.__binary_op
+        self.__operators = {oper: self.__operator(oper) for oper in interpreter.BIN_OPS}
+
+    # the CodeObject the program starts from, which calls main; every function is
+    # compiled along with it
+    def compile_program(self):
+        for func_ast, code in self.codes.items():
+            self.__compile_function(code, func_ast)
+        entry = CodeObject("<program>", 0)
+        self.__code = entry
+        self.__function_name = entry.name
+        self.__statement = None
+        self.__call_user_func("main", [])
+        self.__emit(RETURN)
+        self.__finish(entry)
+        return entry
+
+    def __compile_function(self, code, func_ast):
+        self.__code = code
+        self.__function_name = func_ast.name
+        self.__tries = 0
+        for slot, formal_ast in zip(self.resolution.param_slots[func_ast], func_ast.args):
+            code.slot_names[slot] = formal_ast.name
+        self.__block(func_ast.statements)
+        self.__emit(CONST, NIL_VALUE)  # no return statement gives nil
+        self.__emit(RETURN)
+        self.__finish(code)
+
+    def __emit(self, opcode, arg=None):
+        code = self.__code
+        if not code.line_statements or code.line_statements[-1] is not self.__statement:
+            code.line_pcs.append(len(code.instructions))
+            code.line_statements.append(self.__statement)
+        code.instructions.append((opcode, arg))
+        return len(code.instructions) - 1
+
+    def __here(self):
+        return len(self.__code.instructions)
+
+    # point the jump at instruction pc (its argument, or its argument's last item) to
+    # the next instruction to be generated
+    def __land(self, pc):
+        opcode, arg = self.__code.instructions[pc]
+        arg = arg[:-1] + (self.__here(),) if isinstance(arg, tuple) else self.__here()
+        self.__code.instructions[pc] = (opcode, arg)
+
+    def __fail(self, error_type, message):
+        self.__emit(FAIL, (error_type, message))
+
+    def __slot(self, node):
+        slot = self.resolution.slots[node]
+        if slot != NO_SLOT:
+            self.__code.slot_names[slot] = node.name
+        return slot
+
+    @staticmethod
+    def __finish(code):
+        code.instructions = tuple(code.instructions)
+
+    # statements
+
+    def __block(self, statements):
+        trace_output = self.interpreter.trace_output
+        outer_statement = self.__statement
+        for statement in statements or ():
+            self.__statement = statement
+            if trace_output:
+                self.__emit(TRACE, statement)
+            compile_fn = self.__statement_compilers.get(statement.elem_type)
+            if compile_fn is not None:  # anything else, e.g. an expression statement other than a call, does nothing
+                compile_fn(statement)
+        self.__statement = outer_statement
+
+    def __fcall_statement(self, call_ast):
+        if call_ast.name == "print":
+            self.__print(call_ast, value=False)
+            return
+        self.__call(call_ast)
+        self.__emit(POP)
+
+    def __assign(self, assign_ast):
+        slot = self.__slot(assign_ast)
+        if slot == NO_SLOT:
+            self.__fail(ErrorType.NAME_ERROR, f"Undefined variable {assign_ast.name} in assignment")
+            return
+        self.__lazy(assign_ast.expression, "assignment")
+        self.__emit(STORE, slot)
+
+    def __var_def(self, var_ast):
+        slot = self.__slot(var_ast)
+        if slot == NO_SLOT:
+            self.__fail(ErrorType.NAME_ERROR, f"Duplicate definition for variable {var_ast.name}")
+            return
+        self.__emit(CONST, NIL_VALUE)
+        self.__emit(STORE, slot)
+
+    def __return(self, return_ast):
+        for _ in range(self.__tries):
+            self.__emit(POP_TRY)
+        if return_ast.expression is None:
+            self.__emit(CONST, NIL_VALUE)
+        else:
+            self.__lazy(return_ast.expression, "return value")
+        self.__emit(RETURN)
+
+    # evaluate the condition of an if or for statement, and jump if it's false; gives
+    # the jump, to be landed
+    def __condition(self, condition_ast, statement_name):
+        self.__value(condition_ast)
+        self.__emit(COND, (Type.BOOL, f"Incompatible type for {statement_name} condition"))
+        return self.__emit(JUMP_IF_FALSE)
+
+    def __if(self, if_ast):
+        to_else = self.__condition(if_ast.condition, "if")
+        self.__block(if_ast.statements)
+        if if_ast.else_statements is None:
+            self.__land(to_else)
+            return
+        to_end = self.__emit(JUMP)
+        self.__land(to_else)
+        self.__block(if_ast.else_statements)
+        self.__land(to_end)
+
+    def __for(self, for_ast):
+        self.__assign(for_ast.init)
+        loop = self.__here()
+        to_end = self.__condition(for_ast.condition, "for")
+        self.__block(for_ast.statements)
+        self.__assign(for_ast.update)
+        self.__emit(JUMP, loop)
+        self.__land(to_end)
+
+    # the try block, then, for what's raised in it, the first catch block for its
+    # value; anything else goes on to the try block around this one
+    def __try(self, try_ast):
+        handler = self.__emit(SETUP_TRY)
+        self.__tries += 1
+        self.__block(try_ast.statements)
+        self.__tries -= 1
+        self.__emit(POP_TRY)
+        to_end = [self.__emit(JUMP)]
+        self.__land(handler)
+        catch_blocks = {}
+        self.__emit(CATCH, catch_blocks)
+        for catcher in try_ast.catchers:
+            catch_blocks.setdefault(catcher.exception_type, self.__here())
+            self.__block(catcher.statements)
+            to_end.append(self.__emit(JUMP))
+        for jump in to_end:
+            self.__land(jump)
+
+    def __raise(self, raise_ast):
+        self.__value(raise_ast.exception_type)
+        self.__emit(RAISE, (Type.STRING, "Incompatible type for raise exception type"))
+
+    # lazy values
+
+    # generate code pushing a lazy value of expr_ast, in the locals as they are now
+    def __lazy(self, expr_ast, kind):
+        value = self.__lazy_value(expr_ast, kind)
+        if isinstance(value, CodeObject):
+            self.__emit(THUNK, (value, not self.__code.lazy))
+        else:
+            self.__emit(CONST, value)
+
+    # the Value of expr_ast if it's a literal, or else the CodeObject of a lazy value
+    # of it; kind says what it's the value of, to name the code
+    def __lazy_value(self, expr_ast, kind):
+        kind_of_node = expr_ast.elem_type
+        if kind_of_node == InterpreterBase.NIL_NODE:
+            return NIL_VALUE
+        if kind_of_node in LITERAL_TYPES:
+            return Value(LITERAL_TYPES[kind_of_node], expr_ast.val)
+        outer_code, outer_statement = self.__code, self.__statement
+        code = CodeObject(f"<{kind} in {self.__function_name}>", 0)
+        code.lazy = True
+        code.n_locals = outer_code.n_locals
+        code.slot_names = outer_code.slot_names  # it runs on the same slots
+        self.__code, self.__statement = code, None  # errors are located where it's evaluated
+        self.__expression(expr_ast)
+        self.__emit(END_THUNK)
+        self.__finish(code)
+        self.__code, self.__statement = outer_code, outer_statement
+        self.lazy_codes.append(code)
+        return code
+
+    # calls
+
+    # generate a call, leaving what it gives on the stack: a Value for a builtin, and
+    # what the function returned, which can be a Thunk, for any other
+    def __call(self, call_ast):
+        name, args = call_ast.name, call_ast.args
+        if name == "print":
+            self.__print(call_ast)
+        elif name == "inputi" or name == "inputs":
+            self.__input(call_ast)
+        else:
+            self.__call_user_func(name, args)
+
+    def __call_user_func(self, name, args):
+        candidate_funcs = self.interpreter.func_name_to_ast.get(name)
+        if candidate_funcs is None:
+            self.__fail(ErrorType.NAME_ERROR, f"Function {name} not found")
+            return
+        func_ast = candidate_funcs.get(len(args))
+        if func_ast is None:
+            self.__fail(ErrorType.NAME_ERROR, f"Function {name} taking {len(args)} params not found")
+            return
+        lazy_args = tuple(self.__lazy_value(arg, "argument") for arg in args)
+        param_slots = tuple(self.resolution.param_slots[func_ast])
+        self.__emit(CALL_LAZY, (self.codes[func_ast], param_slots, lazy_args, not self.__code.lazy))
+
+    # A builtin's arguments are evaluated in the running function's variables. In a
+    # function's own code, those are its locals; in a lazy value's, the names in them
+    # are looked up in the function running as it's evaluated. Gives whether it
+    # generated the VIEW, to be ended.
+    def __view(self, call_ast):
+        variables = self.resolution.builtin_variables.get(call_ast)
+        if not self.__code.lazy or not variables:
+            return False
+        self.__emit(VIEW, tuple(variables))
+        return True
+
+    # value: whether to leave print's value, nil, on the stack
+    def __print(self, call_ast, value=True):
+        view = self.__view(call_ast)
+        self.__emit(CONST, "")
+        for arg in call_ast.args:
+            self.__value(arg)
+            self.__emit(CONCAT, get_printable)
+        self.__emit(PRINT)
+        self.__emit(POP)
+        if value:
+            self.__emit(CONST, NIL_VALUE)
+        if view:
+            self.__emit(END_VIEW)
+
+    def __input(self, call_ast):
+        args = call_ast.args
+        if len(args) > 1:
+            self.__fail(ErrorType.NAME_ERROR, "No inputi() function that takes > 1 parameter")
+            return
+        view = False
+        if args:
+            view = self.__view(call_ast)
+            self.__value(args[0])
+            self.__emit(PROMPT, get_printable)
+        self.__emit(INPUT, input_int if call_ast.name == "inputi" else input_string)
+        if view:
+            self.__emit(END_VIEW)
+
+    # expressions
+
+    # generate code leaving the expression's value on the stack, which, for a call,
+    # can be a Thunk
+    def __expression(self, expr_ast):
+        compile_fn = self.__expression_compilers.get(expr_ast.elem_type)
+        if compile_fn is None:
+            self.__emit(CONST, None)  # the tree walker has no value for it either
+            return
+        compile_fn(expr_ast)
+
+    # the same, forced to a Value
+    def __value(self, expr_ast):
+        self.__expression(expr_ast)
+        if expr_ast.elem_type == InterpreterBase.FCALL_NODE:
+            self.__emit(FORCE)
+
+    def __constant(self, literal_ast):
+        self.__emit(CONST, Value(LITERAL_TYPES[literal_ast.elem_type], literal_ast.val))
+
+    def __variable(self, var_ast):
+        self.__emit(LOAD, self.__slot(var_ast))
+        self.__emit(FORCE, f"Variable {var_ast.name} not found")
+
+    def __binary_op(self, arith_ast):
+        self.__operation(arith_ast.elem_type, (arith_ast.op1, arith_ast.op2))
+
+    # operands folded in from the left with oper. && and || skip the operands after one
+    # that decides the result.
+    def __operation(self, oper, operands):
+        if oper in ("&&", "||"):
+            apply = self.interpreter.op_to_lambda[Type.BOOL][oper]
+            self.__value(operands[0])
+            for operand_ast in operands[1:]:
+                decided = self.__emit(SHORT_CIRCUIT, (Type.BOOL, oper == "||", Value(Type.BOOL, oper == "||"), None))
+                self.__value(operand_ast)
+                self.__emit(APPLY, apply)
+                self.__land(decided)
+            return
+        apply = self.__operators[oper]
+        left_call = self.__operand(operands[0])
+        for operand_ast in operands[1:]:
+            right_call = self.__operand(operand_ast)
+            if left_call:
+                self.__emit(SWAP)
+                self.__emit(FORCE)
+                self.__emit(SWAP)
+            if right_call:
+                self.__emit(FORCE)
+            self.__emit(APPLY, apply)
+            left_call = False
+
+    # an operand, forced a step; gives whether it's a call, which can need more
+    def __operand(self, operand_ast):
+        self.__expression(operand_ast)
+        if operand_ast.elem_type != InterpreterBase.FCALL_NODE:
+            return False
+        self.__emit(FORCE_ONCE)
+        return True
+
+    # the function applying oper to two Values, failing as the tree walker does on
+    # types it doesn't take
+    def __operator(self, oper):
+        error = self.error
+        operations = self.interpreter.op_to_lambda
+        any_types = oper in ("==", "!=")
+
+        def operate(left, right):
+            if not any_types and left.t != right.t:
+                error(ErrorType.TYPE_ERROR, f"Incompatible types for {oper} operation")
+            f = operations.get(left.t, {}).get(oper)
+            if f is None:
+                error(ErrorType.TYPE_ERROR, f"Incompatible operator {oper} for type {left.t}")
+            return f(left, right)
+
+        operate.__name__ = oper
+        return operate
+
+    def __unary(self, unary_ast, apply):
+        self.__value(unary_ast.op1)
+        self.__emit(APPLY1, apply)
+
+    def __negate(self, value):
+        if value.t != Type.INT:
+            self.error(ErrorType.TYPE_ERROR, f"Incompatible type for {InterpreterBase.NEG_NODE} operation")
+        return Value(Type.INT, -value.v)
+
+    def __invert(self, value):
+        if value.t != Type.BOOL:
+            self.error(ErrorType.TYPE_ERROR, f"Incompatible type for {InterpreterBase.NOT_NODE} operation")
+        return Value(Type.BOOL, not value.v)
+
+
+def main():
+    from interpreter_v_4.interpreterv4 import Interpreter
+
+    arg_parser = argparse.ArgumentParser(description="Print the bytecode a v4 Brewin program compiles to.")
+    arg_parser.add_argument("path")
+    args = arg_parser.parse_args()
+
+    with open(args.path) as f:
+        program = f.read()
+    interpreter = Interpreter()
+    interpreter.load(program)
+    compiler = BytecodeCompiler(interpreter)
+    entry = compiler.compile_program()
+    codes = [entry, *compiler.codes.values(), *compiler.lazy_codes]
+    print("\n\n".join(disassemble(code) for code in codes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# Compact binary serialization of Element trees.
+#
+# Layout (all integers little-endian):
+#   header   magic "BRWA", format version, string/node/field/item counts, root node,
+#            CRC-32 of everything after the header
+#   strings  (n_strings + 1) u32 offsets into the utf-8 string blob, then the blob
+#   nodes    one (type string, first field, field count, span high, span low) record
+#            per node, the span split at spans.OFFSET_BITS
+#   fields   one (key string, tag, payload) record per node field
+#   items    u32 node indexes making up the list-valued fields (string indexes, for
+#            the tuples of names in fieldpath nodes)
+#
+# Every string (node types, field names, identifiers, literals) is stored once.
+# Nodes are written children first, so a reader can build the whole tree in one
+# forward pass over the node table with every child already materialized.
+import struct
+import zlib
+
+from parser.element import Element
+from parser.spans import OFFSET_BITS, OFFSET_MASK
+
+MAGIC = b"BRWA"
+# also bumped when the parsers change the shape of the trees they build (4: chain
+# nodes; 7: spans on statements only), since ASTStore keys its files on it
+FORMAT_VERSION = 7
+
+_HEADER = struct.Struct("<4sHHIIIIII")
+_U32 = struct.Struct("<I")
+_NODE = struct.Struct("<IIIQQ")
+_FIELD = struct.Struct("<IBq")
+
+_TAG_NONE = 0
+_TAG_BOOL = 1
+_TAG_INT = 2
+_TAG_BIGINT = 3  # ints that don't fit in 64 bits are stored as decimal strings
+_TAG_STR = 4
+_TAG_NODE = 5
+_TAG_LIST = 6
+_TAG_NAMES = 7  # a non-empty tuple of strings
+
+_INT64_MIN = -(1 << 63)
+_INT64_MAX = (1 << 63) - 1
+
+
+class ASTFormatError(ValueError):
+    pass
+
+
+def dumps(ast):
+    strings = {}
+    nodes = bytearray()
+    fields = bytearray()
+    items = bytearray()
+    node_index = {}  # id(element) -> index in the node table
+
+    def intern(s):
+        sid = strings.get(s)
+        if sid is None:
+            sid = strings[s] = len(strings)
+        return sid
+
+    # post-order walk with an explicit stack: a node is written once all its children are
+    stack = [(ast, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if id(node) in node_index:
+            continue
+        if not children_done:
+            stack.append((node, True))
+            for value in node.dict.values():
+                if isinstance(value, Element):
+                    stack.append((value, False))
+                elif isinstance(value, (list, tuple)):
+                    stack.extend((v, False) for v in reversed(value) if isinstance(v, Element))
+            continue
+
+        first_field = len(fields) // _FIELD.size
+        for key, value in node.dict.items():
+            fields += _FIELD.pack(intern(key), *_encode_value(value, intern, node_index, items))
+        node_index[id(node)] = len(node_index)
+        span = node.span
+        nodes += _NODE.pack(
+            intern(node.elem_type), first_field, len(node.dict), span >> OFFSET_BITS, span & OFFSET_MASK
+        )
+
+    blob = bytearray()
+    offsets = bytearray()
+    for s in strings:  # dicts keep insertion order, which matches the string ids
+        offsets += _U32.pack(len(blob))
+        blob += s.encode("utf-8")
+    offsets += _U32.pack(len(blob))
+
+    body = b"".join((offsets, blob, nodes, fields, items))
+    header = _HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        0,
+        len(strings),
+        len(node_index),
+        len(fields) // _FIELD.size,
+        len(items) // _U32.size,
+        node_index[id(ast)],
+        zlib.crc32(body),
+    )
+    return header + body
+
+
+def _encode_value(value, intern, node_index, items):
+    if value is None:
+        return _TAG_NONE, 0
+    if isinstance(value, bool):
+        return _TAG_BOOL, int(value)
+    if isinstance(value, int):
+        if _INT64_MIN <= value <= _INT64_MAX:
+            return _TAG_INT, value
+        return _TAG_BIGINT, intern(str(value))
+    if isinstance(value, str):
+        return _TAG_STR, intern(value)
+    if isinstance(value, Element):
+        return _TAG_NODE, node_index[id(value)]
+    if isinstance(value, tuple) and value and isinstance(value[0], str):
+        first_item = len(items) // _U32.size
+        for v in value:
+            items.extend(_U32.pack(intern(v)))
+        return _TAG_NAMES, (first_item << 32) | len(value)
+    if isinstance(value, (list, tuple)):
+        first_item = len(items) // _U32.size
+        for v in value:
+            items.extend(_U32.pack(node_index[id(v)]))
+        return _TAG_LIST, (first_item << 32) | len(value)
+    raise ASTFormatError(f"Can't serialize field value {value!r}")
+
+
+# Builds a frozen Element tree from a bytes-like object (bytes, memoryview, mmap).
+# The tables are unpacked straight out of the buffer, so a memory-mapped file is
+# never copied as a whole; only the string blob is. The whole tree is built here, in
+# one pass, rather than node by node as it's reached: every interpreter walks all of
+# a program's functions (folding, resolving slots) as soon as it loads it, so nodes
+# built on demand would all be built anyway, and would keep the mapping open and
+# put a check in front of every field read while the program runs. Anything that isn't a complete,
+# undamaged file written by dumps raises ASTFormatError: the checksum catches damage,
+# and every count and index is checked before use, so even a file that passes it
+# can't make the reader fail any other way.
+def loads(buffer):
+    with memoryview(buffer) as buf:
+        return _loads(buf)
+
+
+def _loads(buf):
+    if len(buf) < _HEADER.size:
+        raise ASTFormatError("Truncated AST file")
+    magic, version, pad, n_strings, n_nodes, n_fields, n_items, root, checksum = _HEADER.unpack_from(buf)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ASTFormatError("Not a compiled AST file, or written by another version")
+    if pad != 0 or zlib.crc32(buf[_HEADER.size :]) != checksum:
+        raise ASTFormatError("Corrupt AST file")
+
+    pos = _HEADER.size
+    tables_size = n_nodes * _NODE.size + n_fields * _FIELD.size + n_items * _U32.size
+    if pos + (n_strings + 1) * _U32.size + tables_size > len(buf):
+        raise ASTFormatError("Truncated AST file")
+    offsets = struct.unpack_from(f"<{n_strings + 1}I", buf, pos)
+    pos += (n_strings + 1) * _U32.size
+    if pos + offsets[-1] + tables_size != len(buf) or offsets[0] != 0:
+        raise ASTFormatError("Corrupt AST file")
+    if any(offsets[i] > offsets[i + 1] for i in range(n_strings)):
+        raise ASTFormatError("Corrupt AST file")
+    blob = bytes(buf[pos : pos + offsets[-1]])
+    pos += offsets[-1]
+    strings = [blob[offsets[i] : offsets[i + 1]].decode("utf-8") for i in range(n_strings)]
+    node_table = struct.unpack_from("<" + "IIIQQ" * n_nodes, buf, pos)
+    pos += n_nodes * _NODE.size
+    field_table = struct.unpack_from("<" + "IBq" * n_fields, buf, pos)
+    pos += n_fields * _FIELD.size
+    item_table = struct.unpack_from(f"<{n_items}I", buf, pos)
+    if root >= n_nodes:
+        raise ASTFormatError("Corrupt AST file")
+    try:
+        return _build(strings, node_table, field_table, item_table)[root].freeze()
+    except (IndexError, TypeError) as e:
+        # an index past the end of its table, or fields the node type doesn't have
+        raise ASTFormatError("Corrupt AST file") from e
+
+
+def _build(strings, node_table, field_table, item_table):
+    built = []
+    for n in range(0, len(node_table), 5):
+        type_sid, first_field, n_node_fields, span_high, span_low = node_table[n : n + 5]
+        if 3 * (first_field + n_node_fields) > len(field_table):
+            raise IndexError("field out of range")
+        kwargs = {}
+        for f in range(3 * first_field, 3 * (first_field + n_node_fields), 3):
+            key_sid, tag, payload = field_table[f : f + 3]
+            if tag == _TAG_INT:
+                value = payload
+            elif tag == _TAG_NONE:
+                value = None
+            elif tag == _TAG_BOOL:
+                value = bool(payload)
+            elif tag == _TAG_LIST or tag == _TAG_NAMES:
+                first_item, count = payload >> 32, payload & 0xFFFFFFFF
+                if first_item < 0 or first_item + count > len(item_table):
+                    raise IndexError("item out of range")
+                items = item_table[first_item : first_item + count]
+                if tag == _TAG_LIST:
+                    value = [built[i] for i in items]
+                else:
+                    value = tuple(strings[i] for i in items)
+            elif payload < 0:
+                raise IndexError("negative index")
+            elif tag == _TAG_NODE:
+                value = built[payload]  # children come first, so anything later is out of range
+            elif tag == _TAG_STR:
+                value = strings[payload]
+            elif tag == _TAG_BIGINT:
+                value = int(strings[payload])
+            else:
+                raise ASTFormatError(f"Unknown field tag {tag}")
+            kwargs[strings[key_sid]] = value
+        built.append(Element(strings[type_sid], span=span_high << OFFSET_BITS | span_low, **kwargs))
+    return built
@@ -0,0 +1,88 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+# Returns the key used to look up a program's AST: a digest of its source text
+def source_key(program):
+    return hashlib.blake2b(program.encode("utf-8"), digest_size=16).digest()
+
+
+# source_key of the concatenation of chunks, and its length, without joining them
+def source_key_chunks(chunks):
+    digest = hashlib.blake2b(digest_size=16)
+    size = 0
+    for chunk in chunks:
+        digest.update(chunk.encode("utf-8"))
+        size += len(chunk)
+    return digest.digest(), size
+
+
+# A bounded, thread-safe LRU cache of parsed programs.
+# Entries are evicted least-recently-used first once either the number of
+# entries or their total size (the length of the source each AST came from,
+# a cheap stand-in for the size of the tree) goes over its limit.
+# Every AST stored here is frozen, since the same tree is handed to every caller.
+class ASTCache:
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.__entries = OrderedDict()  # key -> (ast, size)
+        self.__total_bytes = 0
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # returns the cached AST for key, or None
+    def get(self, key):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    # caches ast under key, frozen, and returns it. Every tree put here comes back
+    # frozen, cached or not, so no caller can count on being able to change one.
+    def put(self, key, ast, size):
+        ast.freeze()
+        if size > self.max_bytes or self.max_entries <= 0:
+            return ast  # would evict everything else; don't bother caching it
+        with self.__lock:
+            old = self.__entries.pop(key, None)
+            if old is not None:
+                self.__total_bytes -= old[1]
+            self.__entries[key] = (ast, size)
+            self.__total_bytes += size
+            while (
+                len(self.__entries) > self.max_entries
+                or self.__total_bytes > self.max_bytes
+            ):
+                _, (_, evicted_size) = self.__entries.popitem(last=False)
+                self.__total_bytes -= evicted_size
+                self.evictions += 1
+        return ast
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        with self.__lock:
+            return {
+                "entries": len(self.__entries),
+                "bytes": self.__total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self):
+        return len(self.__entries)
@@ -0,0 +1,64 @@
+import hashlib
+import mmap
+import os
+import tempfile
+
+from parser.astbinary import FORMAT_VERSION, ASTFormatError, dumps, loads
+
+
+# A content-addressed directory of compiled ASTs that any number of processes can share.
+# Files live at <directory>/<grammar>/<xx>/<source digest>.ast, where <grammar> is a
+# digest of the parser's grammar signature (the one PLY stores in parsetab.py) and the
+# binary format version, so a grammar change never serves a stale tree.
+# Files are written to a temporary name and renamed into place, so readers only ever
+# see complete files, and a damaged file is treated as a miss. A file is mapped
+# rather than read, but the tree is still built whole when it's loaded (see
+# astbinary.loads).
+class ASTStore:
+    SUFFIX = ".ast"
+
+    def __init__(self, directory, grammar_signature):
+        digest = hashlib.blake2b(
+            f"{FORMAT_VERSION}:{grammar_signature}".encode("utf-8"), digest_size=8
+        ).hexdigest()
+        self.directory = os.path.join(directory, digest)
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(self, key):
+        name = key.hex()
+        return os.path.join(self.directory, name[:2], name + ASTStore.SUFFIX)
+
+    # returns the stored AST for key (frozen), or None
+    def load(self, key):
+        try:
+            with open(self.path_for(key), "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    ast = loads(mapped)
+        except (OSError, ValueError, ASTFormatError):
+            # missing, empty (mmap refuses zero-length files), truncated or damaged
+            self.misses += 1
+            return None
+        self.hits += 1
+        return ast
+
+    # stores ast under key; a store we can't write to just doesn't cache anything
+    def save(self, key, ast):
+        return self.save_serialized(key, dumps(ast))
+
+    # the same, for a tree already serialized with astbinary.dumps
+    def save_serialized(self, key, data):
+        path = self.path_for(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            return False
+        return True
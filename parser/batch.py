@@ -0,0 +1,150 @@
+# Parsing many program files at once on a pool of worker processes.
+#
+#   results = parse_many(paths, workers=8)
+#
+# gives a ParseResult(path, ast, error) for each path, in the order the paths were
+# given. error is None if the file parsed cleanly; otherwise it's the syntax error
+# message(s) the parser printed, or why the file couldn't be read, and ast is what
+# parsing still produced (None if nothing could be recovered). Trees come back frozen,
+# or as astbinary bytes with serialized=True.
+#
+# Files are handed out in chunks of about chunk_bytes of source, so many small files
+# cost one round trip to a worker rather than one each, and trees travel back
+# serialized with astbinary, which is smaller and much faster to move than a pickled
+# tree. With workers=1 everything runs in this process.
+#
+# From the shell, where a directory stands for every .br file under it:
+#   python -m parser.batch [-j N] [--engine ply|pratt] [--store DIR] PATH...
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from parser.astbinary import dumps, loads
+from parser.astcache import source_key
+from parser.aststore import ASTStore
+from parser.brewparse import ENGINES, parse_program
+
+ParseResult = namedtuple("ParseResult", ("path", "ast", "error"))
+
+# the fewest chunks each worker gets, so one slow chunk doesn't leave the rest idle
+_CHUNKS_PER_WORKER = 4
+
+
+# store is the directory of an ASTStore to also save every parsed tree in, so that
+# parse_program finds them there later (see brewparse.set_ast_store).
+def parse_many(paths, workers=None, engine="ply", serialized=False, store=None, chunk_bytes=1 << 18):
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown parser engine {engine}")
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = _parse_chunk(paths, engine, store)
+    else:
+        chunks = _chunks(paths, chunk_bytes, workers)
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            results = []
+            for chunk_results in pool.map(_parse_chunk, chunks, [engine] * len(chunks), [store] * len(chunks)):
+                results += chunk_results
+    return [
+        ParseResult(path, data if serialized or data is None else loads(data), error)
+        for path, (data, error) in zip(paths, results)
+    ]
+
+
+# paths split up into runs of about chunk_bytes of source, and into at least
+# _CHUNKS_PER_WORKER runs per worker when there are enough paths
+def _chunks(paths, chunk_bytes, workers):
+    sizes = []
+    for path in paths:
+        try:
+            sizes.append(os.path.getsize(path))
+        except OSError:
+            sizes.append(0)  # reported when the worker tries to read it
+    chunk_bytes = max(1, min(chunk_bytes, sum(sizes) // (workers * _CHUNKS_PER_WORKER)))
+    chunks = []
+    chunk = []
+    chunk_size = 0
+    for path, size in zip(paths, sizes):
+        chunk.append(path)
+        chunk_size += size
+        if chunk_size >= chunk_bytes:
+            chunks.append(chunk)
+            chunk = []
+            chunk_size = 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+# (serialized tree or None, error or None) for each of paths; runs in a worker
+def _parse_chunk(paths, engine, store):
+    ast_store = ASTStore(store, _grammar_signature()) if store is not None else None
+    results = []
+    for path in paths:
+        try:
+            with open(path) as f:
+                program = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            results.append((None, str(e)))
+            continue
+        messages = io.StringIO()  # the parsers print syntax errors
+        ast = None
+        with contextlib.redirect_stdout(messages):
+            try:
+                ast = parse_program(program, use_cache=False, engine=engine)
+            except SyntaxError:
+                pass
+        error = messages.getvalue().strip() or (None if ast is not None else "Syntax error")
+        data = None if ast is None else dumps(ast)
+        if ast_store is not None and data is not None and error is None:
+            ast_store.save_serialized(source_key(program), data)
+        results.append((data, error))
+    return results
+
+
+def _grammar_signature():
+    from parser import parsetab
+
+    return parsetab._lr_signature
+
+
+# the .br files under each directory in paths, and every other path as is
+def expand_paths(paths):
+    expanded = []
+    for path in paths:
+        if not os.path.isdir(path):
+            expanded.append(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            expanded += [os.path.join(root, name) for name in sorted(files) if name.endswith(".br")]
+    return expanded
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Parse many Brewin programs in parallel.")
+    arg_parser.add_argument("paths", nargs="+", help="program files, or directories of .br files")
+    arg_parser.add_argument("-j", "--workers", type=int, help="worker processes (default: one per CPU)")
+    arg_parser.add_argument("--engine", choices=ENGINES, default="ply")
+    arg_parser.add_argument("--store", help="directory of an AST store to save the trees in")
+    args = arg_parser.parse_args()
+
+    paths = expand_paths(args.paths)
+    start = time.perf_counter()
+    results = parse_many(paths, args.workers, args.engine, serialized=True, store=args.store)
+    elapsed = time.perf_counter() - start
+    failed = [result for result in results if result.error is not None]
+    for result in failed:
+        print(f"{result.path}: {result.error}")
+    print(f"parsed {len(results)} files in {elapsed:.2f}s, {len(failed)} with errors", file=sys.stderr)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
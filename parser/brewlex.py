@@ -1,6 +1,3 @@
-
-from ply import lex
-
 reserved = (
     "VAR",
     "FUNC",
@@ -130,7 +127,40 @@ def t_error(t):
     t.lexer.skip(1)
 
 def reset_lineno():
-    lexer.lineno = 1
+    get_lexer().lineno = 1
+
+
+# The PLY lexer for the rules above. The parsers don't use it (brewscan's tokenizer
+# reads the rules directly), so it's only built when first asked for, from the
+# precompiled tables in lextab.py; see buildtables.py.
+_lexer = None
+
+
+def get_lexer():
+    global _lexer
+    if _lexer is None:
+        from ply import lex
+
+        lexer = lex.Lexer()
+        try:
+            lexer.readtab("parser.lextab", globals())
+        except ImportError:
+            lexer = build_lexer()  # no tables (or old ones)
+        _lexer = lexer
+    return _lexer
+
+
+# Builds a new PLY lexer from the rules in this module. This has to be called from
+# here: ply.lex reads the rules from its caller's globals, and for rules of the same
+# length their order there (the order they're defined in) decides which one wins.
+def build_lexer():
+    from ply import lex
+
+    return lex.lex()
+
 
-# Build the lexer
-lexer = lex.lex()
+# brewlex.lexer is still available, built on first use
+def __getattr__(name):
+    if name == "lexer":
+        return get_lexer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,7 +1,17 @@
 from parser.element import Element
+import copy
+import os
+import threading
+
+from parser.astcache import ASTCache, source_key, source_key_chunks
+from parser.aststore import ASTStore
+from parser.brewpratt import parse_tokens, report_syntax_error, syntax_errors_reported
+from parser.brewscan import Scanner, tokenize, tokenize_chunks
+from parser.chains import binary_node
+from parser.spans import LINE_SHIFT, OFFSET_BITS, join_spans, make_span
+from parser.incremental import IncrementalParser
 from parser.brewlex import *
 from intbase import InterpreterBase
-from ply import yacc
 
 # Parsing rules
 
@@ -14,6 +24,26 @@ precedence = (
     ("right", "UMINUS", "NOT"),
 )
 
+# Source positions in the LR parser. Tokens know the lineno and lexpos they start at
+# (see brewscan.Token). Definitions and statements get a span from the first token of
+# their rule to the last, which is always a token (a ; or }); only expressions get none
+# (see spans.py). An assignment or expression statement starts with an expression or a
+# dotted name, so those rules hand their first token on, as symbol.start, to the rule
+# above them.
+def rule_span(p):
+    symbols = p.slice
+    first = symbols[1]
+    return first.lineno << LINE_SHIFT | first.lexpos << OFFSET_BITS | symbols[-1].lexpos
+
+
+# the span of a statement made of the symbol before its semicolon, which gave its
+# first token as start
+def statement_span(p):
+    symbols = p.slice
+    first = symbols[1].start
+    return first.lineno << LINE_SHIFT | first.lexpos << OFFSET_BITS | symbols[2].lexpos
+
+
 def collapse_items(p, group_index, singleton_index):
     if len(p) == 2:
         p[0] = [p[1]]
@@ -26,9 +56,11 @@ def p_program(p):
     """program : structs funcs
     | funcs"""
     if len(p) == 2:
-        p[0] = Element(InterpreterBase.PROGRAM_NODE, structs=[], functions=p[1])
+        span = join_spans(p[1][0].span, p[1][-1].span)
+        p[0] = Element(InterpreterBase.PROGRAM_NODE, structs=[], functions=p[1], span=span)
     else:
-        p[0] = Element(InterpreterBase.PROGRAM_NODE, structs=p[1], functions=p[2])
+        span = join_spans(p[1][0].span, p[2][-1].span)
+        p[0] = Element(InterpreterBase.PROGRAM_NODE, structs=p[1], functions=p[2], span=span)
 
 def p_structs(p):
     """structs : structs struct
@@ -37,7 +69,7 @@ def p_structs(p):
 
 def p_struct(p):
    "struct : STRUCT NAME LBRACE fields RBRACE"
-   p[0] = Element(InterpreterBase.STRUCT_NODE, name=p[2], fields=p[4])
+   p[0] = Element(InterpreterBase.STRUCT_NODE, name=p[2], fields=p[4], span=rule_span(p))
 
 def p_fields(p):
    """fields : fields field
@@ -46,7 +78,7 @@ def p_fields(p):
 
 def p_field(p):
   "field : NAME COLON NAME SEMI"  # field_name: type
-  p[0] = Element(InterpreterBase.FIELD_DEF_NODE, name=p[1], var_type=p[3])
+  p[0] = Element(InterpreterBase.FIELD_DEF_NODE, name=p[1], var_type=p[3], span=rule_span(p))
 
 def p_funcs(p):
     """funcs : funcs func
@@ -58,17 +90,17 @@ def p_func(p):
     """func : FUNC NAME LPAREN formal_args RPAREN COLON NAME LBRACE statements RBRACE
     | FUNC NAME LPAREN RPAREN COLON NAME LBRACE statements RBRACE"""
     if len(p) == 11:  # handle with 1+ formal args
-        p[0] = Element(InterpreterBase.FUNC_NODE, name=p[2], args=p[4], return_type = p[7], statements=p[9])
+        p[0] = Element(InterpreterBase.FUNC_NODE, name=p[2], args=p[4], return_type = p[7], statements=p[9], span=rule_span(p))
     else:  # handle no formal args
-        p[0] = Element(InterpreterBase.FUNC_NODE, name=p[2], args=[], return_type = p[6], statements=p[8])
+        p[0] = Element(InterpreterBase.FUNC_NODE, name=p[2], args=[], return_type = p[6], statements=p[8], span=rule_span(p))
 
 def p_func2(p):
     """func : FUNC NAME LPAREN formal_args RPAREN LBRACE statements RBRACE
     | FUNC NAME LPAREN RPAREN LBRACE statements RBRACE"""
     if len(p) == 9:  # handle with 1+ formal args
-        p[0] = Element(InterpreterBase.FUNC_NODE, name=p[2], args=p[4], return_type = None, statements=p[7])
+        p[0] = Element(InterpreterBase.FUNC_NODE, name=p[2], args=p[4], return_type = None, statements=p[7], span=rule_span(p))
     else:  # handle no formal args
-        p[0] = Element(InterpreterBase.FUNC_NODE, name=p[2], args=[], return_type = None, statements=p[6])
+        p[0] = Element(InterpreterBase.FUNC_NODE, name=p[2], args=[], return_type = None, statements=p[6], span=rule_span(p))
 
 def p_formal_args(p):
     """formal_args : formal_args COMMA formal_arg
@@ -80,9 +112,9 @@ def p_formal_arg(p):
     """formal_arg : NAME COLON NAME
     | NAME"""
     if len(p) == 2:
-      p[0] = Element(InterpreterBase.ARG_NODE, name=p[1], var_type = None)
+      p[0] = Element(InterpreterBase.ARG_NODE, name=p[1], var_type = None, span=rule_span(p))
     else:
-      p[0] = Element(InterpreterBase.ARG_NODE, name=p[1], var_type = p[3])
+      p[0] = Element(InterpreterBase.ARG_NODE, name=p[1], var_type = p[3], span=rule_span(p))
 
 def p_statements(p):
     """statements : statements statement
@@ -93,18 +125,22 @@ def p_statements(p):
 def p_statement___assign(p):
     "statement : assign SEMI"
     p[0] = p[1]
+    p[0].span = statement_span(p)
 
 def p_assign(p):
     "assign : variable_w_dot ASSIGN expression"
-    p[0] = Element("=", name=p[1], expression=p[3])
+    symbols = p.slice
+    symbols[0].start = symbols[1].start
+    name, path = dotted_name(p[1])
+    p[0] = Element("=", name=name, expression=p[3], path=path)
 
 def p_statement___var(p):
     """statement : VAR variable COLON NAME SEMI
     | VAR variable SEMI"""
     if len(p) == 6:
-      p[0] = Element(InterpreterBase.VAR_DEF_NODE, name=p[2], var_type=p[4])
+      p[0] = Element(InterpreterBase.VAR_DEF_NODE, name=p[2], var_type=p[4], span=rule_span(p))
     else:
-      p[0] = Element(InterpreterBase.VAR_DEF_NODE, name=p[2], var_type=None)
+      p[0] = Element(InterpreterBase.VAR_DEF_NODE, name=p[2], var_type=None, span=rule_span(p))
 
 def p_variable(p):
     "variable : NAME"
@@ -113,10 +149,21 @@ def p_variable(p):
 def p_variable_w_dot(p):
     """variable_w_dot : variable_w_dot DOT NAME
     | NAME"""
+    symbols = p.slice
     if len(p) == 4:
-        p[0] = p[1] + "." + p[3]
-    else:
+        symbols[0].start = symbols[1].start
         p[0] = p[1]
+        p[0].append(p[3])
+    else:
+        symbols[0].start = symbols[1]
+        p[0] = [p[1]]
+
+# The name and field path (see element.py) for the list of names of a variable_w_dot
+def dotted_name(names):
+    if len(names) == 1:
+        return names[0], None
+    path = Element(InterpreterBase.FIELD_PATH_NODE, base=names[0], fields=tuple(names[1:]))
+    return ".".join(names), path
 
 def p_statement_if(p):
     """statement : IF LPAREN expression RPAREN LBRACE statements RBRACE
@@ -128,6 +175,7 @@ def p_statement_if(p):
             condition=p[3],
             statements=p[6],
             else_statements=None,
+            span=rule_span(p),
         )
     else:
         p[0] = Element(
@@ -135,11 +183,14 @@ def p_statement_if(p):
             condition=p[3],
             statements=p[6],
             else_statements=p[10],
+            span=rule_span(p),
         )
 
 def p_statement_try(p):
     """statement : TRY LBRACE statements RBRACE catchers"""
-    p[0] = Element(InterpreterBase.TRY_NODE, statements=p[3], catchers=p[5])
+    first = p.slice[1]
+    span = join_spans(make_span(first.lineno, first.lexpos, first.lexpos), p[5][-1].span)
+    p[0] = Element(InterpreterBase.TRY_NODE, statements=p[3], catchers=p[5], span=span)
 
 def p_catches(p):
     """catchers : catchers catch
@@ -148,19 +199,20 @@ def p_catches(p):
 
 def p_catch(p):
     "catch : CATCH STRING LBRACE statements RBRACE"
-    p[0] = Element(InterpreterBase.CATCH_NODE, exception_type=p[2], statements=p[4])
+    p[0] = Element(InterpreterBase.CATCH_NODE, exception_type=p[2], statements=p[4], span=rule_span(p))
 
 def p_statement_for(p):
     "statement : FOR LPAREN assign SEMI expression SEMI assign RPAREN LBRACE statements RBRACE"
-    p[0] = Element(InterpreterBase.FOR_NODE, init=p[3], condition=p[5], update=p[7], statements=p[10])
+    p[0] = Element(InterpreterBase.FOR_NODE, init=p[3], condition=p[5], update=p[7], statements=p[10], span=rule_span(p))
 
 def p_statement_raise(p):
     "statement : RAISE expression SEMI"
-    p[0] = Element(InterpreterBase.RAISE_NODE, exception_type=p[2])
+    p[0] = Element(InterpreterBase.RAISE_NODE, exception_type=p[2], span=rule_span(p))
 
 def p_statement_expr(p):
     "statement : expression SEMI"
     p[0] = p[1]
+    p[0].span = statement_span(p)
 
 
 def p_statement_return(p):
@@ -170,20 +222,23 @@ def p_statement_return(p):
         expr = p[2]
     else:
         expr = None
-    p[0] = Element(InterpreterBase.RETURN_NODE, expression=expr)
+    p[0] = Element(InterpreterBase.RETURN_NODE, expression=expr, span=rule_span(p))
 
 
 def p_expression_not(p):
     "expression : NOT expression"
+    p.slice[0].start = p.slice[1]
     p[0] = Element(InterpreterBase.NOT_NODE, op1=p[2])
 
 
 def p_expression_uminus(p):
     "expression : MINUS expression %prec UMINUS"
+    p.slice[0].start = p.slice[1]
     p[0] = Element(InterpreterBase.NEG_NODE, op1=p[2])
 
 def p_expression_new(p):
     "expression : NEW NAME"
+    p.slice[0].start = p.slice[1]
     p[0] = Element(InterpreterBase.NEW_NODE, var_type=p[2])
 
 
@@ -198,50 +253,59 @@ def p_arith_expression_binop(p):
     | expression MINUS expression
     | expression MULTIPLY expression
     | expression DIVIDE expression"""
-    p[0] = Element(p[2], op1=p[1], op2=p[3])
+    p.slice[0].start = p.slice[1].start
+    p[0] = binary_node(p[2], p[1], p[3])
 
 
 def p_expression_group(p):
     "expression : LPAREN expression RPAREN"
+    p.slice[0].start = p.slice[1]
     p[0] = p[2]
 
 
 def p_expression_and_or(p):
     """expression : expression OR expression
     | expression AND expression"""
-    p[0] = Element(p[2], op1=p[1], op2=p[3])
+    p.slice[0].start = p.slice[1].start
+    p[0] = binary_node(p[2], p[1], p[3])
 
 
 def p_expression_number(p):
     "expression : NUMBER"
+    p.slice[0].start = p.slice[1]
     p[0] = Element(InterpreterBase.INT_NODE, val=p[1])
 
 
 def p_expression_bool(p):
     """expression : TRUE
     | FALSE"""
-    bool_val = p[1] == InterpreterBase.TRUE_DEF
-    p[0] = Element(InterpreterBase.BOOL_NODE, val=bool_val)
+    p.slice[0].start = p.slice[1]
+    p[0] = Element(InterpreterBase.BOOL_NODE, val=p[1] == InterpreterBase.TRUE_DEF)
 
 
 def p_expression_nil(p):
     "expression : NIL"
+    p.slice[0].start = p.slice[1]
     p[0] = Element(InterpreterBase.NIL_NODE)
 
 
 def p_expression_string(p):
     "expression : STRING"
+    p.slice[0].start = p.slice[1]
     p[0] = Element(InterpreterBase.STRING_NODE, val=p[1])
 
 
 def p_expression_variable(p):
     "expression : variable_w_dot"
-    p[0] = Element(InterpreterBase.VAR_NODE, name=p[1])
+    p.slice[0].start = p.slice[1].start
+    name, path = dotted_name(p[1])
+    p[0] = Element(InterpreterBase.VAR_NODE, name=name, path=path)
 
 
 def p_func_call(p):
     """expression : NAME LPAREN args RPAREN
     | NAME LPAREN RPAREN"""
+    p.slice[0].start = p.slice[1]
     if len(p) == 5:
         p[0] = Element(InterpreterBase.FCALL_NODE, name=p[1], args=p[3])
     else:
@@ -255,20 +319,183 @@ def p_expression_args(p):
 
 
 def p_error(p):
-    if p:
-        print(f"Syntax error at '{p.value}' on line {p.lineno}")
+    report_syntax_error(p)
+
+
+# ASTs of recently parsed programs, shared by every interpreter in the process.
+# Every tree parse_program and parse_file return with use_cache on is frozen, whether
+# it ends up cached or not, so callers must treat them as read-only.
+parse_cache = ASTCache()
+
+# Optional on-disk store of compiled ASTs shared between processes; see set_ast_store
+ast_store = None
+
+
+# Point parse_program at a directory of compiled ASTs (None turns the store off).
+# The BREWIN_AST_STORE environment variable sets one up at import time.
+def set_ast_store(directory):
+    global ast_store
+    if directory is None:
+        ast_store = None
     else:
-        print("Syntax error at EOF")
+        from parser import parsetab
 
+        ast_store = ASTStore(directory, parsetab._lr_signature)
+    return ast_store
 
-# exported function
-def parse_program(program):
-    reset_lineno()
-    ast = yacc.parse(program)
-    if ast is None:
-        raise SyntaxError("Syntax error")
-    return ast
+
+# Optional IncrementalParser that parse_program hands programs to before parsing them
+# whole; see set_incremental
+incremental_parser = None
+
+
+# Turn function-granularity reparsing on or off for parse_program. When it's on, a
+# program that differs from recently parsed ones in only a few functions costs about
+# as much as parsing those functions.
+def set_incremental(enabled):
+    global incremental_parser
+    incremental_parser = IncrementalParser() if enabled else None
+    return incremental_parser
 
 
-# generate our parser
-yacc.yacc() # yacc.yacc(debug=True, debuglog=open("parse.log", "w"))
+# Parsers parse_program can use: the PLY LALR parser built from the rules above, or
+# the hand-written recursive-descent parser in brewpratt.py. Both accept exactly the
+# same programs and build the same trees.
+ENGINES = ("ply", "pratt")
+
+
+# exported function
+def parse_program(program, use_cache=True, engine="ply"):
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown parser engine {engine}")
+    if not use_cache:
+        return _parse(program, engine)
+    key = source_key(program)
+    ast = parse_cache.get(key)
+    if ast is not None:
+        return ast
+    store = ast_store
+    if store is not None:
+        ast = store.load(key)
+    if ast is None:
+        reported = syntax_errors_reported()
+        incremental = incremental_parser
+        if incremental is not None:
+            ast = incremental.parse(program)
+        if ast is None:
+            ast = _parse(program, engine)
+        # the tree of a program the parser recovered in isn't cached, so the syntax
+        # error it printed is printed again every time the program's parsed
+        if syntax_errors_reported() != reported:
+            return ast.freeze()
+        if store is not None:
+            store.save(key, ast)
+    return parse_cache.put(key, ast, len(program))
+
+
+# Like parse_program, but reads the program from the file at path a chunk at a time,
+# so a very large program is never held in memory as one string alongside its AST.
+# The file is read twice when use_cache is on: once to compute its cache key, and
+# again to parse it if it isn't cached.
+def parse_file(path, use_cache=True, engine="ply", chunk_size=1 << 20):
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown parser engine {engine}")
+    if not use_cache:
+        return _parse_file(path, engine, chunk_size)
+    key, size = source_key_chunks(_read_chunks(path, chunk_size))
+    ast = parse_cache.get(key)
+    if ast is not None:
+        return ast
+    store = ast_store
+    if store is not None:
+        ast = store.load(key)
+    if ast is None:
+        reported = syntax_errors_reported()
+        ast = _parse_file(path, engine, chunk_size)
+        if syntax_errors_reported() != reported:
+            return ast.freeze()  # not cached, as in parse_program
+        if store is not None:
+            store.save(key, ast)
+    return parse_cache.put(key, ast, size)
+
+
+def _read_chunks(path, chunk_size):
+    with open(path) as f:
+        yield from iter(lambda: f.read(chunk_size), "")
+
+
+def _parse_file(path, engine, chunk_size):
+    return _thread_parser(engine).parse_tokens(tokenize_chunks(_read_chunks(path, chunk_size)))
+
+
+def _parse(program, engine):
+    return _thread_parser(engine).parse(program)
+
+
+# A parser with all of its state to itself, so separate Parser objects can be used
+# from separate threads at once. Both engines read tokens from brewscan's tokenizer,
+# which produces the same tokens as the PLY lexer in brewlex.py, only faster; the PLY
+# engine runs a copy of the LALR parser that shares its (read-only) tables with every
+# other copy. A single Parser must only be used by one thread at a time.
+class Parser:
+    def __init__(self, engine="ply"):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown parser engine {engine}")
+        self.engine = engine
+        self.__scanner = Scanner()
+        self.__lr_parser = copy.copy(_get_lr_parser()) if engine == "ply" else None
+
+    # returns the AST for program; raises SyntaxError if it can't be parsed
+    def parse(self, program):
+        return self.parse_tokens(tokenize(program))
+
+    # the same, for a stream of brewscan tokens
+    def parse_tokens(self, tokens):
+        if self.__lr_parser is None:
+            ast = parse_tokens(tokens)
+        else:
+            self.__scanner.feed(tokens)
+            try:
+                ast = self.__lr_parser.parse(lexer=self.__scanner)
+            finally:
+                self.__scanner.feed(())
+        if ast is None:
+            raise SyntaxError("Syntax error")
+        return ast
+
+
+# one Parser per engine for each thread that calls parse_program
+_thread_state = threading.local()
+
+
+def _thread_parser(engine):
+    parsers = getattr(_thread_state, "parsers", None)
+    if parsers is None:
+        parsers = _thread_state.parsers = {}
+    parser = parsers.get(engine)
+    if parser is None:
+        parser = parsers[engine] = Parser(engine)
+    return parser
+
+
+# The LALR parser for the rules above. It's built on first use, straight from the
+# precompiled tables in parsetab.py, without re-checking the grammar or writing any
+# files; run `python -m parser.buildtables` after changing the grammar.
+_lr_parser = None
+_lr_parser_lock = threading.Lock()
+
+
+def _get_lr_parser():
+    global _lr_parser
+    with _lr_parser_lock:
+        if _lr_parser is None:
+            from ply import yacc
+
+            tables = yacc.LRTable()
+            tables.read_table("parser.parsetab")
+            tables.bind_callables(globals())
+            _lr_parser = yacc.LRParser(tables, p_error)
+    return _lr_parser
+
+if os.environ.get("BREWIN_AST_STORE"):
+    set_ast_store(os.environ["BREWIN_AST_STORE"])
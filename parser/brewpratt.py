@@ -0,0 +1,412 @@
+# A hand-written recursive-descent parser for the grammar in brewparse.py, using
+# precedence climbing (Pratt parsing) for expressions. It builds exactly the same
+# Element trees as the PLY parser and reports and recovers from syntax errors the
+# same way PLY does with our grammar (which has no error productions):
+#   - the first bad token is reported through p_error's message,
+#   - everything parsed so far is dropped, along with the bad token,
+#   - tokens are skipped up to the next `func` or `struct`, and parsing restarts there,
+#   - no further errors are reported until 3 tokens have been consumed after a restart.
+import threading
+
+from intbase import InterpreterBase
+from parser.chains import binary_node
+from parser.element import Element
+from parser.spans import LINE_SHIFT, OFFSET_BITS
+
+# binding power of each binary operator token; higher binds tighter
+# (mirrors the precedence table in brewparse.py)
+BINARY_PRECEDENCE = {
+    "OR": 1,
+    "AND": 2,
+    "GREATER_EQ": 3,
+    "GREATER": 3,
+    "LESS_EQ": 3,
+    "LESS": 3,
+    "EQ": 3,
+    "NOT_EQ": 3,
+    "PLUS": 4,
+    "MINUS": 4,
+    "MULTIPLY": 5,
+    "DIVIDE": 5,
+}
+UNARY_PRECEDENCE = 6
+
+# tokens that PLY's start state can shift; error recovery resumes at one of these
+_RESTART_TOKENS = ("FUNC", "STRUCT")
+
+# tokens PLY must shift after an error before it reports another one
+_ERROR_COUNT = 3
+
+
+class _Error(Exception):
+    def __init__(self, token):
+        self.token = token
+
+
+class PrattParser:
+    def __init__(self, tokens):
+        self.__tokens = iter(tokens)
+        self.__tok = None  # current lookahead token, None at end of input
+        self.__last = None  # the last token consumed that ends a definition or statement
+        self.__errorcount = 0
+
+    def parse(self):
+        self.__next()
+        while True:
+            try:
+                return self.__program()
+            except _Error as e:
+                if self.__errorcount == 0:
+                    report_syntax_error(e.token)
+                self.__errorcount = _ERROR_COUNT
+                if e.token is None:
+                    return None
+                self.__next()  # drop the bad token
+                while self.__tok is not None and self.__tok.type not in _RESTART_TOKENS:
+                    self.__next()
+                if self.__tok is None:
+                    return None
+
+    # Parses struct and func definitions up to the end of input, without any error
+    # recovery; returns them in order, or None if there's a syntax error (which isn't
+    # reported). Used to parse pieces of a program on their own.
+    def parse_definitions(self):
+        self.__next()
+        definitions = []
+        try:
+            while self.__tok is not None:
+                if self.__peek() == "STRUCT":
+                    definitions.append(self.__struct())
+                else:
+                    definitions.append(self.__func())
+        except _Error:
+            return None
+        return definitions
+
+    # token handling
+
+    def __next(self):
+        self.__tok = next(self.__tokens, None)
+
+    def __peek(self):
+        return self.__tok.type if self.__tok is not None else None
+
+    # consume the lookahead token, which must be of type token_type, and return its value
+    def __expect(self, token_type):
+        tok = self.__tok
+        if tok is None or tok.type != token_type:
+            raise _Error(tok)
+        if self.__errorcount:
+            self.__errorcount -= 1
+        self.__tok = next(self.__tokens, None)
+        return tok.value
+
+    # __expect for a token that ends a definition or statement (a ;, a block's } or an
+    # argument's last name), the only tokens a span ends on
+    def __expect_end(self, token_type):
+        self.__last = self.__tok
+        return self.__expect(token_type)
+
+    # the source span from token start to the last token consumed by __expect_end,
+    # i.e. of the definition or statement parsed since start was the lookahead (packed
+    # as spans.make_span does)
+    def __span(self, start):
+        return start.lineno << LINE_SHIFT | start.lexpos << OFFSET_BITS | self.__last.lexpos
+
+    # consume the lookahead token if it's of type token_type
+    def __accept(self, token_type):
+        if self.__tok is not None and self.__tok.type == token_type:
+            self.__expect(token_type)
+            return True
+        return False
+
+    # top level
+
+    def __program(self):
+        start = self.__tok
+        structs = []
+        while self.__peek() == "STRUCT":
+            structs.append(self.__struct())
+        functions = [self.__func()]
+        while self.__tok is not None:
+            functions.append(self.__func())
+        return Element(
+            InterpreterBase.PROGRAM_NODE, structs=structs, functions=functions, span=self.__span(start)
+        )
+
+    def __struct(self):
+        start = self.__tok
+        self.__expect("STRUCT")
+        name = self.__expect("NAME")
+        self.__expect("LBRACE")
+        fields = [self.__field()]
+        while self.__peek() != "RBRACE":
+            fields.append(self.__field())
+        self.__expect_end("RBRACE")
+        return Element(InterpreterBase.STRUCT_NODE, name=name, fields=fields, span=self.__span(start))
+
+    def __field(self):
+        start = self.__tok
+        name = self.__expect("NAME")
+        self.__expect("COLON")
+        var_type = self.__expect("NAME")
+        self.__expect_end("SEMI")
+        return Element(InterpreterBase.FIELD_DEF_NODE, name=name, var_type=var_type, span=self.__span(start))
+
+    def __func(self):
+        start = self.__tok
+        self.__expect("FUNC")
+        name = self.__expect("NAME")
+        self.__expect("LPAREN")
+        args = []
+        if not self.__accept("RPAREN"):
+            args.append(self.__formal_arg())
+            while self.__accept("COMMA"):
+                args.append(self.__formal_arg())
+            self.__expect("RPAREN")
+        return_type = None
+        if self.__accept("COLON"):
+            return_type = self.__expect("NAME")
+        statements = self.__block()
+        return Element(
+            InterpreterBase.FUNC_NODE,
+            name=name,
+            args=args,
+            return_type=return_type,
+            statements=statements,
+            span=self.__span(start),
+        )
+
+    def __formal_arg(self):
+        start = self.__tok
+        name = self.__expect_end("NAME")
+        var_type = None
+        if self.__accept("COLON"):
+            var_type = self.__expect_end("NAME")
+        return Element(InterpreterBase.ARG_NODE, name=name, var_type=var_type, span=self.__span(start))
+
+    # statements
+
+    # { statement+ }
+    def __block(self):
+        self.__expect("LBRACE")
+        statements = [self.__statement()]
+        while self.__peek() != "RBRACE":
+            statements.append(self.__statement())
+        self.__expect_end("RBRACE")
+        return statements
+
+    def __statement(self):
+        start = self.__tok
+        kind = self.__peek()
+        if kind == "VAR":
+            self.__expect("VAR")
+            name = self.__expect("NAME")
+            var_type = None
+            if self.__accept("COLON"):
+                var_type = self.__expect("NAME")
+            self.__expect_end("SEMI")
+            return Element(InterpreterBase.VAR_DEF_NODE, name=name, var_type=var_type, span=self.__span(start))
+        if kind == "IF":
+            return self.__if()
+        if kind == "FOR":
+            return self.__for()
+        if kind == "TRY":
+            return self.__try()
+        if kind == "RETURN":
+            self.__expect("RETURN")
+            expr = None
+            if self.__peek() != "SEMI":
+                expr = self.__expression()
+            self.__expect_end("SEMI")
+            return Element(InterpreterBase.RETURN_NODE, expression=expr, span=self.__span(start))
+        if kind == "RAISE":
+            self.__expect("RAISE")
+            expr = self.__expression()
+            self.__expect_end("SEMI")
+            return Element(InterpreterBase.RAISE_NODE, exception_type=expr, span=self.__span(start))
+
+        if kind == "NAME":
+            name = self.__expect("NAME")
+            if self.__peek() == "LPAREN":
+                left = self.__call(name)
+            else:
+                name, path = self.__dotted_name(name)
+                if self.__peek() == "ASSIGN":
+                    statement = self.__assign_rest(name, path)
+                    self.__expect_end("SEMI")
+                    statement.span = self.__span(start)
+                    return statement
+                left = Element(InterpreterBase.VAR_NODE, name=name, path=path)
+            statement = self.__binary_rest(left, 0)
+        else:
+            statement = self.__expression()
+        self.__expect_end("SEMI")
+        statement.span = self.__span(start)
+        return statement
+
+    def __if(self):
+        start = self.__tok
+        self.__expect("IF")
+        self.__expect("LPAREN")
+        condition = self.__expression()
+        self.__expect("RPAREN")
+        statements = self.__block()
+        else_statements = None
+        if self.__accept("ELSE"):
+            else_statements = self.__block()
+        return Element(
+            InterpreterBase.IF_NODE,
+            condition=condition,
+            statements=statements,
+            else_statements=else_statements,
+            span=self.__span(start),
+        )
+
+    def __for(self):
+        start = self.__tok
+        self.__expect("FOR")
+        self.__expect("LPAREN")
+        init = self.__assign()
+        self.__expect("SEMI")
+        condition = self.__expression()
+        self.__expect("SEMI")
+        update = self.__assign()
+        self.__expect("RPAREN")
+        statements = self.__block()
+        return Element(
+            InterpreterBase.FOR_NODE,
+            init=init,
+            condition=condition,
+            update=update,
+            statements=statements,
+            span=self.__span(start),
+        )
+
+    def __try(self):
+        start = self.__tok
+        self.__expect("TRY")
+        statements = self.__block()
+        catchers = [self.__catch()]
+        while self.__peek() == "CATCH":
+            catchers.append(self.__catch())
+        return Element(InterpreterBase.TRY_NODE, statements=statements, catchers=catchers, span=self.__span(start))
+
+    def __catch(self):
+        start = self.__tok
+        self.__expect("CATCH")
+        exception_type = self.__expect("STRING")
+        statements = self.__block()
+        return Element(
+            InterpreterBase.CATCH_NODE, exception_type=exception_type, statements=statements, span=self.__span(start)
+        )
+
+    def __assign(self):
+        name, path = self.__dotted_name(self.__expect("NAME"))
+        return self.__assign_rest(name, path)
+
+    # = expression, given the (dotted) name assigned to and its field path
+    def __assign_rest(self, name, path):
+        self.__expect("ASSIGN")
+        expression = self.__expression()
+        return Element("=", name=name, expression=expression, path=path)
+
+    # name (. name)*, given the first name. Returns the whole dotted name and its field
+    # path node, or None for a plain name.
+    def __dotted_name(self, name):
+        if self.__peek() != "DOT":
+            return name, None
+        names = [name]
+        while self.__accept("DOT"):
+            names.append(self.__expect("NAME"))
+        path = Element(InterpreterBase.FIELD_PATH_NODE, base=name, fields=tuple(names[1:]))
+        return ".".join(names), path
+
+    # expressions
+
+    def __expression(self, min_precedence=0):
+        return self.__binary_rest(self.__unary(), min_precedence)
+
+    # extend left with any binary operators binding at least as tightly as
+    # min_precedence
+    def __binary_rest(self, left, min_precedence):
+        while True:
+            precedence = BINARY_PRECEDENCE.get(self.__peek())
+            if precedence is None or precedence < min_precedence:
+                return left
+            op = self.__expect(self.__tok.type)
+            right = self.__expression(precedence + 1)  # all binary operators are left associative
+            left = binary_node(op, left, right)
+
+    def __unary(self):
+        kind = self.__peek()
+        if kind == "NOT":
+            self.__expect("NOT")
+            return Element(InterpreterBase.NOT_NODE, op1=self.__expression(UNARY_PRECEDENCE))
+        if kind == "MINUS":
+            self.__expect("MINUS")
+            return Element(InterpreterBase.NEG_NODE, op1=self.__expression(UNARY_PRECEDENCE))
+        return self.__primary()
+
+    def __primary(self):
+        kind = self.__peek()
+        if kind == "NUMBER":
+            return Element(InterpreterBase.INT_NODE, val=self.__expect("NUMBER"))
+        if kind == "STRING":
+            return Element(InterpreterBase.STRING_NODE, val=self.__expect("STRING"))
+        if kind == "TRUE" or kind == "FALSE":
+            return Element(InterpreterBase.BOOL_NODE, val=self.__expect(kind) == InterpreterBase.TRUE_DEF)
+        if kind == "NIL":
+            self.__expect("NIL")
+            return Element(InterpreterBase.NIL_NODE)
+        if kind == "NEW":
+            self.__expect("NEW")
+            return Element(InterpreterBase.NEW_NODE, var_type=self.__expect("NAME"))
+        if kind == "LPAREN":
+            self.__expect("LPAREN")
+            expr = self.__expression()
+            self.__expect("RPAREN")
+            return expr
+        if kind == "NAME":
+            name = self.__expect("NAME")
+            if self.__peek() == "LPAREN":
+                return self.__call(name)
+            name, path = self.__dotted_name(name)
+            return Element(InterpreterBase.VAR_NODE, name=name, path=path)
+        raise _Error(self.__tok)
+
+    # name ( args ), given the function name
+    def __call(self, name):
+        self.__expect("LPAREN")
+        args = []
+        if not self.__accept("RPAREN"):
+            args.append(self.__expression())
+            while self.__accept("COMMA"):
+                args.append(self.__expression())
+            self.__expect("RPAREN")
+        return Element(InterpreterBase.FCALL_NODE, name=name, args=args)
+
+
+# the number of syntax errors each thread has reported so far, by either parser;
+# parse_program compares it before and after a parse to tell whether the parser
+# recovered from one (see syntax_errors_reported)
+_reported = threading.local()
+
+
+def syntax_errors_reported():
+    return getattr(_reported, "count", 0)
+
+
+# the message brewparse.p_error prints too
+def report_syntax_error(token):
+    _reported.count = syntax_errors_reported() + 1
+    if token:
+        print(f"Syntax error at '{token.value}' on line {token.lineno}")
+    else:
+        print("Syntax error at EOF")
+
+
+# Parses a stream of brewlex tokens; returns the program Element, or None after
+# a syntax error the parser couldn't recover from.
+def parse_tokens(tokens):
+    return PrattParser(tokens).parse()
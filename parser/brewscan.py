@@ -0,0 +1,166 @@
+# A fast tokenizer for the brewlex token set.
+#
+# It produces exactly the tokens the PLY lexer built in brewlex.py does (same types,
+# values, line numbers and positions) but scans with one compiled master regex whose
+# alternatives are brewlex's own rules in PLY's priority order, emits compact tuple
+# based Token objects, and interns identifiers. Comments are skipped with str.find rather
+# than brewlex's backtracking /\*(.|\n)*?\*/ pattern, and a failed search for the
+# end of a comment is remembered, so even inputs full of unterminated comments or
+# quotes are scanned in linear time.
+import re
+import sys
+from collections import namedtuple
+
+from parser import brewlex
+
+
+class Token(namedtuple("Token", ("type", "value", "lineno", "lexpos"))):
+    __slots__ = ()
+    lexer = None  # PLY's parser attaches a lexer to error tokens that don't have one
+
+    def __repr__(self):
+        return f"LexToken({self.type},{self.value!r},{self.lineno},{self.lexpos})"
+
+
+_token = Token._make
+
+
+# The master pattern: the function rules in source order, then the string rules
+# longest first, exactly as ply.lex orders them. Spaces and tabs (brewlex's t_ignore)
+# are skipped by a prefix of every match, so each match is a token (or a newline run or
+# comment opening), which is why token text is read from the named group.
+def _master_pattern():
+    rules = []
+    functions = sorted(
+        (value for name, value in vars(brewlex).items() if name.startswith("t_") and callable(value)),
+        key=lambda f: f.__code__.co_firstlineno,
+    )
+    for f in functions:
+        name = f.__name__[2:]
+        if name == "error":
+            continue
+        # only the opening of a comment is matched here; see tokenize()
+        rules.append((name, r"/\*" if name == "comment" else f.__doc__))
+    strings = [
+        (name[2:], value)
+        for name, value in vars(brewlex).items()
+        if name.startswith("t_") and name != "t_ignore" and isinstance(value, str)
+    ]
+    strings.sort(key=lambda rule: len(rule[1]), reverse=True)
+    rules += strings
+    alternatives = "|".join(f"(?P<{name}>{regex})" for name, regex in rules)
+    # the lookahead stops the prefix from backtracking, so trailing blanks can't become a DOT
+    ignore = re.escape(brewlex.t_ignore)
+    return re.compile(f"[{ignore}]*(?![{ignore}])(?:{alternatives})", re.VERBOSE)
+
+
+_MASTER = _master_pattern()
+
+
+# Tokens for source, whose first character is at line lineno and position offset of
+# some larger text (e.g. a chunk of a program; see incremental.py).
+def tokenize(source, lineno=1, offset=0):
+    return _scan(source, 0, len(source), lineno, offset, True)
+
+
+# The position just past the token that starts at position lexpos of source. Tokens
+# don't record where they end, since only a source span's position (see spans.py)
+# ever needs to know, so it's found by matching the token again.
+def token_end(source, lexpos):
+    m = _MASTER.match(source, lexpos)
+    if m is None or m.lastgroup == "comment":
+        return lexpos + 1  # the "/" of an unterminated comment, a DIVIDE token
+    return m.end()
+
+
+# Like tokenize(), but for text arriving in pieces (e.g. successive reads of a file),
+# so the whole source never has to be in memory at once. Each piece is scanned up to
+# its last newline, since no token other than a comment spans one; the rest is carried
+# over to the next piece. Positions are counted from the start of the whole text.
+def tokenize_chunks(chunks, lineno=1):
+    buffer = ""
+    offset = 0  # position of buffer[0] in the whole text
+    for chunk in chunks:
+        buffer += chunk
+        endpos = buffer.rfind("\n") + 1
+        if endpos == 0:
+            continue
+        pos, lineno = yield from _scan(buffer, 0, endpos, lineno, offset, False)
+        buffer = buffer[pos:]
+        offset += pos
+    yield from _scan(buffer, 0, len(buffer), lineno, offset, True)
+
+
+# Scans source[pos:endpos], yielding tokens whose lexpos is offset past their index in
+# source; returns where it stopped and the line number there. With final false there
+# may be more text after source: the scan then stops at a comment whose end isn't in
+# sight yet, and a comment that ends past endpos stops it there.
+def _scan(source, pos, endpos, lineno, offset, final):
+    reserved = brewlex.reserved_map
+    intern = sys.intern
+    token = _token
+    finditer = _MASTER.finditer
+    find = source.find
+    count = source.count
+    no_comment_end_after = len(source)  # no "*/" at or after this position
+    while pos < endpos:
+        for m in finditer(source, pos, endpos):
+            kind = m.lastgroup
+            if kind == "NAME":
+                value = m.group(kind)
+                yield token((reserved.get(value, "NAME"), intern(value), lineno, offset + m.start(kind)))
+            elif kind == "newline":
+                lineno += m.end() - m.start(kind)
+            elif kind == "NUMBER":
+                yield token(("NUMBER", int(m.group(kind)), lineno, offset + m.start(kind)))
+            elif kind == "STRING":
+                yield token(("STRING", m.group(kind)[1:-1], lineno, offset + m.start(kind)))
+            elif kind == "comment":
+                start = m.start(kind)
+                end = find("*/", start + 2) if start < no_comment_end_after else -1
+                if end != -1:
+                    lineno += count("\n", start, end)
+                    pos = end + 2
+                elif not final:
+                    return start, lineno  # the rest of the comment is still to come
+                else:
+                    # unterminated: brewlex falls back to a DIVIDE token for the "/"
+                    no_comment_end_after = min(no_comment_end_after, start)
+                    yield token(("DIVIDE", "/", lineno, offset + start))
+                    pos = start + 1
+                break  # restart the scan after the comment
+            else:
+                yield token((kind, m.group(kind), lineno, offset + m.start(kind)))
+        else:
+            break
+    return max(pos, endpos), lineno
+
+
+# A drop-in for the PLY lexer object (input/token/clone/lineno) that runs tokenize(),
+# so it can be handed to ply.yacc as well as to any other parser frontend.
+# It can also be given an existing token stream, e.g. one from tokenize_chunks().
+class Scanner:
+    def __init__(self):
+        self.lineno = 1
+        self.lexdata = ""
+        self.__tokens = iter(())
+
+    def input(self, data):
+        self.lexdata = data
+        self.__tokens = tokenize(data, self.lineno)
+
+    # scan from an existing token stream instead of from text
+    def feed(self, tokens):
+        self.lexdata = ""
+        self.__tokens = iter(tokens)
+
+    def token(self):
+        return next(self.__tokens, None)
+
+    def clone(self):
+        scanner = Scanner()
+        scanner.lineno = self.lineno
+        return scanner
+
+    def __iter__(self):
+        return self.__tokens
@@ -0,0 +1,78 @@
+# Regenerates the precompiled PLY tables the parser loads at run time:
+#   parser/parsetab.py  LALR tables for the grammar in brewparse.py
+#   parser/lextab.py    lexer tables for the token rules in brewlex.py
+# Nothing checks these against the grammar at run time, so run this after changing
+# the grammar or the tokens (--check just reports whether they're out of date):
+#   python -m parser.buildtables [--check]
+import argparse
+import os
+import sys
+import tempfile
+
+from ply import yacc
+
+from parser import brewlex, brewparse
+
+PARSER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def grammar_signature():
+    reflect = yacc.ParserReflect(vars(brewparse))
+    reflect.get_all()
+    return reflect.signature()
+
+
+# the text of lextab.py for the current token rules
+def lextab_text():
+    lexer = brewlex.build_lexer()
+    with tempfile.TemporaryDirectory() as tmp:
+        lexer.writetab("lextab", tmp)
+        with open(os.path.join(tmp, "lextab.py")) as f:
+            return f.read()
+
+
+def read_file(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+# names of the table files that don't match the grammar and tokens
+def stale_tables():
+    from parser import parsetab
+
+    stale = []
+    if parsetab._lr_signature != grammar_signature():
+        stale.append("parsetab.py")
+    if read_file(os.path.join(PARSER_DIR, "lextab.py")) != lextab_text():
+        stale.append("lextab.py")
+    return stale
+
+
+def build():
+    # yacc rewrites parsetab.py only if the grammar signature changed
+    yacc.yacc(module=brewparse, tabmodule="parser.parsetab", outputdir=PARSER_DIR, debug=False)
+    text = lextab_text()
+    path = os.path.join(PARSER_DIR, "lextab.py")
+    if read_file(path) != text:
+        with open(path, "w") as f:
+            f.write(text)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--check", action="store_true", help="only check that the tables are up to date")
+    args = arg_parser.parse_args()
+    if not args.check:
+        build()
+    stale = stale_tables()
+    if stale:
+        print("out of date: " + ", ".join(stale))
+        sys.exit(1)
+    print("tables are up to date")
+
+
+if __name__ == "__main__":
+    main()
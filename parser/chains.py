@@ -0,0 +1,25 @@
+# Chains of one binary operator, like a + b + c + d, as single n-ary nodes.
+#
+# All binary operators are left associative, so a chain parses as ((a + b) + c) + d:
+# a tree as deep as the chain is long, which every interpreter would walk with a level
+# of Python recursion per operator. Instead, as soon as a second use of the same
+# operator joins an expression, both parsers turn it into a chain node whose op is
+# the operator and whose operands are [a, b, c, d]. Interpreters fold the operands in
+# from the left in a loop, which is exactly the order the nested binary nodes are
+# evaluated in, so this is safe for every operator, associative or not (a - b - c is
+# still (a - b) - c), and it keeps short-circuiting, laziness and coercion the same.
+# An operator used once keeps its binary node.
+from intbase import InterpreterBase
+from parser.element import Element
+
+
+# The node for op1 op op2. op1 is extended in place when it is already a chain of op,
+# so it must be a fresh node from the parser.
+def binary_node(op, op1, op2):
+    left_type = op1.elem_type
+    if left_type == InterpreterBase.CHAIN_NODE and op1.op == op:
+        op1.operands.append(op2)
+        return op1
+    if left_type == op:
+        return Element(InterpreterBase.CHAIN_NODE, op=op, operands=[op1.op1, op1.op2, op2])
+    return Element(op, op1=op1, op2=op2)
@@ -1,14 +1,136 @@
+import keyword
+
+from intbase import InterpreterBase
+from parser.spans import span_line, span_position
+
+# The fields of every AST node type the parser builds. Each node type gets its own
+# class (generated below) that stores exactly these fields in __slots__, so nodes
+# carry no per-instance dict and fields are read with plain attribute access,
+# e.g. node.op1 rather than node.get("op1").
+# A dotted name like a.b.c is kept whole in the name field of var and = nodes, and
+# also split up in their path field: a fieldpath node with base "a" and the tuple of
+# field names ("b", "c"). path is None for a plain name.
+# A chain node is a run of one binary operator, e.g. a + b + c; see chains.py.
+# Every node also has a span slot: the packed source span (see spans.py) of the text
+# it was parsed from, which isn't one of its fields. The parsers leave it 0 on
+# expressions; spans.expression_spans works theirs out.
+NODE_FIELDS = {
+    InterpreterBase.PROGRAM_NODE: ("structs", "functions"),
+    InterpreterBase.STRUCT_NODE: ("name", "fields"),
+    InterpreterBase.FIELD_DEF_NODE: ("name", "var_type"),
+    InterpreterBase.FUNC_NODE: ("name", "args", "return_type", "statements"),
+    InterpreterBase.ARG_NODE: ("name", "var_type"),
+    InterpreterBase.VAR_DEF_NODE: ("name", "var_type"),
+    InterpreterBase.IF_NODE: ("condition", "statements", "else_statements"),
+    InterpreterBase.FOR_NODE: ("init", "condition", "update", "statements"),
+    InterpreterBase.TRY_NODE: ("statements", "catchers"),
+    InterpreterBase.CATCH_NODE: ("exception_type", "statements"),
+    InterpreterBase.RAISE_NODE: ("exception_type",),
+    InterpreterBase.RETURN_NODE: ("expression",),
+    InterpreterBase.FCALL_NODE: ("name", "args"),
+    InterpreterBase.VAR_NODE: ("name", "path"),
+    InterpreterBase.FIELD_PATH_NODE: ("base", "fields"),
+    InterpreterBase.NEW_NODE: ("var_type",),
+    InterpreterBase.NEG_NODE: ("op1",),
+    InterpreterBase.NOT_NODE: ("op1",),
+    InterpreterBase.INT_NODE: ("val",),
+    InterpreterBase.BOOL_NODE: ("val",),
+    InterpreterBase.STRING_NODE: ("val",),
+    InterpreterBase.NIL_NODE: (),
+    "=": ("name", "expression", "path"),
+    "+": ("op1", "op2"),
+    "-": ("op1", "op2"),
+    "*": ("op1", "op2"),
+    "/": ("op1", "op2"),
+    "==": ("op1", "op2"),
+    "!=": ("op1", "op2"),
+    "<": ("op1", "op2"),
+    "<=": ("op1", "op2"),
+    ">": ("op1", "op2"),
+    ">=": ("op1", "op2"),
+    "&&": ("op1", "op2"),
+    "||": ("op1", "op2"),
+    InterpreterBase.CHAIN_NODE: ("op", "operands"),
+}
+
+# Class names for node types that aren't valid identifiers
+_CLASS_NAMES = {
+    InterpreterBase.NOT_NODE: "NotNode",
+    InterpreterBase.FIELD_PATH_NODE: "FieldPathNode",
+    "=": "AssignNode",
+    "+": "AddNode",
+    "-": "SubNode",
+    "*": "MulNode",
+    "/": "DivNode",
+    "==": "EqNode",
+    "!=": "NotEqNode",
+    "<": "LessNode",
+    "<=": "LessEqNode",
+    ">": "GreaterNode",
+    ">=": "GreaterEqNode",
+    "&&": "AndNode",
+    "||": "OrNode",
+}
+
+
 class Element:
-    def __init__(self, elem_type, **kwargs):
-        self.elem_type = elem_type
-        self.dict = {}
-        for key, value in kwargs.items():
-            self.dict[key] = value
+    __slots__ = ()
+    elem_type = None
+    _field_names = ()
+
+    # Element(elem_type, **fields) builds an instance of that node type's class
+    def __new__(cls, elem_type=None, **kwargs):
+        if cls is Element:
+            cls = node_class(elem_type, kwargs)
+        return object.__new__(cls)
 
+    # compatibility accessor; prefer reading the field attribute directly
     def get(self, key):
-        if key not in self.dict:
-            return None
-        return self.dict[key]
+        if key in self._field_names:
+            return getattr(self, key)
+        return None
+
+    # the node's fields as a (new) dict, in declaration order
+    @property
+    def dict(self):
+        return {key: getattr(self, key) for key in self._field_names}
+
+    # the line the node starts on, or None if it has no source span
+    @property
+    def line(self):
+        return span_line(self.span)
+
+    # (line, col, end_line, end_col) of the node's text in source, the program it was
+    # parsed from, or None if it has no source span
+    def position(self, source):
+        return span_position(self.span, source)
+
+    # Make this node and every node below it read-only. Lists of children become
+    # tuples and attribute writes raise, so a frozen tree can be shared safely
+    # between interpreters (e.g. out of the parse cache).
+    # Walks the tree with an explicit stack so very deep trees can't overflow.
+    def freeze(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, FrozenElement):
+                continue
+            for key in node._field_names:
+                value = getattr(node, key)
+                if isinstance(value, list):
+                    value = tuple(value)
+                    object.__setattr__(node, key, value)
+                    stack.extend(v for v in value if isinstance(v, Element))
+                elif isinstance(value, Element):
+                    stack.append(value)
+            object.__setattr__(node, "__class__", node._frozen_class)
+        return self
+
+    def is_frozen(self):
+        return False
+
+    def __reduce__(self):
+        return (_rebuild, (self.elem_type, self.dict, self.is_frozen(), self.span))
 
     def __str__(self):
         s = f"{self.elem_type}: "
@@ -19,7 +141,7 @@ class Element:
     def __val(self, v):
         if isinstance(v, Element):
             return "[" + str(v) + "]"
-        if isinstance(v, list):
+        if isinstance(v, (list, tuple)):
             s = ""
             for i in v:
                 s += str(i) + ", "
@@ -27,3 +149,71 @@ class Element:
                 return "[" + s[0:-2] + "]"
             return "[" + s + "]"
         return str(v)
+
+
+# Base of the read-only twin of every node class; see Element.freeze
+class FrozenElement(Element):
+    __slots__ = ()
+
+    def freeze(self):
+        return self
+
+    def is_frozen(self):
+        return True
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"Cannot modify frozen {self.elem_type} node")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"Cannot modify frozen {self.elem_type} node")
+
+
+_node_classes = {}
+
+
+def _make_node_class(elem_type, field_names, class_name):
+    for f in field_names:
+        # they're spliced into the source of __init__, and may come from a file (astbinary)
+        if not f.isidentifier() or keyword.iskeyword(f):
+            raise TypeError(f"Invalid field name {f!r} for {elem_type} node")
+    params = "".join(f", {f}=None" for f in field_names)
+    body = "".join(f"\n    self.{f} = {f}" for f in field_names)
+    namespace = {}
+    exec(f"def __init__(self, elem_type=None{params}, span=0):{body}\n    self.span = span", namespace)
+
+    cls = type(
+        class_name,
+        (Element,),
+        {
+            "__slots__": field_names + ("span",),
+            "__init__": namespace["__init__"],
+            "elem_type": elem_type,
+            "_field_names": field_names,
+        },
+    )
+    cls._frozen_class = type("Frozen" + class_name, (cls, FrozenElement), {"__slots__": ()})
+    return cls
+
+
+# Returns the node class for elem_type. Node types outside NODE_FIELDS (e.g. ones
+# added by a pass over the tree) get a class made on first use from their field names.
+def node_class(elem_type, fields=()):
+    cls = _node_classes.get(elem_type)
+    if cls is None:
+        class_name = "".join(p.capitalize() for p in str(elem_type).split("_")) + "Node"
+        if not class_name.isidentifier():
+            class_name = "Node"
+        cls = _make_node_class(elem_type, tuple(f for f in fields if f != "span"), class_name)
+        _node_classes[elem_type] = cls
+    return cls
+
+
+def _rebuild(elem_type, fields, frozen, span=0):
+    node = Element(elem_type, span=span, **fields)
+    return node.freeze() if frozen else node
+
+
+for _elem_type, _fields in NODE_FIELDS.items():
+    _name = _CLASS_NAMES.get(_elem_type, _elem_type.capitalize() + "Node")
+    _node_classes[_elem_type] = globals()[_name] = _make_node_class(_elem_type, _fields, _name)
+del _elem_type, _fields, _name
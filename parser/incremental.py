@@ -0,0 +1,153 @@
+# Function-granularity incremental parsing.
+#
+# A program is split into chunks at each top-level `func` or `struct` keyword, and the
+# definitions parsed from each chunk are cached under a digest of the chunk's text.
+# Parsing an edited program then only parses the chunks whose text changed and splices
+# the cached subtrees for the rest into a new program node, moving their source spans
+# if text was added or removed above them.
+#
+# Splitting only needs to know where comments and strings are: a `func` or `struct`
+# token anywhere but at the start of a top-level definition is a syntax error, so any
+# chunk cut at one fails to parse on its own. Whenever a chunk doesn't parse, or the
+# definitions come out of order, the whole program is parsed the normal way instead,
+# so syntax errors are reported (and recovered from) exactly as before.
+from intbase import InterpreterBase
+from parser.astcache import ASTCache, source_key
+from parser.brewpratt import PrattParser
+from parser.brewscan import tokenize
+from parser.element import Element
+from parser.spans import join_spans, shift_span
+
+# what the splitter looks for: the keywords it splits at, and the openings of the
+# strings and comments it has to step over
+_NEEDLES = ("func", "struct", '"', "/*")
+
+
+def _is_word_char(c):
+    return c.isalnum() or c == "_"
+
+
+# Returns the (start position, start line) of each chunk of program, the first always
+# being (0, 1). Scans with str.find, which is much faster than a regex
+# that has to try matching a keyword at every position.
+def split_points(program):
+    points = [(0, 1)]
+    find = program.find
+    size = len(program)
+    no_comment_end_after = size  # no "*/" at or after this position
+    line = 1
+    last = 0
+    pos = 0
+    found = {needle: find(needle) for needle in _NEEDLES}  # next occurrence of each
+    while True:
+        for needle, at in found.items():
+            if -1 < at < pos:
+                found[needle] = find(needle, pos)
+        start = min((at for at in found.values() if at != -1), default=-1)
+        if start == -1:
+            return points
+        if start == found["/*"]:
+            end = find("*/", start + 2) if start < no_comment_end_after else -1
+            if end == -1:
+                # an unterminated comment is just a "/" to the lexer
+                no_comment_end_after = min(no_comment_end_after, start)
+                pos = start + 1
+            else:
+                pos = end + 2
+        elif start == found['"']:
+            end = find('"', start + 1)
+            newline = find("\n", start + 1, end)
+            # an unterminated string is just a '"' to the lexer
+            pos = start + 1 if end == -1 or newline != -1 else end + 1
+        else:
+            pos = start + (4 if start == found["func"] else 6)
+            if (start == 0 or not _is_word_char(program[start - 1])) and (
+                pos == size or not _is_word_char(program[pos])
+            ):
+                if start > 0:
+                    line += program.count("\n", last, start)
+                    last = start
+                    points.append((start, line))
+
+
+class IncrementalParser:
+    def __init__(self, max_chunks=8192, max_bytes=32 * 1024 * 1024):
+        self.chunks = ASTCache(max_chunks, max_bytes)  # chunk digest -> "chunk" Element; see __chunk
+        self.reparsed = 0  # chunks parsed by the last call to parse()
+        self.reused = 0  # chunks taken from the cache by the last call to parse()
+
+    # Returns the frozen program Element for program, or None if it has to be parsed
+    # as a whole (because of a syntax error somewhere).
+    def parse(self, program):
+        points = split_points(program)
+        points.append((len(program), None))
+        structs = []
+        functions = []
+        self.reparsed = self.reused = 0
+        for (start, line), (end, _) in zip(points, points[1:]):
+            definitions = self.__chunk(program[start:end], start, line)
+            if definitions is None:
+                return None
+            for definition in definitions:
+                if definition.elem_type == InterpreterBase.STRUCT_NODE:
+                    if functions:
+                        return None  # structs must all come before the first func
+                    structs.append(definition)
+                else:
+                    functions.append(definition)
+        if not functions:
+            return None
+        span = join_spans((structs or functions)[0].span, functions[-1].span)
+        return Element(InterpreterBase.PROGRAM_NODE, structs=structs, functions=functions, span=span).freeze()
+
+    # The definitions in one chunk of a program, which starts at position start, on
+    # line line. They're cached with the position and line they were parsed at; a chunk
+    # that has moved gets a copy with its spans shifted, which is much cheaper than
+    # parsing it again.
+    def __chunk(self, text, start, line):
+        key = source_key(text)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.reused += 1
+            if chunk.start != start or chunk.start_line != line:
+                moved = _shift(chunk, line - chunk.start_line, start - chunk.start)
+                chunk = self.chunks.put(key, moved, len(text))
+            return chunk.definitions
+        definitions = PrattParser(tokenize(text, line, start)).parse_definitions()
+        if definitions is None:
+            return None
+        self.reparsed += 1
+        chunk = Element("chunk", definitions=definitions, start=start, start_line=line)
+        return self.chunks.put(key, chunk, len(text)).definitions
+
+
+# A frozen copy of the tree under root with every source span moved down by lines
+# lines and on by chars characters, and the start and start_line fields of root
+# itself (a "chunk" node) adjusted to match
+def _shift(root, lines, chars):
+    copies = {}  # id(node) -> its copy
+    stack = [(root, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if not children_done:
+            stack.append((node, True))
+            for key in node._field_names:
+                value = getattr(node, key)
+                if isinstance(value, Element):
+                    stack.append((value, False))
+                elif isinstance(value, tuple):
+                    stack.extend((v, False) for v in value if isinstance(v, Element))
+            continue
+        fields = {}
+        for key in node._field_names:
+            value = getattr(node, key)
+            if isinstance(value, Element):
+                value = copies[id(value)]
+            elif isinstance(value, tuple) and value and isinstance(value[0], Element):
+                value = [copies[id(v)] for v in value]
+            fields[key] = value
+        if node is root:
+            fields["start"] += chars
+            fields["start_line"] += lines
+        copies[id(node)] = Element(node.elem_type, span=shift_span(node.span, lines, chars), **fields)
+    return copies[id(root)].freeze()
@@ -0,0 +1,297 @@
+# Source spans: where in the program text a token or AST node came from.
+#
+# A span is packed into one int. Its low 32 bits hold the position (the lexpos) of the
+# last token of the text, the 32 bits above them the position of its first character,
+# and the bits above those the line it starts on. That's all a parser has to hand
+# (every token knows its lineno and lexpos), so building a span is a few int
+# operations per node. Columns, the end line and where the last token ends are only
+# worked out, from the program text, when something asks for them (see
+# span_position). Lines count from 1 and positions from 0. 0 means the span is
+# unknown (e.g. a node built by hand).
+#
+# The parsers only give spans to definitions and statements (an expression used as a
+# statement included), which is all error reporting needs: an error is reported at
+# the line of the statement it happened in. Expressions are most of the nodes of a
+# program, so leaving them out keeps positions nearly free to parse. Their spans are
+# worked out when something asks for them, by expression_spans, from the text of the
+# statement they're in.
+from intbase import InterpreterBase
+from parser.brewscan import token_end, tokenize
+
+OFFSET_BITS = 32
+OFFSET_MASK = (1 << OFFSET_BITS) - 1
+LINE_SHIFT = 2 * OFFSET_BITS
+
+
+def make_span(line, start, last):
+    return line << LINE_SHIFT | start << OFFSET_BITS | last
+
+
+# the line a span starts on, or None
+def span_line(span):
+    if not span:
+        return None
+    return span >> LINE_SHIFT
+
+
+# (start, end) positions in the program text of the span's first character and just
+# past its last, or None for an unknown span. source is the text it was parsed from.
+def span_offsets(span, source):
+    if not span:
+        return None
+    return span >> OFFSET_BITS & OFFSET_MASK, token_end(source, span & OFFSET_MASK)
+
+
+# (line, col, end_line, end_col) of the span's first and last characters, with
+# 1-based columns, or None for an unknown span. source is the text it was parsed from.
+def span_position(span, source):
+    if not span:
+        return None
+    start = span >> OFFSET_BITS & OFFSET_MASK
+    last = span & OFFSET_MASK  # tokens never span lines, so last is on the end line
+    last_line_start = source.rfind("\n", 0, last)
+    return (
+        span >> LINE_SHIFT,
+        start - source.rfind("\n", 0, start),
+        (span >> LINE_SHIFT) + source.count("\n", start, last),
+        token_end(source, last) - 1 - last_line_start,
+    )
+
+
+# the span from the start of first to the end of last
+def join_spans(first, last):
+    if not first or not last:
+        return first or last
+    return first & ~OFFSET_MASK | last & OFFSET_MASK
+
+
+# span moved down by lines lines and on by chars characters (up and back, if they're
+# negative)
+def shift_span(span, lines, chars):
+    if not span:
+        return span
+    return span + (lines << LINE_SHIFT) + (chars << OFFSET_BITS) + chars
+
+
+# {node: span} for the nodes in node, a definition or statement with a span parsed
+# from source, that the parser gave none: its expressions, field paths and the
+# assignments in the header of a for.
+# Each span is the one the parser would give the node if it gave expressions spans:
+# from the first token parsed for it to the last, so the parentheses around a whole
+# expression aren't part of it, but those around its first or last operand are. {} if
+# node isn't the tree source gives there (say, one a pass has changed).
+def expression_spans(node, source):
+    if not node.span:
+        return {}
+    start, end = span_offsets(node.span, source)
+    tokens = list(tokenize(source[start:end], span_line(node.span), start))
+    return _ExpressionSpans(tokens).spans(node)
+
+
+class _Mismatch(Exception):
+    pass
+
+
+_LITERAL_TOKENS = {
+    InterpreterBase.INT_NODE: ("NUMBER",),
+    InterpreterBase.STRING_NODE: ("STRING",),
+    InterpreterBase.BOOL_NODE: ("TRUE", "FALSE"),
+    InterpreterBase.NIL_NODE: ("NIL",),
+}
+
+
+# Lines a tree up with the tokens it was parsed from, as the parser went through them,
+# and notes the first and last token of each expression leaving out any parentheses
+# around it or its operands; those are added back, as the parser would have taken them
+# in, once every parenthesis is matched.
+class _ExpressionSpans:
+    def __init__(self, tokens):
+        self.__tokens = tokens
+        self.__pos = 0
+        self.__end = -1  # index of the last token taken that isn't a grouping parenthesis
+        self.__inner = {}  # expression node -> (first, last) token index, no parentheses
+        self.__parens = []  # indexes of the open ( tokens; None for a call's or statement's
+        self.__matching = {}  # grouping ( index -> its ) index, and the other way round
+
+    def spans(self, node):
+        try:
+            self.__node(node)
+        except (_Mismatch, IndexError):
+            return {}
+        tokens, matching = self.__tokens, self.__matching
+        spans = {}
+        for expr, (first, last) in self.__inner.items():
+            while matching.get(first - 1, last) < last:  # a ( closed inside expr
+                first -= 1
+            while matching.get(last + 1, -1) >= first:  # a ) opened inside it
+                last += 1
+            start = tokens[first]
+            spans[expr] = make_span(start.lineno, start.lexpos, tokens[last].lexpos)
+        return spans
+
+    # token handling
+
+    def __peek(self):
+        return self.__tokens[self.__pos].type if self.__pos < len(self.__tokens) else None
+
+    def __expect(self, *token_types):
+        if self.__tokens[self.__pos].type not in token_types:
+            raise _Mismatch()
+        self.__end = self.__pos
+        self.__pos += 1
+
+    # the tokens up to and including the next } at this level of braces
+    def __skip_braces(self):
+        depth = 0
+        while True:
+            kind = self.__tokens[self.__pos].type
+            self.__pos += 1
+            if kind == "LBRACE":
+                depth += 1
+            elif kind == "RBRACE":
+                depth -= 1
+                if depth == 0:
+                    return
+
+    # definitions and statements
+
+    def __node(self, node):
+        kind = node.elem_type
+        if kind == InterpreterBase.PROGRAM_NODE:
+            for _ in node.structs:
+                self.__skip_braces()
+            for func_ast in node.functions:
+                self.__node(func_ast)
+        elif kind == InterpreterBase.FUNC_NODE:
+            while self.__peek() != "LBRACE":  # no expressions in the header
+                self.__pos += 1
+            self.__block(node.statements)
+        elif kind in (InterpreterBase.STRUCT_NODE, InterpreterBase.FIELD_DEF_NODE, InterpreterBase.ARG_NODE):
+            return
+        else:
+            self.__statement(node)
+
+    def __block(self, statements):
+        self.__expect("LBRACE")
+        for statement in statements:
+            self.__statement(statement)
+        self.__expect("RBRACE")
+
+    def __statement(self, statement):
+        kind = statement.elem_type
+        if kind == InterpreterBase.VAR_DEF_NODE:
+            while self.__peek() != "SEMI":
+                self.__pos += 1
+        elif kind == "=":
+            self.__assign(statement)
+        elif kind == InterpreterBase.RETURN_NODE or kind == InterpreterBase.RAISE_NODE:
+            self.__expect("RETURN", "RAISE")
+            expr = statement.expression if kind == InterpreterBase.RETURN_NODE else statement.exception_type
+            if expr is not None:
+                self.__root(expr)
+        elif kind == InterpreterBase.IF_NODE:
+            self.__expect("IF")
+            self.__expect("LPAREN")
+            self.__root(statement.condition)
+            self.__expect("RPAREN")
+            self.__block(statement.statements)
+            if statement.else_statements is not None:
+                self.__expect("ELSE")
+                self.__block(statement.else_statements)
+            return
+        elif kind == InterpreterBase.FOR_NODE:
+            self.__expect("FOR")
+            self.__expect("LPAREN")
+            self.__assign(statement.init)
+            self.__expect("SEMI")
+            self.__root(statement.condition)
+            self.__expect("SEMI")
+            self.__assign(statement.update)
+            self.__expect("RPAREN")
+            self.__block(statement.statements)
+            return
+        elif kind == InterpreterBase.TRY_NODE:
+            self.__expect("TRY")
+            self.__block(statement.statements)
+            for catcher in statement.catchers:
+                self.__expect("CATCH")
+                self.__expect("STRING")
+                self.__block(catcher.statements)
+            return
+        else:
+            self.__root(statement)
+        self.__expect("SEMI")
+
+    def __assign(self, assign_ast):
+        first = self.__pos
+        self.__names(assign_ast.path)
+        if assign_ast.path is not None:
+            self.__inner[assign_ast.path] = (first, self.__end)
+        self.__expect("ASSIGN")
+        self.__root(assign_ast.expression)
+        if not assign_ast.span:  # one in a for's header
+            self.__inner[assign_ast] = (first, self.__end)
+
+    # NAME (. NAME)*, as many as path (a fieldpath node, or None) has
+    def __names(self, path):
+        self.__expect("NAME")
+        for _ in path.fields if path is not None else ():
+            self.__expect("DOT")
+            self.__expect("NAME")
+
+    # expressions
+
+    # an expression on its own, like a statement's or an argument
+    def __root(self, expr):
+        self.__parens.append(None)
+        self.__expression(expr)
+        self.__parens.pop()
+
+    def __expression(self, expr):
+        while self.__peek() == "LPAREN":
+            self.__parens.append(self.__pos)
+            self.__pos += 1
+        first = self.__pos
+        kind = expr.elem_type
+        if kind == InterpreterBase.CHAIN_NODE or hasattr(expr, "op2"):
+            op = expr.op if kind == InterpreterBase.CHAIN_NODE else kind
+            operands = expr.operands if kind == InterpreterBase.CHAIN_NODE else (expr.op1, expr.op2)
+            self.__expression(operands[0])
+            for operand in operands[1:]:
+                if self.__tokens[self.__pos].value != op:
+                    raise _Mismatch()
+                self.__end = self.__pos
+                self.__pos += 1
+                self.__expression(operand)
+        elif kind == InterpreterBase.NEG_NODE or kind == InterpreterBase.NOT_NODE:
+            self.__expect("MINUS" if kind == InterpreterBase.NEG_NODE else "NOT")
+            self.__expression(expr.op1)
+        elif kind == InterpreterBase.VAR_NODE:
+            self.__names(expr.path)
+            if expr.path is not None:
+                self.__inner[expr.path] = (first, self.__end)
+        elif kind == InterpreterBase.FCALL_NODE:
+            self.__expect("NAME")
+            self.__expect("LPAREN")
+            self.__parens.append(None)
+            for i, arg in enumerate(expr.args):
+                if i:
+                    self.__expect("COMMA")
+                self.__expression(arg)
+            self.__parens.pop()
+            self.__expect("RPAREN")
+        elif kind == InterpreterBase.NEW_NODE:
+            self.__expect("NEW")
+            self.__expect("NAME")
+        elif kind in _LITERAL_TOKENS:
+            self.__expect(*_LITERAL_TOKENS[kind])
+        else:
+            raise _Mismatch()
+        if not expr.span:
+            self.__inner[expr] = (first, self.__end)
+        # the grouping parentheses that close after it
+        while self.__peek() == "RPAREN" and self.__parens[-1] is not None:
+            opened = self.__parens.pop()
+            self.__matching[opened] = self.__pos
+            self.__matching[self.__pos] = opened
+            self.__pos += 1
@@ -0,0 +1,137 @@
+# Quickening of the binary operators of the dynamically typed tree walkers (v2 and
+# v4). An operator takes operands of any type there, so each time one runs, the tree
+# walker checks that the two types go together and looks the operation up by the
+# left one's (see __setup_ops), though nearly every operator in a program sees the
+# same types every time. So each operator node gets a Site that records the types it
+# sees, and once it's seen the same two warmup times in a row it's specialized: its
+# operation is done straight on those types (int + int on the two ints, say) behind a
+# guard that the operands still have them. An operation that fails the guard takes
+# the generic path again and de-specializes the site, which starts watching the new
+# types; a site that's been de-specialized max_despecializations times stays
+# generic (it's megamorphic).
+#
+# AST nodes are slotted, and frozen ones are shared between interpreters (see
+# parser/element.py), so the sites live in a table keyed by node, one per
+# interpreter, rather than on the nodes themselves.
+from parser.element import Element
+
+
+class Site:
+    __slots__ = (
+        "oper", "left_type", "right_type", "fast", "seen", "streak",
+        "hits", "generic", "despecializations",
+    )
+
+    def __init__(self, oper):
+        self.oper = oper
+        # the guard: the operand types the site is specialized to, None if it isn't
+        self.left_type = None
+        self.right_type = None
+        self.fast = None  # the specialized operation
+        self.seen = None  # (left type, right type) of the last generic operation
+        self.streak = 0  # generic operations in a row on those types
+        self.hits = 0  # operations done by the specialized operation
+        self.generic = 0  # operations done on the generic path
+        self.despecializations = 0
+
+    def state(self):
+        if self.left_type is not None:
+            return f"{self.left_type} {self.oper} {self.right_type}"
+        return "megamorphic" if self.seen is None else "generic"
+
+
+class Quickening:
+    def __init__(self, value_class, type_class, op_to_lambda, warmup=2, max_despecializations=4):
+        self.op_to_lambda = op_to_lambda
+        self.warmup = warmup
+        self.max_despecializations = max_despecializations
+        self.sites = {}  # operator node -> its Site
+        self.__functions = ()  # of the program run, for the lines of its sites
+        self.__fast_paths = _fast_paths(value_class, type_class)
+
+    # forget the sites of the last program run; functions are those of the next one
+    def reset(self, functions=()):
+        self.sites = {}
+        self.__functions = functions
+
+    # Record that the operator node op_ast did oper on left and right on the generic
+    # path, which it did without an error; specializes or de-specializes its site
+    def observe(self, op_ast, oper, left, right):
+        site = self.sites.get(op_ast)
+        if site is None:
+            site = self.sites[op_ast] = Site(oper)
+        site.generic += 1
+        if site.left_type is not None:  # the operands failed the guard
+            site.left_type = site.right_type = site.fast = None
+            site.despecializations += 1
+            site.streak = 0
+        if site.despecializations >= self.max_despecializations:
+            site.seen = None
+            return
+        types = (left.type(), right.type())
+        if types != site.seen:
+            site.seen = types
+            site.streak = 0
+        site.streak += 1
+        if site.streak >= self.warmup:
+            site.fast = self.__fast_paths.get((oper,) + types) or self.op_to_lambda[types[0]][oper]
+            site.left_type, site.right_type = types
+
+    # {"oper on line n": (hits, generic operations, de-specializations, state)} for
+    # each operator that's run, where state is the types it's specialized to,
+    # "generic" or "megamorphic". An operator's line is that of the statement it's in,
+    # as expressions have no spans of their own (see parser/spans.py).
+    def counters(self):
+        lines = _statement_lines(self.__functions)
+        return {
+            f"{site.oper} on line {lines.get(op_ast)}": (site.hits, site.generic, site.despecializations, site.state())
+            for op_ast, site in self.sites.items()
+        }
+
+    # (operations done by specialized operations, all operations)
+    def totals(self):
+        hits = sum(site.hits for site in self.sites.values())
+        return hits, hits + sum(site.generic for site in self.sites.values())
+
+
+# {node: line of the statement it's in} for the nodes of functions
+def _statement_lines(functions):
+    lines = {}
+    stack = [(func_ast, func_ast.line) for func_ast in functions]
+    while stack:
+        node, line = stack.pop()
+        if node.span:
+            line = node.line
+        lines[node] = line
+        for value in node.dict.values():
+            if isinstance(value, Element):
+                stack.append((value, line))
+            elif isinstance(value, (list, tuple)):
+                stack.extend((v, line) for v in value if isinstance(v, Element))
+    return lines
+
+
+# The operations with a fast path of their own, each the same as the generic one
+# (see __setup_ops) on operands of just those types; any other operation a site is
+# specialized to is the generic one, minus the checks and the lookup.
+def _fast_paths(Value, Type):
+    INT, BOOL, STRING = Type.INT, Type.BOOL, Type.STRING
+    return {
+        ("+", INT, INT): lambda x, y: Value(INT, x.v + y.v),
+        ("-", INT, INT): lambda x, y: Value(INT, x.v - y.v),
+        ("*", INT, INT): lambda x, y: Value(INT, x.v * y.v),
+        ("/", INT, INT): lambda x, y: Value(INT, x.v // y.v),
+        ("==", INT, INT): lambda x, y: Value(BOOL, x.v == y.v),
+        ("!=", INT, INT): lambda x, y: Value(BOOL, x.v != y.v),
+        ("<", INT, INT): lambda x, y: Value(BOOL, x.v < y.v),
+        ("<=", INT, INT): lambda x, y: Value(BOOL, x.v <= y.v),
+        (">", INT, INT): lambda x, y: Value(BOOL, x.v > y.v),
+        (">=", INT, INT): lambda x, y: Value(BOOL, x.v >= y.v),
+        ("+", STRING, STRING): lambda x, y: Value(STRING, x.v + y.v),
+        ("==", STRING, STRING): lambda x, y: Value(BOOL, x.v == y.v),
+        ("!=", STRING, STRING): lambda x, y: Value(BOOL, x.v != y.v),
+        ("==", BOOL, BOOL): lambda x, y: Value(BOOL, x.v == y.v),
+        ("!=", BOOL, BOOL): lambda x, y: Value(BOOL, x.v != y.v),
+        ("&&", BOOL, BOOL): lambda x, y: Value(BOOL, x.v and y.v),
+        ("||", BOOL, BOOL): lambda x, y: Value(BOOL, x.v or y.v),
+    }
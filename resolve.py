@@ -0,0 +1,171 @@
+# Lexical addressing for the tree walker (core.py). A variable is only ever looked
+# up in the running function's blocks, innermost first, and a block's definitions
+# happen in the order its statements are written, so which definition a name in a
+# statement refers to is known before the program runs. The Resolver works that out
+# when a program is loaded, and gives every definition in a function (its
+# parameters and var statements) a slot of its own in a flat frame: a list the size
+# of the function's slots, made once per call, that variables are read and written
+# in by index. Blocks then cost nothing to enter and leave, and a lookup costs the
+# same however deep it's nested.
+#
+# A name that isn't defined where it's used gets a slot that's never written, so it
+# reads as undefined, and a definition of a name its block already has, or an
+# assignment to a name that isn't defined, gets NO_SLOT. Both are recorded in errors,
+# though it's the tree walker that reports them, once (and if) it reaches them, as
+# before.
+#
+# AST nodes are frozen and shared (see parser/element.py), so a Resolution keeps
+# what it works out in tables keyed by node, rather than on the nodes themselves.
+from intbase import InterpreterBase
+
+NO_SLOT = -1
+
+_BUILTINS = ("print", "inputi", "inputs")
+
+
+# Whether statements, run as a block, define a variable in it (a var statement of
+# their own, not one in a block inside them). One that doesn't needs no scope of its
+# own where variables are kept by name, as every name its statements use is one of
+# the blocks around it.
+def declares_variables(statements):
+    return any(statement.elem_type == InterpreterBase.VAR_DEF_NODE for statement in statements or ())
+
+
+class Resolution:
+    def __init__(self):
+        # var, = and var def node -> slot, or NO_SLOT
+        self.slots = {}
+        self.frame_sizes = {}  # function node -> slots in its frame
+        self.param_slots = {}  # function node -> slot of each of its parameters, in order
+        # statement -> {name: slot} of the variables defined where it runs
+        self.scopes = {}
+        # call of a builtin -> ((slot, name), ...) of the variables in its arguments
+        self.builtin_variables = {}
+        # (line, message) for each definition and use of a variable that's bound to
+        # fail if it's reached, where line is the line of the statement it's in
+        self.errors = []
+
+
+class Resolver:
+    # fields: whether a dotted name (v3's a.b.c) is its base variable
+    def __init__(self, fields=False):
+        self.fields = fields
+
+    def resolve(self, functions):
+        resolution = Resolution()
+        for func_ast in functions:
+            self.__function(resolution, func_ast)
+        return resolution
+
+    def __function(self, resolution, func_ast):
+        self.__resolution = resolution
+        self.__size = 0
+        self.__undefined = {}  # name -> the never-written slot it reads as undefined from
+        self.__line = func_ast.line  # of the statement being resolved
+        params = {}
+        param_slots = []
+        for arg_ast in func_ast.args:
+            # a repeated parameter name is one variable, holding the last argument
+            if arg_ast.name not in params:
+                params[arg_ast.name] = self.__new_slot()
+            param_slots.append(params[arg_ast.name])
+        # the body is a block of its own inside the parameters' (see __run_statements)
+        self.__block(func_ast.statements, params)
+        resolution.frame_sizes[func_ast] = self.__size
+        resolution.param_slots[func_ast] = param_slots
+
+    def __new_slot(self):
+        self.__size += 1
+        return self.__size - 1
+
+    def __block(self, statements, visible):
+        declared = set()
+        for statement in statements or ():
+            visible = self.__statement(statement, visible, declared)
+
+    # resolves statement, run with the variables visible, in a block that's defined
+    # the names declared so far; gives the variables visible after it
+    def __statement(self, statement, visible, declared):
+        resolution = self.__resolution
+        resolution.scopes[statement] = visible
+        if statement.span:  # not a for's init or update, which are on the for's line
+            self.__line = statement.line
+        kind = statement.elem_type
+        if kind == InterpreterBase.VAR_DEF_NODE:
+            name = statement.name
+            if name in declared:
+                resolution.slots[statement] = NO_SLOT
+                resolution.errors.append((statement.line, f"Duplicate definition for variable {name}"))
+                return visible
+            declared.add(name)
+            slot = resolution.slots[statement] = self.__new_slot()
+            visible = dict(visible)
+            visible[name] = slot
+        elif kind == "=":
+            name = self.__base_name(statement)
+            slot = visible.get(name)
+            if slot is None:
+                slot = NO_SLOT
+                resolution.errors.append((self.__line, f"Undefined variable {name} in assignment"))
+            resolution.slots[statement] = slot
+            self.__expression(statement.expression, visible)
+        elif kind == InterpreterBase.FCALL_NODE:
+            self.__expression(statement, visible)
+        elif kind == InterpreterBase.RETURN_NODE:
+            if statement.expression is not None:
+                self.__expression(statement.expression, visible)
+        elif kind == InterpreterBase.IF_NODE:
+            self.__expression(statement.condition, visible)
+            self.__block(statement.statements, visible)
+            self.__block(statement.else_statements, visible)
+        elif kind == InterpreterBase.FOR_NODE:
+            # the loop's init, condition and update run in the block it's in, and its
+            # body in a new block each time around
+            visible = self.__statement(statement.init, visible, declared)
+            self.__expression(statement.condition, visible)
+            self.__block(statement.statements, visible)
+            self.__line = statement.line
+            self.__statement(statement.update, visible, declared)
+        elif kind == InterpreterBase.TRY_NODE:
+            self.__block(statement.statements, visible)
+            for catcher in statement.catchers:
+                self.__block(catcher.statements, visible)
+        elif kind == InterpreterBase.RAISE_NODE:
+            self.__expression(statement.exception_type, visible)
+        return visible
+
+    def __base_name(self, node):
+        if self.fields and node.path is not None:
+            return node.path.base
+        return node.name
+
+    def __expression(self, expr_ast, visible):
+        resolution = self.__resolution
+        # each node, with the variable lists of the builtin calls it's an argument of
+        stack = [(expr_ast, ())]
+        while stack:
+            node, calls = stack.pop()
+            kind = node.elem_type
+            if kind == InterpreterBase.VAR_NODE:
+                name = self.__base_name(node)
+                slot = visible.get(name)
+                if slot is None:
+                    slot = self.__undefined.get(name)
+                    if slot is None:
+                        slot = self.__undefined[name] = self.__new_slot()
+                    resolution.errors.append((self.__line, f"Undefined variable {name}"))
+                resolution.slots[node] = slot
+                for variables in calls:
+                    variables.append((slot, name))
+            elif kind == InterpreterBase.FCALL_NODE:
+                if node.name in _BUILTINS:
+                    variables = resolution.builtin_variables[node] = []
+                    calls += (variables,)
+                stack.extend((arg, calls) for arg in node.args)
+            elif kind == InterpreterBase.CHAIN_NODE:
+                stack.extend((operand, calls) for operand in node.operands)
+            elif kind in (InterpreterBase.NEG_NODE, InterpreterBase.NOT_NODE):
+                stack.append((node.op1, calls))
+            elif hasattr(node, "op2"):
+                stack.append((node.op1, calls))
+                stack.append((node.op2, calls))
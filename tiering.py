@@ -0,0 +1,150 @@
+# Tiered execution for the tree walkers (the "tiered" engine of the v2 and v3
+# interpreters). Programs start out walking the AST, which costs nothing up front;
+# each function counts its calls, and the loops in it their back edges (jumps back
+# to the condition for another iteration), and a function that crosses either
+# threshold is compiled to closures (interpreter_v_N/compile_vN.py) and runs that way
+# from its next call on. Where the interpreter can (v2), a loop that's hot is also
+# switched over to compiled code right away, so a long loop in a function that's
+# only called once, e.g. main, doesn't have to wait for a next call.
+#
+# A function that can't be compiled stays with the tree walker; every tier-up, or
+# attempt at one, is recorded as a TierUp event, and counters() gives each
+# function's counts, for tuning the thresholds.
+from intbase import InterpreterBase
+
+
+# raised by an interpreter's compile function for a function it won't compile
+class CannotTierUp(Exception):
+    pass
+
+
+class TierUp:
+    def __init__(self, function, trigger, calls, back_edges, error=None, line=None):
+        self.function = function  # name/number of params
+        # "calls" or "back edges" for a function compiled for its next call, "loop"
+        # for a running loop switched over to compiled code
+        self.trigger = trigger
+        self.calls = calls
+        self.back_edges = back_edges
+        self.error = error  # why it couldn't be compiled, or None
+        self.line = line  # of the loop, for a loop
+
+    def __repr__(self):
+        where = f" (loop on line {self.line})" if self.line is not None else ""
+        outcome = f"failed: {self.error}" if self.error is not None else "compiled"
+        return f"TierUp({self.function}{where} after {self.calls} calls, {self.back_edges} back edges: {outcome})"
+
+
+# what a function that couldn't be compiled is marked with
+_FAILED = object()
+
+
+class Tiering:
+    def __init__(self, call_threshold=50, back_edge_threshold=1000, on_tier_up=None):
+        self.call_threshold = call_threshold
+        self.back_edge_threshold = back_edge_threshold
+        self.on_tier_up = on_tier_up  # called with each TierUp, if not None
+        self.events = []
+        self.__calls = {}  # function AST node -> calls so far
+        self.__back_edges = {}  # function AST node -> back edges taken in its loops so far
+        self.__compiled = {}  # function AST node -> closure running its body, or _FAILED
+        self.__loops = {}  # for statement -> closure running the rest of it
+        self.__loop_functions = {}  # for statement -> function AST node it's in
+        self.__compile_function = None
+        self.__compile_loop = None
+
+    # Start counting afresh for a run of a program with the function AST nodes in
+    # functions. compile_function(func_ast) gives a closure running a function's body;
+    # compile_loop(for_ast), if given, one running the rest of a loop.
+    def start(self, functions, compile_function, compile_loop=None):
+        self.events = []
+        self.__calls = dict.fromkeys(functions, 0)
+        self.__back_edges = dict.fromkeys(functions, 0)
+        self.__compiled = {}
+        self.__loops = {}
+        self.__loop_functions = {}
+        for func_ast in functions:
+            self.__find_loops(func_ast.statements, func_ast)
+        self.__compile_function = compile_function
+        self.__compile_loop = compile_loop
+
+    def __find_loops(self, statements, func_ast):
+        for statement in statements or ():
+            if statement.elem_type == InterpreterBase.FOR_NODE:
+                self.__loop_functions[statement] = func_ast
+                self.__find_loops(statement.statements, func_ast)
+            elif statement.elem_type == InterpreterBase.IF_NODE:
+                self.__find_loops(statement.statements, func_ast)
+                self.__find_loops(statement.else_statements, func_ast)
+
+    # Count a call of func_ast; gives the closure to run its body with, if it's
+    # compiled (now or before), or None to walk it
+    def call(self, func_ast):
+        compiled = self.__compiled.get(func_ast)
+        if compiled is not None:
+            return None if compiled is _FAILED else compiled
+        calls = self.__calls[func_ast] = self.__calls.get(func_ast, 0) + 1
+        if calls >= self.call_threshold:
+            return self.__tier_up(func_ast, "calls")
+        return None
+
+    # Count a back edge of the loop for_ast; gives a closure to run the rest of the
+    # loop with, if it's to switch over to compiled code now, or None to keep walking it
+    def back_edge(self, for_ast):
+        func_ast = self.__loop_functions.get(for_ast)
+        if func_ast is None:
+            return None
+        compiled = self.__compiled.get(func_ast)
+        if compiled is None:
+            back_edges = self.__back_edges[func_ast] = self.__back_edges.get(func_ast, 0) + 1
+            if back_edges < self.back_edge_threshold:
+                return None
+            compiled = self.__tier_up(func_ast, "back edges")
+        if compiled is None or compiled is _FAILED or self.__compile_loop is None:
+            return None
+        if for_ast not in self.__loops:
+            # the function's compiled, but this call of it is still being walked
+            try:
+                self.__loops[for_ast] = self.__compile_loop(for_ast)
+            except Exception as e:
+                self.__loops[for_ast] = None
+                self.__record(func_ast, "loop", e, for_ast.line)
+            else:
+                self.__record(func_ast, "loop", None, for_ast.line)
+        return self.__loops[for_ast]
+
+    # compile func_ast for its next call; gives the closure running its body, or None
+    # if it couldn't be
+    def __tier_up(self, func_ast, trigger):
+        try:
+            compiled = self.__compile_function(func_ast)
+        except Exception as e:
+            self.__compiled[func_ast] = _FAILED
+            self.__record(func_ast, trigger, e)
+            return None
+        self.__compiled[func_ast] = compiled
+        self.__record(func_ast, trigger, None)
+        return compiled
+
+    def __record(self, func_ast, trigger, error, line=None):
+        event = TierUp(
+            f"{func_ast.name}/{len(func_ast.args)}",
+            trigger,
+            self.__calls.get(func_ast, 0),
+            self.__back_edges.get(func_ast, 0),
+            None if error is None else str(error) or type(error).__name__,
+            line,
+        )
+        self.events.append(event)
+        if self.on_tier_up is not None:
+            self.on_tier_up(event)
+
+    # {name/number of params: (calls, back edges, tier)} for each function, where
+    # tier is "ast", "compiled" or "failed"; counting stops once a function's compiled
+    def counters(self):
+        counters = {}
+        for func_ast, calls in self.__calls.items():
+            compiled = self.__compiled.get(func_ast)
+            tier = "ast" if compiled is None else "failed" if compiled is _FAILED else "compiled"
+            counters[f"{func_ast.name}/{len(func_ast.args)}"] = (calls, self.__back_edges.get(func_ast, 0), tier)
+        return counters
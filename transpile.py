@@ -0,0 +1,143 @@
+# What the Brewin-to-Python transpilers (interpreter_v_2/transpile_v2.py and
+# interpreter_v_3/transpile_v3.py) have in common: building the Python source, with
+# the Brewin statement every line of it came from; compiling and running it; and a
+# cache of compiled programs.
+#
+# A transpiled program is a Python module with one function per Brewin function, and
+# a _run function that calls main. It works on bare Python values and calls back
+# into a handful of helpers (its runtime) for output, input and errors, which are
+# handed to it as its globals each time it runs, so the same compiled code serves
+# every interpreter. When a Brewin error escapes it, the Python line each of its
+# frames was on gives the statement to locate the error at, as the tree walker's
+# __run_statements would.
+import itertools
+import threading
+from collections import OrderedDict
+
+from intbase import BrewinError, ErrorType
+from parser.astcache import source_key
+
+
+# raised by a transpiler for a program it can't express in Python, which is then run
+# some other way
+class Untranslatable(Exception):
+    pass
+
+
+# Lines of Python being generated, each with the Brewin statement it came from (or
+# None)
+class PythonSource:
+    INDENT = "    "
+
+    def __init__(self):
+        self.lines = []
+        self.statements = [None]  # of each line, numbered from 1 as Python does
+        self.traced = []  # statements _trace prints, by the number it's called with
+
+    def add(self, depth, text, statement=None):
+        self.lines.append(PythonSource.INDENT * depth + text)
+        self.statements.append(statement)
+
+    # a line printing statement, for running with trace output
+    def add_trace(self, depth, statement):
+        self.add(depth, f"_trace({len(self.traced)})", statement)
+        self.traced.append(statement)
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+
+class TranspiledProgram:
+    __names = itertools.count()
+
+    def __init__(self, python_source):
+        self.source = python_source.text()
+        self.statements = tuple(python_source.statements)
+        self.traced = tuple(python_source.traced)
+        self.filename = f"<brewin {next(TranspiledProgram.__names)}>"
+        try:
+            self.code = compile(self.source, self.filename, "exec")
+        except (SyntaxError, RecursionError, MemoryError) as e:
+            raise Untranslatable(f"Python can't compile it: {e}") from e  # e.g. too deeply nested
+
+    # run the program's main function, with the helpers in runtime as its globals
+    def run(self, interpreter, runtime):
+        namespace = dict(runtime)
+        namespace["_trace"] = lambda index: print(self.traced[index])
+        exec(self.code, namespace)
+        try:
+            return namespace["_run"]()
+        except BrewinError as error:
+            self.__locate(interpreter, error)
+            raise
+
+    # give error the position of the statement running in the innermost frame of this
+    # program it passed through, as each block does in the tree walker
+    def __locate(self, interpreter, error):
+        lines = []
+        traceback = error.__traceback__
+        while traceback is not None:
+            if traceback.tb_frame.f_code.co_filename == self.filename:
+                lines.append(traceback.tb_lineno)
+            traceback = traceback.tb_next
+        for line in reversed(lines):
+            statement = self.statements[line] if line < len(self.statements) else None
+            if statement is not None:
+                interpreter.locate_error(error, statement)
+
+
+# The helpers every transpiled program calls, bound to interpreter
+def runtime(interpreter):
+    error = interpreter.error
+
+    # raise an error once the values it's given, which the tree walker evaluates
+    # before raising it, have been
+    def fail(error_type, message, *evaluated):
+        error(error_type, message)
+
+    return {"ErrorType": ErrorType, "_fail": fail, "_output": interpreter.output}
+
+
+# A bounded, thread-safe LRU cache of transpiled programs (None for one that couldn't
+# be transpiled), keyed by the source and whatever else the transpiler's output
+# depends on
+class TranspileCache:
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # the program cached for key, transpiling it with make() on a miss
+    def get_or_make(self, key, make):
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return self.__entries[key]
+            self.misses += 1
+        try:
+            program = make()
+        except Untranslatable:
+            program = None
+        with self.__lock:
+            self.__entries[key] = program
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+        return program
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+CACHE = TranspileCache()
+
+
+# the key program is cached under, for a transpiler whose output also depends on
+# the things in extra
+def cache_key(version, program, *extra):
+    return (version, source_key(program), *extra)